@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import logging
 from pathlib import Path
 from datetime import timedelta
@@ -7,24 +8,30 @@ from porter import Porter
 
 # --- Third-Party Imports ---
 from dotenv import load_dotenv
-from flask import Flask, request, session, render_template
+from flask import Flask, request, session, render_template, jsonify
 from flask_socketio import SocketIO
 from werkzeug.middleware.proxy_fix import ProxyFix
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
-from rich.logging import RichHandler
 from rich.rule import Rule
 
 # --- Application Imports ---
-from backbone import (FileManager, ContentManager, UserManager, BlocklistManager, 
-                      ActionLogger, log_history, PYCLIP_AVAILABLE, NotesManager)
+from backbone import (FileManager, ContentManager, ClipHistory, UserManager, BlocklistManager, 
+                      RateLimiter, HashingPool, ActionLogger, log_history, configure_history_logger,
+                      PYCLIP_AVAILABLE, NotesManager, LeaderLock, configure_shared_state,
+                      FileSystemWatcher, INOTIFY_AVAILABLE, SearchIndex, DedupStore,
+                      IntegrityVerifier, DeltaSync, JobManager, Trash, BlobCache, ClientRegistry,
+                      ConnectionSupervisor, install_lean_websockets, metrics_registry, instrument_flask,
+                      instrument_socketio, private_dir_beside, TRASH_DIRNAME, STORE_DIRNAME)
+from cluster import WorkerCluster, FORK_AVAILABLE
 
 from routes import admin_bp, main_bp, ai_chat_bp
 from routes.routes_admin import init_admin_routes
-from routes.routes_index import init_index_routes, register_socketio_events
+from routes.routes_index import (init_index_routes, register_socketio_events, broadcast_file_changes,
+                                 broadcast_job_update)
 from routes.routes_ai_chat import init_ai_chat_routes
-from routes.utils import get_local_ip
+from routes.utils import network_info
 from routes.ssl_utils import ensure_ssl_cert
 
 # --- Initial Setup ---
@@ -82,10 +89,7 @@ class _SSLStderrFilter:
         return getattr(self._stream, name)
 
 _sys.stderr = _SSLStderrFilter(_sys.stderr)
-history_logger = logging.getLogger('history')
-history_logger.setLevel(logging.INFO)
-history_logger.addHandler(RichHandler(console=console, show_path=False, show_level=False, show_time=True, markup=True))
-history_logger.propagate = False
+configure_history_logger(console)
 
 # --- Directory and Path Setup ---
 APP_DIR_NAME = "SnailSynk"
@@ -99,30 +103,176 @@ except Exception as e:
     sys.exit(1)
 
 # --- App Configuration & Initialization ---
-app = Flask(__name__, instance_relative_config=True)
+# SNAILSYNK_INSTANCE_DIR relocates config and state (e.g. for throwaway benchmark runs).
+app = Flask(__name__, instance_relative_config=True,
+            instance_path=os.path.abspath(os.environ['SNAILSYNK_INSTANCE_DIR']) if os.environ.get('SNAILSYNK_INSTANCE_DIR') else None)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', os.urandom(24))
 app.config['FILES_FOLDER'] = str(files_folder_path)
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
-socketio = SocketIO(app, cors_allowed_origins='*')
-socketio.active_clients = {}
+
+# --- Worker Processes ---
+# SNAILSYNK_WORKERS > 1 forks that many server processes onto the same port. Their
+# shared state lives under instance/run and Socket.IO events go through a local broker.
+WORKER_COUNT = max(1, int(os.environ.get('SNAILSYNK_WORKERS', 1)))
+worker_cluster = None
+if WORKER_COUNT > 1:
+    if FORK_AVAILABLE:
+        worker_cluster = WorkerCluster(os.path.join(app.instance_path, 'run'), WORKER_COUNT)
+    else:
+        console.log("[bold yellow]SNAILSYNK_WORKERS ignored: multi-worker mode needs os.fork (Linux/macOS).[/bold yellow]")
+# Only with several processes can a shared-state file change behind a store's back.
+configure_shared_state(multi_process=worker_cluster is not None)
+
+socketio_options = {'client_manager': worker_cluster.client_manager()} if worker_cluster else {}
+# Engine.IO heartbeat: a client that leaves a ping unanswered for SNAILSYNK_PING_TIMEOUT seconds is dropped.
+socketio_options.update(ping_interval=float(os.environ.get('SNAILSYNK_PING_INTERVAL', 25)),
+                        ping_timeout=float(os.environ.get('SNAILSYNK_PING_TIMEOUT', 20)))
+socketio = SocketIO(app, cors_allowed_origins='*', **socketio_options)
+if worker_cluster and socketio.async_mode != 'gevent':
+    console.log(f"[bold red]FATAL: multi-worker mode requires gevent (async mode is '{socketio.async_mode}').[/bold red]")
+    sys.exit(1)
+# Prometheus metrics at /admin/metrics; in multi-worker mode each worker publishes its own under instance/run/metrics.
+metrics_registry.configure(share_dir=worker_cluster.state_path('metrics') if worker_cluster else None)
+instrument_flask(app)
+instrument_socketio(socketio.server)
+# Lets a scraper read /admin/metrics with 'Authorization: Bearer <token>' instead of an admin session.
+METRICS_TOKEN = os.environ.get('SNAILSYNK_METRICS_TOKEN') or None
+# Idle WebSockets free their permessage-deflate state between messages (see backbone/lean_websocket.py).
+install_lean_websockets(socketio.server.eio)
+# Connected clients; in multi-worker mode each worker publishes its own under instance/run/clients.
+client_registry = ClientRegistry(share_dir=worker_cluster.state_path('clients') if worker_cluster else None)
+# Connection caps (0 = no cap): per client IP and for the whole server, across all workers.
+connection_supervisor = ConnectionSupervisor(client_registry,
+                                             max_per_ip=int(os.environ.get('SNAILSYNK_MAX_CONNECTIONS_PER_IP', 100)),
+                                             max_total=int(os.environ.get('SNAILSYNK_MAX_CONNECTIONS', 0)))
 
 # --- Initialize Managers ---
-file_manager = FileManager(app.config['FILES_FOLDER'], app.instance_path)
-content_manager = ContentManager()
-user_manager = UserManager(os.path.join(app.instance_path, 'user.json'))
+# Argon2 runs on a capped worker pool so hashing never stalls the event loop.
+hashing_pool = HashingPool(use_gevent=(socketio.async_mode == 'gevent'))
+metrics_registry.gauge('snailsynk_connected_clients', 'Socket.IO clients connected.').set_function(client_registry.local_count)
+metrics_registry.gauge('snailsynk_hashing_pending', 'Hashing jobs queued or running.').set_function(
+    lambda: hashing_pool.get_stats()['pending'])
+# Content-addressed uploads: identical files are stored once. SNAILSYNK_DEDUP:
+# 'off' (default), 'auto' (reflink if supported, else hardlink), 'hardlink' or 'reflink'.
+DEDUP_MODE = os.environ.get('SNAILSYNK_DEDUP', 'off').lower()
+dedup_store = DedupStore(app.config['FILES_FOLDER'], private_dir_beside(app.config['FILES_FOLDER'], STORE_DIRNAME),
+                         mode=DEDUP_MODE) if DEDUP_MODE != 'off' else None
+# Deletes move items into a trash folder beside the share; a background reaper frees the space later.
+# SNAILSYNK_TRASH_RETENTION_DAYS (default 30, 0 = reclaim at the next pass) and
+# SNAILSYNK_TRASH_MAX_GB (default 0 = no cap) set how much is kept.
+trash = Trash(private_dir_beside(app.config['FILES_FOLDER'], TRASH_DIRNAME),
+              os.path.join(app.instance_path, 'trash.json'),
+              retention_days=float(os.environ.get('SNAILSYNK_TRASH_RETENTION_DAYS', 30)),
+              max_bytes=float(os.environ.get('SNAILSYNK_TRASH_MAX_GB', 0)) * 1024 ** 3)
+file_manager = FileManager(app.config['FILES_FOLDER'], app.instance_path, password_hasher=hashing_pool,
+                           secret_key=app.secret_key, dedup_store=dedup_store, trash=trash)
+# Pins and past buffer texts are kept in an append-only log that survives restarts.
+# SNAILSYNK_HISTORY_RETENTION_DAYS (default 30), SNAILSYNK_HISTORY_MAX_REVISIONS (default 200)
+# and SNAILSYNK_HISTORY_MAX_MB (default 64, 0 = no cap) bound the buffer history;
+# SNAILSYNK_PIN_LIMIT caps pins (default 0 = no cap).
+clip_history = ClipHistory(os.path.join(app.instance_path, 'clip_history.jsonl'),
+                           retention_days=float(os.environ.get('SNAILSYNK_HISTORY_RETENTION_DAYS', 30)),
+                           max_revisions=int(os.environ.get('SNAILSYNK_HISTORY_MAX_REVISIONS', 200)),
+                           max_bytes=float(os.environ.get('SNAILSYNK_HISTORY_MAX_MB', 64)) * 1024 ** 2)
+content_manager = ContentManager(pin_limit=int(os.environ.get('SNAILSYNK_PIN_LIMIT', 0)), history=clip_history,
+                                 state_path=worker_cluster.state_path('content.json') if worker_cluster else None)
+# Binary clipboard items (screenshots, big pastes) in an LRU cache of SNAILSYNK_CLIP_CACHE_MB
+# (default 1024); SNAILSYNK_CLIP_BLOB_MAX_MB (default 100) caps a single item.
+blob_cache = BlobCache(os.path.join(app.instance_path, 'clip_blobs'),
+                       max_bytes=float(os.environ.get('SNAILSYNK_CLIP_CACHE_MB', 1024)) * 1024 ** 2,
+                       max_blob_bytes=float(os.environ.get('SNAILSYNK_CLIP_BLOB_MAX_MB', 100)) * 1024 ** 2)
+user_manager = UserManager(os.path.join(app.instance_path, 'user.json'), password_hasher=hashing_pool)
 blocklist_manager = BlocklistManager(os.path.join(app.instance_path, 'blocklist.json'))
+# Optional JSON overrides, e.g. SNAILSYNK_RATE_LIMITS='{"upload": {"capacity": 100, "refill_per_sec": 5}}'
+try:
+    RATE_LIMIT_OVERRIDES = json.loads(os.environ.get('SNAILSYNK_RATE_LIMITS') or '{}')
+except ValueError as e:
+    logging.warning(f"Ignoring SNAILSYNK_RATE_LIMITS: not valid JSON ({e}).")
+    RATE_LIMIT_OVERRIDES = {}
+rate_limiter = RateLimiter(blocklist_manager, policies=RATE_LIMIT_OVERRIDES)
 action_logger = ActionLogger(os.path.join(app.instance_path, 'actions.jsonl'), socketio=socketio)
 notes_manager = NotesManager(os.path.join(app.instance_path, 'notes'))
 
+# One worker runs cluster-wide jobs (watcher broadcasts, search index upkeep).
+cluster_leader = LeaderLock(worker_cluster.state_path('leader.lock')) if worker_cluster else None
+
+# Persistent filename index behind /api/files/search. SNAILSYNK_SEARCH_CONTENT=1 also
+# indexes the text of small text files.
+search_index = SearchIndex(app.config['FILES_FOLDER'], os.path.join(app.instance_path, 'search_index.db'),
+                           index_contents=os.environ.get('SNAILSYNK_SEARCH_CONTENT') == '1')
+
+# Re-hashes uploaded files in the background to catch bit rot. SNAILSYNK_VERIFY_INTERVAL
+# is in seconds (0 disables); SNAILSYNK_VERIFY_RATE_MB caps the read rate.
+VERIFY_INTERVAL = float(os.environ.get('SNAILSYNK_VERIFY_INTERVAL', 86400))
+integrity_verifier = IntegrityVerifier(file_manager, os.path.join(app.instance_path, 'integrity.json'),
+                                       rate_mb=float(os.environ.get('SNAILSYNK_VERIFY_RATE_MB', 20)),
+                                       interval=VERIFY_INTERVAL) if VERIFY_INTERVAL > 0 else None
+
+# Manifests and block signatures for clients that mirror folders (/api/sync/*).
+delta_sync = DeltaSync(file_manager, use_gevent=(socketio.async_mode == 'gevent'))
+
+# Long move/copy/delete/zip operations run as resumable background jobs (/api/jobs).
+# SNAILSYNK_JOB_WORKERS sets how many run at once.
+job_manager = JobManager(file_manager, os.path.join(app.instance_path, 'jobs.json'),
+                         os.path.join(app.instance_path, 'job_outputs'),
+                         max_workers=int(os.environ.get('SNAILSYNK_JOB_WORKERS', 1)))
+job_manager.subscribe(broadcast_job_update)
+
+def index_fs_changes(batch):
+    if cluster_leader is None or cluster_leader.is_leader():
+        search_index.apply_fs_changes(batch)
+
+# Picks up files added by other tools (rsync, camera import). SNAILSYNK_FS_WATCH:
+# 'auto' (inotify, polling fallback), 'poll' or 'off'.
+FS_WATCH_MODE = os.environ.get('SNAILSYNK_FS_WATCH', 'auto').lower()
+fs_watcher = None
+if FS_WATCH_MODE != 'off':
+    fs_watcher = FileSystemWatcher(app.config['FILES_FOLDER'], use_inotify=(FS_WATCH_MODE != 'poll'),
+                                   poll_interval=float(os.environ.get('SNAILSYNK_FS_POLL_INTERVAL', 2.0)))
+    file_manager.attach_watcher(fs_watcher)
+    fs_watcher.subscribe(broadcast_file_changes)
+    fs_watcher.subscribe(index_fs_changes)
+else:
+    # Without a watcher the index only hears about changes made through the app.
+    file_manager.add_change_listener(search_index.queue_paths)
+
+def start_background_services():
+    """Per-process background work; in multi-worker mode this runs inside each worker after the fork."""
+    network_info.start()
+    if cluster_leader is None or cluster_leader.is_leader():
+        search_index.start_background_reconcile()
+        if integrity_verifier:
+            integrity_verifier.start()
+        if dedup_store:
+            dedup_store.start_background_scrubber(interval=float(os.environ.get('SNAILSYNK_DEDUP_SCRUB_INTERVAL', 3600)))
+        trash.start_background_reaper(interval=float(os.environ.get('SNAILSYNK_TRASH_REAP_INTERVAL', 3600)))
+    job_manager.start(spawn=socketio.start_background_task, sleep=socketio.sleep,
+                      run_jobs=cluster_leader is None or cluster_leader.is_leader())
+    if fs_watcher:
+        fs_watcher.start(spawn=socketio.start_background_task, sleep=socketio.sleep)
+    client_registry.start_flusher(spawn=socketio.start_background_task, sleep=socketio.sleep)
+    metrics_registry.start_flusher(spawn=socketio.start_background_task, sleep=socketio.sleep)
+    connection_supervisor.start(socketio.server, spawn=socketio.start_background_task, sleep=socketio.sleep,
+                                on_drop=lambda client: socketio.emit('client_left', {'sid': client['sid'], 'ip': client['ip']},
+                                                                     room='admin_room'))
+
+def purge_worker_state(pid):
+    """Runs in the supervisor when a worker dies: drops what that worker published."""
+    client_registry.purge_owner(pid)
+    metrics_registry.purge_owner(pid)
+
 # Migrate old log entries from 'ip' to 'ip_address' field
 migrated_count = action_logger.migrate_old_logs()
 if migrated_count > 0:
     console.log(f"[bold green]Migrated {migrated_count} log entries to new format[/bold green]")
 
 # --- Initialize and Register Blueprints ---
-init_admin_routes(user_manager, socketio, blocklist_manager, action_logger, notes_manager)
-init_index_routes(file_manager, content_manager, action_logger, socketio)
+init_admin_routes(user_manager, socketio, blocklist_manager, action_logger, notes_manager, rate_limiter, hashing_pool, dedup_store,
+                  integrity_verifier, file_manager, cr=client_registry, cs=connection_supervisor,
+                  mr=metrics_registry, mt=METRICS_TOKEN)
+init_index_routes(file_manager, content_manager, action_logger, socketio, leader=cluster_leader, si=search_index,
+                  ds=delta_sync, jm=job_manager, bc=blob_cache, cr=client_registry, cs=connection_supervisor)
 init_ai_chat_routes(action_logger, app.instance_path)
 
 app.register_blueprint(admin_bp)
@@ -132,16 +282,47 @@ app.register_blueprint(ai_chat_bp)
 # --- Register SocketIO Events ---
 register_socketio_events(socketio)
 
+@app.context_processor
+def inject_socketio_transports():
+    # Long-polling needs sticky sessions, which a shared listening socket can't give.
+    return {'socketio_transports': ['websocket'] if worker_cluster else ['polling', 'websocket']}
+
 # --- App-level Request Hooks ---
+# Endpoints that are expensive or brute-forceable, mapped to their rate-limit class.
+RATE_LIMITED_ENDPOINTS = {
+    'main.upload_file': 'upload',
+    'main.clipboard_blob_upload': 'upload',
+    'main.get_image_preview': 'preview',
+    'main.generate_qr_code': 'qr',
+    'main.download_locked_file': 'password',
+    'main.unlock_folder': 'password',
+    'main.unlock_batch_files': 'password',
+    'admin.login': 'login',
+}
+
 @app.before_request
 def before_request_handler():
     # Blocklist Check
     if not request.path.startswith('/static') and request.remote_addr != '127.0.0.1':
         if blocklist_manager.is_blocked(request.remote_addr):
             return render_template('error.html', error_code=403, error_title="Forbidden", error_description="Your IP address has been banned by the administrator."), 403
+
+    # Rate Limiting
+    limit_class = RATE_LIMITED_ENDPOINTS.get(request.endpoint)
+    if limit_class and request.remote_addr != '127.0.0.1' and not (limit_class == 'login' and request.method != 'POST'):
+        allowed, retry_after, banned = rate_limiter.check(request.remote_addr, limit_class)
+        if banned:
+            action_logger.log(request.remote_addr, 'IP_AUTO_BAN', {'class': limit_class, 'ban_seconds': rate_limiter.escalation['ban_seconds']})
+            socketio.emit('update_blocklist', {'blocklist': blocklist_manager.get_blocklist()}, room='admin_room')
+        if not allowed:
+            headers = {'Retry-After': str(max(1, int(retry_after + 0.999)))}
+            message = "Too many requests. Please slow down and try again shortly."
+            if request.path.startswith('/api/') or request.is_json:
+                return jsonify(success=False, error=message), 429, headers
+            return render_template('error.html', error_code=429, error_title="Too Many Requests", error_description=message), 429, headers
     
     # Page Access Logging
-    ignored_paths = ('/static/', '/api/', '/favicon.ico', '/socket.io/', '/admin/api/')
+    ignored_paths = ('/static/', '/api/', '/favicon.ico', '/socket.io/', '/admin/api/', '/admin/metrics')
     if request.path.startswith(ignored_paths): return
     remote_ip = request.remote_addr
     ip_color = "yellow" if remote_ip != "127.0.0.1" else "cyan"
@@ -183,7 +364,7 @@ def handle_error(e):
 # --- Main Execution ---
 if __name__ == '__main__':
     APP_PORT = int(os.environ.get('SNAILSYNK_PORT', 9000))
-    local_ip = get_local_ip()
+    local_ip = network_info.local_ip
     
     # Generate or load SSL certificate
     certfile, keyfile = ensure_ssl_cert(app.instance_path)
@@ -200,6 +381,16 @@ if __name__ == '__main__':
     info_text.append("\n")
     info_text.append("HTTPS: ", style="default")
     info_text.append("Enabled (Self-Signed)", style="bold green")
+    info_text.append("\n")
+    info_text.append("File Watcher: ", style="default")
+    if not fs_watcher:
+        info_text.append("Disabled", style="bold yellow")
+    else:
+        info_text.append("inotify" if fs_watcher.use_inotify else "Polling", style="bold green")
+    if worker_cluster:
+        info_text.append("\n")
+        info_text.append("Workers: ", style="default")
+        info_text.append(str(WORKER_COUNT), style="bold green")
 
     panel_content = f"""
 [bold]Access from this computer:[/] [cyan]https://localhost:{APP_PORT}[/]
@@ -224,4 +415,11 @@ if __name__ == '__main__':
     # --- Start Server with HTTP→HTTPS auto-redirect on same port ---
     porter = Porter(certfile, keyfile, APP_PORT)
     porter.activate()
-    socketio.run(app, host='0.0.0.0', port=APP_PORT, certfile=certfile, keyfile=keyfile)
\ No newline at end of file
+    if worker_cluster:
+        # The supervisor never emits itself: its Socket.IO manager must stay uninitialized so each
+        # forked worker starts its own broker listener.
+        worker_cluster.serve(app, '0.0.0.0', APP_PORT, on_worker_start=start_background_services,
+                             on_worker_exit=purge_worker_state, certfile=certfile, keyfile=keyfile)
+    else:
+        start_background_services()
+        socketio.run(app, host='0.0.0.0', port=APP_PORT, certfile=certfile, keyfile=keyfile)
\ No newline at end of file
@@ -1,9 +1,25 @@
 # backbone/__init__.py
 
-from .utils import log_history, PYCLIP_AVAILABLE
+from .utils import log_history, configure_history_logger, private_dir_beside, PYCLIP_AVAILABLE
+from .metrics import REGISTRY as metrics_registry, instrument_flask, instrument_socketio
+from .hash_pool import HashingPool
+from .shared_state import SharedJSONStore, LeaderLock, configure_shared_state
+from .fs_watcher import FileSystemWatcher, INOTIFY_AVAILABLE
+from .search_index import SearchIndex
+from .dedup_store import DedupStore, STORE_DIRNAME
+from .integrity import IntegrityVerifier
+from .delta_sync import DeltaSync
+from .job_manager import JobManager
+from .trash import Trash, TRASH_DIRNAME
 from .file_manager import FileManager
+from .clip_history import ClipHistory
+from .blob_cache import BlobCache
+from .client_registry import ClientRegistry
+from .connection_supervisor import ConnectionSupervisor
+from .lean_websocket import install_lean_websockets
 from .content_manager import ContentManager
 from .user_manager import UserManager
 from .blocklist_manager import BlocklistManager
+from .rate_limiter import RateLimiter
 from .action_logger import ActionLogger
 from .notes_manager import NotesManager # This is the line you just added
@@ -1,8 +1,13 @@
 # backbone/action_logger.py
 import json
+import time
 import logging
 from pathlib import Path
 from datetime import datetime, timezone
+from .metrics import REGISTRY
+
+ACTIONS = REGISTRY.counter('snailsynk_actions_total', 'Logged user actions by type.', ('action',))
+WRITE_SECONDS = REGISTRY.histogram('snailsynk_action_log_write_seconds', 'Time to append one action and notify the admin room.')
 
 class ActionLogger:
     """Handles writing and reading structured action logs with real-time emission."""
@@ -21,10 +26,13 @@ class ActionLogger:
             'timestamp': datetime.now(timezone.utc).isoformat(),
             'ip_address': ip, 'action': action, 'details': details or {}
         }
+        ACTIONS.labels(action).inc()
+        started = time.perf_counter()
         try:
             with open(self.path, 'a') as f:
                 f.write(json.dumps(log_entry) + '\n')
             self._emit_log(log_entry)
+            WRITE_SECONDS.observe(time.perf_counter() - started)
         except IOError as e:
             logging.error(f"Failed to write to action log at {self.path}: {e}")
 
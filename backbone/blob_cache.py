@@ -0,0 +1,130 @@
+# backbone/blob_cache.py
+import os
+import re
+import time
+import uuid
+import logging
+import shutil
+
+from .shared_state import SharedJSONStore
+from .integrity import HashingReader
+
+BLOB_ID = re.compile(r'^[0-9a-f]{64}$')
+# Reading a blob refreshes its LRU position at most this often, to spare index writes.
+TOUCH_INTERVAL = 60
+BLOB_TOO_LARGE = "Clipboard item is larger than the server allows."
+# Uploader-supplied types that are safe to render in the browser; anything else is served as a download.
+INLINE_MIME_TYPES = frozenset({'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'text/plain'})
+
+
+class _LimitedReader:
+    """Stops a stream after `limit` bytes; `exceeded` is set if there was more."""
+    def __init__(self, stream, limit):
+        self.stream, self.remaining, self.exceeded = stream, limit, False
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            self.exceeded = bool(self.stream.read(1))
+            return b''
+        chunk = self.stream.read(self.remaining if size is None or size < 0 else min(size, self.remaining))
+        self.remaining -= len(chunk)
+        return chunk
+
+
+class BlobCache:
+    """
+    Binary clipboard items (screenshots, large logs, any MIME type), kept
+    outside the text buffer so they never travel base64-encoded or inside a
+    broadcast.
+
+    Uploads are streamed to disk and hashed in one pass; the SHA-256 is the
+    blob id, so pasting the same thing twice stores it once. The cache holds
+    at most max_bytes: adding a blob evicts the least recently used ones
+    until it fits. Blobs larger than max_blob_bytes are refused. The index
+    is a shared JSON store, so every worker sees the same blobs.
+    """
+    def __init__(self, root, max_bytes=1024 ** 3, max_blob_bytes=100 * 1024 ** 2):
+        self.root = root
+        self.max_bytes = max(1, int(max_bytes))
+        self.max_blob_bytes = max(1, min(int(max_blob_bytes), self.max_bytes))
+        os.makedirs(root, exist_ok=True)
+        self._index = SharedJSONStore(os.path.join(root, 'index.json'))
+
+    def _path(self, blob_id):
+        return os.path.join(self.root, blob_id)
+
+    def put(self, stream, mime, name, remote_addr):
+        """Stores a blob read from stream. Returns (entry, error)."""
+        tmp_path = os.path.join(self.root, f".upload-{uuid.uuid4().hex}")
+        limited = _LimitedReader(stream, self.max_blob_bytes)
+        reader = HashingReader(limited)
+        try:
+            with open(tmp_path, 'wb') as out:
+                shutil.copyfileobj(reader, out, 1024 * 1024)
+            if limited.exceeded:
+                os.remove(tmp_path)
+                return None, BLOB_TOO_LARGE
+            if not reader.size:
+                os.remove(tmp_path)
+                return None, "Clipboard item is empty."
+            blob_id = reader.hexdigest()
+            os.replace(tmp_path, self._path(blob_id))
+        except OSError as e:
+            logging.error(f"Failed to store clipboard blob: {e}")
+            try: os.remove(tmp_path)
+            except OSError: pass
+            return None, "Could not store the clipboard item."
+        now = time.time()
+        entry = {'id': blob_id, 'mime': mime or 'application/octet-stream', 'name': name or '',
+                 'size': reader.size, 'created': now, 'last_access': now, 'by': remote_addr}
+        with self._index.transaction() as index:
+            index[blob_id] = entry
+            evicted = self._evict(index)
+        for victim in evicted:
+            try: os.remove(self._path(victim))
+            except OSError: pass
+        if evicted: logging.info(f"Clipboard blob cache evicted {len(evicted)} item(s)")
+        return entry, None
+
+    def _evict(self, index):
+        """Drops least recently used entries until the cache fits. Returns their ids; the caller removes the files."""
+        total = sum(e['size'] for e in index.values())
+        evicted = []
+        for entry in sorted(index.values(), key=lambda e: e['last_access']):
+            if total <= self.max_bytes: break
+            if len(index) - len(evicted) == 1: break  # never evict the blob just added
+            evicted.append(entry['id'])
+            total -= entry['size']
+        for blob_id in evicted:
+            del index[blob_id]
+        return evicted
+
+    def open(self, blob_id):
+        """Returns (path, entry) for reading a blob, or (None, None). Counts as a use for LRU."""
+        if not BLOB_ID.match(blob_id or ''): return None, None
+        entry = self._index.data.get(blob_id)
+        if not entry or not os.path.isfile(self._path(blob_id)): return None, None
+        now = time.time()
+        if now - entry['last_access'] > TOUCH_INTERVAL:
+            with self._index.transaction() as index:
+                if blob_id in index: index[blob_id]['last_access'] = now
+        return self._path(blob_id), entry
+
+    def delete(self, blob_id):
+        """Returns True if the blob existed."""
+        with self._index.transaction() as index:
+            entry = index.pop(blob_id, None)
+        if not entry: return False
+        try: os.remove(self._path(blob_id))
+        except OSError: pass
+        return True
+
+    def list_entries(self, limit=50):
+        """Newest blobs first, without the uploader's address."""
+        entries = sorted(self._index.data.values(), key=lambda e: e['created'], reverse=True)[:limit]
+        return [{k: v for k, v in e.items() if k != 'by'} for e in entries]
+
+    def stats(self):
+        entries = self._index.data.values()
+        return {'items': len(entries), 'bytes': sum(e['size'] for e in entries),
+                'max_bytes': self.max_bytes, 'max_blob_bytes': self.max_blob_bytes}
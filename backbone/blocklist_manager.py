@@ -1,52 +1,204 @@
 # backbone/blocklist_manager.py
 import json
+import math
+import time
 import logging
+import threading
 from pathlib import Path
-from ipaddress import ip_address, AddressValueError
+from ipaddress import ip_address, ip_network, IPv4Network
 from .utils import log_history
+from .shared_state import file_lock, file_signature, atomic_write_json
+
+_MISSING = object()
+
+# How often is_blocked checks whether another worker process rewrote the file.
+RELOAD_CHECK_SECONDS = 1.0
 
 class BlocklistManager:
-    """Manages the IP blocklist for the application."""
+    """
+    Manages the IP blocklist for the application.
+
+    A rule is a single address or a CIDR network (IPv4 or IPv6), optionally with
+    an expiry time. Rules are compiled into one hash table per prefix length, so
+    a lookup is at most one dict probe per distinct prefix length in use
+    (bounded by 32 for IPv4 and 128 for IPv6) regardless of how many rules exist.
+
+    Changes made by other worker processes are picked up from the file within
+    RELOAD_CHECK_SECONDS; mutations hold the file lock and start from the latest copy.
+    """
     def __init__(self, blocklist_path):
         self.path = Path(blocklist_path)
-        self.blocked_ips = self._load()
+        self._lock = threading.Lock()
+        self._signature = None
+        self.rules = self._load()  # {rule string: expiry timestamp or None}
+        self._tables = self._compile(self.rules)
+        self._has_expired = False
+        self._next_reload_check = time.monotonic() + RELOAD_CHECK_SECONDS
 
     def _load(self):
-        if not self.path.exists(): return set()
+        self._signature = file_signature(self.path)
+        if self._signature is None: return {}
         try:
-            with open(self.path, 'r') as f: return set(json.load(f))
+            with open(self.path, 'r') as f: entries = json.load(f)
         except (json.JSONDecodeError, IOError) as e:
             logging.error(f"Could not load blocklist file at {self.path}: {e}")
-            return set()
+            return {}
+        rules = {}
+        for entry in entries:
+            # Plain strings are permanent rules (the original file format).
+            raw, expires = (entry, None) if isinstance(entry, str) else (entry.get('rule'), entry.get('expires'))
+            try:
+                rules[self._normalize(raw)] = expires
+            except (TypeError, ValueError):
+                logging.warning(f"Skipping invalid blocklist entry: {entry!r}")
+        return rules
 
     def _save(self):
+        entries = [rule if expires is None else {'rule': rule, 'expires': expires}
+                   for rule, expires in sorted(self.rules.items())]
         try:
-            with open(self.path, 'w') as f: json.dump(list(self.blocked_ips), f, indent=2)
-        except IOError as e: logging.error(f"Could not save blocklist file to {self.path}: {e}")
+            atomic_write_json(self.path, entries)
+            self._signature = file_signature(self.path)
+        except (IOError, OSError) as e: logging.error(f"Could not save blocklist file to {self.path}: {e}")
+
+    def _reload_if_changed(self):
+        """Picks up rules written by another process. Caller holds _lock."""
+        if file_signature(self.path) != self._signature:
+            self.rules = self._load()
+            self._tables = self._compile(self.rules)
+            self._has_expired = False
+
+    @staticmethod
+    def _normalize(rule):
+        """Returns the canonical form of a rule: bare address for hosts, 'net/len' otherwise."""
+        rule = str(rule).strip()
+        if '/' not in rule:
+            addr = ip_address(rule)
+            # is_blocked looks IPv4-mapped IPv6 clients up as IPv4, so their rules are stored that way.
+            if addr.version == 6 and addr.ipv4_mapped: addr = addr.ipv4_mapped
+            return str(addr)
+        network = ip_network(rule, strict=False)
+        if network.version == 6 and network.prefixlen >= 96 and network.network_address.ipv4_mapped:
+            network = IPv4Network((network.network_address.ipv4_mapped, network.prefixlen - 96))
+        if network.prefixlen == network.max_prefixlen:
+            return str(network.network_address)
+        return str(network)
+
+    @staticmethod
+    def _compile(rules):
+        """Builds {version: [(prefixlen, {network >> host_bits: expires}), ...]}, longest prefix first."""
+        by_length = {4: {}, 6: {}}
+        for rule, expires in rules.items():
+            # Rules are already normalized, so parsing the address part alone is enough.
+            address, _, length = rule.partition('/')
+            addr = ip_address(address)
+            prefixlen = int(length) if length else addr.max_prefixlen
+            by_length[addr.version].setdefault(prefixlen, {})[int(addr) >> (addr.max_prefixlen - prefixlen)] = expires
+        return {version: sorted(tables.items(), reverse=True) for version, tables in by_length.items()}
+
+    def _publish(self):
+        """Recompiles the lookup tables from self.rules and persists them. Caller holds _lock."""
+        self._tables = self._compile(self.rules)
+        self._has_expired = False
+        self._save()
 
     def is_valid_ip(self, ip_string):
         try:
             ip_address(ip_string)
             return True
-        except AddressValueError: return False
+        except ValueError: return False
 
-    def block_ip(self, ip_to_block):
-        if not self.is_valid_ip(ip_to_block): return False, "Invalid IP address format."
-        if ip_to_block in self.blocked_ips: return True, "IP is already blocked."
-        self.blocked_ips.add(ip_to_block)
-        self._save()
-        log_history("IP Blocked", f"'{ip_to_block}' was added to the blocklist.")
-        return True, f"IP {ip_to_block} blocked successfully."
+    def is_valid_rule(self, rule):
+        try:
+            self._normalize(rule)
+            return True
+        except (TypeError, ValueError): return False
+
+    def covers(self, rule, ip_to_check):
+        """True if the given rule (address or CIDR) would match ip_to_check."""
+        try:
+            addr = ip_address(ip_to_check)
+            if addr.version == 6 and addr.ipv4_mapped: addr = addr.ipv4_mapped
+            return addr in ip_network(str(rule).strip(), strict=False)
+        except (TypeError, ValueError): return False
+
+    def block_ip(self, ip_to_block, ttl_seconds=None):
+        """Blocks an address or CIDR network, permanently or for ttl_seconds."""
+        try:
+            rule = self._normalize(ip_to_block)
+        except (TypeError, ValueError):
+            return False, "Invalid IP address or CIDR format."
+        if ttl_seconds is not None and not (math.isfinite(ttl_seconds) and ttl_seconds > 0):
+            return False, "Ban duration must be a positive number of seconds."
+        expires = time.time() + ttl_seconds if ttl_seconds else None
+        with self._lock, file_lock(self.path):
+            self._reload_if_changed()
+            current = self.rules.get(rule, _MISSING)
+            if current is None or (current is not _MISSING and expires is not None and current >= expires):
+                return True, f"{rule} is already blocked."
+            self.rules[rule] = expires
+            self._publish()
+        duration = f" for {int(ttl_seconds)}s" if expires else ""
+        log_history("IP Blocked", f"'{rule}' was added to the blocklist{duration}.")
+        return True, f"{rule} blocked successfully."
 
     def unblock_ip(self, ip_to_unblock):
-        if ip_to_unblock not in self.blocked_ips: return False, "IP was not found in the blocklist."
-        self.blocked_ips.remove(ip_to_unblock)
-        self._save()
-        log_history("IP Unblocked", f"'{ip_to_unblock}' was removed from the blocklist.")
-        return True, f"IP {ip_to_unblock} unblocked successfully."
+        try:
+            rule = self._normalize(ip_to_unblock)
+        except (TypeError, ValueError):
+            return False, "Invalid IP address or CIDR format."
+        with self._lock, file_lock(self.path):
+            self._reload_if_changed()
+            if rule not in self.rules: return False, "IP was not found in the blocklist."
+            del self.rules[rule]
+            self._publish()
+        log_history("IP Unblocked", f"'{rule}' was removed from the blocklist.")
+        return True, f"{rule} unblocked successfully."
+
+    def purge_expired(self):
+        """Drops rules whose ban has run out. Returns the number removed."""
+        now = time.time()
+        with self._lock, file_lock(self.path):
+            self._reload_if_changed()
+            expired = [rule for rule, expires in self.rules.items() if expires is not None and expires <= now]
+            for rule in expired:
+                del self.rules[rule]
+            if expired:
+                self._publish()
+            else:
+                self._has_expired = False
+        for rule in expired:
+            log_history("IP Unblocked", f"'{rule}' ban expired.")
+        return len(expired)
 
     def is_blocked(self, ip_to_check):
-        return ip_to_check in self.blocked_ips
+        try:
+            addr = ip_address(ip_to_check)
+        except ValueError:
+            return False
+        if addr.version == 6 and addr.ipv4_mapped: addr = addr.ipv4_mapped
+        if time.monotonic() >= self._next_reload_check:
+            self._next_reload_check = time.monotonic() + RELOAD_CHECK_SECONDS
+            with self._lock:
+                self._reload_if_changed()
+        value, max_len = int(addr), addr.max_prefixlen
+        now = None
+        for prefixlen, table in self._tables[addr.version]:
+            expires = table.get(value >> (max_len - prefixlen), _MISSING)
+            if expires is _MISSING: continue
+            if expires is None: return True
+            if now is None: now = time.time()
+            if expires > now: return True
+            self._has_expired = True
+        if self._has_expired:
+            self.purge_expired()
+        return False
 
     def get_blocklist(self):
-        return sorted(list(self.blocked_ips))
\ No newline at end of file
+        self.purge_expired()
+        return sorted(self.rules)
+
+    def get_rules(self):
+        """Active rules with their expiry (None for permanent), for the admin UI."""
+        self.purge_expired()
+        return [{'rule': rule, 'expires': expires} for rule, expires in sorted(self.rules.items())]
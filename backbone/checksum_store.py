@@ -0,0 +1,111 @@
+# backbone/checksum_store.py
+import os
+import sqlite3
+import threading
+
+_MAX_CHAR = '\U0010ffff'
+_COLUMNS = ('sha256', 'size', 'mtime_ns', 'verified_at')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checksums (
+    path        TEXT PRIMARY KEY,
+    sha256      TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    verified_at REAL
+);
+"""
+
+_UNDER = "(path = ? OR (path > ? AND path < ?))"
+
+
+def _under(prefix):
+    return (prefix, prefix + '/', prefix + '/' + _MAX_CHAR)
+
+
+def _record(row):
+    return dict(zip(_COLUMNS, row))
+
+
+class ChecksumStore:
+    """
+    Upload checksums (see integrity.checksum_record), one SQLite row per file.
+
+    Kept apart from file_metadata.json so a share with many uploads doesn't
+    make every lock, favorite or rename rewrite a multi-megabyte JSON file:
+    each change here touches only its own rows. Paths are relative to the
+    share root; the *_under methods act on a path and everything below it.
+
+    Connections are per thread and per process, like SearchIndex.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            conn.commit()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, rel_path):
+        row = self._conn().execute("SELECT sha256, size, mtime_ns, verified_at FROM checksums WHERE path = ?",
+                                   (rel_path,)).fetchone()
+        return _record(row) if row else None
+
+    def put_many(self, records):
+        """Stores {rel path: record}, replacing any existing rows."""
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO checksums (path, sha256, size, mtime_ns, verified_at) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             [(path,) + tuple(r.get(c) for c in _COLUMNS) for path, r in records.items()])
+
+    def put(self, rel_path, record):
+        self.put_many({rel_path: record})
+
+    def replace(self, rel_path, previous, record):
+        """Swaps previous for record (None deletes) unless the row changed meanwhile. True if it was replaced."""
+        conn = self._conn()
+        match = "path = ? AND sha256 = ? AND size = ? AND mtime_ns = ? AND verified_at IS ?"
+        old = (rel_path,) + tuple(previous.get(c) for c in _COLUMNS)
+        with conn:
+            if record is None:
+                cursor = conn.execute(f"DELETE FROM checksums WHERE {match}", old)
+            else:
+                cursor = conn.execute("UPDATE checksums SET sha256 = ?, size = ?, mtime_ns = ?, verified_at = ? "
+                                      f"WHERE {match}", tuple(record.get(c) for c in _COLUMNS) + old)
+        return cursor.rowcount > 0
+
+    def items(self):
+        """Every (rel path, record), in path order."""
+        return [(row[0], _record(row[1:])) for row in self._conn().execute(
+            "SELECT path, sha256, size, mtime_ns, verified_at FROM checksums ORDER BY path")]
+
+    def take_under(self, prefix):
+        """Removes and returns {rel path: record} for prefix and everything below it."""
+        conn = self._conn()
+        with conn:
+            taken = {row[0]: _record(row[1:]) for row in conn.execute(
+                f"SELECT path, sha256, size, mtime_ns, verified_at FROM checksums WHERE {_UNDER}", _under(prefix))}
+            if taken:
+                conn.execute(f"DELETE FROM checksums WHERE {_UNDER}", _under(prefix))
+        return taken
+
+    def remap_under(self, old_prefix, new_prefix, keep_source=False):
+        """Re-keys prefix and everything below it to new_prefix; keep_source=True copies instead."""
+        conn = self._conn()
+        new_path = "? || substr(path, ?)"
+        args = (new_prefix, len(old_prefix) + 1) + _under(old_prefix)
+        with conn:
+            if keep_source:
+                conn.execute(f"INSERT OR REPLACE INTO checksums (path, sha256, size, mtime_ns, verified_at) "
+                             f"SELECT {new_path}, sha256, size, mtime_ns, verified_at FROM checksums WHERE {_UNDER}",
+                             args)
+            else:
+                conn.execute(f"UPDATE OR REPLACE checksums SET path = {new_path} WHERE {_UNDER}", args)
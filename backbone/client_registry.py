@@ -0,0 +1,191 @@
+# backbone/client_registry.py
+import os
+import re
+import glob
+import json
+import time
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+
+from .shared_state import atomic_write_json, file_signature
+
+# (pattern, label) pairs tried in order; the first match names the platform or browser.
+_PLATFORMS = [(r'iPhone|iPad|iPod', 'iOS'), (r'Android', 'Android'), (r'Windows', 'Windows'),
+              (r'Mac OS X|Macintosh', 'macOS'), (r'CrOS', 'ChromeOS'), (r'Linux', 'Linux')]
+_BROWSERS = [(r'Edg/', 'Edge'), (r'OPR/|Opera', 'Opera'), (r'Firefox/|FxiOS', 'Firefox'),
+             (r'Chrome/|CriOS', 'Chrome'), (r'Safari/', 'Safari'), (r'python|curl|wget', 'Script')]
+
+
+def describe_device(user_agent):
+    """'Chrome on Android'-style label from a User-Agent string."""
+    ua = user_agent or ''
+    platform = next((label for pattern, label in _PLATFORMS if re.search(pattern, ua)), None)
+    browser = next((label for pattern, label in _BROWSERS if re.search(pattern, ua, re.I)), None)
+    if browser and platform: return f"{browser} on {platform}"
+    return browser or platform or 'Unknown device'
+
+
+def device_fingerprint(ip, user_agent, accept_language=''):
+    """Short stable id for one browser on one address, so several tabs count as one device."""
+    return hashlib.sha1(f"{ip}|{user_agent}|{accept_language}".encode()).hexdigest()[:12]
+
+
+class ClientRegistry:
+    """
+    Connected Socket.IO clients, indexed by session id and grouped by IP.
+
+    connect(), disconnect() and touch() are O(1): a dict keyed by sid plus a
+    per-IP set of sids. Each entry carries a device label and fingerprint
+    derived from the User-Agent, and connected_since / last_seen times.
+
+    With share_dir (multi-worker mode) each worker owns a snapshot file,
+    clients-<pid>.json, rewritten by flush() at most once per flush interval
+    when something changed. Readers merge their own live sessions with the
+    other workers' snapshots, and purge_owner() drops a dead worker's file.
+    """
+    def __init__(self, share_dir=None):
+        self.share_dir = share_dir
+        self._sessions = {}
+        self._by_ip = {}
+        self._dirty = False
+        self._pid = None
+        self._remote_cache = {}  # path -> (signature, sessions, per-IP counts)
+        if share_dir: os.makedirs(share_dir, exist_ok=True)
+
+    # --- Presence ---
+    def connect(self, sid, ip, user_agent='', accept_language=''):
+        now = time.time()
+        entry = {'sid': sid, 'ip': ip, 'device': describe_device(user_agent),
+                 'fingerprint': device_fingerprint(ip, user_agent, accept_language),
+                 'user_agent': (user_agent or '')[:256],
+                 'connected_since': datetime.now(timezone.utc).isoformat(), 'last_seen': now}
+        self._sessions[sid] = entry
+        self._by_ip.setdefault(ip, set()).add(sid)
+        self._dirty = True
+        return entry
+
+    def disconnect(self, sid):
+        """Returns the removed entry, or None if the sid was unknown."""
+        entry = self._sessions.pop(sid, None)
+        if entry:
+            sids = self._by_ip.get(entry['ip'])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids: del self._by_ip[entry['ip']]
+            self._dirty = True
+        return entry
+
+    def touch(self, sid):
+        entry = self._sessions.get(sid)
+        if entry:
+            entry['last_seen'] = time.time()
+            self._dirty = True
+
+    def get(self, sid):
+        return self._sessions.get(sid)
+
+    def local_count(self, ip=None):
+        """Sessions held by this process (for one IP, if given)."""
+        return len(self._by_ip.get(ip, ())) if ip is not None else len(self._sessions)
+
+    def local_sessions(self):
+        return list(self._sessions.values())
+
+    # --- Cluster-wide reads ---
+    def _remote_snapshots(self):
+        """(sessions, per-IP counts) for each other worker's snapshot, re-read only when the file changed."""
+        if not self.share_dir: return []
+        own, snapshots = self._own_path(), []
+        for path in glob.glob(os.path.join(self.share_dir, 'clients-*.json')):
+            if path == own: continue
+            signature = file_signature(path)
+            cached = self._remote_cache.get(path)
+            if not cached or cached[0] != signature:
+                try:
+                    with open(path) as f: sessions = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                cached = (signature, sessions, Counter(s['ip'] for s in sessions))
+                self._remote_cache[path] = cached
+            snapshots.append(cached[1:])
+        return snapshots
+
+    def _all_sessions(self):
+        sessions = list(self._sessions.values())
+        for remote, _ in self._remote_snapshots():
+            sessions.extend(remote)
+        return sessions
+
+    def connection_counts(self, ip):
+        """(connections from ip, all connections) across workers, without building the session list."""
+        per_ip, total = self.local_count(ip), self.local_count()
+        for remote, by_ip in self._remote_snapshots():
+            per_ip += by_ip.get(ip, 0)
+            total += len(remote)
+        return per_ip, total
+
+    def count(self):
+        return len(self._all_sessions())
+
+    def page(self, offset=0, limit=50, ip=None):
+        """Clients newest first, optionally for one IP. Returns (clients, total)."""
+        sessions = self._all_sessions()
+        if ip: sessions = [s for s in sessions if s['ip'] == ip]
+        sessions.sort(key=lambda s: s['connected_since'], reverse=True)
+        return sessions[offset:offset + limit], len(sessions)
+
+    def summary(self, top=20):
+        """Connections and distinct devices per IP, busiest first."""
+        groups = {}
+        for s in self._all_sessions():
+            group = groups.setdefault(s['ip'], {'ip': s['ip'], 'connections': 0, 'devices': set()})
+            group['connections'] += 1
+            group['devices'].add(s['fingerprint'])
+        ranked = sorted(groups.values(), key=lambda g: g['connections'], reverse=True)[:top]
+        return [{**g, 'devices': len(g['devices'])} for g in ranked]
+
+    # --- Multi-worker snapshots ---
+    def _own_path(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            if self._pid is not None:
+                # Forked into a new worker: the parent's sessions are not ours.
+                self._sessions, self._by_ip, self._remote_cache = {}, {}, {}
+            self._pid = pid
+        return os.path.join(self.share_dir, f"clients-{self._pid}.json")
+
+    def flush(self):
+        """Publishes this worker's sessions if they changed since the last flush."""
+        if not self.share_dir or not self._dirty: return
+        self._dirty = False
+        try:
+            atomic_write_json(self._own_path(), list(self._sessions.values()), indent=None)
+        except (OSError, TypeError, ValueError) as e:
+            self._dirty = True
+            logging.error(f"Failed to publish client registry: {e}")
+
+    def start_flusher(self, spawn, sleep, interval=1.0):
+        """Runs flush() every `interval` seconds on a background task (multi-worker mode only)."""
+        if not self.share_dir: return
+        self._own_path()
+        def _run():
+            while True:
+                sleep(interval)
+                self.flush()
+        spawn(_run)
+
+    def purge_owner(self, pid):
+        """Drops a dead worker's snapshot. Returns how many sessions it held."""
+        path = os.path.join(self.share_dir, f"clients-{pid}.json") if self.share_dir else None
+        if not path or not os.path.exists(path): return 0
+        try:
+            with open(path) as f: count = len(json.load(f))
+        except (OSError, ValueError):
+            count = 0
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return count
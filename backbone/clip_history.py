@@ -0,0 +1,241 @@
+# backbone/clip_history.py
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import nullcontext
+
+from .shared_state import file_lock
+
+# Compaction rewrites the log once it holds this many records (or bytes) more than are live.
+COMPACT_SLACK = 1000
+COMPACT_SLACK_BYTES = 8 * 1024 * 1024
+# A revision bigger than this (as logged) is kept only while it is the current buffer.
+MAX_REVISION_BYTES = 1024 * 1024
+
+
+class ClipHistory:
+    """
+    Persistent history of the shared buffer and the pinned messages.
+
+    Everything is an append-only JSON-lines log: a 'revision' record for each
+    committed buffer text, 'pin' / 'unpin' / 'clear_pins' records for the pins.
+    Every record gets a sequence number, which doubles as the pagination cursor
+    (pages run newest first; pass the cursor back as `before`).
+
+    Appends take a file lock, and each process tails the file for records
+    written by the others, so all workers share one history. Revisions older
+    than retention_days (except the newest) and all but the newest
+    max_revisions are dropped, as are the oldest while revisions take more
+    than max_bytes (0 = no cap) and any revision over MAX_REVISION_BYTES once
+    a newer one replaces it; pins stay until unpinned. Dead records are
+    removed by compact(), which rewrites the log atomically once it is mostly
+    garbage, by record count or by size. With path=None the history lives in
+    memory only.
+    """
+    def __init__(self, path=None, retention_days=30, max_revisions=200, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.retention = max(0.0, float(retention_days)) * 86400
+        self.max_revisions = max(1, int(max_revisions))
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._reset()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            open(path, 'a').close()
+            self.compact()
+
+    def _reset(self):
+        self._seq, self._records, self._offset, self._inode = 0, 0, 0, None
+        self._revisions, self._pins = [], {}
+        self._sizes = {}  # seq -> logged size, for live revisions and pins
+        self._bytes = {'revision': 0, 'pin': 0}
+
+    def _track(self, record, size):
+        self._sizes[record['seq']] = size
+        self._bytes[record['kind']] += size
+
+    def _untrack(self, record):
+        self._bytes[record['kind']] -= self._sizes.pop(record['seq'], 0)
+
+    # --- Log replay ---
+    def _replay(self, record, size):
+        """Applies one record; size is its length in the log."""
+        kind = record.get('kind')
+        self._seq = max(self._seq, record.get('seq', 0))
+        self._records += 1
+        if kind == 'revision':
+            revisions = self._revisions
+            if revisions and self._sizes.get(revisions[-1]['seq'], 0) > MAX_REVISION_BYTES:
+                self._untrack(revisions.pop())
+            revisions.append(record)
+            self._track(record, size)
+            while len(revisions) > self.max_revisions or \
+                    (self.max_bytes and len(revisions) > 1 and self._bytes['revision'] > self.max_bytes):
+                self._untrack(revisions.pop(0))
+        elif kind == 'pin':
+            self._pins[record['id']] = record
+            self._track(record, size)
+        elif kind == 'unpin':
+            pin = self._pins.pop(record['id'], None)
+            if pin: self._untrack(pin)
+        elif kind == 'clear_pins':
+            for pin in self._pins.values():
+                self._untrack(pin)
+            self._pins.clear()
+
+    def _refresh(self):
+        """Reads records other processes appended since the last call. Caller holds self._lock."""
+        if not self.path: return
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._reset()  # compacted (replaced) by another process
+            self._inode = st.st_ino
+        if st.st_size == self._offset: return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1  # a line still being written is picked up next time
+        for line in data[:end].splitlines():
+            try:
+                self._replay(json.loads(line), len(line) + 1)
+            except (ValueError, KeyError, AttributeError):
+                logging.error(f"Skipping corrupt record in {self.path}")
+        self._offset += end
+
+    def _append(self, records):
+        """Numbers and writes records. Caller holds self._lock (and the file lock, with a path)."""
+        for record in records:
+            self._seq += 1
+            record['seq'] = self._seq
+            # Pin ids are sequence numbers, so they are unique across workers.
+            if record['kind'] == 'pin': record['id'] = str(self._seq)
+        lines = [json.dumps(r).encode() + b'\n' for r in records]
+        if self.path:
+            with open(self.path, 'ab') as f:
+                f.write(b''.join(lines))
+                self._offset = f.tell()
+        for record, line in zip(records, lines):
+            self._replay(record, len(line))
+
+    def _write(self, build):
+        """Runs build() -> records (after catching up with the log) and appends them. Returns what build returned."""
+        with self._lock, file_lock(self.path) if self.path else nullcontext():
+            self._refresh()
+            records, result = build()
+            if records: self._append(records)
+            live = len(self._revisions) + len(self._pins)
+            live_bytes = self._bytes['revision'] + self._bytes['pin']
+            garbage, garbage_bytes = self._records - live, self._offset - live_bytes
+        if self.path and (garbage > max(COMPACT_SLACK, live) or garbage_bytes > max(COMPACT_SLACK_BYTES, live_bytes)):
+            self.compact()
+        return result
+
+    def compact(self):
+        """Rewrites the log with only the live records (and drops expired revisions). Returns records removed."""
+        with self._lock, file_lock(self.path) if self.path else nullcontext():
+            self._refresh()
+            revisions = self._kept_revisions()
+            live = sorted(revisions + list(self._pins.values()), key=lambda r: r['seq'])
+            removed = self._records - len(live)
+            if not self.path:
+                kept = {r['seq'] for r in revisions}
+                for record in self._revisions:
+                    if record['seq'] not in kept: self._untrack(record)
+                self._revisions, self._records = revisions, len(live)
+                return removed
+            if removed <= 0: return 0
+            # The header keeps the sequence counter even when nothing else survives.
+            header = {'kind': 'meta', 'seq': self._seq}
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(b''.join(json.dumps(r).encode() + b'\n' for r in [header] + live))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.error(f"Failed to compact clipboard history {self.path}: {e}")
+                return 0
+            self._reset()
+            self._refresh()
+        if removed: logging.info(f"Compacted clipboard history: {removed} record(s) removed")
+        return removed
+
+    def _kept_revisions(self):
+        # The newest revision is the current buffer, so it outlives the retention period.
+        cutoff = time.time() - self.retention
+        return [r for r in self._revisions[:-1] if r['ts'] >= cutoff] + self._revisions[-1:]
+
+    # --- Updates ---
+    def add_revision(self, text, remote_addr):
+        """Records a committed buffer text (skipped if it equals the last one). Returns the sequence number."""
+        def build():
+            if self._revisions and self._revisions[-1]['text'] == text: return [], self._revisions[-1]
+            record = {'kind': 'revision', 'ts': time.time(), 'text': text, 'by': remote_addr}
+            return [record], record
+        return self._write(build)['seq']
+
+    def add_pin(self, text, remote_addr, limit=0):
+        """Pins text. Returns (pin, error); limit > 0 caps how many pins may exist."""
+        def build():
+            if limit and len(self._pins) >= limit: return [], (None, f"Pin limit of {limit} reached.")
+            record = {'kind': 'pin', 'ts': time.time(), 'text': text, 'by': remote_addr}
+            return [record], (record, None)
+        pin, error = self._write(build)
+        return (_public(pin) if pin else None), error
+
+    def remove_pin(self, pin_id):
+        """Returns True if the pin existed."""
+        return self._write(lambda: ([{'kind': 'unpin', 'ts': time.time(), 'id': pin_id}], True)
+                           if pin_id in self._pins else ([], False))
+
+    def clear_pins(self):
+        """Removes every pin. Returns how many there were."""
+        return self._write(lambda: ([{'kind': 'clear_pins', 'ts': time.time()}], len(self._pins))
+                           if self._pins else ([], 0))
+
+    # --- Reads ---
+    def latest_text(self):
+        """Text of the newest revision, or None."""
+        with self._lock:
+            self._refresh()
+            return self._revisions[-1]['text'] if self._revisions else None
+
+    def pins_page(self, before=None, limit=20):
+        """Returns (pins newest first, cursor for the next page or None, total pins)."""
+        with self._lock:
+            self._refresh()
+            entries = list(self._pins.values())
+        return _page(entries, before, limit) + (len(entries),)
+
+    def revisions_page(self, before=None, limit=20):
+        """Returns (buffer revisions newest first, cursor for the next page or None, total kept)."""
+        with self._lock:
+            self._refresh()
+            entries = self._kept_revisions()
+        return _page(entries, before, limit) + (len(entries),)
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {'pins': len(self._pins), 'revisions': len(self._revisions), 'records': self._records,
+                    'revision_bytes': self._bytes['revision'], 'bytes': os.path.getsize(self.path) if self.path else 0}
+
+
+def _public(record):
+    """A record as sent to clients: without the writer's address or the record kind."""
+    return {'id': record.get('id', str(record['seq'])), 'seq': record['seq'], 'ts': record['ts'], 'text': record['text']}
+
+
+def _page(entries, before, limit):
+    """entries in ascending seq order -> (newest-first slice older than `before`, next cursor or None)."""
+    if before is not None:
+        entries = [r for r in entries if r['seq'] < before]
+    page = entries[::-1][:limit]
+    cursor = page[-1]['seq'] if len(entries) > limit else None
+    return [_public(r) for r in page], cursor
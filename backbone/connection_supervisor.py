@@ -0,0 +1,111 @@
+# backbone/connection_supervisor.py
+import time
+from collections import deque
+
+TOO_MANY_FROM_IP = "Too many connections from this address."
+SERVER_FULL = "The server has reached its connection limit."
+
+
+class ConnectionSupervisor:
+    """
+    Admission control, liveness reaping and churn metrics for Socket.IO
+    connections.
+
+    admit() runs in the connect handler before a client is registered and
+    refuses it when its IP already holds max_per_ip connections or the server
+    holds max_total (0 disables either cap). Counts come from the
+    ClientRegistry, so with several workers they span all of them, lagging by
+    at most one registry flush.
+
+    reap() checks this worker's sessions against their Engine.IO sockets:
+    a session whose socket is already gone is dropped from the registry, one
+    that left a ping unanswered for longer than ping_timeout + grace is
+    disconnected, and one that answered its last ping is marked as seen.
+
+    Counters (connects, disconnects, refusals, reaped sessions) and per-minute
+    buckets for the last `window` minutes are kept per worker.
+    """
+    def __init__(self, registry, max_per_ip=0, max_total=0, grace=5.0, window=60):
+        self.registry = registry
+        self.max_per_ip = max(0, int(max_per_ip))
+        self.max_total = max(0, int(max_total))
+        self.grace = grace
+        self.peak = 0
+        self.totals = {'connects': 0, 'disconnects': 0, 'refused_per_ip': 0, 'refused_total': 0,
+                       'reaped_gone': 0, 'reaped_unresponsive': 0}
+        self._minutes = deque(maxlen=window)  # [minute, connects, disconnects, refused]
+
+    # --- Admission ---
+    def admit(self, ip):
+        """Returns None if a new connection from ip may proceed, else the reason it is refused."""
+        if not self.max_per_ip and not self.max_total: return None
+        per_ip, total = self.registry.connection_counts(ip)
+        if self.max_per_ip and per_ip >= self.max_per_ip:
+            self._record('refused_per_ip', 3)
+            return TOO_MANY_FROM_IP
+        if self.max_total and total >= self.max_total:
+            self._record('refused_total', 3)
+            return SERVER_FULL
+        return None
+
+    def connected(self):
+        self._record('connects', 1)
+        self.peak = max(self.peak, self.registry.local_count())
+
+    def disconnected(self):
+        self._record('disconnects', 2)
+
+    def _record(self, counter, column=None):
+        self.totals[counter] += 1
+        if column is None: return
+        minute = int(time.time() // 60)
+        if not self._minutes or self._minutes[-1][0] != minute:
+            self._minutes.append([minute, 0, 0, 0])
+        self._minutes[-1][column] += 1
+
+    # --- Liveness ---
+    def reap(self, server):
+        """One pass over this worker's sessions. Returns the entries dropped because their socket was gone."""
+        eio, now = server.eio, time.time()
+        dropped = []
+        for entry in self.registry.local_sessions():
+            sid = entry['sid']
+            eio_sid = server.manager.eio_sid_from_sid(sid, '/')
+            sock = eio.sockets.get(eio_sid) if eio_sid else None
+            if sock is None or sock.closed:
+                # The disconnect handler never ran for this one.
+                self.registry.disconnect(sid)
+                self._record('reaped_gone', 2)
+                dropped.append(entry)
+            elif sock.last_ping and now - sock.last_ping > eio.ping_timeout + self.grace:
+                self._record('reaped_unresponsive')
+                server.disconnect(sid, namespace='/')  # the disconnect handler unregisters it
+            elif not sock.last_ping and now - entry['last_seen'] >= eio.ping_interval:
+                self.registry.touch(sid)
+        return dropped
+
+    def start(self, server, spawn, sleep, interval=None, on_drop=None):
+        """Runs reap() every `interval` seconds (the ping interval by default); on_drop gets each dropped entry."""
+        interval = interval or server.eio.ping_interval
+        def _run():
+            while True:
+                sleep(interval)
+                for entry in self.reap(server):
+                    if on_drop: on_drop(entry)
+        spawn(_run)
+
+    # --- Metrics ---
+    def stats(self, minutes=15):
+        """Totals since start, connections now and at peak, and per-minute churn for the last `minutes` minutes."""
+        current = int(time.time() // 60)
+        recent = [m for m in self._minutes if m[0] > current - minutes]
+        span = max(1, min(minutes, current - recent[0][0] + 1)) if recent else 1
+        return {
+            'connections': self.registry.local_count(),
+            'peak': self.peak,
+            'limits': {'per_ip': self.max_per_ip, 'total': self.max_total},
+            'totals': dict(self.totals),
+            'per_minute': [{'minute': m[0] * 60, 'connects': m[1], 'disconnects': m[2], 'refused': m[3]} for m in recent],
+            'connects_per_minute': round(sum(m[1] for m in recent) / span, 2),
+            'disconnects_per_minute': round(sum(m[2] for m in recent) / span, 2),
+        }
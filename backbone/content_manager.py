@@ -1,26 +1,103 @@
 # backbone/content_manager.py
+import time
 import logging
 from datetime import datetime
 from .utils import log_history, PYCLIP_AVAILABLE
+from .shared_state import SharedJSONStore
+from . import text_ot
+from .clip_history import ClipHistory
+from .metrics import REGISTRY
 
 if PYCLIP_AVAILABLE:
     import pyperclip
 
+# Edits are transformed against the operations committed since their base
+# version; this many are kept, and a client further behind reloads a snapshot.
+OP_LOG_LIMIT = 200
+STALE_VERSION = "The buffer has changed too much since this edit; reload it and try again."
+# Pins and buffer revisions sent per page (and to each client on connect).
+PIN_PAGE_SIZE = 20
+
+TEXT_COMMITS = REGISTRY.counter('snailsynk_text_commits_total', 'Shared-text edits by outcome.', ('result',))
+TEXT_COMMIT_SECONDS = REGISTRY.histogram('snailsynk_text_commit_seconds', 'Time to transform, apply and store one shared-text edit.')
+
 class ContentManager:
-    """Manages all text content: the shared buffer and pinned messages."""
-    def __init__(self, pin_limit=10):
-        self.shared_text = ""
-        self.pins = []
-        self.limit = pin_limit
+    """
+    Manages all text content: the shared buffer and pinned messages.
+    The live buffer is kept in memory by default; given a state_path, it is
+    shared with the other worker processes through a file-backed store. Pins
+    and past buffer texts live in a ClipHistory, which persists them across
+    restarts when it has a path; the buffer is restored from it on start.
+
+    The buffer is a versioned collaborative document. Clients send operations
+    (see text_ot) against the version they last saw; the server transforms
+    each one over the operations committed since, applies it as the next
+    version and broadcasts only that delta. Concurrent editors therefore
+    merge instead of overwriting each other. get_snapshot() returns the full
+    text and its version, for page loads and for clients that fell behind.
+    """
+    def __init__(self, pin_limit=0, state_path=None, history=None):
+        self._store = SharedJSONStore(state_path, default=lambda: {'shared_text': "", 'version': 0, 'ops': []})
+        self.history = history or ClipHistory()
+        self.limit = pin_limit  # 0 = unlimited
+        restored = self.history.latest_text()
+        if restored:
+            with self._store.transaction() as state:
+                if not state['shared_text'] and not state.get('version'): state['shared_text'] = restored
+
+    @property
+    def shared_text(self): return self._store.data['shared_text']
 
     def get_shared_text(self): return self.shared_text
 
-    def update_shared_text(self, new_text, remote_addr):
-        self.shared_text = str(new_text)
+    def get_snapshot(self):
+        state = self._store.data
+        return {'text': state['shared_text'], 'version': state.get('version', 0)}
+
+    def apply_text_delta(self, op, base_version, remote_addr, client_id=None):
+        """
+        Commits an edit made against base_version. Returns (delta, error); delta is
+        the operation as applied, with its new version, ready to broadcast. error is
+        STALE_VERSION when base_version has dropped out of the operation log.
+        """
+        started = time.perf_counter()
+        delta, error = self._commit_text_delta(op, base_version, remote_addr, client_id)
+        TEXT_COMMIT_SECONDS.observe(time.perf_counter() - started)
+        TEXT_COMMITS.labels('ok' if error is None else 'stale' if error == STALE_VERSION else 'rejected').inc()
+        return delta, error
+
+    def _commit_text_delta(self, op, base_version, remote_addr, client_id):
+        try:
+            op = text_ot.normalize(op)
+            base_version = int(base_version)
+        except (TypeError, ValueError) as e:
+            return None, f"Invalid edit: {e}"
+        with self._store.transaction() as state:
+            version = state.get('version', 0)
+            log = state.setdefault('ops', [])
+            if base_version > version: return None, "Unknown buffer version."
+            missed = version - base_version
+            if missed > len(log): return None, STALE_VERSION
+            for _, committed in log[len(log) - missed:]:
+                op = text_ot.transform(op, committed)[0]
+            try:
+                text = text_ot.apply(state['shared_text'], op)
+            except ValueError as e:
+                return None, f"Invalid edit: {e}"
+            if not op: return {'version': version, 'op': [], 'length': len(text), 'client_id': client_id}, None
+            state['shared_text'], state['version'] = text, version + 1
+            log.append([version + 1, op])
+            del log[:-OP_LOG_LIMIT]
+        self.history.add_revision(text, remote_addr)
         ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
-        details = f"by [{ip_color}]{remote_addr}[/], length: {len(self.shared_text)}"
-        log_history("Buffer Cleared" if not self.shared_text else "Buffer Updated", details)
-        return self.shared_text
+        details = f"by [{ip_color}]{remote_addr}[/], length: {len(text)}, version {version + 1}"
+        log_history("Buffer Cleared" if not text else "Buffer Updated", details)
+        return {'version': version + 1, 'op': op, 'length': len(text), 'client_id': client_id}, None
+
+    def update_shared_text(self, new_text, remote_addr):
+        """Replaces the whole buffer (the plain POST API) by committing the difference as a delta. Returns (delta, error)."""
+        snapshot = self.get_snapshot()
+        return self.apply_text_delta(text_ot.diff(snapshot['text'], str(new_text)), snapshot['version'], remote_addr)
 
     def copy_buffer_to_clipboard(self):
         if not PYCLIP_AVAILABLE:
@@ -33,30 +110,34 @@ class ContentManager:
             logging.error(f"Failed to copy text to server clipboard: {e}")
             return False, str(e)
 
-    def get_pins(self): return self.pins
+    def get_pins(self, before=None, limit=PIN_PAGE_SIZE):
+        """A page of pins, newest first: {'pins', 'cursor' (for the next page, or None), 'total'}."""
+        pins, cursor, total = self.history.pins_page(before, limit)
+        return {'pins': pins, 'cursor': cursor, 'total': total}
+
+    def get_revisions(self, before=None, limit=PIN_PAGE_SIZE):
+        """A page of earlier buffer texts, newest first, shaped like get_pins()."""
+        revisions, cursor, total = self.history.revisions_page(before, limit)
+        return {'revisions': revisions, 'cursor': cursor, 'total': total}
 
     def add_pin(self, text, remote_addr):
-        if len(self.pins) >= self.limit: return None, f"Pin limit of {self.limit} reached."
         if not text or not text.strip(): return None, "Cannot pin empty text."
-        new_pin = {'id': str(datetime.now().timestamp()), 'text': text}
-        self.pins.append(new_pin)
+        new_pin, error = self.history.add_pin(text, remote_addr, limit=self.limit)
+        if error: return None, error
         ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
         log_history("Message Pinned", f"ID: {new_pin['id']} from [{ip_color}]{remote_addr}[/]")
-        return self.pins, None
+        return self.get_pins(), None
 
     def delete_pin(self, pin_id, remote_addr):
-        original_count = len(self.pins)
-        self.pins = [pin for pin in self.pins if pin.get('id') != pin_id]
-        if len(self.pins) < original_count:
+        if self.history.remove_pin(pin_id):
             ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
             log_history("Message Unpinned", f"ID: {pin_id} by [{ip_color}]{remote_addr}[/]")
-            return self.pins, None
+            return self.get_pins(), None
         else:
             return None, "Pin not found."
 
     def clear_all_pins(self, remote_addr):
-        count = len(self.pins)
-        self.pins = []
+        count = self.history.clear_pins()
         ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
         log_history("All Pins Cleared", f"{count} pins cleared by [{ip_color}]{remote_addr}[/]")
-        return self.pins, None
\ No newline at end of file
+        return self.get_pins(), None
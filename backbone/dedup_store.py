@@ -0,0 +1,281 @@
+# backbone/dedup_store.py
+import os
+import time
+import errno
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+
+from .shared_state import SharedJSONStore, file_lock
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+try:
+    import fcntl
+    # FICLONE from <linux/fs.h>: share the source's extents copy-on-write (btrfs, XFS, bcachefs).
+    FICLONE = 0x40049409
+    REFLINK_SUPPORTED = hasattr(fcntl, 'ioctl') and os.uname().sysname == 'Linux'
+except (ImportError, AttributeError):
+    REFLINK_SUPPORTED = False
+
+STORE_DIRNAME = '.snailsynk-store'
+CHUNK_SIZE = 1024 * 1024
+# Blobs younger than this are never scrubbed, so an upload that is still linking its blob is safe.
+SCRUB_GRACE_SECONDS = 3600
+STATS_TTL_SECONDS = 60
+
+
+class DedupStore:
+    """
+    Content-addressed storage for uploads. Each upload is hashed while it is
+    streamed to disk; identical content is kept once under <root>/blobs and
+    the visible file is linked to it.
+
+    mode='hardlink': the visible file and the blob are the same inode. A blob
+    whose link count drops to 1 is an orphan. Editing such a file in place
+    would change every copy; SnailSynk only ever renames, moves and deletes.
+    mode='reflink': the visible file is a copy-on-write clone of the blob, so
+    copies stay independent. Clones are tracked by inode in refs.json.
+    mode='auto': reflink where the filesystem supports it, else hardlink.
+
+    root is a folder beside the share on the same filesystem (see
+    private_dir_beside), so links never cross filesystems and blobs are never
+    served. A dedup hit touches its blob under the blob lock, and scrub()
+    re-checks every orphan under that lock, so a blob is never removed while
+    an upload is being linked to it.
+    """
+    def __init__(self, files_folder, root, mode='auto'):
+        self.files_folder = files_folder
+        self.root = root
+        self.algorithm = 'blake3' if BLAKE3_AVAILABLE else 'sha256'
+        self.blob_dir = os.path.join(self.root, 'blobs', self.algorithm)
+        self.tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.mode = self._resolve_mode(mode)
+        self._refs = SharedJSONStore(os.path.join(self.root, 'refs.json'))  # reflink mode: digest -> [inodes]
+        self._lock = threading.Lock()
+        self._counters = {'uploads': 0, 'deduplicated': 0, 'bytes_saved_at_upload': 0, 'scrubbed_blobs': 0}
+        self._stats_cache = (0.0, None)
+        self._scrub_thread = None
+
+    def _resolve_mode(self, mode):
+        if mode == 'hardlink': return 'hardlink'
+        if self._reflink_works(): return 'reflink'
+        if mode == 'reflink':
+            logging.warning(f"Reflinks are not supported under {self.files_folder}; deduplicating with hardlinks.")
+        return 'hardlink'
+
+    def _reflink_works(self):
+        if not REFLINK_SUPPORTED: return False
+        src, dst = os.path.join(self.tmp_dir, f"probe-{uuid.uuid4().hex}"), None
+        try:
+            with open(src, 'wb') as f: f.write(b'probe')
+            dst = src + '.clone'
+            self._clone(src, dst)
+            return True
+        except OSError:
+            return False
+        finally:
+            for path in (src, dst):
+                if path:
+                    try: os.remove(path)
+                    except OSError: pass
+
+    @staticmethod
+    def _clone(src, dst):
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+    def _new_hasher(self):
+        return blake3.blake3() if BLAKE3_AVAILABLE else hashlib.sha256()
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _temp_beside(self, path):
+        """A hidden temp name in path's directory, so the final os.replace is atomic."""
+        return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+
+    # --- Ingest ---
+    def ingest(self, stream, dest_path):
+        """
+        Streams an upload into dest_path (which may be an empty placeholder),
+        hashing it on the way. Returns (digest, deduplicated).
+        """
+        hasher = self._new_hasher()
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk: break
+                    hasher.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = hasher.hexdigest()
+            blob = self.blob_path(digest)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            with file_lock(self.blob_dir):
+                try:
+                    os.utime(blob)  # restarts the scrub grace period before we link to it
+                    deduplicated = True
+                except FileNotFoundError:
+                    deduplicated = False
+            if not deduplicated:
+                try:
+                    os.link(tmp_path, blob)  # atomic: the first writer of this content wins
+                except FileExistsError:
+                    deduplicated = True
+            self._place(blob, dest_path)
+        finally:
+            try: os.remove(tmp_path)
+            except OSError: pass
+        with self._lock:
+            self._counters['uploads'] += 1
+            if deduplicated:
+                self._counters['deduplicated'] += 1
+                self._counters['bytes_saved_at_upload'] += size
+        return digest, deduplicated
+
+    def _place(self, blob, dest_path):
+        staged = self._temp_beside(dest_path)
+        try:
+            if self.mode == 'reflink':
+                self._clone(blob, staged)
+            else:
+                os.link(blob, staged)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL, errno.EMLINK, errno.EPERM):
+                raise
+            # Destination on another filesystem (or link limit hit): store a plain copy.
+            shutil.copyfile(blob, staged)
+            os.replace(staged, dest_path)
+            return
+        os.replace(staged, dest_path)
+        if self.mode == 'reflink':
+            inode = os.stat(dest_path).st_ino
+            with self._refs.transaction() as refs:
+                refs.setdefault(os.path.basename(blob), [])
+                if inode not in refs[os.path.basename(blob)]:
+                    refs[os.path.basename(blob)].append(inode)
+
+    # --- Scrubbing & reporting ---
+    def _iter_blobs(self):
+        for bucket in os.scandir(self.blob_dir):
+            if not bucket.is_dir(): continue
+            for entry in os.scandir(bucket.path):
+                try:
+                    yield entry.name, entry.path, entry.stat()
+                except OSError:
+                    continue
+
+    def _live_inodes(self):
+        """Inodes of every regular file in the share folder outside the store (reflink mode)."""
+        inodes, stack = set(), [self.files_folder]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.path == self.root: continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            inodes.add(entry.inode())
+            except OSError:
+                continue
+        return inodes
+
+    def scrub(self):
+        """Deletes blobs no visible file refers to any more, plus stale temp files. Returns (removed, bytes freed)."""
+        removed = freed = 0
+        cutoff = time.time() - SCRUB_GRACE_SECONDS
+        live = self._live_inodes() if self.mode == 'reflink' else None
+        refs = self._refs.data
+        orphans = []
+        for digest, path, st in self._iter_blobs():
+            if st.st_mtime > cutoff: continue
+            if self.mode == 'reflink':
+                orphaned = not any(inode in live for inode in refs.get(digest, []))
+            else:
+                orphaned = st.st_nlink <= 1
+            if orphaned:
+                orphans.append((digest, path, st.st_size))
+        with file_lock(self.blob_dir):
+            for digest, path, size in orphans:
+                try:
+                    st = os.stat(path)
+                    # Touched by an upload since the scan: it is about to gain a link.
+                    if st.st_mtime > cutoff or (self.mode == 'hardlink' and st.st_nlink > 1): continue
+                    os.remove(path)
+                    removed += 1
+                    freed += size
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logging.error(f"Could not remove orphaned blob {path}: {e}")
+        if self.mode == 'reflink':
+            with self._refs.transaction() as refs:
+                for digest in list(refs):
+                    refs[digest] = [inode for inode in refs[digest] if inode in live]
+                    if not refs[digest] or not os.path.exists(self.blob_path(digest)):
+                        del refs[digest]
+        for entry in os.scandir(self.tmp_dir):
+            try:
+                if entry.stat().st_mtime < cutoff: os.remove(entry.path)
+            except OSError:
+                pass
+        with self._lock:
+            self._counters['scrubbed_blobs'] += removed
+            self._stats_cache = (0.0, None)
+        if removed:
+            logging.info(f"Dedup scrubber removed {removed} orphaned blobs ({freed} bytes)")
+        return removed, freed
+
+    def start_background_scrubber(self, interval=3600):
+        """Runs scrub() every `interval` seconds on a daemon thread."""
+        if self._scrub_thread and self._scrub_thread.is_alive(): return
+        def _run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.scrub()
+                except Exception as e:
+                    logging.error(f"Dedup scrubber failed: {e}")
+        self._scrub_thread = threading.Thread(target=_run, name='dedup-scrubber', daemon=True)
+        self._scrub_thread.start()
+
+    def get_stats(self):
+        """Space report for the admin dashboard. Walks the blob store at most once a minute."""
+        cached_at, cached = self._stats_cache
+        if cached is not None and time.monotonic() - cached_at < STATS_TTL_SECONDS:
+            return dict(cached, **self._counters)
+        blobs = stored = logical = orphans = 0
+        live = self._live_inodes() if self.mode == 'reflink' else None
+        refs = self._refs.data
+        for digest, _, st in self._iter_blobs():
+            blobs += 1
+            stored += st.st_size
+            copies = (sum(1 for inode in refs.get(digest, []) if inode in live) if self.mode == 'reflink'
+                      else st.st_nlink - 1)
+            if copies <= 0:
+                orphans += 1
+            logical += st.st_size * copies
+        report = {
+            'mode': self.mode,
+            'algorithm': self.algorithm,
+            'blobs': blobs,
+            'orphaned_blobs': orphans,
+            'stored_bytes': stored,
+            'logical_bytes': logical,
+            'saved_bytes': max(0, logical - stored),
+        }
+        self._stats_cache = (time.monotonic(), report)
+        return dict(report, **self._counters)
@@ -0,0 +1,203 @@
+# backbone/delta_sync.py
+import os
+import math
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .hash_pool import HashingBusyError
+
+try:
+    from gevent.threadpool import ThreadPool as GeventThreadPool
+    GEVENT_AVAILABLE = True
+except ImportError:
+    GEVENT_AVAILABLE = False
+
+# Blocks are sized ~sqrt(file size) like rsync, within these bounds.
+MIN_BLOCK_SIZE = 4 * 1024
+MAX_BLOCK_SIZE = 1024 * 1024
+SIGNATURE_CACHE_ENTRIES = 64
+HASH_CACHE_ENTRIES = 100000
+CHUNK_SIZE = 1024 * 1024
+# File hashing jobs queued or running at once; beyond this, requests get HashingBusyError.
+MAX_PENDING_DIGESTS = 16
+
+
+def block_size_for(size):
+    """rsync's heuristic: sqrt(size) rounded up to a whole KiB, clamped to [MIN_BLOCK_SIZE, MAX_BLOCK_SIZE]."""
+    return min(MAX_BLOCK_SIZE, max(MIN_BLOCK_SIZE, math.ceil(math.sqrt(max(size, 1)) / 1024) * 1024))
+
+
+def _strong(block):
+    return hashlib.blake2b(block, digest_size=16).hexdigest()
+
+
+def _compute_signature(path, block_size):
+    """Per-block (adler32, blake2b-128) pairs plus the whole-file SHA-256, in one read."""
+    blocks, whole = [], hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block: break
+            whole.update(block)
+            blocks.append([zlib.adler32(block), _strong(block)])
+    return blocks, whole.hexdigest()
+
+
+def _sha256_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class DeltaSync:
+    """
+    Server side of folder mirroring.
+
+    iter_manifest() lists a subtree (path, size, mtime and optionally SHA-256)
+    so a client can tell which files changed. For a large file that changed
+    only in places, signature() returns zsync-style block signatures: the
+    client rolls Adler-32 over its own copy, keeps the blocks whose checksums
+    match, and fetches only the missing byte ranges with HTTP Range requests
+    on /files/<path>. All the rolling happens on the client; the server just
+    hashes each block once, and caches the result per (size, mtime).
+
+    Hashing runs on a small pool of its own (max_workers threads, at most
+    MAX_PENDING_DIGESTS jobs), so large files don't stall the event loop and
+    never queue in front of Argon2 logins; hashlib and zlib release the GIL on
+    big buffers. max_workers=0 hashes inline.
+    """
+    def __init__(self, file_manager, max_workers=1, use_gevent=False):
+        self.file_manager = file_manager
+        self.max_workers = max_workers
+        self.use_gevent = use_gevent and GEVENT_AVAILABLE
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._signatures = OrderedDict()  # (rel path, size, mtime_ns, block size) -> signature dict
+        self._hashes = OrderedDict()      # (rel path, size, mtime_ns) -> sha256 hex
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # Worker threads don't survive a fork; the child builds its own pool on first use.
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created lazily: a gevent pool must be built from the hub's own thread.
+        if self._pool is None:
+            if self.use_gevent:
+                self._pool = GeventThreadPool(self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='delta-sync')
+        return self._pool
+
+    def _offload(self, fn, *args):
+        if not self.max_workers: return fn(*args)
+        with self._lock:
+            if self._pending >= MAX_PENDING_DIGESTS:
+                raise HashingBusyError("Too many file hashing jobs in progress.")
+            self._pending += 1
+
+        def job():
+            # Errors come back as values so gevent's pool doesn't print a traceback for a vanished file.
+            try:
+                return fn(*args), None
+            except Exception as e:
+                return None, e
+
+        try:
+            if self.use_gevent:
+                result, error = self._get_pool().spawn(job).get()
+            else:
+                result, error = self._get_pool().submit(job).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+        if error is not None:
+            raise error
+        return result
+
+    @staticmethod
+    def _remember(cache, key, value, limit):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+    def file_hash(self, rel_path, st):
+        """SHA-256 of a file: the upload checksum if still current, else computed once per (size, mtime)."""
+        stored = self.file_manager.get_checksum(rel_path)
+        if stored: return stored
+        key = (rel_path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._hashes.get(key)
+        if cached: return cached
+        digest = self._offload(_sha256_file, os.path.join(self.file_manager.files_folder, rel_path))
+        with self._lock:
+            self._remember(self._hashes, key, digest, HASH_CACHE_ENTRIES)
+        return digest
+
+    def iter_manifest(self, subpath='', hashes=False, hash_filter=None):
+        """
+        Yields one dict per folder and file under subpath (depth first, sorted by
+        name), then a final {'type': 'end'} summary so clients can detect a
+        truncated stream. Paths are relative to the share root. hash_filter(path)
+        may return False to leave a file's hash out (e.g. locked files).
+        """
+        self.file_manager._validate_subpath(subpath)
+        files_folder = self.file_manager.files_folder
+        files = total = 0
+        stack = [subpath]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                with os.scandir(os.path.join(files_folder, rel_dir) if rel_dir else files_folder) as it:
+                    entries = sorted((e for e in it if not e.name.startswith('.')), key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                    if entry.is_dir(follow_symlinks=False):
+                        yield {'type': 'folder', 'path': rel_path, 'mtime': st.st_mtime}
+                        subdirs.append(rel_path)
+                    elif entry.is_file(follow_symlinks=False):
+                        item = {'type': 'file', 'path': rel_path, 'size': st.st_size, 'mtime': st.st_mtime}
+                        if hashes and (hash_filter is None or hash_filter(rel_path)):
+                            item['sha256'] = self.file_hash(rel_path, st)
+                        files += 1
+                        total += st.st_size
+                        yield item
+                except OSError:
+                    continue  # vanished mid-walk
+            stack.extend(reversed(subdirs))
+        yield {'type': 'end', 'path': subpath, 'files': files, 'bytes': total, 'generated_at': time.time()}
+
+    def signature(self, rel_path, block_size=None):
+        """Block signature of a file. Raises FileNotFoundError if it isn't a regular file."""
+        full_path = os.path.join(self.file_manager.files_folder, rel_path)
+        if not os.path.isfile(full_path): raise FileNotFoundError(rel_path)
+        st = os.stat(full_path)
+        block_size = min(MAX_BLOCK_SIZE, max(MIN_BLOCK_SIZE, int(block_size))) if block_size else block_size_for(st.st_size)
+        key = (rel_path, st.st_size, st.st_mtime_ns, block_size)
+        with self._lock:
+            cached = self._signatures.get(key)
+            if cached: self._signatures.move_to_end(key)
+        if cached: return cached
+        blocks, sha256 = self._offload(_compute_signature, full_path, block_size)
+        after = os.stat(full_path)
+        signature = {'path': rel_path, 'size': st.st_size, 'mtime': st.st_mtime, 'sha256': sha256,
+                     'block_size': block_size, 'weak': 'adler32', 'strong': 'blake2b-128', 'blocks': blocks}
+        if (after.st_size, after.st_mtime_ns) == (st.st_size, st.st_mtime_ns):  # don't cache a file caught mid-write
+            with self._lock:
+                self._remember(self._signatures, key, signature, SIGNATURE_CACHE_ENTRIES)
+        return signature
@@ -1,23 +1,156 @@
 # backbone/file_manager.py
 import os
 import io
-import json
 import uuid
 import time
 import shutil
 import base64
+import hashlib
 import zipfile
 import logging
+import threading
 from pathlib import Path
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 from urllib.parse import quote
 from werkzeug.utils import secure_filename
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 from .utils import log_history
+from .hash_pool import HashingBusyError
+from .shared_state import SharedJSONStore
+from .integrity import HashingReader, checksum_record, parse_sha256
+from .checksum_store import ChecksumStore
+from .metrics import REGISTRY
+
+# Lifetime of the capability token handed out after a successful password check.
+UNLOCK_TOKEN_TTL = 600
+# Memory budget for cached image previews (base64 data URIs).
+PREVIEW_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+LISTING_SECONDS = REGISTRY.histogram('snailsynk_listing_duration_seconds', 'Time to build one folder listing.')
+UPLOAD_BYTES = REGISTRY.counter('snailsynk_upload_bytes_total', 'Bytes written by completed uploads.')
+UPLOAD_FILES = REGISTRY.counter('snailsynk_uploaded_files_total', 'Uploaded files by outcome.', ('result',))
+UPLOAD_SECONDS = REGISTRY.histogram('snailsynk_upload_write_seconds', 'Time to stream, hash and store one uploaded file.')
+ZIP_SECONDS = REGISTRY.histogram('snailsynk_zip_build_seconds', 'Time to build one zip archive.', ('source',))
+ZIP_BYTES = REGISTRY.counter('snailsynk_zip_bytes_total', 'Bytes of zip archives built.', ('source',))
+
+def _ancestors(rel_path):
+    """'a/b/c' -> ['a/b', 'a', '']: every folder whose listing shows rel_path or its size."""
+    parts = rel_path.split('/')[:-1] if rel_path else []
+    return ['/'.join(parts[:i]) for i in range(len(parts), -1, -1)]
+
+def _is_under(path, prefix):
+    return path == prefix or not prefix or path.startswith(prefix + '/')
+
+class _PathLocks:
+    """
+    Hierarchical locks on paths relative to files_folder. Holding 'a/b' excludes
+    anyone holding 'a/b', an ancestor such as 'a', or a descendant such as
+    'a/b/c', so a folder rename can't interleave with edits to files inside it.
+    Critical sections must not yield to other greenlets.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._held = []
+
+    @staticmethod
+    def _overlaps(a, b):
+        return a == b or not a or not b or a.startswith(b + '/') or b.startswith(a + '/')
+
+    @contextmanager
+    def hold(self, *paths):
+        paths = {os.path.normpath(p).replace(os.sep, '/').strip('/') if p else '' for p in paths}
+        paths = {'' if p == '.' else p for p in paths}
+        with self._cond:
+            while any(self._overlaps(p, held) for p in paths for held in self._held):
+                self._cond.wait()
+            self._held.extend(paths)
+        try:
+            yield
+        finally:
+            with self._cond:
+                for p in paths:
+                    self._held.remove(p)
+                self._cond.notify_all()
+
+class _MetadataKeys:
+    """
+    Metadata keys sorted by path ('folder:' tag stripped), so the entries for a
+    folder and everything inside it are two bisect range scans instead of a
+    pass over every key. The index belongs to one snapshot of the metadata
+    store: FileManager's own transactions update it in place, and it is
+    rebuilt when another worker has replaced the snapshot.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._items = []  # sorted (path, key)
+
+    @staticmethod
+    def _item(key):
+        return (key[len('folder:'):] if key.startswith('folder:') else key, key)
+
+    def under(self, snapshot, prefix):
+        """Keys of snapshot for prefix itself and anything below it."""
+        with self._lock:
+            if self._snapshot is not snapshot:
+                self._items = sorted(self._item(k) for k in snapshot)
+                self._snapshot = snapshot
+            items = self._items
+            # (prefix, ...) sorts before (prefix + '\0',); 'prefix/...' paths lie between 'prefix/' and 'prefix0'.
+            exact = items[bisect_left(items, (prefix,)):bisect_left(items, (prefix + '\0',))]
+            below = items[bisect_left(items, (prefix + '/',)):bisect_left(items, (prefix + '0',))]
+        return [key for _, key in exact + below]
+
+    def apply(self, before, after, touched):
+        """Carries the index from snapshot `before` to `after`, given the keys a transaction touched."""
+        with self._lock:
+            if self._snapshot is not before: return  # already stale; rebuilt on next use
+            for key in touched:
+                was, now = key in before, key in after
+                if was and not now:
+                    item = self._item(key)
+                    index = bisect_left(self._items, item)
+                    if index < len(self._items) and self._items[index] == item: del self._items[index]
+                elif now and not was:
+                    insort(self._items, self._item(key))
+            self._snapshot = after
+
+
+class _TrackedMetadata(MutableMapping):
+    """The working copy of a metadata transaction, noting which top-level keys were set or deleted."""
+    def __init__(self, data):
+        self.data = data
+        self.touched = set()
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.touched.add(key)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.touched.add(key)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
 
 class FileManager:
     """Handles all file-related operations."""
-    def __init__(self, files_folder, instance_path):
+    def __init__(self, files_folder, instance_path, password_hasher=None, secret_key=None, dedup_store=None, trash=None):
         if not files_folder or not os.path.isdir(files_folder):
             raise ValueError("Invalid files_folder provided to FileManager.")
         self.files_folder = files_folder
@@ -25,35 +158,276 @@ class FileManager:
 
         self.metadata_path = os.path.join(instance_path, 'file_metadata.json')
         self.share_links_path = os.path.join(instance_path, 'share_links.json')
-        self.ph = PasswordHasher()
-        self.metadata = self._load_metadata()
-        self.share_links = self._load_share_links()
+        self.ph = password_hasher or PasswordHasher()
+        self.token_serializer = URLSafeTimedSerializer(secret_key or os.urandom(32), salt='snailsynk-unlock')
+        self.dedup_store = dedup_store  # optional DedupStore; uploads are content-addressed when set
+        self.trash = trash  # optional Trash; deletes are moved there instead of removed outright
+        # Both files are shared with other worker processes; every mutation goes
+        # through a store transaction so concurrent writers can't lose updates.
+        self._metadata_store = SharedJSONStore(self.metadata_path)
+        self._metadata_keys = _MetadataKeys()
+        self._share_links_store = SharedJSONStore(self.share_links_path)
+        # Upload checksums, one row per file, so they don't bloat the metadata file.
+        self._checksums = ChecksumStore(os.path.join(instance_path, 'checksums.db'))
+        self._migrate_checksums()
+        # Operations that touch the filesystem and the metadata for a path hold its
+        # lock across both steps; readers use the store's copy-on-write snapshots.
+        self._path_locks = _PathLocks()
+        # Listing rows and folder sizes are only cached while a FileSystemWatcher
+        # reports external changes (see attach_watcher); previews are validated by stat.
+        self._watcher = None
+        self._change_listeners = []
+        self._cache_lock = threading.Lock()
+        self._cache_generation = 0
+        self._listing_cache = {}   # subpath -> (dir mtime_ns, rows)
+        self._folder_sizes = {}    # folder rel path -> total bytes
+        self._folder_children = {} # folder rel path -> (dir mtime_ns, sorted subfolder names)
+        self._preview_cache = OrderedDict()  # rel path -> ((mtime_ns, size), data uri)
+        self._preview_cache_bytes = 0
 
-    def _load_metadata(self):
-        if not os.path.exists(self.metadata_path): return {}
-        try:
-            with open(self.metadata_path, 'r') as f: return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            logging.error(f"Could not load or parse file metadata from {self.metadata_path}")
-            return {}
-        
-    def _save_metadata(self):
-        try:
-            with open(self.metadata_path, 'w') as f: json.dump(self.metadata, f, indent=2)
-        except IOError as e: logging.error(f"Could not save file metadata to {self.metadata_path}: {e}")
+    @property
+    def metadata(self):
+        return self._metadata_store.data
+
+    @contextmanager
+    def _metadata_transaction(self):
+        """A metadata store transaction that keeps the sorted key index in step with it."""
+        with self._metadata_store.transaction() as working:
+            before = self._metadata_store.data  # the snapshot working was copied from
+            tracked = _TrackedMetadata(working)
+            yield tracked
+            # If the write fails the store keeps `before`, the index no longer matches, and it is rebuilt.
+            self._metadata_keys.apply(before, working, tracked.touched)
+
+    @property
+    def share_links(self):
+        return self._share_links_store.data
+
+    @contextmanager
+    def _mutating(self, *paths):
+        """Path locks for a filesystem change, dropping cached listings/sizes for those paths afterwards."""
+        with self._path_locks.hold(*paths):
+            try:
+                yield
+            finally:
+                self._invalidate(*paths)
+
+    # --- Change Tracking & Caches ---
+    def add_change_listener(self, callback):
+        """Registers callback(*rel_paths), called after each successful change made through FileManager."""
+        self._change_listeners.append(callback)
+
+    def _notify(self, *rel_paths):
+        for callback in self._change_listeners:
+            try:
+                callback(*rel_paths)
+            except Exception as e:
+                logging.error(f"File change listener failed for {rel_paths}: {e}")
+
+    def attach_watcher(self, watcher):
+        """Enables the listing and folder-size caches, kept fresh by the watcher's change stream."""
+        self._watcher = watcher
+
+    @property
+    def _caching(self):
+        return self._watcher is not None and self._watcher.running
+
+    def _invalidate(self, *rel_paths):
+        with self._cache_lock:
+            self._cache_generation += 1
+            for rel_path in rel_paths:
+                rel_path = rel_path.strip('/')
+                stale = set(_ancestors(rel_path))
+                for folder in [f for f in self._folder_sizes if f in stale or _is_under(f, rel_path)]:
+                    del self._folder_sizes[folder]
+                for subpath in [d for d in self._listing_cache if d in stale or _is_under(d, rel_path)]:
+                    del self._listing_cache[subpath]
+                for folder in [f for f in self._folder_children if f in stale or _is_under(f, rel_path)]:
+                    del self._folder_children[folder]
+                for path in [p for p in self._preview_cache if _is_under(p, rel_path)]:
+                    self._preview_cache_bytes -= len(self._preview_cache.pop(path)[1])
 
-    def _load_share_links(self):
-        if not os.path.exists(self.share_links_path): return {}
+    def apply_fs_changes(self, batch):
+        """
+        Consumes a ChangeBatch from the watcher: drops affected cache entries and
+        returns the subpaths whose visible listing actually changed, so callers
+        only broadcast those (changes the app made itself were already sent).
+        """
+        if batch.rescan:
+            affected = set(self._listing_cache) | {''}
+            previous = {}
+            with self._cache_lock:
+                self._cache_generation += 1
+                self._listing_cache.clear()
+                self._folder_sizes.clear()
+                self._folder_children.clear()
+                self._preview_cache.clear()
+                self._preview_cache_bytes = 0
+        else:
+            affected = {folder for rel_path in batch.changes for folder in _ancestors(rel_path)}
+            previous = {subpath: self._listing_cache.get(subpath) for subpath in affected}
+            self._invalidate(*batch.changes)
+        changed = []
+        for subpath in sorted(affected):
+            target_dir = os.path.join(self.files_folder, subpath) if subpath else self.files_folder
+            if not os.path.isdir(target_dir):
+                continue
+            before = previous.get(subpath)
+            if before is None or before[1] != self._list_rows(subpath, target_dir):
+                changed.append(subpath)
+        return changed
+
+    def _folder_size(self, rel_path):
+        """Total size of all files under a folder, built from (and into) the per-folder index."""
+        caching = self._caching
+        if caching:
+            size = self._folder_sizes.get(rel_path)
+            if size is not None:
+                return size
+        generation = self._cache_generation
+        total = 0
         try:
-            with open(self.share_links_path, 'r') as f: return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            logging.error(f"Could not load share links from {self.share_links_path}")
-            return {}
+            with os.scandir(os.path.join(self.files_folder, rel_path)) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            total += self._folder_size(f"{rel_path}/{entry.name}")
+                        elif entry.is_file():
+                            total += entry.stat().st_size
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        if caching and generation == self._cache_generation:
+            self._folder_sizes[rel_path] = total
+        return total
+
+    def _list_rows(self, subpath, target_dir):
+        """Name/type/mtime/size rows for a directory, folders first. Lock and favorite flags are added per request."""
+        caching = self._caching
+        if caching:
+            try:
+                dir_mtime = os.stat(target_dir).st_mtime_ns
+            except OSError:
+                dir_mtime = None
+            cached = self._listing_cache.get(subpath)
+            if cached and cached[0] == dir_mtime:
+                return cached[1]
+        generation = self._cache_generation
+        entries = sorted([e for e in os.listdir(target_dir) if not e.startswith('.')], key=str.lower)
+        folders, files = [], []
+        for entry in entries:
+            full_path = os.path.join(target_dir, entry)
+            rel_path = f"{subpath}/{entry}" if subpath else entry
+            try:
+                if os.path.isdir(full_path):
+                    folders.append({'name': entry, 'type': 'folder', 'mtime': os.path.getmtime(full_path),
+                                    'size': self._folder_size(rel_path)})
+                elif os.path.isfile(full_path):
+                    files.append({'name': entry, 'type': 'file', 'mtime': os.path.getmtime(full_path),
+                                  'size': os.path.getsize(full_path)})
+            except OSError:
+                continue  # removed while listing
+        rows = folders + files
+        if caching and generation == self._cache_generation:
+            self._listing_cache[subpath] = (dir_mtime, rows)
+        return rows
 
-    def _save_share_links(self):
+    @staticmethod
+    def _entry(metadata, key):
+        """Copy of a metadata entry as a dict, so locking keeps fields like 'favorite'."""
+        entry = metadata.get(key)
+        return dict(entry) if isinstance(entry, dict) else {}
+
+    def _keys_under(self, prefix):
+        """Metadata keys (plain or 'folder:' lock keys) for prefix and everything inside it."""
+        return self._metadata_keys.under(self.metadata, prefix)
+
+    @staticmethod
+    def _clear_lock(metadata, key):
+        """Drops the lock from a metadata entry, keeping flags such as favorite. False if it wasn't locked."""
+        meta = metadata.get(key)
+        if not isinstance(meta, dict) or 'password_hash' not in meta: return False
+        del meta['password_hash']
+        meta.pop('locked', None)
+        if not meta:
+            del metadata[key]
+        return True
+
+    def _remap_metadata(self, old_prefix, new_prefix, keep_source=False):
+        """
+        Re-keys metadata and checksums for old_prefix and everything under it to
+        new_prefix. keep_source=True copies instead (locks and checksums, not
+        favorites), so a copy of a locked file stays locked.
+        """
+        self._checksums.remap_under(old_prefix, new_prefix, keep_source)
+        if not self._keys_under(old_prefix): return
+        with self._metadata_transaction() as metadata:
+            # Inside the transaction self.metadata is the snapshot the working copy was made from.
+            for key in self._keys_under(old_prefix):
+                folder_tag = 'folder:' if key.startswith('folder:') else ''
+                new_key = folder_tag + new_prefix + key[len(folder_tag) + len(old_prefix):]
+                if not keep_source:
+                    metadata[new_key] = metadata.pop(key)
+                    continue
+                entry = {k: v for k, v in self._entry(metadata, key).items() if k != 'favorite'}
+                if entry: metadata[new_key] = entry
+
+    def _take_metadata(self, prefix):
+        """
+        Removes and returns the metadata for prefix and everything under it, with
+        each file's checksum folded into its entry as 'checksum' (the form the
+        trash keeps and _put_metadata expects).
+        """
+        entries = {}
+        if self._keys_under(prefix):
+            with self._metadata_transaction() as metadata:
+                entries = {key: metadata.pop(key) for key in self._keys_under(prefix)}
+        for rel_path, record in self._checksums.take_under(prefix).items():
+            entries[rel_path] = {**self._entry(entries, rel_path), 'checksum': record}
+        return entries
+
+    def _put_metadata(self, entries, old_prefix, new_prefix):
+        """Writes entries taken by _take_metadata back, re-keyed from old_prefix to new_prefix."""
+        if not entries: return
+        checksums, rekeyed = {}, {}
+        for key, entry in entries.items():
+            folder_tag = 'folder:' if key.startswith('folder:') else ''
+            new_key = folder_tag + new_prefix + key[len(folder_tag) + len(old_prefix):]
+            if isinstance(entry, dict) and 'checksum' in entry:
+                entry = dict(entry)
+                checksums[new_key] = entry.pop('checksum')
+            if entry: rekeyed[new_key] = entry
+        if checksums: self._checksums.put_many(checksums)
+        if not rekeyed: return
+        with self._metadata_transaction() as metadata:
+            for key, entry in rekeyed.items():
+                metadata[key] = entry
+
+    def _discard(self, full_path, rel_path, remote_addr):
+        """Moves an item to the trash (or deletes it if there is none) with its metadata. Caller holds the path lock."""
+        entries = self._take_metadata(rel_path)
         try:
-            with open(self.share_links_path, 'w') as f: json.dump(self.share_links, f, indent=2)
-        except IOError as e: logging.error(f"Could not save share links to {self.share_links_path}: {e}")
+            if self.trash:
+                self.trash.stash(full_path, rel_path, entries, remote_addr)
+            elif os.path.isdir(full_path) and not os.path.islink(full_path):
+                shutil.rmtree(full_path)
+            else:
+                os.remove(full_path)
+        except Exception:
+            self._put_metadata(entries, rel_path, rel_path)
+            raise
+
+    def _reserve_unique_filename(self, file_path):
+        """Like _generate_unique_filename, but atomically creates an empty placeholder so two
+        concurrent uploads of the same name can't both claim it."""
+        while True:
+            candidate = self._generate_unique_filename(file_path)
+            try:
+                os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return candidate
+            except FileExistsError:
+                continue
 
     def _generate_unique_filename(self, file_path):
         if not os.path.exists(file_path): return file_path
@@ -73,9 +447,10 @@ class FileManager:
         normalized = os.path.normpath(subpath)
         if normalized.startswith('..') or os.path.isabs(normalized):
             raise ValueError("Invalid path.")
-        # Check each component is safe
+        # Check each component is safe. Dot-prefixed names are server-private (upload temp
+        # files, a trash or dedup store left in the share) and are never listed, so never reachable.
         for part in Path(normalized).parts:
-            if part in ('.', '..') or not part.strip():
+            if part.startswith('.') or not part.strip():
                 raise ValueError("Invalid path component.")
         full_path = os.path.join(self.files_folder, normalized)
         # Final check: resolved path must be inside files_folder
@@ -92,86 +467,170 @@ class FileManager:
     def lock_file(self, filename, password):
         if not password: return False, "Password cannot be empty."
         if not os.path.isfile(os.path.join(self.files_folder, filename)): return False, "File not found."
-        password_hash = self.ph.hash(password)
-        self.metadata[filename] = {'password_hash': password_hash}
-        self._save_metadata()
+        try:
+            password_hash = self.ph.hash(password)
+        except HashingBusyError:
+            return False, "Server is busy, please try again shortly."
+        with self._path_locks.hold(filename):
+            # Re-check under the lock: the file may have been renamed while we were hashing.
+            if not os.path.isfile(os.path.join(self.files_folder, filename)): return False, "File not found."
+            with self._metadata_transaction() as metadata:
+                metadata[filename] = {**self._entry(metadata, filename), 'password_hash': password_hash}
         return True, f"File '{filename}' locked."
 
     def unlock_file(self, filename):
-        meta = self.metadata.get(filename)
-        if meta and isinstance(meta, dict) and 'password_hash' in meta:
-            del meta['password_hash']
-            # If no other useful keys remain, remove the entry entirely
-            if not any(k for k in meta if k != 'favorite' or meta.get(k)):
-                pass  # Keep entry if favorite flag exists
-            if not meta:
-                del self.metadata[filename]
-            self._save_metadata()
+        if not self.is_locked(filename): return False, "File was not locked."
+        with self._path_locks.hold(filename), self._metadata_transaction() as metadata:
+            unlocked = self._clear_lock(metadata, filename)
+        if unlocked:
             return True, f"File '{filename}' unlocked."
         return False, "File was not locked."
     
     def verify_file_password(self, filename, password):
-        if not self.is_locked(filename): return False
-        password_hash = self.metadata[filename].get('password_hash')
+        meta = self.metadata.get(filename)
+        password_hash = meta.get('password_hash') if isinstance(meta, dict) else None
+        if not password_hash: return False
+        return self._verify_hash(password_hash, password, filename)
+
+    def _verify_hash(self, password_hash, password, label):
         try:
             self.ph.verify(password_hash, password)
             return True
         except VerifyMismatchError: return False
         except Exception as e:
-            logging.error(f"Error during file password verification for {filename}: {e}")
+            logging.error(f"Error during password verification for {label}: {e}")
+            return False
+
+    def _item_key(self, path, kind):
+        return f"folder:{path}" if kind == 'folder' else path
+
+    def _hash_fingerprint(self, path):
+        """Short digest of the file's current lock hash; re-locking or unlocking invalidates old tokens."""
+        meta = self.metadata.get(path)
+        password_hash = meta.get('password_hash') if isinstance(meta, dict) else None
+        if not password_hash: return None
+        return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+    def issue_unlock_token(self, path):
+        """Mints a signed, short-lived token proving the password for the locked file at path was verified."""
+        fingerprint = self._hash_fingerprint(path)
+        if not fingerprint: return None
+        return self.token_serializer.dumps({'p': path, 'h': fingerprint})
+
+    def verify_unlock_token(self, token, path):
+        """Checks a token from issue_unlock_token without touching Argon2."""
+        if not token: return False
+        try:
+            data = self.token_serializer.loads(token, max_age=UNLOCK_TOKEN_TTL)
+        except BadSignature:
             return False
+        fingerprint = self._hash_fingerprint(path)
+        return bool(fingerprint) and data.get('p') == path and data.get('h') == fingerprint
+
+    def lock_batch(self, subpath, names, password):
+        """Locks several files/folders under subpath with one password, hashing it only once."""
+        if not password: return [], list(names)
+        try:
+            target_dir = self._validate_subpath(subpath)
+        except ValueError:
+            return [], list(names)
+        try:
+            password_hash = self.ph.hash(password)
+        except HashingBusyError:
+            return [], list(names)
+        locked, failed, entries = [], [], {}
+        rel_paths = {name: f"{subpath}/{name}" if subpath else name for name in names}
+        with self._path_locks.hold(*rel_paths.values()):
+            for name, rel_path in rel_paths.items():
+                try:
+                    full_path = self._validate_subpath(rel_path)
+                except ValueError:
+                    failed.append(name)
+                    continue
+                if os.path.isdir(full_path):
+                    entries[f"folder:{rel_path}"] = {'locked': True, 'password_hash': password_hash}
+                elif os.path.isfile(full_path):
+                    entries[rel_path] = {'password_hash': password_hash}
+                else:
+                    failed.append(name)
+                    continue
+                locked.append(name)
+            if entries:
+                with self._metadata_transaction() as metadata:
+                    for key, entry in entries.items():
+                        metadata[key] = {**self._entry(metadata, key), **entry}
+        return locked, failed
+
+    def unlock_batch(self, subpath, names, password):
+        """
+        Unlocks several files/folders under subpath. Items locked together share a
+        hash, so each distinct hash is verified once rather than once per item.
+        """
+        try:
+            target_dir = self._validate_subpath(subpath)
+        except ValueError:
+            return [], list(names)
+        verified = {}  # password_hash -> bool
+        candidates, failed = [], []  # (name, metadata key, verified hash)
+        for name in names:
+            rel_path = f"{subpath}/{name}" if subpath else name
+            kind = 'folder' if os.path.isdir(os.path.join(target_dir, name)) else 'file'
+            key = self._item_key(rel_path, kind)
+            meta = self.metadata.get(key)
+            password_hash = meta.get('password_hash') if isinstance(meta, dict) else None
+            if not password_hash:
+                failed.append(name)
+                continue
+            if password_hash not in verified:
+                verified[password_hash] = self._verify_hash(password_hash, password, rel_path)
+            if not verified[password_hash]:
+                failed.append(name)
+                continue
+            candidates.append((name, key, password_hash))
+        unlocked = []
+        if candidates:
+            rel_paths = [f"{subpath}/{name}" if subpath else name for name, _, _ in candidates]
+            with self._path_locks.hold(*rel_paths), self._metadata_transaction() as metadata:
+                for name, key, password_hash in candidates:
+                    # Skip items that were re-locked with another password since we verified.
+                    meta = metadata.get(key)
+                    if isinstance(meta, dict) and meta.get('password_hash') == password_hash and self._clear_lock(metadata, key):
+                        unlocked.append(name)
+                    else:
+                        failed.append(name)
+        return unlocked, failed
 
     def list_files(self, subpath=''):
         """List files and folders in the given subpath."""
-        items = []
+        items, started = [], time.perf_counter()
         try:
             target_dir = self._validate_subpath(subpath)
             if not os.path.isdir(target_dir):
                 return items
-            raw_entries = os.listdir(target_dir)
-            entries = sorted([e for e in raw_entries if not e.startswith('.')], key=str.lower)
             # Folders first, then files
-            folders = []
-            files = []
-            for entry in entries:
-                full_path = os.path.join(target_dir, entry)
+            for row in self._list_rows(subpath, target_dir):
                 # Build the relative path from files_folder root for encoded_name
-                rel_path = f"{subpath}/{entry}" if subpath else entry
-                if os.path.isdir(full_path):
-                    # Calculate folder size (sum of all files recursively)
-                    folder_size = 0
-                    for dirpath, dirnames, filenames_inner in os.walk(full_path):
-                        for f in filenames_inner:
-                            try: folder_size += os.path.getsize(os.path.join(dirpath, f))
-                            except OSError: pass
-                    folders.append({
-                        'name': entry,
-                        'encoded_name': quote(rel_path, safe='/'),
-                        'type': 'folder',
-                        'is_locked': self.is_folder_locked(rel_path),
-                        'mtime': os.path.getmtime(full_path),
-                        'size': folder_size,
-                        'is_favorite': self.is_favorite(rel_path)
-                    })
-                elif os.path.isfile(full_path):
-                    files.append({
-                        'name': entry,
-                        'encoded_name': quote(rel_path, safe='/'),
-                        'type': 'file',
-                        'is_locked': self.is_locked(rel_path),
-                        'mtime': os.path.getmtime(full_path),
-                        'size': os.path.getsize(full_path),
-                        'is_favorite': self.is_favorite(rel_path)
-                    })
-            items = folders + files
+                rel_path = f"{subpath}/{row['name']}" if subpath else row['name']
+                is_folder = row['type'] == 'folder'
+                items.append({
+                    'name': row['name'],
+                    'encoded_name': quote(rel_path, safe='/'),
+                    'type': row['type'],
+                    'is_locked': self.is_folder_locked(rel_path) if is_folder else self.is_locked(rel_path),
+                    'mtime': row['mtime'],
+                    'size': row['size'],
+                    'is_favorite': self.is_favorite(rel_path)
+                })
         except ValueError as e:
             logging.warning(f"Invalid subpath requested: {subpath} - {e}")
         except Exception as e:
             logging.error(f"Error listing files in {self.files_folder}/{subpath}: {e}")
             raise
+        LISTING_SECONDS.observe(time.perf_counter() - started)
         return items
 
-    def save_uploaded_files(self, uploaded_files, remote_addr, subpath='', is_admin=False):
+    def save_uploaded_files(self, uploaded_files, remote_addr, subpath='', is_admin=False, expected_hashes=None):
+        """expected_hashes optionally lists a client-computed SHA-256 per file (same order, '' to skip)."""
         success_messages, error_messages, uploaded_count = [], [], 0
         ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
         if not uploaded_files or all(f.filename == '' for f in uploaded_files):
@@ -185,28 +644,95 @@ class FileManager:
         # Non-admin users cannot upload to locked folders
         if not is_admin and self.is_folder_locked(subpath):
             return [], ['This folder is locked. Only admins can upload here.']
-        for file in uploaded_files:
+        expected_hashes = list(expected_hashes or [])
+        for index, file in enumerate(uploaded_files):
             if not file or file.filename == '': continue
             original_filename = file.filename
             if not secure_filename(original_filename):
                 error_messages.append(f'Filename "{original_filename}" is not allowed.')
                 continue
-            unique_path = self._generate_unique_filename(os.path.join(target_dir, original_filename))
+            expected = expected_hashes[index] if index < len(expected_hashes) else ''
+            if expected and not parse_sha256(expected):
+                error_messages.append(f'Checksum for "{original_filename}" is not a valid SHA-256.')
+                continue
+            # Claim the name before the (slow, yielding) save so parallel uploads can't collide.
+            unique_path = self._reserve_unique_filename(os.path.join(target_dir, original_filename))
             final_filename = os.path.basename(unique_path)
             try:
-                file.save(unique_path)
+                started = time.perf_counter()
+                digest = self._save_stream(file.stream, unique_path)
+                UPLOAD_SECONDS.observe(time.perf_counter() - started)
                 display_path = f"{subpath}/{final_filename}" if subpath else final_filename
+                if expected and parse_sha256(expected) != digest:
+                    os.remove(unique_path)
+                    UPLOAD_FILES.labels('checksum_mismatch').inc()
+                    error_messages.append(f'File "{original_filename}" was corrupted in transit (checksum mismatch).')
+                    logging.error(f"Checksum mismatch for upload {display_path}: expected {expected}, got {digest}")
+                    continue
+                with self._path_locks.hold(display_path):
+                    self._checksums.put(display_path, checksum_record(digest, os.stat(unique_path)))
+                self._invalidate(display_path)
+                self._notify(display_path)
+                UPLOAD_BYTES.inc(os.path.getsize(unique_path))
+                UPLOAD_FILES.labels('ok').inc()
                 log_history("File Uploaded", f"'{display_path}' from [{ip_color}]{remote_addr}[/]")
                 if final_filename == original_filename: success_messages.append(f'File "{original_filename}" uploaded successfully.')
                 else: success_messages.append(f'File "{original_filename}" was renamed to "{final_filename}".')
                 uploaded_count += 1
             except Exception as e:
+                UPLOAD_FILES.labels('error').inc()
                 error_messages.append(f'Error saving file "{original_filename}". Check server logs.')
                 logging.error(f'Error saving file {unique_path}: {e}')
+                try: os.remove(unique_path)
+                except OSError: pass
         if uploaded_count == 0 and any(f.filename for f in uploaded_files if f):
              error_messages.append('No files were successfully uploaded.')
         return success_messages, error_messages
 
+    def _save_stream(self, stream, dest_path):
+        """Writes an upload to dest_path, hashing it in the same pass. Returns the SHA-256 hex digest."""
+        if self.dedup_store and self.dedup_store.algorithm == 'sha256':
+            return self.dedup_store.ingest(stream, dest_path)[0]
+        reader = HashingReader(stream)
+        if self.dedup_store:
+            self.dedup_store.ingest(reader, dest_path)
+        else:
+            with open(dest_path, 'wb') as out:
+                shutil.copyfileobj(reader, out, 1024 * 1024)
+        return reader.hexdigest()
+
+    # --- Checksums ---
+    def _migrate_checksums(self):
+        """Moves checksum records that older versions kept in file_metadata.json into the checksum store."""
+        if not any(isinstance(meta, dict) and 'checksum' in meta for meta in self.metadata.values()): return
+        with self._metadata_transaction() as metadata:
+            moved = {}
+            for key in [k for k, meta in metadata.items() if isinstance(meta, dict) and 'checksum' in meta]:
+                moved[key] = metadata[key].pop('checksum')
+                if not metadata[key]: del metadata[key]
+            self._checksums.put_many(moved)
+        logging.info(f"Moved {len(moved)} checksum(s) out of {self.metadata_path}")
+
+    def checksums(self):
+        """Every stored (rel path, checksum record), for the integrity verifier."""
+        return self._checksums.items()
+
+    def get_checksum(self, rel_path):
+        """Stored SHA-256 of a file, or None if there is none or the file has changed since it was taken."""
+        record = self._checksums.get(rel_path)
+        if record is None: return None
+        try:
+            st = os.stat(os.path.join(self.files_folder, rel_path))
+        except OSError:
+            return None
+        if (st.st_size, st.st_mtime_ns) != (record.get('size'), record.get('mtime_ns')): return None
+        return record.get('sha256')
+
+    def update_checksum(self, rel_path, previous, sha256, st):
+        """Replaces a checksum record unless it changed since `previous` was read. sha256=None drops it."""
+        with self._path_locks.hold(rel_path):
+            self._checksums.replace(rel_path, previous, checksum_record(sha256, st) if sha256 else None)
+
     def move_file(self, filename, source_path, dest_path, remote_addr):
         """Move a file from source_path to dest_path. Both are relative subpaths."""
         try:
@@ -215,48 +741,80 @@ class FileManager:
         except ValueError:
             return False, "Invalid path."
         source_file = os.path.join(source_dir, filename)
-        if not os.path.isfile(source_file):
-            return False, f"File '{filename}' not found in source."
-        if not os.path.isdir(dest_dir):
-            return False, "Destination folder does not exist."
-        dest_file = self._generate_unique_filename(os.path.join(dest_dir, filename))
-        try:
-            shutil.move(source_file, dest_file)
-            # Update metadata (lock info) if the file was locked
-            old_rel = f"{source_path}/{filename}" if source_path else filename
-            new_rel = f"{dest_path}/{os.path.basename(dest_file)}" if dest_path else os.path.basename(dest_file)
-            if old_rel in self.metadata:
-                self.metadata[new_rel] = self.metadata.pop(old_rel)
-                self._save_metadata()
-            ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
-            log_history("File Moved", f"'{old_rel}' -> '{new_rel}' by [{ip_color}]{remote_addr}[/]")
-            return True, f"File '{filename}' moved successfully."
-        except Exception as e:
-            logging.error(f"Error moving file {source_file} to {dest_file}: {e}")
-            return False, "An unexpected server error occurred."
-
-    def list_all_folders(self, base_path=''):
-        """Recursively list all folder paths relative to files_folder root."""
-        folders = [{'path': '', 'name': 'Root'}]
-        def _walk(rel_path):
+        old_rel = f"{source_path}/{filename}" if source_path else filename
+        with self._mutating(old_rel, dest_path):
+            if not os.path.isfile(source_file):
+                return False, f"File '{filename}' not found in source."
+            if not os.path.isdir(dest_dir):
+                return False, "Destination folder does not exist."
+            dest_file = self._generate_unique_filename(os.path.join(dest_dir, filename))
             try:
-                target_dir = self._validate_subpath(rel_path)
-            except ValueError:
-                return
-            if not os.path.isdir(target_dir):
-                return
-            try:
-                for entry in sorted(os.listdir(target_dir), key=str.lower):
-                    if entry.startswith('.'):
-                        continue
-                    full = os.path.join(target_dir, entry)
-                    if os.path.isdir(full):
-                        child_rel = f"{rel_path}/{entry}" if rel_path else entry
-                        folders.append({'path': child_rel, 'name': child_rel})
-                        _walk(child_rel)
+                shutil.move(source_file, dest_file)
+                # Update metadata (lock info) if the file was locked
+                new_rel = f"{dest_path}/{os.path.basename(dest_file)}" if dest_path else os.path.basename(dest_file)
+                self._checksums.remap_under(old_rel, new_rel)
+                if old_rel in self.metadata:
+                    with self._metadata_transaction() as metadata:
+                        if old_rel in metadata:
+                            metadata[new_rel] = metadata.pop(old_rel)
             except Exception as e:
-                logging.error(f"Error walking folders in {target_dir}: {e}")
-        _walk(base_path)
+                logging.error(f"Error moving file {source_file} to {dest_file}: {e}")
+                return False, "An unexpected server error occurred."
+        ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
+        self._notify(old_rel, new_rel)
+        log_history("File Moved", f"'{old_rel}' -> '{new_rel}' by [{ip_color}]{remote_addr}[/]")
+        return True, f"File '{filename}' moved successfully."
+
+    def _child_folders(self, rel_path):
+        """
+        Sorted names of the subfolders of rel_path, from the folder-tree cache. An
+        entry is reused while the directory's mtime is unchanged (adding, removing
+        or renaming a child bumps it); with a watcher running it is trusted as is.
+        """
+        full_path = os.path.join(self.files_folder, rel_path) if rel_path else self.files_folder
+        cached = self._folder_children.get(rel_path)
+        if cached is not None and self._caching:
+            return cached[1]
+        try:
+            dir_mtime = os.stat(full_path).st_mtime_ns
+        except OSError:
+            return []
+        if cached is not None and cached[0] == dir_mtime:
+            return cached[1]
+        generation = self._cache_generation
+        try:
+            with os.scandir(full_path) as it:
+                names = sorted((e.name for e in it if not e.name.startswith('.') and e.is_dir()), key=str.lower)
+        except OSError as e:
+            logging.error(f"Error walking folders in {full_path}: {e}")
+            return []
+        if generation == self._cache_generation:
+            self._folder_children[rel_path] = (dir_mtime, names)
+        return names
+
+    def list_all_folders(self, base_path='', max_depth=None, include_root=True):
+        """
+        Folder paths under base_path, relative to files_folder root, in tree order.
+        max_depth limits how many levels are expanded (None = all); has_children
+        tells the client whether a folder can be expanded further.
+        """
+        base_path = base_path.strip('/')
+        try:
+            target_dir = self._validate_subpath(base_path)
+        except ValueError:
+            return []
+        if not os.path.isdir(target_dir):
+            return []
+        folders = []
+        if include_root and not base_path:
+            folders.append({'path': '', 'name': 'Root', 'has_children': bool(self._child_folders(''))})
+        def _walk(rel_path, depth):
+            for name in self._child_folders(rel_path):
+                child_rel = f"{rel_path}/{name}" if rel_path else name
+                folders.append({'path': child_rel, 'name': child_rel, 'has_children': bool(self._child_folders(child_rel))})
+                if max_depth is None or depth < max_depth:
+                    _walk(child_rel, depth + 1)
+        _walk(base_path, 1)
         return folders
 
     # --- Folder Locking ---
@@ -281,9 +839,15 @@ class FileManager:
         except ValueError:
             return False, "Invalid path."
         key = f"folder:{subpath}"
-        password_hash = self.ph.hash(password)
-        self.metadata[key] = {'locked': True, 'password_hash': password_hash}
-        self._save_metadata()
+        try:
+            password_hash = self.ph.hash(password)
+        except HashingBusyError:
+            return False, "Server is busy, please try again shortly."
+        with self._path_locks.hold(subpath):
+            if not os.path.isdir(os.path.join(self.files_folder, subpath)):
+                return False, "Folder not found."
+            with self._metadata_transaction() as metadata:
+                metadata[key] = {**self._entry(metadata, key), 'locked': True, 'password_hash': password_hash}
         return True, f"Folder '{subpath}' locked."
 
     def unlock_folder(self, subpath, password):
@@ -297,26 +861,17 @@ class FileManager:
             return False, "Folder was not locked."
         if not self.verify_folder_password(subpath, password):
             return False, "Incorrect password."
-        del self.metadata[key]
-        self._save_metadata()
+        with self._path_locks.hold(subpath), self._metadata_transaction() as metadata:
+            metadata.pop(key, None)
         return True, f"Folder '{subpath}' unlocked."
 
     def verify_folder_password(self, subpath, password):
         """Verify a folder's lock password."""
-        key = f"folder:{subpath}"
-        if key not in self.metadata:
-            return False
-        password_hash = self.metadata[key].get('password_hash')
+        meta = self.metadata.get(f"folder:{subpath}")
+        password_hash = meta.get('password_hash') if isinstance(meta, dict) else None
         if not password_hash:
             return False
-        try:
-            self.ph.verify(password_hash, password)
-            return True
-        except VerifyMismatchError:
-            return False
-        except Exception as e:
-            logging.error(f"Error during folder password verification for {subpath}: {e}")
-            return False
+        return self._verify_hash(password_hash, password, f"folder {subpath}")
 
     def zip_selected_files(self, filenames, remote_addr, subpath=''):
         memory_file, skipped_files = io.BytesIO(), []
@@ -325,6 +880,7 @@ class FileManager:
             target_dir = self._validate_subpath(subpath)
         except ValueError:
             return io.BytesIO(), filenames
+        started = time.perf_counter()
         with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
             for filename in filenames:
                 full_path = os.path.join(target_dir, filename)
@@ -338,6 +894,8 @@ class FileManager:
                             zipf.write(file_path, arcname=arcname)
                 else:
                     skipped_files.append(filename)
+        ZIP_SECONDS.labels('selection').observe(time.perf_counter() - started)
+        ZIP_BYTES.labels('selection').inc(memory_file.tell())
         memory_file.seek(0)
         log_history("Files Downloaded", f"'SnailSynk_Selected_Files.zip' by [{ip_color}]{remote_addr}[/]")
         return memory_file, skipped_files
@@ -356,7 +914,7 @@ class FileManager:
             return None, "Folder not found."
         if not os.path.abspath(folder_path).startswith(os.path.abspath(self.files_folder)):
             return None, "Access denied."
-        memory_file = io.BytesIO()
+        memory_file, started = io.BytesIO(), time.perf_counter()
         try:
             with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
                 for dirpath, dirnames, filenames in os.walk(folder_path):
@@ -364,6 +922,8 @@ class FileManager:
                         file_full = os.path.join(dirpath, filename)
                         arcname = os.path.relpath(file_full, target_dir)
                         zipf.write(file_full, arcname=arcname)
+            ZIP_SECONDS.labels('folder').observe(time.perf_counter() - started)
+            ZIP_BYTES.labels('folder').inc(memory_file.tell())
             memory_file.seek(0)
             ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
             display_path = f"{subpath}/{safe_name}" if subpath else safe_name
@@ -383,13 +943,11 @@ class FileManager:
         filename = os.path.basename(filepath)
         if not secure_filename(filename): return False, "Invalid filename provided."
         try:
-            os.remove(file_path)
-            # Check metadata with the full relative path
-            if filepath in self.metadata:
-                del self.metadata[filepath]
-                self._save_metadata()
+            with self._mutating(filepath):
+                self._discard(file_path, filepath, remote_addr)
             ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
             display_name = filepath
+            self._notify(filepath)
             log_history("File Deleted", f"'{display_name}' by [{ip_color}]{remote_addr}[/]")
             return True, f"File '{display_name}' was successfully deleted."
         except Exception as e:
@@ -416,17 +974,24 @@ class FileManager:
         if old_ext and not new_ext:
             safe_new_name += old_ext
         new_path = os.path.join(target_dir, safe_new_name)
-        if os.path.exists(new_path):
-            return False, f"A file named '{safe_new_name}' already exists."
-        try:
-            os.rename(old_path, new_path)
-            # Update metadata (lock info)
-            old_rel = f"{subpath}/{old_name}" if subpath else old_name
-            new_rel = f"{subpath}/{safe_new_name}" if subpath else safe_new_name
-            if old_rel in self.metadata:
-                self.metadata[new_rel] = self.metadata.pop(old_rel)
-                self._save_metadata()
+        old_rel = f"{subpath}/{old_name}" if subpath else old_name
+        new_rel = f"{subpath}/{safe_new_name}" if subpath else safe_new_name
+        try:
+            with self._mutating(old_rel, new_rel):
+                # Re-checked under the lock; the checks above can race with other requests.
+                if not os.path.isfile(old_path):
+                    return False, "File not found."
+                if os.path.exists(new_path):
+                    return False, f"A file named '{safe_new_name}' already exists."
+                os.rename(old_path, new_path)
+                self._checksums.remap_under(old_rel, new_rel)
+                # Update metadata (lock info)
+                if old_rel in self.metadata:
+                    with self._metadata_transaction() as metadata:
+                        if old_rel in metadata:
+                            metadata[new_rel] = metadata.pop(old_rel)
             ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
+            self._notify(old_rel, new_rel)
             log_history("File Renamed", f"'{old_rel}' -> '{new_rel}' by [{ip_color}]{remote_addr}[/]")
             return True, f"File renamed to '{safe_new_name}'."
         except Exception as e:
@@ -449,26 +1014,65 @@ class FileManager:
         if not os.path.abspath(old_path).startswith(os.path.abspath(self.files_folder)):
             return False, "Access denied."
         new_path = os.path.join(target_dir, safe_new)
-        if os.path.exists(new_path):
-            return False, f"A folder named '{safe_new}' already exists."
-        try:
-            os.rename(old_path, new_path)
-            # Update metadata keys for all items inside the folder
-            old_prefix = f"{subpath}/{safe_old}" if subpath else safe_old
-            new_prefix = f"{subpath}/{safe_new}" if subpath else safe_new
-            keys_to_update = [k for k in self.metadata if k == old_prefix or k.startswith(old_prefix + '/')]
-            for key in keys_to_update:
-                new_key = new_prefix + key[len(old_prefix):]
-                self.metadata[new_key] = self.metadata.pop(key)
-            if keys_to_update:
-                self._save_metadata()
+        old_prefix = f"{subpath}/{safe_old}" if subpath else safe_old
+        new_prefix = f"{subpath}/{safe_new}" if subpath else safe_new
+        try:
+            with self._mutating(old_prefix, new_prefix):
+                if not os.path.isdir(old_path):
+                    return False, "Folder not found."
+                if os.path.exists(new_path):
+                    return False, f"A folder named '{safe_new}' already exists."
+                os.rename(old_path, new_path)
+                # Update metadata keys for the folder itself and all items inside it
+                self._remap_metadata(old_prefix, new_prefix)
             ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
+            self._notify(old_prefix, new_prefix)
             log_history("Folder Renamed", f"'{old_prefix}' -> '{new_prefix}' by [{ip_color}]{remote_addr}[/]")
             return True, f"Folder renamed to '{safe_new}'."
         except Exception as e:
             logging.error(f"Error renaming folder {old_path} to {new_path}: {e}")
             return False, "An unexpected server error occurred."
 
+    # --- Bulk Operations (run by JobManager) ---
+    def move_path(self, old_rel, new_rel, remote_addr):
+        """
+        Renames a file or folder to new_rel, which may be in any folder of the
+        share, carrying its metadata along. Raises OSError; errno EXDEV means
+        new_rel is on another filesystem, so the data must be copied first and
+        the move completed with finish_copied_move().
+        """
+        old_abs, new_abs = self._validate_subpath(old_rel), self._validate_subpath(new_rel)
+        with self._mutating(old_rel, new_rel):
+            if not os.path.lexists(old_abs): raise FileNotFoundError(old_rel)
+            if os.path.lexists(new_abs): raise FileExistsError(new_rel)
+            os.rename(old_abs, new_abs)
+            self._remap_metadata(old_rel, new_rel)
+        ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
+        self._notify(old_rel, new_rel)
+        log_history("Item Moved", f"'{old_rel}' -> '{new_rel}' by [{ip_color}]{remote_addr}[/]")
+
+    def finish_copied_move(self, old_rel, new_rel, remote_addr):
+        """Second half of a cross-filesystem move: new_rel holds a complete copy, so drop the source."""
+        old_abs = self._validate_subpath(old_rel)
+        # Renamed aside under the lock, deleted after it: a big tree must not hold the path lock for long.
+        doomed = os.path.join(os.path.dirname(old_abs), f".{os.path.basename(old_abs)}.{uuid.uuid4().hex}.moved")
+        with self._mutating(old_rel, new_rel):
+            if os.path.lexists(old_abs): os.rename(old_abs, doomed)
+            self._remap_metadata(old_rel, new_rel)
+        if os.path.isdir(doomed) and not os.path.islink(doomed): shutil.rmtree(doomed, ignore_errors=True)
+        elif os.path.lexists(doomed): os.remove(doomed)
+        ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
+        self._notify(old_rel, new_rel)
+        log_history("Item Moved", f"'{old_rel}' -> '{new_rel}' (copied) by [{ip_color}]{remote_addr}[/]")
+
+    def finish_copy(self, old_rel, new_rel, remote_addr):
+        """Registers a completed copy of old_rel at new_rel."""
+        with self._mutating(new_rel):
+            self._remap_metadata(old_rel, new_rel, keep_source=True)
+        ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
+        self._notify(new_rel)
+        log_history("Item Copied", f"'{old_rel}' -> '{new_rel}' by [{ip_color}]{remote_addr}[/]")
+
     def create_folder(self, subpath, folder_name, remote_addr):
         """Create a new folder inside the given subpath."""
         safe_name = secure_filename(folder_name)
@@ -483,12 +1087,16 @@ class FileManager:
             return False, "Access denied."
         if os.path.exists(new_folder_path):
             return False, f"A folder named '{safe_name}' already exists."
+        display_path = f"{subpath}/{safe_name}" if subpath else safe_name
         try:
-            os.makedirs(new_folder_path)
+            with self._mutating(display_path):
+                os.makedirs(new_folder_path)
             ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
-            display_path = f"{subpath}/{safe_name}" if subpath else safe_name
+            self._notify(display_path)
             log_history("Folder Created", f"'{display_path}' by [{ip_color}]{remote_addr}[/]")
             return True, f"Folder '{safe_name}' created successfully."
+        except FileExistsError:
+            return False, f"A folder named '{safe_name}' already exists."
         except Exception as e:
             logging.error(f"Error creating folder {new_folder_path}: {e}")
             return False, "An unexpected server error occurred."
@@ -505,35 +1113,91 @@ class FileManager:
         folder_path = os.path.join(target_dir, safe_name)
         if not os.path.abspath(folder_path).startswith(os.path.abspath(self.files_folder)):
             return False, "Access denied."
-        if not os.path.isdir(folder_path):
-            return False, "Folder not found."
+        display_path = f"{subpath}/{safe_name}" if subpath else safe_name
         try:
-            shutil.rmtree(folder_path)
+            with self._mutating(display_path):
+                if not os.path.isdir(folder_path):
+                    return False, "Folder not found."
+                # A rename into the trash, however big the tree; locks and favorites inside go with it
+                self._discard(folder_path, display_path, remote_addr)
             ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
-            display_path = f"{subpath}/{safe_name}" if subpath else safe_name
+            self._notify(display_path)
             log_history("Folder Deleted", f"'{display_path}' by [{ip_color}]{remote_addr}[/]")
             return True, f"Folder '{safe_name}' deleted successfully."
         except Exception as e:
             logging.error(f"Error deleting folder {folder_path}: {e}")
             return False, "An unexpected server error occurred."
-        
+
+    # --- Trash ---
+    def restore_from_trash(self, entry_id, remote_addr):
+        """
+        Moves a trashed item back to its original folder (recreated if needed),
+        renamed if the name has been taken since. Returns (success, message, rel_path).
+        """
+        entry = self.trash.get(entry_id) if self.trash else None
+        if not entry: return False, "Item not found in trash.", None
+        parent_rel = entry['path'].rpartition('/')[0]
+        try:
+            parent_dir = self._validate_subpath(parent_rel)
+        except ValueError:
+            return False, "Invalid path.", None
+        try:
+            with self._mutating(parent_rel):
+                os.makedirs(parent_dir, exist_ok=True)
+                dest = self._generate_unique_filename(os.path.join(parent_dir, entry['name']))
+                new_rel = f"{parent_rel}/{os.path.basename(dest)}" if parent_rel else os.path.basename(dest)
+                os.rename(self.trash.item_path(entry), dest)
+                self._put_metadata(entry['metadata'], entry['path'], new_rel)
+            self.trash.forget(entry_id)
+        except FileNotFoundError:
+            return False, "Item not found in trash.", None
+        except Exception as e:
+            logging.error(f"Error restoring {entry['path']} from trash: {e}")
+            return False, "An unexpected server error occurred.", None
+        ip_color = "yellow" if remote_addr != "127.0.0.1" else "cyan"
+        self._notify(new_rel)
+        log_history("Item Restored", f"'{new_rel}' from trash by [{ip_color}]{remote_addr}[/]")
+        return True, f"'{os.path.basename(dest)}' restored.", new_rel
+
     def get_image_preview_b64(self, filepath):
         """filepath is relative to files_folder (e.g. 'subfolder/image.png')."""
         _, extension = os.path.splitext(filepath)
         if extension.lower() not in self.supported_image_extensions: return None
         file_path = os.path.join(self.files_folder, os.path.normpath(filepath))
         if not os.path.abspath(file_path).startswith(os.path.abspath(self.files_folder)): return None
+        if any(part.startswith('.') for part in Path(os.path.normpath(filepath)).parts): return None
         if not os.path.isfile(file_path): return None
         try:
+            st = os.stat(file_path)
+            signature = (st.st_mtime_ns, st.st_size)
+            with self._cache_lock:
+                cached = self._preview_cache.get(filepath)
+                if cached and cached[0] == signature:
+                    self._preview_cache.move_to_end(filepath)
+                    return cached[1]
             with open(file_path, "rb") as image_file:
                 encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
             mime_type = f"image/{extension.lower().lstrip('.').replace('jpg', 'jpeg')}"
             if extension.lower() == '.svg': mime_type = 'image/svg+xml'
-            return f"data:{mime_type};base64,{encoded_string}"
+            data_uri = f"data:{mime_type};base64,{encoded_string}"
+            self._cache_preview(filepath, signature, data_uri)
+            return data_uri
         except Exception as e:
             logging.error(f"Could not read and encode image file for preview '{file_path}': {e}")
             return None
 
+    def _cache_preview(self, filepath, signature, data_uri):
+        if len(data_uri) > PREVIEW_CACHE_MAX_BYTES // 4:
+            return
+        with self._cache_lock:
+            old = self._preview_cache.pop(filepath, None)
+            if old: self._preview_cache_bytes -= len(old[1])
+            self._preview_cache[filepath] = (signature, data_uri)
+            self._preview_cache_bytes += len(data_uri)
+            while self._preview_cache_bytes > PREVIEW_CACHE_MAX_BYTES:
+                _, (_, evicted) = self._preview_cache.popitem(last=False)
+                self._preview_cache_bytes -= len(evicted)
+
     # --- Share Link Methods ---
     def create_share_link(self, filepath, expiry_hours=None):
         """Create a shareable link for a file or folder. Returns (token, error_string or None)."""
@@ -555,8 +1219,8 @@ class FileManager:
         }
         if expiry_hours and expiry_hours > 0:
             link_data['expires'] = time.time() + (expiry_hours * 3600)
-        self.share_links[token] = link_data
-        self._save_share_links()
+        with self._share_links_store.transaction() as share_links:
+            share_links[token] = link_data
         return token, None
 
     def resolve_share_link(self, token):
@@ -574,11 +1238,11 @@ class FileManager:
     def cleanup_expired_links(self):
         """Remove expired share links."""
         now = time.time()
-        expired = [t for t, d in self.share_links.items() if d.get('expires') and d['expires'] < now]
-        if expired:
-            for token in expired:
-                del self.share_links[token]
-            self._save_share_links()
+        if not any(d.get('expires') and d['expires'] < now for d in self.share_links.values()):
+            return
+        with self._share_links_store.transaction() as share_links:
+            for token in [t for t, d in share_links.items() if d.get('expires') and d['expires'] < now]:
+                del share_links[token]
 
     # --- Favorites Methods ---
     def is_favorite(self, filepath):
@@ -590,12 +1254,16 @@ class FileManager:
 
     def toggle_favorite(self, filepath):
         """Toggle the favorite status of a file or folder. Returns new state."""
-        if filepath not in self.metadata:
-            self.metadata[filepath] = {}
-        elif not isinstance(self.metadata[filepath], dict):
-            # Legacy format (was just a lock hash string), wrap it
-            self.metadata[filepath] = {'lock_hash': self.metadata[filepath]}
-        current = self.metadata[filepath].get('favorite', False)
-        self.metadata[filepath]['favorite'] = not current
-        self._save_metadata()
-        return not current
\ No newline at end of file
+        with self._path_locks.hold(filepath):
+            # A path renamed or deleted since the listing was fetched would leave an orphan entry.
+            if not os.path.exists(os.path.join(self.files_folder, os.path.normpath(filepath))):
+                return self.is_favorite(filepath)
+            with self._metadata_transaction() as metadata:
+                if filepath not in metadata:
+                    metadata[filepath] = {}
+                elif not isinstance(metadata[filepath], dict):
+                    # Legacy format (was just a lock hash string), wrap it
+                    metadata[filepath] = {'lock_hash': metadata[filepath]}
+                current = metadata[filepath].get('favorite', False)
+                metadata[filepath]['favorite'] = not current
+        return not current
@@ -0,0 +1,330 @@
+# backbone/fs_watcher.py
+import os
+import time
+import queue
+import errno
+import select
+import struct
+import logging
+import threading
+
+try:
+    import ctypes
+    import ctypes.util
+    _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    INOTIFY_AVAILABLE = hasattr(_libc, 'inotify_init1')
+except (OSError, AttributeError):
+    INOTIFY_AVAILABLE = False
+
+# inotify constants from <sys/inotify.h>
+IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x4, 0x8, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF = 0x100, 0x200, 0x400, 0x800
+IN_Q_OVERFLOW, IN_IGNORED, IN_ONLYDIR, IN_ISDIR = 0x4000, 0x8000, 0x1000000, 0x40000000
+IN_NONBLOCK, IN_CLOEXEC = os.O_NONBLOCK, 0o2000000
+_WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+               | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+CREATED, MODIFIED, DELETED = 'created', 'modified', 'deleted'
+
+
+def _is_hidden(rel_path):
+    # Dotfiles never show up in listings; rsync/browser temp files would only add noise.
+    return any(part.startswith('.') for part in rel_path.split('/'))
+
+
+class ChangeBatch:
+    """
+    One coalesced set of changes. changes maps a path relative to the watched
+    root to CREATED, MODIFIED or DELETED. rescan is set when events were lost
+    (queue overflow, backend switch) and consumers should drop everything.
+    """
+    def __init__(self, changes=None, rescan=False):
+        self.changes = changes or {}
+        self.rescan = rescan
+
+    def __bool__(self):
+        return bool(self.changes) or self.rescan
+
+    def __repr__(self):
+        return f"ChangeBatch({len(self.changes)} changes, rescan={self.rescan})"
+
+
+class _Coalescer:
+    """Merges raw events per path so a bulk copy or a create-then-delete turns into one entry or none."""
+    def __init__(self):
+        self.changes = {}
+        self.rescan = False
+        self.first_at = self.last_at = None
+
+    def add(self, rel_path, kind):
+        if _is_hidden(rel_path): return
+        previous = self.changes.get(rel_path)
+        if previous == CREATED and kind == DELETED:
+            del self.changes[rel_path]
+        elif previous == CREATED and kind == MODIFIED:
+            pass
+        elif previous == DELETED and kind == CREATED:
+            self.changes[rel_path] = MODIFIED
+        else:
+            self.changes[rel_path] = kind
+        self._touch()
+
+    def request_rescan(self):
+        self.rescan = True
+        self._touch()
+
+    def _touch(self):
+        now = time.monotonic()
+        self.last_at = now
+        if self.first_at is None: self.first_at = now
+
+    def ready(self, settle, max_delay):
+        if self.first_at is None: return False
+        now = time.monotonic()
+        return now - self.last_at >= settle or now - self.first_at >= max_delay
+
+    def take(self):
+        batch = ChangeBatch(self.changes, self.rescan)
+        self.__init__()
+        return batch
+
+
+class _InotifyBackend:
+    """Recursive inotify watches on a directory tree, read through a non-blocking fd."""
+    def __init__(self, root):
+        self.root = root
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = {}      # wd -> relative dir path ('' is the root)
+        self._detached = {}   # wd -> old path, for directories moved away in this batch
+        try:
+            self._add_tree('')
+        except Exception:
+            # Closing the fd drops the watches already added, so a fallback to polling doesn't keep them.
+            os.close(self.fd)
+            raise
+
+    def close(self):
+        os.close(self.fd)
+
+    def _add_watch(self, rel_path):
+        full = os.path.join(self.root, rel_path) if rel_path else self.root
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(full), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            return  # vanished or unreadable directory
+        self._paths[wd] = rel_path
+        self._detached.pop(wd, None)
+
+    def _add_tree(self, rel_path, coalescer=None):
+        self._add_watch(rel_path)
+        full = os.path.join(self.root, rel_path) if rel_path else self.root
+        for dirpath, dirnames, filenames in os.walk(full):
+            rel_dir = os.path.relpath(dirpath, self.root).replace(os.sep, '/')
+            for name in dirnames:
+                self._add_watch(f"{rel_dir}/{name}" if rel_dir != '.' else name)
+            if coalescer is not None:
+                # Files copied into a new directory before its watch existed produce no events.
+                for name in dirnames + filenames:
+                    coalescer.add(f"{rel_dir}/{name}" if rel_dir != '.' else name, CREATED)
+
+    def _detach_tree(self, rel_path):
+        for wd, path in list(self._paths.items()):
+            if path == rel_path or path.startswith(rel_path + '/'):
+                self._detached[wd] = self._paths.pop(wd)
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(ready)
+
+    def read(self, coalescer):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                coalescer.request_rescan()
+                continue
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                self._detached.pop(wd, None)
+                continue
+            parent = self._paths.get(wd)
+            if parent is None or not name:
+                continue  # self-events; the parent directory reports the same change
+            rel_path = f"{parent}/{name}" if parent else name
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if is_dir: self._add_tree(rel_path, coalescer)
+                coalescer.add(rel_path, CREATED)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                if is_dir: self._detach_tree(rel_path)
+                coalescer.add(rel_path, DELETED)
+            else:
+                coalescer.add(rel_path, MODIFIED)
+
+    def flush(self):
+        # Directories moved out of the tree keep their watches until removed explicitly.
+        for wd in self._detached:
+            _libc.inotify_rm_watch(self.fd, wd)
+        self._detached.clear()
+
+
+class _PollingBackend:
+    """Periodic stat() scan of the tree, diffed against the previous scan."""
+    def __init__(self, root, interval):
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def close(self):
+        pass
+
+    def _scan(self):
+        snapshot, stack = {}, ['']
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                with os.scandir(os.path.join(self.root, rel_dir) if rel_dir else self.root) as it:
+                    for entry in it:
+                        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        snapshot[rel_path] = (is_dir, st.st_mtime_ns, 0 if is_dir else st.st_size)
+                        if is_dir: stack.append(rel_path)
+            except OSError:
+                continue
+        return snapshot
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        return True
+
+    def read(self, coalescer):
+        current = self._scan()
+        previous, self._snapshot = self._snapshot, current
+        for rel_path, signature in current.items():
+            old = previous.get(rel_path)
+            if old is None:
+                coalescer.add(rel_path, CREATED)
+            elif old != signature and not signature[0]:
+                coalescer.add(rel_path, MODIFIED)
+        for rel_path in previous.keys() - current.keys():
+            coalescer.add(rel_path, DELETED)
+
+    def flush(self):
+        pass
+
+
+class FileSystemWatcher:
+    """
+    Watches a directory tree and publishes one coalesced stream of ChangeBatch
+    objects to subscribers. Uses inotify on Linux and falls back to polling
+    elsewhere (or if inotify can't be set up, e.g. the watch limit is hit).
+
+    Detection runs on a background thread. Subscribers are called from a
+    separate dispatch loop, started with the given spawn/sleep functions, so
+    under gevent they run as a greenlet and may emit Socket.IO events safely.
+
+    Events are held until the tree has been quiet for `settle` seconds, or at
+    most `max_delay` seconds, so a bulk copy becomes a few batches rather than
+    thousands of broadcasts.
+    """
+    def __init__(self, root, settle=0.5, max_delay=3.0, poll_interval=2.0, use_inotify=True):
+        self.root = root
+        self.settle = settle
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and INOTIFY_AVAILABLE
+        self.backend_name = None
+        self._subscribers = []
+        self._batches = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Registers callback(batch). Callbacks run in subscription order; exceptions are logged."""
+        self._subscribers.append(callback)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, spawn=None, sleep=None):
+        """Starts detection and dispatch. Safe to call more than once, including after a fork."""
+        if self.running: return
+        self._stop_event.clear()
+        self._batches = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='fs-watcher', daemon=True)
+        self._thread.start()
+        spawn = spawn or (lambda target: threading.Thread(target=target, name='fs-dispatch', daemon=True).start())
+        spawn(lambda: self._dispatch_loop(sleep or time.sleep))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _open_backend(self):
+        if self.use_inotify:
+            try:
+                backend = _InotifyBackend(self.root)
+                self.backend_name = 'inotify'
+                return backend
+            except OSError as e:
+                logging.warning(f"inotify unavailable, polling {self.root} instead: {e}")
+        self.backend_name = 'polling'
+        return _PollingBackend(self.root, self.poll_interval)
+
+    def _run(self):
+        coalescer = _Coalescer()
+        try:
+            backend = self._open_backend()
+        except Exception as e:
+            logging.error(f"File watcher could not start: {e}")
+            return
+        try:
+            while not self._stop_event.is_set():
+                timeout = self.settle if coalescer.first_at is not None else 1.0
+                try:
+                    if backend.wait(timeout):
+                        backend.read(coalescer)
+                except OSError as e:
+                    # Typically the watch limit while adding a new subtree: switch to polling.
+                    logging.warning(f"File watcher backend failed, falling back to polling: {e}")
+                    backend.close()
+                    self.use_inotify = False
+                    backend = self._open_backend()
+                    coalescer.request_rescan()
+                if coalescer.ready(self.settle, self.max_delay):
+                    backend.flush()
+                    batch = coalescer.take()
+                    if batch: self._batches.put(batch)
+        except Exception as e:
+            logging.error(f"File watcher stopped: {e}")
+        finally:
+            backend.close()
+
+    def _dispatch_loop(self, sleep):
+        while not self._stop_event.is_set():
+            try:
+                batch = self._batches.get_nowait()
+            except queue.Empty:
+                sleep(0.2)
+                continue
+            for callback in self._subscribers:
+                try:
+                    callback(batch)
+                except Exception as e:
+                    logging.error(f"File change subscriber {getattr(callback, '__name__', callback)} failed: {e}")
@@ -0,0 +1,127 @@
+# backbone/hash_pool.py
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher
+from .metrics import REGISTRY
+
+try:
+    from gevent.threadpool import ThreadPool as GeventThreadPool
+    GEVENT_AVAILABLE = True
+except ImportError:
+    GEVENT_AVAILABLE = False
+
+WAIT_SECONDS = REGISTRY.histogram('snailsynk_hashing_wait_seconds', 'Time a hashing job queued before a worker took it.', ('op',))
+RUN_SECONDS = REGISTRY.histogram('snailsynk_hashing_run_seconds', 'Time a worker spent on one hashing job.', ('op',))
+REJECTED = REGISTRY.counter('snailsynk_hashing_rejected_total', 'Hashing jobs refused because the queue was full.')
+
+class HashingBusyError(RuntimeError):
+    """Raised when the hashing queue is full and a new job is refused."""
+
+class HashingPool:
+    """
+    Runs Argon2 hash/verify calls on a small dedicated thread pool.
+
+    argon2-cffi releases the GIL while hashing, so worker threads hash in
+    parallel with request handling. Under gevent the caller's greenlet yields
+    while it waits instead of stalling the event loop. max_workers caps how
+    many cores hashing may occupy, and max_pending bounds the queue so a
+    burst of password attempts is refused instead of piling up.
+
+    Exposes the same hash()/verify() interface as argon2.PasswordHasher, so
+    managers can use it in place of one.
+    """
+    def __init__(self, max_workers=None, max_pending=32, use_gevent=False, hasher=None):
+        self.hasher = hasher or PasswordHasher()
+        self.max_workers = max_workers or max(1, min(2, (os.cpu_count() or 1) - 1))
+        self.max_pending = max_pending
+        self.use_gevent = use_gevent and GEVENT_AVAILABLE
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._waits = deque(maxlen=500)  # seconds between submit and a worker picking the job up
+        self._runs = deque(maxlen=500)   # seconds spent hashing
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # Worker threads don't survive a fork; the child builds its own pool on first use.
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _get_pool(self):
+        # Created lazily: a gevent pool must be built from the hub's own thread.
+        if self._pool is None:
+            if self.use_gevent:
+                self._pool = GeventThreadPool(self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='argon2')
+        return self._pool
+
+    def _run(self, fn, *args, op):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                REJECTED.inc()
+                raise HashingBusyError("Too many password operations in progress.")
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def job():
+            # Exceptions are handed back as values: gevent's pool would otherwise print a
+            # traceback for every expected VerifyMismatchError.
+            started = time.perf_counter()
+            try:
+                return fn(*args), None
+            except Exception as e:
+                return None, e
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._waits.append(started - submitted)
+                    self._runs.append(finished - started)
+                WAIT_SECONDS.labels(op).observe(started - submitted)
+                RUN_SECONDS.labels(op).observe(finished - started)
+
+        try:
+            if self.use_gevent:
+                result, error = self._get_pool().spawn(job).get()
+            else:
+                result, error = self._get_pool().submit(job).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+        if error is not None:
+            raise error
+        return result
+
+    def hash(self, password):
+        return self._run(self.hasher.hash, password, op='hash')
+
+    def verify(self, password_hash, password):
+        """Returns True or raises VerifyMismatchError, exactly like PasswordHasher.verify."""
+        return self._run(self.hasher.verify, password_hash, password, op='verify')
+
+    def get_stats(self):
+        with self._lock:
+            waits, runs = sorted(self._waits), list(self._runs)
+            stats = {
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+        stats['queue_wait_ms'] = {
+            'avg': round(sum(waits) / len(waits) * 1000, 2) if waits else 0,
+            'p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2) if waits else 0,
+            'max': round(waits[-1] * 1000, 2) if waits else 0,
+        }
+        stats['hash_ms_avg'] = round(sum(runs) / len(runs) * 1000, 2) if runs else 0
+        return stats
@@ -0,0 +1,205 @@
+# backbone/integrity.py
+import os
+import time
+import base64
+import hashlib
+import logging
+import platform
+import threading
+
+from .shared_state import SharedJSONStore
+from .utils import log_history
+
+try:
+    import ctypes
+    import ctypes.util
+    _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    # ioprio_set has no libc wrapper; syscall numbers from the kernel's unistd tables.
+    _SYS_IOPRIO_SET = {'x86_64': 251, 'aarch64': 30, 'armv7l': 314, 'i686': 289}.get(platform.machine())
+    IOPRIO_AVAILABLE = _SYS_IOPRIO_SET is not None and hasattr(_libc, 'syscall')
+except (OSError, AttributeError):
+    IOPRIO_AVAILABLE = False
+
+IOPRIO_WHO_PROCESS, IOPRIO_CLASS_IDLE, IOPRIO_CLASS_SHIFT = 1, 3, 13
+CHUNK_SIZE = 1024 * 1024
+
+
+class HashingReader:
+    """Wraps an upload stream and hashes it as it is read, so saving and checksumming share one pass."""
+    def __init__(self, stream):
+        self.stream = stream
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        if chunk:
+            self.hasher.update(chunk)
+            self.size += len(chunk)
+        return chunk
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+def checksum_record(sha256, st):
+    """A file's checksum record (see ChecksumStore). size and mtime_ns tell a legitimate edit apart from bit rot."""
+    return {'sha256': sha256, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'verified_at': time.time()}
+
+
+def parse_sha256(value):
+    """Accepts a hex digest or an RFC 9530 style 'sha-256=:<base64>:' value. Returns hex, or None if malformed."""
+    value = (value or '').strip()
+    if value.lower().startswith('sha-256='):
+        try:
+            raw = base64.b64decode(value[len('sha-256='):].strip(':'), validate=True)
+        except ValueError:
+            return None
+        return raw.hex() if len(raw) == 32 else None
+    value = value.lower()
+    if len(value) == 64 and all(c in '0123456789abcdef' for c in value):
+        return value
+    return None
+
+
+def lower_thread_priority():
+    """Puts the calling thread at idle I/O priority (Linux) and nice 19, for background maintenance work."""
+    # Both calls take a thread id on Linux, so only this thread is affected.
+    tid = threading.get_native_id()
+    if IOPRIO_AVAILABLE:
+        _libc.syscall(_SYS_IOPRIO_SET, IOPRIO_WHO_PROCESS, tid, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, 19)
+    except (AttributeError, OSError):
+        pass
+
+
+class IntegrityVerifier:
+    """
+    Periodically re-hashes every file that has a stored checksum and compares
+    it with the digest recorded at upload. A file whose size and mtime are
+    unchanged but whose content differs is reported as corrupted; a file that
+    was edited (new mtime or size) just gets a fresh baseline.
+
+    Runs on its own thread at idle I/O priority (Linux) and reads at most
+    rate_mb MB/s, so a verification pass never competes with transfers.
+    Results are kept in a shared JSON report for the admin dashboard.
+    """
+    def __init__(self, file_manager, report_path, rate_mb=20.0, interval=86400):
+        self.file_manager = file_manager
+        self.rate = max(0.1, float(rate_mb)) * 1024 * 1024
+        self.interval = interval
+        self._report = SharedJSONStore(report_path)
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def report(self):
+        data = self._report.data
+        return {
+            'running': data.get('running', False),
+            'last_started': data.get('last_started'),
+            'last_finished': data.get('last_finished'),
+            'files_checked': data.get('files_checked', 0),
+            'bytes_checked': data.get('bytes_checked', 0),
+            'corrupted': data.get('corrupted', {}),
+        }
+
+    def summary(self):
+        report = self.report
+        return {'corrupted': len(report['corrupted']), 'last_finished': report['last_finished'],
+                'files_checked': report['files_checked'], 'running': report['running']}
+
+    def start(self):
+        """Starts the background thread; the first pass runs after one interval."""
+        if self._thread and self._thread.is_alive(): return
+        # A pass (or request) recorded by a process that has since died would otherwise
+        # show as running forever and make request_run refuse every new pass.
+        with self._report.transaction() as report:
+            report.update(running=False, requested=False)
+        self._thread = threading.Thread(target=self._run, name='integrity-verifier', daemon=True)
+        self._thread.start()
+
+    def request_run(self):
+        """
+        Asks for a pass now. The request goes through the shared report, so it
+        reaches the verifier thread even if it runs in another worker process.
+        False if a pass is already running.
+        """
+        with self._report.transaction() as report:
+            if report.get('running'): return False
+            report['requested'] = True
+        self._wake.set()
+        return True
+
+    def _run(self):
+        lower_thread_priority()
+        next_run = time.monotonic() + self.interval
+        while True:
+            self._wake.wait(5)
+            self._wake.clear()
+            if not self._report.data.get('requested') and time.monotonic() < next_run: continue
+            next_run = time.monotonic() + self.interval
+            try:
+                self.verify_all()
+            except Exception as e:
+                logging.error(f"Integrity verification failed: {e}")
+                with self._report.transaction() as report:
+                    report['running'] = False
+
+    def _hash_file(self, path):
+        """SHA-256 of a file, read at no more than self.rate bytes per second."""
+        hasher = hashlib.sha256()
+        started = time.monotonic()
+        read = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk: break
+                hasher.update(chunk)
+                read += len(chunk)
+                ahead = read / self.rate - (time.monotonic() - started)
+                if ahead > 0: time.sleep(ahead)
+        return hasher.hexdigest(), read
+
+    def verify_all(self):
+        """One full pass. Returns the number of corrupted files found."""
+        with self._report.transaction() as report:
+            report.update(running=True, requested=False, last_started=time.time())
+        checked = bytes_checked = 0
+        entries = self.file_manager.checksums()
+        # Reports for files deleted or renamed since the last pass are dropped.
+        tracked = {key for key, _ in entries}
+        corrupted = {k: v for k, v in self._report.data.get('corrupted', {}).items() if k in tracked}
+        for rel_path, record in entries:
+            full_path = os.path.join(self.file_manager.files_folder, rel_path)
+            try:
+                st = os.stat(full_path)
+                if st.st_size != record.get('size') or st.st_mtime_ns != record.get('mtime_ns'):
+                    # Edited since the checksum was taken: take a new baseline instead of crying wolf.
+                    digest, size = self._hash_file(full_path)
+                    after = os.stat(full_path)
+                    if (after.st_size, after.st_mtime_ns) == (st.st_size, st.st_mtime_ns):  # not mid-write
+                        self.file_manager.update_checksum(rel_path, record, digest, after)
+                    corrupted.pop(rel_path, None)
+                else:
+                    digest, size = self._hash_file(full_path)
+                    if digest == record['sha256']:
+                        corrupted.pop(rel_path, None)
+                    elif rel_path not in corrupted:
+                        corrupted[rel_path] = {'expected': record['sha256'], 'actual': digest, 'detected_at': time.time()}
+                        logging.error(f"Integrity check failed for '{rel_path}': expected {record['sha256']}, got {digest}")
+                        log_history("Integrity Error", f"'{rel_path}' no longer matches its upload checksum")
+            except FileNotFoundError:
+                self.file_manager.update_checksum(rel_path, record, None, None)
+                corrupted.pop(rel_path, None)
+                continue
+            except OSError as e:
+                logging.error(f"Could not verify '{rel_path}': {e}")
+                continue
+            checked += 1
+            bytes_checked += size
+        with self._report.transaction() as report:
+            report.update(running=False, last_finished=time.time(), files_checked=checked,
+                          bytes_checked=bytes_checked, corrupted=corrupted)
+        return len(corrupted)
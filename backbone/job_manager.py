@@ -0,0 +1,469 @@
+# backbone/job_manager.py
+import os
+import time
+import uuid
+import queue
+import errno
+import shutil
+import logging
+import zipfile
+import threading
+
+from .shared_state import SharedJSONStore
+from .utils import log_history
+from .file_manager import ZIP_SECONDS, ZIP_BYTES
+
+JOB_TYPES = ('move', 'copy', 'delete', 'zip')
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = 'queued', 'running', 'completed', 'failed', 'cancelled'
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+# Progress is written to the shared store (and pushed to clients) at most this often per job.
+PROGRESS_INTERVAL = 0.5
+# Finished jobs, and their zip outputs, are forgotten after this long.
+FINISHED_JOB_TTL = 24 * 3600
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+PART_SUFFIX = '.snailsynk-part'
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested."""
+
+
+def _part_path(dest):
+    directory, name = os.path.split(dest)
+    return os.path.join(directory, f".{name}{PART_SUFFIX}")
+
+
+def _tree_files(root):
+    """(path, size) for root itself if it is a file, else for every file below it, in a stable order."""
+    if not os.path.isdir(root) or os.path.islink(root):
+        yield root, os.lstat(root).st_size
+        return
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                yield path, os.lstat(path).st_size
+            except OSError:
+                continue
+
+
+class _Run:
+    """Progress and cancellation bookkeeping for the job a runner thread is executing."""
+    def __init__(self, manager, job):
+        self.manager = manager
+        self.job_id = job['id']
+        self.progress = dict(job.get('progress') or {})
+        self._last_flush = 0.0
+
+    def set_total(self, items, total_bytes):
+        self.progress.update(items_total=items, bytes_total=total_bytes, items_done=0, bytes_done=0)
+        self.flush(force=True)
+
+    def advance(self, nbytes=0, items=0, current=None):
+        self.progress['bytes_done'] = self.progress.get('bytes_done', 0) + nbytes
+        self.progress['items_done'] = self.progress.get('items_done', 0) + items
+        if current is not None: self.progress['current'] = current
+        self.flush()
+
+    def flush(self, force=False):
+        """Publishes progress if PROGRESS_INTERVAL has passed, and raises JobCancelled if asked to stop."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < PROGRESS_INTERVAL: return
+        self._last_flush = now
+        job = self.manager._update(self.job_id, progress=dict(self.progress))
+        if job and job.get('cancel_requested'):
+            raise JobCancelled()
+
+
+class JobManager:
+    """
+    Background queue for long file operations (move, copy, delete, zip).
+
+    Jobs live in a shared JSON store, so any worker can submit, list and
+    cancel them, and they survive a restart: a job that was running when the
+    server stopped is queued again and picks up where it left off. Copies
+    skip files already present with the same size and mtime, and continue a
+    half-written file from its '.<name>.snailsynk-part' temp file. Zip jobs
+    start over.
+
+    Jobs run on runner threads in the process that calls start(run_jobs=True);
+    only the cluster leader should. Job updates are handed to subscribers from
+    a dispatch loop started with the given spawn/sleep functions, so under
+    gevent they may emit Socket.IO events safely.
+    """
+    def __init__(self, file_manager, state_path, output_dir, max_workers=1):
+        self.file_manager = file_manager
+        self.output_dir = output_dir
+        self.max_workers = max(1, max_workers)
+        os.makedirs(output_dir, exist_ok=True)
+        self._store = SharedJSONStore(state_path)
+        self._updates = queue.Queue()
+        self._subscribers = []
+        self._wake = threading.Event()
+        self._threads = []
+
+    # --- Public API ---
+    def subscribe(self, callback):
+        """Registers callback(job), called from the dispatch loop whenever a job changes."""
+        self._subscribers.append(callback)
+
+    def submit(self, job_type, params, remote_addr):
+        """Validates and queues a job. Returns (True, job) or (False, error message)."""
+        if job_type not in JOB_TYPES:
+            return False, f"Unknown job type '{job_type}'."
+        items = params.get('items')
+        if not isinstance(items, list) or not items or not all(isinstance(i, str) and i for i in items):
+            return False, "No items given."
+        if any('/' in i or '\\' in i or i in ('.', '..') for i in items):
+            return False, "Items must be names inside the source folder."
+        source = (params.get('source_path') or '').strip('/')
+        dest = (params.get('dest_path') or '').strip('/')
+        try:
+            source_dir = self.file_manager._validate_subpath(source)
+            dest_dir = self.file_manager._validate_subpath(dest) if job_type in ('move', 'copy') else None
+        except ValueError:
+            return False, "Invalid path."
+        if not os.path.isdir(source_dir):
+            return False, "Source folder does not exist."
+        if dest_dir is not None:
+            if not os.path.isdir(dest_dir):
+                return False, "Destination folder does not exist."
+            for name in items:
+                item_rel = f"{source}/{name}" if source else name
+                if dest == item_rel or dest.startswith(item_rel + '/'):
+                    return False, f"Cannot {job_type} '{name}' into itself."
+        job = {
+            'id': uuid.uuid4().hex[:12], 'type': job_type, 'status': QUEUED,
+            'params': {'items': items, 'source_path': source, 'dest_path': dest},
+            'progress': {'items_total': len(items), 'items_done': 0, 'bytes_total': 0, 'bytes_done': 0},
+            'result': {'done': [], 'failed': []}, 'plan': None, 'error': None, 'cancel_requested': False,
+            'created_by': remote_addr, 'created_at': time.time(), 'started_at': None, 'finished_at': None,
+            'attempts': 0,
+        }
+        with self._store.transaction() as jobs:
+            jobs[job['id']] = job
+        self._wake.set()
+        self._publish(job)
+        return True, self._public(job)
+
+    def get(self, job_id):
+        job = self._store.data.get(job_id)
+        return self._public(job) if job else None
+
+    def list_jobs(self, status=None, limit=50):
+        jobs = [j for j in self._store.data.values() if status is None or j['status'] == status]
+        jobs.sort(key=lambda j: j['created_at'], reverse=True)
+        return [self._public(j) for j in jobs[:limit]]
+
+    def cancel(self, job_id):
+        """Cancels a queued job immediately, or asks a running one to stop. Returns (success, message)."""
+        with self._store.transaction() as jobs:
+            job = jobs.get(job_id)
+            if not job: return False, "Job not found."
+            if job['status'] in FINISHED: return False, f"Job already {job['status']}."
+            if job['status'] == QUEUED:
+                job.update(status=CANCELLED, finished_at=time.time())
+            else:
+                job['cancel_requested'] = True
+            snapshot = dict(job)
+        self._publish(snapshot)
+        return True, "Job cancelled." if snapshot['status'] == CANCELLED else "Cancelling job..."
+
+    def output_path(self, job_id):
+        """Path of a completed zip job's archive, or None."""
+        job = self._store.data.get(job_id)
+        if not job or job['type'] != 'zip' or job['status'] != COMPLETED: return None
+        path = os.path.join(self.output_dir, f"{job_id}.zip")
+        return path if os.path.isfile(path) else None
+
+    def start(self, spawn=None, sleep=None, run_jobs=True):
+        """Starts the dispatch loop and, with run_jobs, the runner threads. Call once per process."""
+        if run_jobs and not self._threads:
+            self._recover()
+            for i in range(self.max_workers):
+                thread = threading.Thread(target=self._runner, name=f'job-runner-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        spawn = spawn or (lambda target: threading.Thread(target=target, name='job-dispatch', daemon=True).start())
+        spawn(lambda: self._dispatch_loop(sleep or time.sleep))
+
+    # --- Internals ---
+    @staticmethod
+    def _public(job):
+        return {k: v for k, v in job.items() if k != 'plan'}
+
+    def _publish(self, job):
+        self._updates.put(self._public(job))
+
+    def _dispatch_loop(self, sleep):
+        while True:
+            try:
+                job = self._updates.get_nowait()
+            except queue.Empty:
+                sleep(0.2)
+                continue
+            for callback in self._subscribers:
+                try:
+                    callback(job)
+                except Exception as e:
+                    logging.error(f"Job subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+
+    def _update(self, job_id, **fields):
+        with self._store.transaction() as jobs:
+            job = jobs.get(job_id)
+            if not job: return None
+            job.update(fields)
+            snapshot = dict(job)
+        self._publish(snapshot)
+        return snapshot
+
+    def _recover(self):
+        """Requeues jobs left running by a previous process."""
+        with self._store.transaction() as jobs:
+            for job_id, job in jobs.items():
+                if job['status'] == RUNNING:
+                    job['status'] = QUEUED
+                    logging.info(f"Resuming interrupted {job['type']} job {job_id}")
+        self._prune_finished()
+
+    def _prune_finished(self):
+        """Forgets finished jobs older than FINISHED_JOB_TTL and deletes zip outputs nobody can fetch any more."""
+        cutoff = time.time() - FINISHED_JOB_TTL
+        with self._store.transaction() as jobs:
+            for job_id in [j for j, job in jobs.items() if job['status'] in FINISHED and (job.get('finished_at') or 0) < cutoff]:
+                del jobs[job_id]
+        live = self._store.data
+        for name in os.listdir(self.output_dir):
+            if name.split('.')[0] not in live:
+                try: os.remove(os.path.join(self.output_dir, name))
+                except OSError: pass
+
+    def _claim(self):
+        """Atomically moves the oldest queued job to running."""
+        with self._store.transaction() as jobs:
+            queued = sorted((j for j in jobs.values() if j['status'] == QUEUED), key=lambda j: j['created_at'])
+            if not queued: return None
+            job = queued[0]
+            job.update(status=RUNNING, started_at=job['started_at'] or time.time(), attempts=job['attempts'] + 1)
+            return dict(job)
+
+    def _runner(self):
+        last_prune = time.monotonic()
+        while True:
+            try:
+                job = self._claim()
+                if job is None:
+                    self._wake.wait(1.0)
+                    self._wake.clear()
+                    if time.monotonic() - last_prune > 600:
+                        self._prune_finished()
+                        last_prune = time.monotonic()
+                    continue
+                self._publish(job)
+                self._execute(job)
+            except Exception as e:
+                # e.g. the job state could not be saved; keep the runner alive and retry later.
+                logging.error(f"Job runner error: {e}")
+                self._wake.wait(5.0)
+
+    def _execute(self, job):
+        run = _Run(self, job)
+        handler = getattr(self, f"_run_{job['type']}")
+        try:
+            handler(job, run)
+            status, error = COMPLETED, None
+        except JobCancelled:
+            status, error = CANCELLED, None
+        except Exception as e:
+            logging.error(f"{job['type'].capitalize()} job {job['id']} failed: {e}")
+            status, error = FAILED, str(e)
+        finished = self._update(job['id'], status=status, error=error, finished_at=time.time(),
+                                progress=dict(run.progress, current=None))
+        if finished:
+            result = finished['result']
+            log_history(f"Job {status.capitalize()}", f"{job['type']} of {len(job['params']['items'])} item(s), "
+                        f"{len(result['done'])} done, {len(result['failed'])} failed")
+
+    def _record(self, job, run, name, reason=None):
+        """Marks one item as done or failed, keeping the result in the store for resume."""
+        job['result']['failed' if reason else 'done'].append({'item': name, 'reason': reason} if reason else name)
+        self._update(job['id'], result=job['result'])
+        run.advance(items=1)
+
+    @staticmethod
+    def _finished_items(job):
+        return set(job['result']['done']) | {f['item'] for f in job['result']['failed']}
+
+    def _plan_destinations(self, job):
+        """Fixes each item's destination name once, so a resumed job writes to the same place."""
+        if job.get('plan'): return job['plan']
+        params = job['params']
+        source_dir = self.file_manager._validate_subpath(params['source_path'])
+        dest_dir = self.file_manager._validate_subpath(params['dest_path'])
+        plan, taken = {}, set()
+        for name in params['items']:
+            if not os.path.lexists(os.path.join(source_dir, name)): continue
+            candidate = os.path.join(dest_dir, name)
+            base, ext = os.path.splitext(name)
+            counter = 1
+            while os.path.lexists(candidate) or candidate in taken:
+                candidate = os.path.join(dest_dir, f"{base} ({counter}){ext}")
+                counter += 1
+            taken.add(candidate)
+            plan[name] = os.path.basename(candidate)
+        self._update(job['id'], plan=plan)
+        job['plan'] = plan
+        return plan
+
+    def _copy_file(self, src, dest, run):
+        """Copies one file through a resumable .part file, preserving mtime. Skips an identical existing copy."""
+        st = os.stat(src)
+        try:
+            existing = os.stat(dest)
+            if existing.st_size == st.st_size and existing.st_mtime_ns == st.st_mtime_ns:
+                run.advance(st.st_size)
+                return
+        except FileNotFoundError:
+            pass
+        part = _part_path(dest)
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset > st.st_size: offset = 0
+        run.advance(offset)
+        with open(src, 'rb') as fsrc, open(part, 'r+b' if offset else 'wb') as fdst:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            fdst.truncate()
+            while True:
+                chunk = fsrc.read(COPY_CHUNK_SIZE)
+                if not chunk: break
+                fdst.write(chunk)
+                run.advance(len(chunk))
+        shutil.copystat(src, part)
+        os.replace(part, dest)
+
+    def _copy_tree(self, src, dest, run):
+        if not os.path.isdir(src) or os.path.islink(src):
+            self._copy_file(src, dest, run)
+            return
+        for dirpath, dirnames, filenames in os.walk(src):
+            dirnames.sort()
+            target = os.path.join(dest, os.path.relpath(dirpath, src))
+            os.makedirs(target, exist_ok=True)
+            for name in sorted(filenames):
+                self._copy_file(os.path.join(dirpath, name), os.path.join(target, name), run)
+        for dirpath, _, _ in os.walk(src):
+            shutil.copystat(dirpath, os.path.join(dest, os.path.relpath(dirpath, src)))
+
+    @staticmethod
+    def _remove(path):
+        if os.path.isdir(path) and not os.path.islink(path): shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path): os.remove(path)
+
+    def _transfer(self, job, run, keep_source):
+        """Shared body of move and copy jobs."""
+        params = job['params']
+        source, dest = params['source_path'], params['dest_path']
+        source_dir = self.file_manager._validate_subpath(source)
+        dest_dir = self.file_manager._validate_subpath(dest)
+        plan = self._plan_destinations(job)
+        pending = [name for name in params['items'] if name not in self._finished_items(job)]
+        sizes = {name: sum(size for _, size in _tree_files(os.path.join(source_dir, name)))
+                 for name in pending if name in plan and os.path.lexists(os.path.join(source_dir, name))}
+        run.set_total(len(params['items']), sum(sizes.values()))
+        run.progress['items_done'] = len(params['items']) - len(pending)
+        for name in pending:
+            if name not in plan:
+                self._record(job, run, name, "Not found in source.")
+                continue
+            src = os.path.join(source_dir, name)
+            old_rel = f"{source}/{name}" if source else name
+            new_rel = f"{dest}/{plan[name]}" if dest else plan[name]
+            run.advance(current=old_rel)
+            if not os.path.lexists(src):
+                self._record(job, run, name, "Not found in source.")
+                continue
+            if not keep_source:
+                try:
+                    self.file_manager.move_path(old_rel, new_rel, job['created_by'])
+                    run.advance(sizes.get(name, 0))
+                    self._record(job, run, name)
+                    continue
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        # On resume the destination may hold our own partial copy; anything else is a real error.
+                        if not (isinstance(e, FileExistsError) and job['attempts'] > 1):
+                            self._record(job, run, name, str(e))
+                            continue
+            dest_path = os.path.join(dest_dir, plan[name])
+            try:
+                self._copy_tree(src, dest_path, run)
+            except JobCancelled:
+                self._remove(dest_path)  # the source is intact; don't leave half an item behind
+                self._remove(_part_path(dest_path))
+                raise
+            if keep_source:
+                self.file_manager.finish_copy(old_rel, new_rel, job['created_by'])
+            else:
+                self.file_manager.finish_copied_move(old_rel, new_rel, job['created_by'])
+            self._record(job, run, name)
+
+    def _run_move(self, job, run):
+        self._transfer(job, run, keep_source=False)
+
+    def _run_copy(self, job, run):
+        self._transfer(job, run, keep_source=True)
+
+    def _run_delete(self, job, run):
+        params = job['params']
+        source = params['source_path']
+        source_dir = self.file_manager._validate_subpath(source)
+        pending = [name for name in params['items'] if name not in self._finished_items(job)]
+        run.progress['items_done'] = len(params['items']) - len(pending)
+        for name in pending:
+            rel = f"{source}/{name}" if source else name
+            run.advance(current=rel)
+            if os.path.isdir(os.path.join(source_dir, name)):
+                success, message = self.file_manager.delete_folder(source, name, job['created_by'])
+            else:
+                success, message = self.file_manager.delete_file(rel, job['created_by'])
+            self._record(job, run, name, None if success else message)
+
+    def _run_zip(self, job, run):
+        params = job['params']
+        source_dir = self.file_manager._validate_subpath(params['source_path'])
+        entries = []
+        for name in params['items']:
+            path = os.path.join(source_dir, name)
+            if not os.path.lexists(path):
+                job['result']['failed'].append({'item': name, 'reason': 'Not found.'})
+                continue
+            entries.extend((name, file_path, size) for file_path, size in _tree_files(path))
+        run.set_total(len(params['items']), sum(size for _, _, size in entries))
+        output = os.path.join(self.output_dir, f"{job['id']}.zip")
+        part = output + PART_SUFFIX
+        # zip archives can't be resumed mid-stream; an interrupted zip job starts over.
+        started = time.perf_counter()
+        try:
+            with zipfile.ZipFile(part, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
+                for name, file_path, size in entries:
+                    arcname = os.path.relpath(file_path, source_dir)
+                    run.advance(current=arcname)
+                    info = zipfile.ZipInfo.from_file(file_path, arcname)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with open(file_path, 'rb') as src, zipf.open(info, 'w', force_zip64=size > 2 ** 31) as dst:
+                        for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+                            dst.write(chunk)
+                            run.advance(len(chunk))
+            os.replace(part, output)
+            ZIP_SECONDS.labels('job').observe(time.perf_counter() - started)
+            ZIP_BYTES.labels('job').inc(os.path.getsize(output))
+        except BaseException:
+            try: os.remove(part)
+            except OSError: pass
+            raise
+        for name in params['items']:
+            if name not in self._finished_items(job): job['result']['done'].append(name)
+        single = params['items'][0] if len(params['items']) == 1 else None
+        self._update(job['id'], result=job['result'],
+                     download_name=f"{single}.zip" if single else 'SnailSynk_Selected_Files.zip')
@@ -0,0 +1,58 @@
+# backbone/lean_websocket.py
+#
+# Keeps idle WebSockets small under gevent. By default wsproto holds a zlib
+# compressor and decompressor for the whole life of a permessage-deflate
+# connection (context takeover), which is about 120 KB resident per socket
+# and more than everything else an idle connection costs. Here the server
+# answers every permessage-deflate offer with no context takeover in both
+# directions (RFC 7692 lets a server add both parameters on its own), so
+# compression state only exists while a message is being packed or unpacked.
+# Each message is compressed on its own, which is already how the payload
+# benchmark measures the wire size.
+import dataclasses
+
+import simple_websocket
+from wsproto.events import AcceptConnection
+from wsproto.extensions import PerMessageDeflate
+
+try:
+    from engineio.async_drivers.gevent import WebSocketWSGI
+    from engineio.async_drivers._websocket_wsgi import SimpleWebSocketWSGI
+    LEAN_WEBSOCKET_AVAILABLE = issubclass(WebSocketWSGI, SimpleWebSocketWSGI)
+except ImportError:
+    LEAN_WEBSOCKET_AVAILABLE = False
+
+
+def lean_deflate():
+    return PerMessageDeflate(client_no_context_takeover=True, server_no_context_takeover=True)
+
+
+class _LeanServer(simple_websocket.Server):
+    """simple_websocket.Server whose handshake accepts permessage-deflate without context takeover."""
+    def handshake(self):
+        send = self.ws.send
+        def send_accept(event):
+            if isinstance(event, AcceptConnection) and event.extensions:
+                event = dataclasses.replace(event, extensions=[lean_deflate()])
+            return send(event)
+        self.ws.send = send_accept
+        try:
+            super().handshake()
+        finally:
+            del self.ws.send
+
+
+if LEAN_WEBSOCKET_AVAILABLE:
+    class LeanWebSocketWSGI(WebSocketWSGI):
+        def __call__(self, environ, start_response):
+            self.ws = _LeanServer(environ, **self.server_args)
+            return self.app(self)
+
+
+def install_lean_websockets(eio_server):
+    """Serves eio_server's WebSocket upgrades with LeanWebSocketWSGI. Returns False if the server isn't on gevent + simple-websocket."""
+    if not LEAN_WEBSOCKET_AVAILABLE or eio_server.async_mode != 'gevent' or eio_server._async.get('websocket') is not WebSocketWSGI:
+        return False
+    # _async is the driver module's shared dict; give this server its own copy.
+    eio_server._async = {**eio_server._async, 'websocket': LeanWebSocketWSGI}
+    return True
@@ -0,0 +1,43 @@
+# backbone/listing_codec.py
+#
+# Compact wire format for folder listings pushed over Socket.IO. Instead of one
+# JSON object per entry, which repeats every key and the full encoded path,
+# a listing is sent as column names plus one array of values per entry:
+#
+#   {"path": "photos", "columns": ["name", "is_folder", ...], "rows": [["a.jpg", 0, ...], ...]}
+#
+# Booleans travel as 0/1, mtime as whole seconds, and encoded_name is dropped:
+# the client rebuilds it from path and name (unpackListing in index.js, which
+# must stay in step with this file).
+from urllib.parse import quote
+
+LISTING_COLUMNS = ('name', 'is_folder', 'is_locked', 'is_favorite', 'mtime', 'size')
+
+
+def pack_listing(files, subpath=''):
+    """A file_manager.list_files() result as a columnar payload."""
+    return {
+        'path': subpath,
+        'columns': LISTING_COLUMNS,
+        'rows': [[f['name'], int(f['type'] == 'folder'), int(bool(f['is_locked'])), int(bool(f['is_favorite'])),
+                  int(f['mtime'] or 0), f['size']] for f in files],
+    }
+
+
+def unpack_listing(payload):
+    """The inverse of pack_listing, for Python clients (and the payload benchmark)."""
+    subpath, columns = payload.get('path', ''), payload['columns']
+    files = []
+    for row in payload['rows']:
+        item = dict(zip(columns, row))
+        rel_path = f"{subpath}/{item['name']}" if subpath else item['name']
+        files.append({
+            'name': item['name'],
+            'encoded_name': quote(rel_path, safe='/'),
+            'type': 'folder' if item['is_folder'] else 'file',
+            'is_locked': bool(item['is_locked']),
+            'mtime': item['mtime'],
+            'size': item['size'],
+            'is_favorite': bool(item['is_favorite']),
+        })
+    return files
@@ -0,0 +1,393 @@
+# backbone/metrics.py
+#
+# Counters, gauges and histograms for /admin/metrics, in the Prometheus text
+# exposition format (0.0.4). Modules declare their metrics at import time on
+# the shared REGISTRY and update them inline; an update is a dict lookup,
+# an uncontended lock and an addition (a bisect for histograms), so hot
+# paths can afford it.
+#
+# With several workers each one publishes a snapshot of its own metrics to
+# metrics-<pid>.json in the share dir (see MetricsRegistry.start_flusher), and
+# render() adds them to the serving worker's live values, so a scrape covers
+# the whole server whichever worker answers it.
+import os
+import glob
+import json
+import time
+import bisect
+import logging
+import threading
+from functools import wraps
+
+from .shared_state import atomic_write_json, file_signature
+
+# Seconds; from a fast cached listing up to a large zip.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Recipients of one Socket.IO emit.
+FANOUT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _format_value(value):
+    if value == float('inf'): return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Value:
+    """One labelled series of a counter or gauge."""
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value, self._lock = 0.0, threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock: self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock: self.value -= amount
+
+    def set(self, value):
+        self.value = float(value)
+
+    def state(self):
+        return self.value
+
+
+class _Buckets:
+    """One labelled series of a histogram: per-bucket counts (not cumulative), sum and count."""
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds, self.counts, self.sum = bounds, [0] * (len(bounds) + 1), 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def state(self):
+        return {'counts': list(self.counts), 'sum': self.sum}
+
+
+class _Timer:
+    """Context manager and decorator that observes elapsed seconds."""
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.started)
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            with _Timer(self.series):
+                return fn(*args, **kwargs)
+        return timed
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name, self.documentation, self.label_names = name, documentation, tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        self._function = None
+        self._default = None if self.label_names else self.labels()
+
+    def _new_series(self):
+        return _Value()
+
+    def labels(self, *values):
+        """The series for these label values (in declaration order), created on first use."""
+        series = self._series.get(values)
+        if series is None:
+            key = tuple(str(v) for v in values)
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+                # Also reachable by the caller's own values (e.g. an int status code) without converting them.
+                self._series.setdefault(values, series)
+        return series
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+        self._default = None if self.label_names else self.labels()
+
+    def snapshot(self):
+        if self._function is not None:
+            try:
+                return {(): float(self._function())}
+            except Exception as e:
+                logging.error(f"Metric {self.name} could not be collected: {e}")
+                return {}
+        # Alias keys (see labels()) point at a series already listed under its string key.
+        return {key: series.state() for key, series in list(self._series.items())
+                if all(isinstance(v, str) for v in key)}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, fn):
+        """Reads the value from fn() at collection time instead (unlabelled gauges only)."""
+        self._function = fn
+        return self
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labels)
+
+    def _new_series(self):
+        return _Buckets(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return _Timer(self._default)
+
+
+class MetricsRegistry:
+    """
+    The set of metrics rendered by /admin/metrics.
+
+    counter(), gauge() and histogram() return the existing metric when the
+    name is already registered, so modules can declare theirs at import
+    time. With share_dir (multi-worker mode) flush() publishes this worker's
+    values and render() merges in the other workers' files: counters,
+    gauges and histogram buckets are summed.
+    """
+    def __init__(self, share_dir=None):
+        self.share_dir = share_dir
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._remote_cache = {}  # path -> (signature, snapshot)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # A new worker starts from zero; what the parent counted is not its own.
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            if metric._function is None: metric.reset()
+        self._lock = threading.Lock()
+        self._remote_cache = {}
+
+    def configure(self, share_dir=None):
+        self.share_dir = share_dir
+        if share_dir: os.makedirs(share_dir, exist_ok=True)
+
+    def _register(self, cls, name, documentation, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered differently.")
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    # --- Collection ---
+    def snapshot(self):
+        """{name: {'kind', 'help', 'labels', 'bounds', 'series': [[label values, state], ...]}} as plain JSON types."""
+        out = {}
+        for name, metric in list(self._metrics.items()):
+            out[name] = {'kind': metric.kind, 'help': metric.documentation, 'labels': list(metric.label_names),
+                         'bounds': list(getattr(metric, 'bounds', ())),
+                         'series': [[list(key), state] for key, state in metric.snapshot().items()]}
+        return out
+
+    def _remote_snapshots(self):
+        if not self.share_dir: return []
+        own, snapshots = self._own_path(), []
+        for path in glob.glob(os.path.join(self.share_dir, 'metrics-*.json')):
+            if path == own: continue
+            signature = file_signature(path)
+            cached = self._remote_cache.get(path)
+            if not cached or cached[0] != signature:
+                try:
+                    with open(path) as f: cached = (signature, json.load(f))
+                except (OSError, ValueError):
+                    continue
+                self._remote_cache[path] = cached
+            snapshots.append(cached[1])
+        return snapshots
+
+    def render(self):
+        """All metrics, summed across workers, in the Prometheus text format."""
+        merged = {}
+        for snapshot in [self.snapshot()] + self._remote_snapshots():
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, {**metric, 'series': {}})
+                for labels, state in metric['series']:
+                    key = tuple(labels)
+                    if isinstance(state, dict):
+                        current = target['series'].get(key)
+                        if current is None or len(current['counts']) != len(state['counts']):
+                            target['series'][key] = {'counts': list(state['counts']), 'sum': state['sum']}
+                        else:
+                            current['counts'] = [a + b for a, b in zip(current['counts'], state['counts'])]
+                            current['sum'] += state['sum']
+                    else:
+                        target['series'][key] = target['series'].get(key, 0) + state
+        lines = []
+        for name in sorted(merged):
+            metric = merged[name]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            names = metric['labels']
+            for key, state in sorted(metric['series'].items()):
+                if metric['kind'] != 'histogram':
+                    lines.append(f"{name}{_label_text(names, key)} {_format_value(state)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(metric['bounds']) + [float('inf')], state['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text(names, key, [('le', _format_value(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_label_text(names, key)} {_format_value(state['sum'])}")
+                lines.append(f"{name}_count{_label_text(names, key)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+    # --- Multi-worker snapshots ---
+    def _own_path(self):
+        self._pid = os.getpid()
+        return os.path.join(self.share_dir, f"metrics-{self._pid}.json")
+
+    def flush(self):
+        if not self.share_dir: return
+        try:
+            atomic_write_json(self._own_path(), self.snapshot(), indent=None)
+        except (OSError, TypeError, ValueError) as e:
+            logging.error(f"Failed to publish metrics: {e}")
+
+    def start_flusher(self, spawn, sleep, interval=5.0):
+        """Runs flush() every `interval` seconds on a background task (multi-worker mode only)."""
+        if not self.share_dir: return
+        def _run():
+            while True:
+                self.flush()
+                sleep(interval)
+        spawn(_run)
+
+    def purge_owner(self, pid):
+        """Drops a dead worker's snapshot."""
+        if not self.share_dir: return
+        try:
+            os.remove(os.path.join(self.share_dir, f"metrics-{pid}.json"))
+        except OSError:
+            pass
+
+
+REGISTRY = MetricsRegistry()
+
+
+# --- Framework hooks ---
+HTTP_REQUESTS = REGISTRY.counter('snailsynk_http_requests_total', 'HTTP requests by endpoint, method and status code.',
+                                 ('endpoint', 'method', 'status'))
+HTTP_DURATION = REGISTRY.histogram('snailsynk_http_request_duration_seconds',
+                                   'Time until the response is returned to the server (streamed bodies excluded).',
+                                   ('endpoint',))
+HTTP_IN_FLIGHT = REGISTRY.gauge('snailsynk_http_requests_in_flight', 'HTTP requests being handled.')
+SOCKETIO_EMITS = REGISTRY.counter('snailsynk_socketio_emits_total', 'Socket.IO events emitted by the server.', ('event',))
+SOCKETIO_FANOUT = REGISTRY.histogram('snailsynk_socketio_emit_recipients', 'Clients one emit was delivered to by this worker.',
+                                     buckets=FANOUT_BUCKETS)
+SOCKETIO_FANOUT_SECONDS = REGISTRY.histogram('snailsynk_socketio_emit_delivery_seconds',
+                                             'Time to queue one emit for all its recipients on this worker.')
+
+
+def instrument_flask(app):
+    """Counts and times every request. Endpoints, not paths, are used as labels to keep the series bounded."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        endpoint = request.endpoint or 'unmatched'
+        HTTP_REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+        if started is not None:
+            HTTP_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc=None):
+        HTTP_IN_FLIGHT.dec()
+
+
+def instrument_socketio(server):
+    """
+    Counts emits by event on the python-socketio server, and measures how many
+    local clients each one reaches and how long queueing them takes. The
+    manager's get_participants() is wrapped on this instance because it is the
+    delivery loop for both the in-process and the cross-worker managers.
+    """
+    emit, get_participants = server.emit, server.manager.get_participants
+
+    @wraps(emit)
+    def counted_emit(event, *args, **kwargs):
+        SOCKETIO_EMITS.labels(event).inc()
+        return emit(event, *args, **kwargs)
+
+    def measured_participants(namespace, room):
+        started, recipients = time.perf_counter(), 0
+        for participant in get_participants(namespace, room):
+            recipients += 1
+            yield participant
+        SOCKETIO_FANOUT.observe(recipients)
+        SOCKETIO_FANOUT_SECONDS.observe(time.perf_counter() - started)
+
+    server.emit = counted_emit
+    server.manager.get_participants = measured_participants
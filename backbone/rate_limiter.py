@@ -0,0 +1,165 @@
+# backbone/rate_limiter.py
+import math
+import time
+import logging
+import threading
+from collections import deque, defaultdict
+from .utils import log_history
+
+# capacity: burst size, refill_per_sec: sustained rate. Password-style classes are
+# tight because every attempt costs an Argon2 verify on the server.
+DEFAULT_POLICIES = {
+    'login':    {'capacity': 5,  'refill_per_sec': 5 / 60},
+    'password': {'capacity': 10, 'refill_per_sec': 10 / 60},
+    'upload':   {'capacity': 30, 'refill_per_sec': 1.0},
+    'preview':  {'capacity': 60, 'refill_per_sec': 10.0},
+    'qr':       {'capacity': 20, 'refill_per_sec': 1.0},
+}
+
+# Starting point for a class that only exists in the overrides.
+FALLBACK_POLICY = {'capacity': 30, 'refill_per_sec': 1.0}
+
+# Repeated throttling escalates into a temporary ban through the BlocklistManager.
+DEFAULT_ESCALATION = {'violations': 20, 'window_seconds': 60, 'ban_seconds': 900}
+
+STATS_WINDOW_SECONDS = 60
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter keyed by (client IP, endpoint class).
+
+    Each class has its own bucket per IP. Throttled requests are recorded in a
+    per-IP sliding window; an IP that keeps hammering after being throttled is
+    handed to the BlocklistManager for a temporary ban.
+    """
+    def __init__(self, blocklist_manager=None, policies=None, escalation=None):
+        self.blocklist_manager = blocklist_manager
+        self.policies = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+        if policies is not None and not isinstance(policies, dict):
+            logging.warning(f"Ignoring rate limit overrides: expected an object of policies, got {policies!r}.")
+            policies = None
+        for name, policy in (policies or {}).items():
+            merged = self._validate_policy(name, policy, self.policies.get(name, FALLBACK_POLICY))
+            if merged: self.policies[name] = merged
+        self.escalation = {**DEFAULT_ESCALATION, **(escalation or {})}
+        self._lock = threading.Lock()
+        self._buckets = {}                   # (ip, class) -> [tokens, last_refill]
+        self._violations = defaultdict(deque)  # ip -> timestamps of throttled requests
+        self._recent = defaultdict(deque)      # class -> [second, allowed, throttled] slots in the stats window
+        self._totals = defaultdict(lambda: {'allowed': 0, 'throttled': 0})
+        self._bans = deque(maxlen=50)
+        self._checks_since_prune = 0
+
+    @staticmethod
+    def _validate_policy(name, policy, base):
+        """Fills the fields an override leaves out from base. Returns None (and logs) if the override is unusable."""
+        if not isinstance(policy, dict):
+            logging.warning(f"Ignoring rate limit override for '{name}': expected an object, got {policy!r}.")
+            return None
+        merged = dict(base)
+        for field, minimum in (('capacity', 1), ('refill_per_sec', 0)):
+            if field not in policy: continue
+            value = policy[field]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < minimum:
+                logging.warning(f"Ignoring rate limit override for '{name}': {field} must be a number >= {minimum}.")
+                return None
+            merged[field] = value
+        return merged
+
+    def check(self, ip, endpoint_class):
+        """
+        Consumes a token for the request. Returns (allowed, retry_after_seconds, banned),
+        where banned is True if this request tipped the IP into a temporary ban.
+        """
+        policy = self.policies.get(endpoint_class)
+        if not policy: return True, 0, False
+        capacity, rate = policy['capacity'], policy['refill_per_sec']
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get((ip, endpoint_class))
+            if bucket is None:
+                bucket = self._buckets[(ip, endpoint_class)] = [capacity, now]
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            allowed = bucket[0] >= 1
+            if allowed:
+                bucket[0] -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - bucket[0]) / rate if rate > 0 else self.escalation['ban_seconds']
+            self._record(endpoint_class, allowed, now)
+            should_ban = not allowed and self._record_violation(ip, now)
+            self._checks_since_prune += 1
+            if self._checks_since_prune >= 1000:
+                self._prune(now)
+        if should_ban:
+            self._ban(ip, endpoint_class)
+        return allowed, retry_after, should_ban
+
+    def _record(self, endpoint_class, allowed, now):
+        self._totals[endpoint_class]['allowed' if allowed else 'throttled'] += 1
+        second = int(now)
+        recent = self._recent[endpoint_class]
+        if not recent or recent[-1][0] != second:
+            recent.append([second, 0, 0])
+            while now - recent[0][0] > STATS_WINDOW_SECONDS:
+                recent.popleft()
+        recent[-1][1 if allowed else 2] += 1
+
+    def _record_violation(self, ip, now):
+        """Returns True once the IP crosses the escalation threshold."""
+        window = self._violations[ip]
+        window.append(now)
+        while window and now - window[0] > self.escalation['window_seconds']:
+            window.popleft()
+        if len(window) >= self.escalation['violations']:
+            window.clear()
+            return True
+        return False
+
+    def _ban(self, ip, endpoint_class):
+        ban_seconds = self.escalation['ban_seconds']
+        self._bans.append({'ip': ip, 'class': endpoint_class, 'at': time.time(), 'ban_seconds': ban_seconds})
+        log_history("IP Throttled", f"[yellow]{ip}[/] kept hitting '{endpoint_class}' limits, banned for {ban_seconds}s")
+        if self.blocklist_manager:
+            try:
+                self.blocklist_manager.block_ip(ip, ttl_seconds=ban_seconds)
+            except Exception as e:
+                logging.error(f"Failed to escalate rate-limit ban for {ip}: {e}")
+
+    def _prune(self, now):
+        """Drops buckets that have refilled completely and violation windows that emptied."""
+        self._checks_since_prune = 0
+        for key, (tokens, last) in list(self._buckets.items()):
+            policy = self.policies[key[1]]
+            if tokens + (now - last) * policy['refill_per_sec'] >= policy['capacity']:
+                del self._buckets[key]
+        for ip, window in list(self._violations.items()):
+            if not window or now - window[-1] > self.escalation['window_seconds']:
+                del self._violations[ip]
+
+    def get_stats(self):
+        """Counters for the admin dashboard."""
+        now = time.monotonic()
+        with self._lock:
+            classes = {}
+            for name, policy in self.policies.items():
+                recent = [slot for slot in self._recent.get(name, ()) if now - slot[0] <= STATS_WINDOW_SECONDS]
+                classes[name] = {
+                    'capacity': policy['capacity'],
+                    'refill_per_sec': policy['refill_per_sec'],
+                    'allowed': self._totals[name]['allowed'],
+                    'throttled': self._totals[name]['throttled'],
+                    'recent_requests': sum(slot[1] + slot[2] for slot in recent),
+                    'recent_throttled': sum(slot[2] for slot in recent),
+                }
+            offenders = sorted(((ip, len(w)) for ip, w in self._violations.items() if w), key=lambda x: -x[1])[:10]
+            return {
+                'classes': classes,
+                'window_seconds': STATS_WINDOW_SECONDS,
+                'tracked_buckets': len(self._buckets),
+                'top_offenders': [{'ip': ip, 'violations': count} for ip, count in offenders],
+                'recent_bans': list(self._bans)[::-1],
+                'escalation': dict(self.escalation),
+            }
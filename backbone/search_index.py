@@ -0,0 +1,402 @@
+# backbone/search_index.py
+import os
+import time
+import sqlite3
+import difflib
+import logging
+import threading
+
+def _probe_fts5():
+    try:
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE VIRTUAL TABLE probe USING fts5(x, tokenize='trigram')")
+        conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+# FTS5 with the trigram tokenizer (SQLite >= 3.34) makes substring and fuzzy
+# filename queries index lookups; without it they fall back to LIKE scans.
+FTS5_AVAILABLE = _probe_fts5()
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.csv', '.json', '.log', '.py', '.js', '.ts', '.html', '.css', '.xml',
+                   '.yml', '.yaml', '.ini', '.cfg', '.toml', '.sh', '.c', '.h', '.cpp', '.java', '.go', '.rs',
+                   '.sql', '.tex', '.rst'}
+CONTENT_MAX_BYTES = 1024 * 1024
+FUZZY_MIN_SCORE = 0.6
+# FileManager changes are synced this long after the first one, so bursts share one pass.
+SYNC_DELAY_SECONDS = 0.5
+_FUZZY_CANDIDATES = 500
+# Rows per write transaction during a reconcile; short transactions keep request-path writes from waiting.
+_BATCH_ROWS = 500
+_MAX_CHAR = '\U0010ffff'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_name_key ON entries(name_key);
+CREATE INDEX IF NOT EXISTS idx_entries_parent ON entries(parent);
+CREATE INDEX IF NOT EXISTS idx_entries_mtime ON entries(mtime);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS names_fts USING fts5(name_key, content='entries', content_rowid='id', tokenize='trigram');
+CREATE VIRTUAL TABLE IF NOT EXISTS names_vocab USING fts5vocab(names_fts, 'row');
+CREATE VIRTUAL TABLE IF NOT EXISTS contents_fts USING fts5(body);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO names_fts(rowid, name_key) VALUES (new.id, new.name_key);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO names_fts(names_fts, rowid, name_key) VALUES ('delete', old.id, old.name_key);
+    DELETE FROM contents_fts WHERE rowid = old.id;
+END;
+"""
+
+def _is_hidden(rel_path):
+    return any(part.startswith('.') for part in rel_path.split('/'))
+
+def _parent(rel_path):
+    return rel_path.rsplit('/', 1)[0] if '/' in rel_path else ''
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def _like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SearchIndex:
+    """
+    Persistent filename index over the share folder, kept in SQLite next to the
+    other instance files, with optional full-text indexing of small text files.
+
+    The index is reconciled with the disk once at startup (only changed rows
+    are written) and then updated incrementally: the FileSystemWatcher stream
+    goes through apply_fs_changes(); without a watcher, FileManager reports its
+    own changes to queue_paths(), which a background thread syncs so requests
+    never wait on a subtree walk.
+
+    Connections are per thread and per process. Queries run on the request
+    path, so every statement is an index lookup or a bounded scan.
+    """
+    def __init__(self, files_folder, db_path, index_contents=False):
+        self.files_folder = files_folder
+        self.db_path = db_path
+        self.index_contents = index_contents and FTS5_AVAILABLE
+        self._local = threading.local()
+        self._reconcile_thread = None
+        self.last_reconcile = None
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._pending_event = threading.Event()
+        self._sync_thread = None
+
+    # --- Connection & schema ---
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            if FTS5_AVAILABLE:
+                conn.executescript(_FTS_SCHEMA)
+            conn.commit()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # --- Scanning ---
+    def _row(self, rel_path, st, is_dir):
+        name = rel_path.rsplit('/', 1)[-1]
+        ext = '' if is_dir else os.path.splitext(name)[1].lower()
+        return (rel_path, name, name.lower(), _parent(rel_path), 'folder' if is_dir else 'file', ext,
+                0 if is_dir else st.st_size, st.st_mtime)
+
+    def _stat_row(self, rel_path):
+        full = os.path.join(self.files_folder, rel_path)
+        try:
+            st = os.stat(full)
+        except OSError:
+            return None
+        return self._row(rel_path, st, os.path.isdir(full))
+
+    def _scan_dir(self, rel_dir):
+        """Rows for the direct, non-hidden children of a directory."""
+        rows = []
+        try:
+            with os.scandir(os.path.join(self.files_folder, rel_dir) if rel_dir else self.files_folder) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                        if not is_dir and not entry.is_file():
+                            continue
+                        rows.append(self._row(f"{rel_dir}/{entry.name}" if rel_dir else entry.name, entry.stat(), is_dir))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return rows
+
+    def _walk(self, rel_path):
+        """Rows for rel_path and, if it is a folder, everything below it."""
+        root = self._stat_row(rel_path)
+        if root is None:
+            return
+        yield root
+        stack = [rel_path] if root[4] == 'folder' else []
+        while stack:
+            for row in self._scan_dir(stack.pop()):
+                yield row
+                if row[4] == 'folder':
+                    stack.append(row[0])
+
+    # --- Writes ---
+    def _upsert(self, conn, rows):
+        conn.executemany(
+            "INSERT INTO entries (path, name, name_key, parent, kind, ext, size, mtime) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, kind = excluded.kind",
+            rows)
+        if self.index_contents:
+            for row in rows:
+                if row[4] == 'file' and row[5] in TEXT_EXTENSIONS and row[6] <= CONTENT_MAX_BYTES:
+                    self._index_content(conn, row[0])
+
+    def _index_content(self, conn, rel_path):
+        try:
+            with open(os.path.join(self.files_folder, rel_path), 'r', encoding='utf-8', errors='ignore') as f:
+                body = f.read(CONTENT_MAX_BYTES)
+        except OSError:
+            return
+        entry_id = conn.execute("SELECT id FROM entries WHERE path = ?", (rel_path,)).fetchone()[0]
+        conn.execute("DELETE FROM contents_fts WHERE rowid = ?", (entry_id,))
+        conn.execute("INSERT INTO contents_fts (rowid, body) VALUES (?, ?)", (entry_id, body))
+
+    @staticmethod
+    def _delete_under(conn, rel_path):
+        conn.execute("DELETE FROM entries WHERE path = ? OR (path > ? AND path < ?)",
+                      (rel_path, rel_path + '/', rel_path + '/' + _MAX_CHAR))
+
+    def sync_paths(self, *rel_paths):
+        """Re-reads the given paths (and anything below them) from disk. Missing paths are removed."""
+        conn = self._conn()
+        for rel_path in self._outermost(rel_paths):
+            with conn:
+                self._delete_under(conn, rel_path)
+                batch = []
+                for row in self._walk(rel_path):
+                    batch.append(row)
+                    if len(batch) >= _BATCH_ROWS:
+                        self._upsert(conn, batch)
+                        batch = []
+                if batch:
+                    self._upsert(conn, batch)
+
+    def queue_paths(self, *rel_paths):
+        """FileManager change listener: the paths are synced shortly after, on the search-sync thread."""
+        with self._pending_lock:
+            self._pending.update(rel_paths)
+            if self._sync_thread is None or not self._sync_thread.is_alive():
+                self._sync_thread = threading.Thread(target=self._drain_pending, name='search-sync', daemon=True)
+                self._sync_thread.start()
+        self._pending_event.set()
+
+    def _drain_pending(self):
+        while True:
+            self._pending_event.wait()
+            time.sleep(SYNC_DELAY_SECONDS)  # let a burst of changes (a multi-file upload) arrive as one batch
+            self._pending_event.clear()
+            with self._pending_lock:
+                rel_paths, self._pending = self._pending, set()
+            if not rel_paths: continue
+            try:
+                self.sync_paths(*rel_paths)
+            except Exception as e:
+                logging.error(f"Search index sync failed for {len(rel_paths)} path(s): {e}")
+
+    @staticmethod
+    def _outermost(rel_paths):
+        """Drops hidden paths and paths already covered by an ancestor in the same call."""
+        kept = []
+        for rel_path in sorted({p.strip('/') for p in rel_paths if p and not _is_hidden(p)}):
+            if not any(rel_path.startswith(k + '/') for k in kept):
+                kept.append(rel_path)
+        return kept
+
+    def apply_fs_changes(self, batch):
+        """FileSystemWatcher subscriber."""
+        if batch.rescan:
+            self.start_background_reconcile()
+        elif batch.changes:
+            self.sync_paths(*batch.changes)
+
+    def reconcile(self):
+        """Brings the index in line with the disk, one directory at a time, writing only what differs."""
+        started = time.monotonic()
+        conn = self._conn()
+        pending, stack = [], ['']
+        changed = removed = 0
+        while stack:
+            rel_dir = stack.pop()
+            on_disk = {row[0]: row for row in self._scan_dir(rel_dir)}
+            indexed = {path: (kind, size, mtime) for path, kind, size, mtime in conn.execute(
+                "SELECT path, kind, size, mtime FROM entries WHERE parent = ?", (rel_dir,))}
+            for path in indexed.keys() - on_disk.keys():
+                with conn:
+                    self._delete_under(conn, path)
+                removed += 1
+            for path, row in on_disk.items():
+                if indexed.get(path) != (row[4], row[6], row[7]):
+                    pending.append(row)
+                if row[4] == 'folder':
+                    stack.append(path)
+            if len(pending) >= _BATCH_ROWS:
+                with conn:
+                    self._upsert(conn, pending)
+                changed += len(pending)
+                pending = []
+        if pending:
+            with conn:
+                self._upsert(conn, pending)
+            changed += len(pending)
+        self.last_reconcile = time.time()
+        logging.info(f"Search index reconciled in {time.monotonic() - started:.1f}s "
+                     f"({changed} updated, {removed} removed)")
+
+    def start_background_reconcile(self):
+        """Runs reconcile() on a background thread unless one is already running."""
+        if self._reconcile_thread and self._reconcile_thread.is_alive(): return
+        def _run():
+            try:
+                self.reconcile()
+            except Exception as e:
+                logging.error(f"Search index reconcile failed: {e}")
+        self._reconcile_thread = threading.Thread(target=_run, name='search-reconcile', daemon=True)
+        self._reconcile_thread.start()
+
+    # --- Queries ---
+    def search(self, query='', match='auto', kind=None, extensions=None, min_size=None, max_size=None,
+               modified_after=None, modified_before=None, scope='', content=False, limit=50):
+        """
+        Returns up to `limit` entry dicts (path, name, type, ext, size, mtime, and
+        'score' for fuzzy hits). match is 'prefix', 'substring', 'fuzzy' or 'auto'
+        (prefix hits first, then substring, then fuzzy if still short). content=True
+        searches indexed file contents instead of names.
+        """
+        where, params = ["1"], []
+        if kind in ('file', 'folder'):
+            where.append("e.kind = ?"); params.append(kind)
+        if extensions:
+            exts = [x if x.startswith('.') else f".{x}" for x in (x.lower().strip() for x in extensions) if x]
+            where.append(f"e.ext IN ({','.join('?' * len(exts))})"); params.extend(exts)
+        if min_size is not None:
+            where.append("e.kind = 'file' AND e.size >= ?"); params.append(min_size)
+        if max_size is not None:
+            where.append("e.kind = 'file' AND e.size <= ?"); params.append(max_size)
+        if modified_after is not None:
+            where.append("e.mtime >= ?"); params.append(modified_after)
+        if modified_before is not None:
+            where.append("e.mtime <= ?"); params.append(modified_before)
+        scope = (scope or '').strip('/')
+        if scope:
+            where.append("e.path > ? AND e.path < ?"); params.extend([scope + '/', scope + '/' + _MAX_CHAR])
+        filters = " AND ".join(where)
+        q = (query or '').strip().lower()
+        conn = self._conn()
+
+        if content:
+            if not self.index_contents or not q: return []
+            terms = ' '.join(_fts_phrase(t) for t in q.split())
+            return self._fetch(conn, f"SELECT e.* FROM contents_fts c JOIN entries e ON e.id = c.rowid "
+                                     f"WHERE contents_fts MATCH ? AND {filters} ORDER BY c.rank LIMIT ?",
+                               [terms] + params + [limit])
+        if not q:
+            return self._fetch(conn, f"SELECT e.* FROM entries e WHERE {filters} ORDER BY e.mtime DESC LIMIT ?",
+                               params + [limit])
+
+        results, seen = [], set()
+        def add(rows):
+            for row in rows:
+                if row['path'] not in seen and len(results) < limit:
+                    seen.add(row['path']); results.append(row)
+        if match in ('prefix', 'auto'):
+            add(self._fetch(conn, f"SELECT e.* FROM entries e WHERE e.name_key >= ? AND e.name_key < ? AND {filters} "
+                                  f"ORDER BY e.name_key LIMIT ?", [q, q + _MAX_CHAR] + params + [limit]))
+        if match in ('substring', 'auto') and len(results) < limit:
+            if FTS5_AVAILABLE and len(q) >= 3:
+                # No ORDER BY: ranking a common substring would mean sorting every match.
+                sql = (f"SELECT e.* FROM names_fts n JOIN entries e ON e.id = n.rowid WHERE names_fts MATCH ? "
+                       f"AND {filters} LIMIT ?")
+                add(self._fetch(conn, sql, [_fts_phrase(q)] + params + [limit + len(seen)]))
+            else:
+                add(self._fetch(conn, f"SELECT e.* FROM entries e WHERE e.name_key LIKE ? ESCAPE '\\' AND {filters} "
+                                      f"LIMIT ?", [f"%{_like_escape(q)}%"] + params + [limit + len(seen)]))
+        if match == 'fuzzy' or (match == 'auto' and len(results) < limit and len(q) >= 3):
+            add(self._fuzzy(conn, q, filters, params))
+        return results
+
+    def _fuzzy(self, conn, q, filters, params):
+        """
+        Typo-tolerant matches. Candidates must share the query's rarest trigrams
+        (both of the two rarest first, then any of the three rarest), which keeps
+        the posting lists short; they are then ranked by similarity to the query.
+        """
+        trigrams = sorted({q[i:i + 3] for i in range(max(1, len(q) - 2))})
+        candidates = []
+        if FTS5_AVAILABLE and len(q) >= 3:
+            counts = conn.execute(f"SELECT term, doc FROM names_vocab WHERE term IN ({','.join('?' * len(trigrams))})",
+                                  trigrams).fetchall()
+            rarest = [term for term, _ in sorted(counts, key=lambda tc: tc[1])]
+            sql = (f"SELECT e.* FROM names_fts n JOIN entries e ON e.id = n.rowid WHERE names_fts MATCH ? "
+                   f"AND {filters} LIMIT ?")
+            if len(rarest) >= 2:
+                candidates = self._fetch(conn, sql, [' AND '.join(_fts_phrase(t) for t in rarest[:2])] + params + [_FUZZY_CANDIDATES])
+            if rarest and len(candidates) < _FUZZY_CANDIDATES:
+                candidates += self._fetch(conn, sql, [' OR '.join(_fts_phrase(t) for t in rarest[:3])] + params + [_FUZZY_CANDIDATES])
+        else:
+            clauses = ' OR '.join("e.name_key LIKE ? ESCAPE '\\'" for _ in trigrams)
+            candidates = self._fetch(conn, f"SELECT e.* FROM entries e WHERE ({clauses}) AND {filters} LIMIT ?",
+                                     [f"%{_like_escape(t)}%" for t in trigrams] + params + [_FUZZY_CANDIDATES])
+        scored, seen = [], set()
+        for row in candidates:
+            if row['path'] in seen: continue
+            seen.add(row['path'])
+            name = row['name'].lower()
+            stem = os.path.splitext(name)[0] if row['type'] == 'file' else name
+            matcher = difflib.SequenceMatcher(None, q, stem)
+            if matcher.real_quick_ratio() < FUZZY_MIN_SCORE or matcher.quick_ratio() < FUZZY_MIN_SCORE:
+                continue
+            score = matcher.ratio()
+            if score >= FUZZY_MIN_SCORE:
+                row['score'] = round(score, 3)
+                scored.append(row)
+        scored.sort(key=lambda r: -r['score'])
+        return scored
+
+    @staticmethod
+    def _fetch(conn, sql, params):
+        return [{'path': r[1], 'name': r[2], 'type': r[5], 'ext': r[6], 'size': r[7], 'mtime': r[8]}
+                for r in conn.execute(sql, params)]
+
+    def stats(self):
+        conn = self._conn()
+        files, folders = conn.execute(
+            "SELECT COALESCE(SUM(kind = 'file'), 0), COALESCE(SUM(kind = 'folder'), 0) FROM entries").fetchone()
+        return {
+            'files': files,
+            'folders': folders,
+            'fts5': FTS5_AVAILABLE,
+            'contents_indexed': self.index_contents,
+            'reconciling': bool(self._reconcile_thread and self._reconcile_thread.is_alive()),
+            'last_reconcile': self.last_reconcile,
+        }
@@ -0,0 +1,176 @@
+# backbone/shared_state.py
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Set by configure_shared_state() when several worker processes share the files.
+_MULTI_PROCESS = False
+# How stale a read may be in multi-process mode: the file is stat'ed at most this often per store.
+RELOAD_CHECK_SECONDS = 0.05
+
+def configure_shared_state(multi_process):
+    """With multi_process=False (one server process) reads trust the in-memory snapshot and never stat the file."""
+    global _MULTI_PROCESS
+    _MULTI_PROCESS = bool(multi_process)
+
+@contextmanager
+def file_lock(path):
+    """Exclusive inter-process lock on a '<path>.lock' sidecar. A no-op where fcntl is unavailable."""
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def file_signature(path):
+    """(inode, mtime, size) of a file, or None if it doesn't exist. Changes on every atomic rewrite."""
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def atomic_write_json(path, data, indent=2):
+    """Writes JSON to a temp file and renames it over path, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f: json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    except (IOError, OSError, TypeError, ValueError):
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        raise
+
+def _copy_for_write(data):
+    """
+    Copies the top-level container and each dict/list directly inside it. That is
+    as deep as the managers ever mutate in place (e.g. metadata[path]['favorite'],
+    state['pins'].append); deeper values are replaced, never edited.
+    """
+    if isinstance(data, dict):
+        return {k: v.copy() if isinstance(v, (dict, list)) else v for k, v in data.items()}
+    return [v.copy() if isinstance(v, (dict, list)) else v for v in data]
+
+class SharedJSONStore:
+    """
+    A JSON document that several worker processes can read and update safely.
+
+    Reads return an immutable-by-convention snapshot, reloaded first if another
+    process has replaced the file. Updates go through transaction(), which takes
+    the locks, hands the caller a private copy of the latest data to mutate,
+    writes it back atomically and only then publishes it as the new snapshot
+    (copy-on-write). Readers never see a half-applied update and never iterate
+    a dict that is being mutated. With path=None the store lives in memory only.
+
+    Reads only look for another process's changes in multi-process mode (see
+    configure_shared_state), and then at most every RELOAD_CHECK_SECONDS;
+    transactions always start from the file. A transaction whose write fails
+    raises, so the caller never reports an update that was not saved.
+
+    Transactions hold a plain thread lock, so the code inside must not yield to
+    other greenlets (no sockets, no hashing-pool calls).
+    """
+    def __init__(self, path=None, default=dict, indent=2):
+        self.path = path
+        self.default = default
+        self.indent = indent
+        self._lock = threading.Lock()
+        # Guards the (_data, _signature) pair; held only briefly, never across a transaction body.
+        self._snapshot_lock = threading.Lock()
+        self._signature = None
+        self._next_check = 0.0
+        self._data = default()
+        if path: self._data, self._signature = self._load()
+
+    def _load(self):
+        """Returns (data, signature), with the signature taken from the same open file that was parsed."""
+        try:
+            with open(self.path, 'r') as f:
+                st = os.fstat(f.fileno())
+                return json.load(f), (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return self.default(), None
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Could not load shared state from {self.path}: {e}")
+            return self.default(), file_signature(self.path)
+
+    def _refresh(self, force=False):
+        if not self.path: return
+        if not force:
+            if not _MULTI_PROCESS: return
+            now = time.monotonic()
+            if now < self._next_check: return
+            self._next_check = now + RELOAD_CHECK_SECONDS
+        if file_signature(self.path) == self._signature: return
+        with self._snapshot_lock:
+            if file_signature(self.path) != self._signature:
+                self._data, self._signature = self._load()
+
+    @property
+    def data(self):
+        """The current snapshot. Treat it as read-only; mutate through transaction()."""
+        self._refresh()
+        return self._data
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if not self.path:
+                working = _copy_for_write(self._data)
+                yield working
+                self._data = working
+                return
+            with file_lock(self.path):
+                self._refresh(force=True)
+                working = _copy_for_write(self._data)
+                # An exception raised by the caller propagates here and the copy is discarded.
+                yield working
+                try:
+                    atomic_write_json(self.path, working, self.indent)
+                except (IOError, OSError, TypeError, ValueError) as e:
+                    logging.error(f"Could not save shared state to {self.path}: {e}")
+                    raise
+                with self._snapshot_lock:
+                    self._data = working
+                    self._signature = file_signature(self.path)
+
+class LeaderLock:
+    """
+    Picks one worker for jobs that must run once per cluster (e.g. broadcasts
+    triggered by the file watcher). The first process to flock the file is the
+    leader until it exits; the next is_leader() call elsewhere then takes over.
+    Without fcntl every process considers itself the leader.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._pid = None
+
+    def is_leader(self):
+        if not FCNTL_AVAILABLE: return True
+        if self._pid != os.getpid():
+            # flock belongs to the open file description, which a forked child shares; start over.
+            self._file, self._pid = None, os.getpid()
+        if self._file is None:
+            lock_file = open(self.path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._file = lock_file
+        return True
@@ -0,0 +1,158 @@
+# backbone/text_ot.py
+#
+# Operational transformation for the shared text buffer. An operation is a
+# JSON list walked left to right over the document: a positive int retains
+# that many characters, a negative int deletes that many, and a string is
+# inserted (the ot.js / text-operation format). Lengths count UTF-16 code
+# units, as browsers do, so server and client agree on positions around emoji.
+# static/js/text-ot.js is the client half and must stay in step with this file.
+
+
+def _units(text):
+    """Length of text in UTF-16 code units."""
+    return len(text.encode('utf-16-le', 'surrogatepass')) // 2
+
+
+def _encode(text):
+    return text.encode('utf-16-le', 'surrogatepass')
+
+
+def _decode(data):
+    return data.decode('utf-16-le', 'surrogatepass')
+
+
+class _Builder:
+    """Accumulates components, merging neighbours of the same kind."""
+    def __init__(self):
+        self.ops = []
+
+    def retain(self, n):
+        if n <= 0: return
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] > 0: self.ops[-1] += n
+        else: self.ops.append(n)
+
+    def delete(self, n):
+        if n <= 0: return
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] < 0: self.ops[-1] -= n
+        else: self.ops.append(-n)
+
+    def insert(self, text):
+        if not text: return
+        if self.ops and isinstance(self.ops[-1], str): self.ops[-1] += text
+        # Keep inserts before deletes at the same position, so equal edits normalise equally.
+        elif self.ops and isinstance(self.ops[-1], int) and self.ops[-1] < 0:
+            if len(self.ops) > 1 and isinstance(self.ops[-2], str): self.ops[-2] += text
+            else: self.ops.insert(len(self.ops) - 1, text)
+        else: self.ops.append(text)
+
+    def result(self):
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] > 0: self.ops.pop()  # trailing retain is implied
+        return self.ops
+
+
+def normalize(op):
+    """Validates an operation from a client and returns it in canonical form. Raises ValueError."""
+    if not isinstance(op, list): raise ValueError("Operation must be a list.")
+    builder = _Builder()
+    for component in op:
+        if isinstance(component, bool): raise ValueError("Invalid operation component.")
+        if isinstance(component, str): builder.insert(component)
+        elif isinstance(component, int):
+            if component > 0: builder.retain(component)
+            elif component < 0: builder.delete(-component)
+        else: raise ValueError("Invalid operation component.")
+    return builder.result()
+
+
+def base_length(op):
+    """Shortest document op can apply to (retains and deletes; a trailing retain is implied)."""
+    return sum(abs(c) for c in op if isinstance(c, int))
+
+
+def apply(text, op):
+    """Applies op to text. Raises ValueError if op reaches past the end of the document."""
+    data, out, pos = _encode(text), [], 0
+    size = len(data) // 2
+    for component in op:
+        if isinstance(component, str):
+            out.append(_encode(component))
+        elif component > 0:
+            if pos + component > size: raise ValueError("Operation is longer than the document.")
+            out.append(data[pos * 2:(pos + component) * 2])
+            pos += component
+        else:
+            if pos - component > size: raise ValueError("Operation is longer than the document.")
+            pos -= component
+    out.append(data[pos * 2:])
+    return _decode(b''.join(out))
+
+
+def transform(a, b):
+    """
+    For a and b made concurrently against the same document, returns (a', b')
+    such that apply(apply(doc, a), b') == apply(apply(doc, b), a'). When both
+    insert at the same position, a's text goes first.
+    """
+    a_out, b_out = _Builder(), _Builder()
+    a, b = list(a), list(b)
+    ia = ib = 0
+    ca = a[0] if a else None
+    cb = b[0] if b else None
+
+    def _next(ops, i):
+        i += 1
+        return i, (ops[i] if i < len(ops) else None)
+
+    while ca is not None or cb is not None:
+        if isinstance(ca, str):
+            a_out.insert(ca)
+            b_out.retain(_units(ca))
+            ia, ca = _next(a, ia)
+            continue
+        if isinstance(cb, str):
+            a_out.retain(_units(cb))
+            b_out.insert(cb)
+            ib, cb = _next(b, ib)
+            continue
+        # Past the end of either op the rest of the document is an implied retain.
+        if ca is None: ca = abs(cb)
+        if cb is None: cb = abs(ca)
+        n = min(abs(ca), abs(cb))
+        if ca > 0 and cb > 0:
+            a_out.retain(n)
+            b_out.retain(n)
+        elif ca < 0 and cb > 0:
+            a_out.delete(n)
+        elif ca > 0 and cb < 0:
+            b_out.delete(n)
+        # both delete: already gone on each side
+        ca = (ca - n if ca > 0 else ca + n) or None
+        cb = (cb - n if cb > 0 else cb + n) or None
+        if ca is None: ia, ca = _next(a, ia)
+        if cb is None: ib, cb = _next(b, ib)
+    return a_out.result(), b_out.result()
+
+
+def diff(old, new):
+    """A single-region operation turning old into new (common prefix and suffix are retained)."""
+    a, b = _encode(old), _encode(new)
+    la, lb = len(a) // 2, len(b) // 2
+    # Binary search on slice equality: memcmp speed even for megabyte buffers.
+    lo, hi = 0, min(la, lb)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid * 2] == b[:mid * 2]: lo = mid
+        else: hi = mid - 1
+    prefix = lo
+    lo, hi = 0, min(la, lb) - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[(la - mid) * 2:] == b[(lb - mid) * 2:]: lo = mid
+        else: hi = mid - 1
+    suffix = lo
+    builder = _Builder()
+    builder.retain(prefix)
+    builder.insert(_decode(b[prefix * 2:(lb - suffix) * 2]))
+    builder.delete(la - prefix - suffix)
+    builder.retain(suffix)
+    return builder.result()
@@ -0,0 +1,188 @@
+# backbone/trash.py
+import os
+import time
+import uuid
+import shutil
+import logging
+import threading
+
+from .shared_state import SharedJSONStore
+from .integrity import lower_thread_priority
+
+TRASH_DIRNAME = '.snailsynk-trash'
+# Folders in the trash that the index doesn't know about (a crash mid-delete or mid-restore)
+# are swept after this long; younger ones may belong to a delete still writing its entry.
+ORPHAN_GRACE_SECONDS = 3600
+# How often the reaper checks for items an admin asked to purge right away.
+PURGE_POLL_SECONDS = 5
+
+
+def _tree_size(path):
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path): shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path): os.remove(path)
+
+
+class Trash:
+    """
+    Deleted files and folders, kept for a while before the space is reclaimed.
+
+    Deleting is a single rename into <root>/<id>/, so it is instant however
+    big the tree is, and the item can be restored with its locks and
+    favorites. root is a folder beside the share on the same filesystem (see
+    private_dir_beside), so the rename never crosses filesystems and nothing
+    in the trash is ever served. The index, which holds each item's saved
+    metadata, lives in the instance folder.
+
+    Space comes back in reap(), run by a background reaper thread at idle
+    priority: items older than retention_days go first, then the oldest items
+    while the trash holds more than max_bytes (0 = no size cap). A retention
+    of 0 days keeps nothing, so deletes are just deferred. The index is a
+    shared JSON store, so any worker can trash, list, restore or purge.
+    """
+    def __init__(self, root, index_path, retention_days=30, max_bytes=0):
+        self.root = root
+        self.retention = max(0.0, float(retention_days)) * 86400
+        self.max_bytes = max(0, int(max_bytes))
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        # Older versions kept the index inside the trash folder.
+        legacy_index = os.path.join(self.root, 'index.json')
+        if os.path.exists(legacy_index) and not os.path.exists(index_path):
+            shutil.move(legacy_index, index_path)
+        self._index = SharedJSONStore(index_path)
+        self._thread = None
+
+    # --- Used by FileManager, under its path lock ---
+    def stash(self, full_path, rel_path, metadata, remote_addr):
+        """Moves full_path into the trash. metadata holds the item's metadata entries, for restore. Returns the entry."""
+        entry_id = uuid.uuid4().hex[:12]
+        os.mkdir(os.path.join(self.root, entry_id))
+        name = os.path.basename(full_path)
+        is_dir = os.path.isdir(full_path) and not os.path.islink(full_path)
+        try:
+            os.rename(full_path, os.path.join(self.root, entry_id, name))
+        except OSError:
+            os.rmdir(os.path.join(self.root, entry_id))
+            raise
+        entry = {'id': entry_id, 'path': rel_path, 'name': name, 'is_dir': is_dir,
+                 'deleted_at': time.time(), 'deleted_by': remote_addr, 'metadata': metadata, 'size': None}
+        with self._index.transaction() as index:
+            index[entry_id] = entry
+        return entry
+
+    def item_path(self, entry):
+        return os.path.join(self.root, entry['id'], entry['name'])
+
+    def get(self, entry_id):
+        entry = self._index.data.get(entry_id)
+        return None if not entry or entry.get('purge') else entry
+
+    def forget(self, entry_id):
+        """Drops an entry whose item was moved back out of the trash."""
+        with self._index.transaction() as index:
+            index.pop(entry_id, None)
+        try:
+            os.rmdir(os.path.join(self.root, entry_id))
+        except OSError:
+            pass
+
+    # --- Admin API ---
+    def list_entries(self):
+        """Trashed items, newest first, without their saved metadata."""
+        entries = [{k: v for k, v in e.items() if k != 'metadata'}
+                   for e in self._index.data.values() if not e.get('purge')]
+        return sorted(entries, key=lambda e: e['deleted_at'], reverse=True)
+
+    def purge(self, entry_id=None):
+        """
+        Marks one item (or, with no id, everything) for deletion by the reaper,
+        which picks it up within PURGE_POLL_SECONDS. Returns the number marked.
+        """
+        with self._index.transaction() as index:
+            targets = [entry_id] if entry_id else list(index)
+            marked = 0
+            for key in targets:
+                if key in index and not index[key].get('purge'):
+                    index[key]['purge'] = True
+                    marked += 1
+        return marked
+
+    def stats(self):
+        entries = [e for e in self._index.data.values() if not e.get('purge')]
+        return {'items': len(entries), 'bytes': sum(e.get('size') or 0 for e in entries),
+                'retention_days': self.retention / 86400, 'max_bytes': self.max_bytes}
+
+    # --- Reclamation ---
+    def reap(self):
+        """Deletes purged, expired and over-quota items, then stray folders. Returns (items removed, bytes freed)."""
+        for entry_id, entry in list(self._index.data.items()):
+            if entry.get('size') is None:
+                try:
+                    size = _tree_size(self.item_path(entry))
+                except OSError:
+                    size = 0
+                with self._index.transaction() as index:
+                    if entry_id in index: index[entry_id]['size'] = size
+        now = time.time()
+        with self._index.transaction() as index:
+            doomed = [e for e in index.values() if e.get('purge') or now - e['deleted_at'] >= self.retention]
+            if self.max_bytes:
+                doomed_ids = {e['id'] for e in doomed}
+                kept = sorted((e for e in index.values() if e['id'] not in doomed_ids), key=lambda e: e['deleted_at'])
+                total = sum(e['size'] or 0 for e in kept)
+                while kept and total > self.max_bytes:
+                    oldest = kept.pop(0)
+                    doomed.append(oldest)
+                    total -= oldest['size'] or 0
+            for entry in doomed:
+                del index[entry['id']]
+        freed = 0
+        for entry in doomed:
+            _remove(os.path.join(self.root, entry['id']))
+            freed += entry.get('size') or 0
+        self._sweep_orphans()
+        if doomed:
+            logging.info(f"Trash reaper removed {len(doomed)} item(s), {freed} bytes")
+        return len(doomed), freed
+
+    def _sweep_orphans(self):
+        known = self._index.data
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.name in known or not entry.is_dir(follow_symlinks=False): continue
+                try:
+                    if entry.stat(follow_symlinks=False).st_mtime < cutoff: _remove(entry.path)
+                except OSError:
+                    continue
+
+    def start_background_reaper(self, interval=3600):
+        """Runs reap() every `interval` seconds, or sooner when something is purged, on an idle-priority thread."""
+        if self._thread and self._thread.is_alive(): return
+        def _run():
+            lower_thread_priority()
+            next_run = time.monotonic() + interval
+            while True:
+                time.sleep(PURGE_POLL_SECONDS)
+                if time.monotonic() < next_run and not any(e.get('purge') for e in self._index.data.values()):
+                    continue
+                next_run = time.monotonic() + interval
+                try:
+                    self.reap()
+                except Exception as e:
+                    logging.error(f"Trash reaper failed: {e}")
+        self._thread = threading.Thread(target=_run, name='trash-reaper', daemon=True)
+        self._thread.start()
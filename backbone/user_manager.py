@@ -9,10 +9,10 @@ from argon2.exceptions import VerifyMismatchError
 
 class UserManager:
     """Handles admin user authentication and credential management."""
-    def __init__(self, config_path):
+    def __init__(self, config_path, password_hasher=None):
         self.config_path = Path(config_path)
         self.config_path.parent.mkdir(exist_ok=True)
-        self.ph = PasswordHasher()
+        self.ph = password_hasher or PasswordHasher()
         self.user_data = self._load_or_initialize_user()
 
     def _load_or_initialize_user(self):
@@ -1,5 +1,12 @@
 # backbone/utils.py
+import os
+import re
+import time
+import queue
+import atexit
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
 
 try:
     import pyperclip
@@ -10,13 +17,140 @@ except ImportError:
 history_logger = logging.getLogger('history')
 last_log_action = None
 
+# Rendering to the terminal happens on a listener thread; request handlers only
+# pay for a queue put. The queue is bounded so a stalled console can't eat memory.
+HISTORY_QUEUE_SIZE = 10000
+_history_listener = None
+
+# Actions that fire on nearly every request. Only the first few per window are
+# printed; the rest are folded into a single "+N more" summary line.
+AGGREGATED_ACTIONS = {"Page Accessed"}
+AGGREGATE_WINDOW = 5.0
+AGGREGATE_BURST = 3
+_aggregate_state = {}  # action -> [window_start, printed, suppressed]
+_log_lock = threading.Lock()
+
+# Only the styles SnailSynk's own lines use are stripped, so user text such as
+# 'report [final].pdf' reaches the plain-text log intact.
+_STYLE = r"(?:bold|dim|italic|underline|white|black|red|green|yellow|blue|magenta|cyan|bright_[a-z]+|#[0-9a-fA-F]{6})"
+_MARKUP_RE = re.compile(rf"\[/?(?:{_STYLE}(?: {_STYLE})*)?\]")
+
+def strip_markup(text):
+    """Removes Rich style tags like [yellow]...[/] from a log line."""
+    return _MARKUP_RE.sub('', text)
+
+class PlainTextFormatter(logging.Formatter):
+    """Formatter for non-TTY output: a timestamp and the message without markup."""
+    def __init__(self):
+        super().__init__(datefmt='%Y-%m-%d %H:%M:%S')
+
+    def format(self, record):
+        return f"[{self.formatTime(record, self.datefmt)}] {strip_markup(record.getMessage())}"
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller: lines are dropped (and counted) if the queue is full."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.dropped:
+            notice = logging.makeLogRecord({
+                'name': record.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"[dim]... {self.dropped} log lines dropped (console backlog)[/dim]",
+            })
+            try:
+                self.queue.put_nowait(notice)
+                self.dropped = 0
+            except queue.Full:
+                pass
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_history_logger(console=None):
+    """
+    Routes the 'history' logger through a queue drained by a background listener.
+    Uses a RichHandler when the console is an interactive terminal and a plain
+    StreamHandler otherwise, so piped or redirected output skips Rich rendering.
+    """
+    global _history_listener
+    if _history_listener is not None:
+        return _history_listener
+
+    if console is not None and console.is_terminal:
+        from rich.logging import RichHandler
+        handler = RichHandler(console=console, show_path=False, show_level=False, show_time=True, markup=True)
+    else:
+        handler = logging.StreamHandler(console.file if console is not None else None)
+        handler.setFormatter(PlainTextFormatter())
+
+    log_queue = queue.Queue(maxsize=HISTORY_QUEUE_SIZE)
+    for existing in list(history_logger.handlers):
+        history_logger.removeHandler(existing)
+    history_logger.addHandler(_DroppingQueueHandler(log_queue))
+    history_logger.setLevel(logging.INFO)
+    history_logger.propagate = False
+
+    _history_listener = QueueListener(log_queue, handler)
+    _history_listener.start()
+    atexit.register(stop_history_logger)
+    return _history_listener
+
+def stop_history_logger():
+    """Flushes pending aggregate summaries and stops the listener thread."""
+    global _history_listener
+    with _log_lock:
+        for action in list(_aggregate_state):
+            _flush_aggregate(action)
+    if _history_listener is not None:
+        _history_listener.stop()
+        _history_listener = None
+
+def _restart_history_logger_after_fork():
+    """The listener thread doesn't survive fork(); give the child a fresh queue and listener."""
+    global _history_listener, _log_lock
+    _log_lock = threading.Lock()
+    if _history_listener is None:
+        return
+    log_queue = queue.Queue(maxsize=HISTORY_QUEUE_SIZE)
+    for existing in history_logger.handlers:
+        if isinstance(existing, QueueHandler):
+            existing.queue = log_queue
+    _history_listener = QueueListener(log_queue, *_history_listener.handlers)
+    _history_listener.start()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_history_logger_after_fork)
+
+def _flush_aggregate(action):
+    """Emits the '+N more' line for an action's finished window. Caller holds _log_lock."""
+    state = _aggregate_state.pop(action, None)
+    if state and state[2]:
+        history_logger.info(f"{' ' * 21}[dim]... +{state[2]} more '{action}' in {AGGREGATE_WINDOW:.0f}s[/dim]")
+
+def _should_print(action):
+    """Rate-limits repetitive actions. Caller holds _log_lock."""
+    now = time.monotonic()
+    state = _aggregate_state.get(action)
+    if state is None or now - state[0] >= AGGREGATE_WINDOW:
+        _flush_aggregate(action)
+        _aggregate_state[action] = [now, 1, 0]
+        return True
+    if state[1] < AGGREGATE_BURST:
+        state[1] += 1
+        return True
+    state[2] += 1
+    return False
+
 def log_history(action, details):
     """
     Logs an action to the terminal history, adding a divider
     only when the action type changes.
     """
     global last_log_action
-    
+
     action_colors = {
         "File Uploaded": "green",
         "File Downloaded": "cyan",
@@ -30,14 +164,51 @@ def log_history(action, details):
         "Message Unpinned": "red",
         "IP Blocked": "red",
         "IP Unblocked": "green",
+        "IP Throttled": "yellow",
     }
     action_color = action_colors.get(action, "white")
 
-    if action != last_log_action:
-        if last_log_action is not None:
-            history_logger.info("[dim]----------------------------------------------------[/dim]")
-        last_log_action = action
-        
-    action_str = f"[{action_color}]{action}:[/]".ljust(32)
-    log_message = f"{action_str} {details}"
-    history_logger.info(log_message)
\ No newline at end of file
+    with _log_lock:
+        if action in AGGREGATED_ACTIONS and not _should_print(action):
+            return
+
+        if action != last_log_action:
+            if last_log_action is not None:
+                if last_log_action in _aggregate_state:
+                    _flush_aggregate(last_log_action)
+                history_logger.info("[dim]----------------------------------------------------[/dim]")
+            last_log_action = action
+
+        action_str = f"[{action_color}]{action}:[/]".ljust(32)
+        log_message = f"{action_str} {details}"
+        history_logger.info(log_message)
+
+def private_dir_beside(files_folder, dirname):
+    """
+    Where server-side data that must share a filesystem with files_folder lives:
+    <parent of files_folder>/<dirname>, so it is never served and renames or
+    hardlinks into it stay a single syscall. Falls back to <files_folder>/<dirname>
+    (a dotfolder the routes refuse to serve) when the parent is on another
+    filesystem or read-only. A folder left inside the share by an older version
+    is moved across.
+    """
+    files_folder = os.path.abspath(files_folder)
+    legacy = os.path.join(files_folder, dirname)
+    parent = os.path.dirname(files_folder)
+    try:
+        usable = parent != files_folder and os.access(parent, os.W_OK) \
+            and os.stat(parent).st_dev == os.stat(files_folder).st_dev
+    except OSError:
+        usable = False
+    if not usable:
+        return legacy
+    target = os.path.join(parent, dirname)
+    if os.path.isdir(legacy) and not os.path.lexists(target):
+        try:
+            os.rename(legacy, target)
+            logging.info(f"Moved {legacy} out of the share to {target}")
+        except OSError as e:
+            # Another worker may have just moved it; anything else leaves the old copy in place.
+            if os.path.isdir(legacy):
+                logging.error(f"Could not move {legacy} to {target}: {e}")
+    return target
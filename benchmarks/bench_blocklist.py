@@ -0,0 +1,127 @@
+"""
+bench_blocklist.py — BlocklistManager lookup benchmark
+
+Builds a blocklist of N rules (mixed IPv4/IPv6 hosts and CIDR ranges, some
+with an expiry), loads it through BlocklistManager and measures compile time
+and is_blocked() throughput for a mix of hits and misses. A naive linear scan
+over ip_network objects is timed on a small sample for comparison.
+
+Usage:
+    python benchmarks/bench_blocklist.py
+    python benchmarks/bench_blocklist.py --rules 100000 --lookups 200000 --json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+from ipaddress import IPv4Address, IPv6Address, ip_address, ip_network
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from backbone.blocklist_manager import BlocklistManager
+
+
+def make_rules(count, rng):
+    """Returns blocklist file entries: 60% v4 hosts, 20% v4 /24, 1% v4 /16, 15% v6 /64, rest v6 hosts."""
+    rules = set()
+    now = time.time()
+    while len(rules) < count:
+        roll = rng.random()
+        if roll < 0.60:
+            rule = str(IPv4Address(rng.getrandbits(32)))
+        elif roll < 0.80:
+            rule = f"{IPv4Address(rng.getrandbits(24) << 8)}/24"
+        elif roll < 0.81:
+            rule = f"{IPv4Address(rng.getrandbits(16) << 16)}/16"
+        elif roll < 0.96:
+            rule = f"{IPv6Address(rng.getrandbits(64) << 64)}/64"
+        else:
+            rule = str(IPv6Address(rng.getrandbits(128)))
+        rules.add(rule)
+    entries = []
+    for rule in rules:
+        # One rule in ten is a temporary ban that is still active.
+        entries.append({'rule': rule, 'expires': now + 3600} if rng.random() < 0.1 else rule)
+    return entries
+
+
+def make_queries(entries, count, rng):
+    """Half the queries fall inside a rule, half are random addresses."""
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            entry = rng.choice(entries)
+            network = ip_network(entry if isinstance(entry, str) else entry['rule'], strict=False)
+            offset = rng.getrandbits(network.max_prefixlen - network.prefixlen) if network.prefixlen < network.max_prefixlen else 0
+            queries.append(str(network.network_address + offset))
+        elif rng.random() < 0.8:
+            queries.append(str(IPv4Address(rng.getrandbits(32))))
+        else:
+            queries.append(str(IPv6Address(rng.getrandbits(128))))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    parser.add_argument('--naive-sample', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entries = make_rules(args.rules, rng)
+    queries = make_queries(entries, args.lookups, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'blocklist.json')
+        with open(path, 'w') as f:
+            json.dump(entries, f)
+
+        start = time.perf_counter()
+        manager = BlocklistManager(path)
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits = sum(1 for q in queries if manager.is_blocked(q))
+        lookup_seconds = time.perf_counter() - start
+
+        networks = [ip_network(e if isinstance(e, str) else e['rule'], strict=False) for e in entries]
+        sample = queries[:args.naive_sample]
+        start = time.perf_counter()
+        naive_hits = 0
+        for q in sample:
+            addr = ip_address(q)
+            naive_hits += any(addr in n for n in networks)
+        naive_seconds = time.perf_counter() - start
+        compiled_sample_hits = sum(1 for q in sample if manager.is_blocked(q))
+
+    results = {
+        'rules': len(manager.rules),
+        'prefix_lengths': {v: len(t) for v, t in manager._tables.items()},
+        'load_and_compile_ms': round(load_seconds * 1000, 1),
+        'lookups': len(queries),
+        'hits': hits,
+        'lookup_us_avg': round(lookup_seconds / len(queries) * 1e6, 3),
+        'lookups_per_sec': round(len(queries) / lookup_seconds),
+        'naive_lookup_us_avg': round(naive_seconds / len(sample) * 1e6, 1),
+        'naive_agrees': naive_hits == compiled_sample_hits,
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Rules loaded:          {results['rules']:,} ({results['load_and_compile_ms']} ms load + compile)")
+    print(f"Prefix tables:         IPv4 {results['prefix_lengths'][4]}, IPv6 {results['prefix_lengths'][6]}")
+    print(f"Compiled lookups:      {results['lookups']:,} in {lookup_seconds:.3f}s "
+          f"({results['lookup_us_avg']} us each, {results['lookups_per_sec']:,}/s, {hits:,} hits)")
+    print(f"Naive linear scan:     {results['naive_lookup_us_avg']} us each (sample of {len(sample)})")
+    print(f"Results agree:         {results['naive_agrees']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+bench_folder_tree.py — Folder picker tree benchmark
+
+Creates a nested tree of N folders (each holding a few files) and times
+FileManager.list_all_folders: the first, cold call; warm calls validated by
+directory mtime; warm calls trusted because a file watcher is running; and a
+single-level ?parent= style expansion. The original implementation
+(listdir + isdir over the whole tree on every call) is timed for comparison.
+
+Usage:
+    python benchmarks/bench_folder_tree.py
+    python benchmarks/bench_folder_tree.py --folders 20000 --json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from backbone.file_manager import FileManager
+
+
+def build_tree(root, folders, fanout, files_per_folder):
+    queue, made = [''], 0
+    while queue and made < folders:
+        parent = queue.pop(0)
+        for i in range(fanout):
+            if made >= folders: break
+            rel = f"{parent}/d{i}" if parent else f"d{made}"
+            os.makedirs(os.path.join(root, rel))
+            for f in range(files_per_folder):
+                open(os.path.join(root, rel, f"f{f}.txt"), 'w').close()
+            queue.append(rel)
+            made += 1
+
+
+def naive_walk(fm):
+    """The original list_all_folders: listdir + isdir for every entry, every call."""
+    folders = [{'path': '', 'name': 'Root'}]
+    def _walk(rel_path):
+        target_dir = fm._validate_subpath(rel_path)
+        for entry in sorted(os.listdir(target_dir), key=str.lower):
+            if entry.startswith('.'): continue
+            if os.path.isdir(os.path.join(target_dir, entry)):
+                child_rel = f"{rel_path}/{entry}" if rel_path else entry
+                folders.append({'path': child_rel, 'name': child_rel})
+                _walk(child_rel)
+    _walk('')
+    return folders
+
+
+class _RunningWatcher:
+    running = True
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--folders', type=int, default=5000)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--files', type=int, default=4, help='Files per folder.')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='snailsynk-tree-')
+    try:
+        files_dir, instance_dir = os.path.join(root, 'files'), os.path.join(root, 'instance')
+        os.makedirs(files_dir); os.makedirs(instance_dir)
+        build_tree(files_dir, args.folders, args.fanout, args.files)
+        fm = FileManager(files_dir, instance_dir)
+        results = {'naive_ms': timed(lambda: naive_walk(fm), 3)}
+        start = time.perf_counter(); count = len(fm.list_all_folders())
+        results['cold_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        results['warm_mtime_checked_ms'] = timed(fm.list_all_folders)
+        fm.attach_watcher(_RunningWatcher())
+        results['warm_watched_ms'] = timed(fm.list_all_folders)
+        results['expand_one_level_ms'] = timed(lambda: fm.list_all_folders('d0', max_depth=1, include_root=False))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    summary = {'folders': count - 1, 'results': results}
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{summary['folders']} folders")
+    for name, ms in results.items():
+        print(f"  {name:<24} {ms:>9} ms")
+
+
+if __name__ == '__main__':
+    main()
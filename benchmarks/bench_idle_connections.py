@@ -0,0 +1,246 @@
+"""
+bench_idle_connections.py — Memory per idle Socket.IO connection, caps and reaping
+
+Starts SnailSynk (gevent, HTTPS) in a throwaway HOME and opens N WebSocket
+connections to /socket.io/ (5000 by default), each offering permessage-deflate
+like a browser and completing the Socket.IO handshake. The connections then
+sit idle, answering Engine.IO pings, for a couple of ping cycles; the server's
+resident memory growth divided by the number of connections is the
+per-connection cost, checked against --budget-kb (the budget documented in
+the README).
+
+It also checks the connection supervisor:
+
+  - reaping: --silent extra connections never answer a ping and must be
+    dropped by the server within ping interval + ping timeout;
+  - cap: the server runs with SNAILSYNK_MAX_CONNECTIONS_PER_IP set to
+    N + silent; once the reaped connections are replaced, one more from the
+    same address must be refused.
+
+Linux only (reads VmRSS from /proc). Opening 5000 TLS connections takes a
+few minutes; the client raises its open-file limit as far as it can.
+
+Exits non-zero if a connection fails, the cap or the reaping check fails,
+or the memory per connection is over budget.
+
+Usage:
+    python benchmarks/bench_idle_connections.py
+    python benchmarks/bench_idle_connections.py --connections 1000 --budget-kb 128 --json
+"""
+
+import os
+import sys
+import ssl
+import json
+import time
+import queue
+import shutil
+import socket
+import argparse
+import resource
+import tempfile
+import selectors
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from wsproto import WSConnection, ConnectionType
+from wsproto.events import Request, AcceptConnection, RejectConnection, TextMessage, CloseConnection
+from wsproto.extensions import PerMessageDeflate
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_CONNECTIONS = 50
+PING_INTERVAL, PING_TIMEOUT = 10, 5
+
+CONTEXT = ssl.create_default_context()
+CONTEXT.check_hostname, CONTEXT.verify_mode = False, ssl.CERT_NONE
+
+
+class Client:
+    """One Socket.IO connection over a raw TLS socket; `silent` ones ignore pings."""
+    def __init__(self, port, silent=False):
+        self.silent, self.closed, self.deflate = silent, False, False
+        self.sock = CONTEXT.wrap_socket(socket.create_connection(('127.0.0.1', port), timeout=30))
+        self.ws = WSConnection(ConnectionType.CLIENT)
+        self.sock.sendall(self.ws.send(Request(host=f'127.0.0.1:{port}', target='/socket.io/?EIO=4&transport=websocket',
+                                               extensions=[PerMessageDeflate()])))
+        self.refusal = None
+        while True:
+            data = self.sock.recv(65536)
+            if not data: raise ConnectionError("closed during handshake")
+            self.ws.receive_data(data)
+            for event in self.ws.events():
+                if isinstance(event, AcceptConnection):
+                    self.deflate = bool(event.extensions)
+                elif isinstance(event, RejectConnection):
+                    raise ConnectionError(f"upgrade rejected ({event.status_code})")
+                elif isinstance(event, TextMessage):
+                    if event.data.startswith('0'):
+                        self.sock.sendall(self.ws.send(TextMessage('40')))
+                    elif event.data.startswith('40'):
+                        self.sock.setblocking(False)
+                        return
+                    elif event.data.startswith('44'):
+                        self.refusal = json.loads(event.data[2:]).get('message')
+                        self.sock.close()
+                        return
+
+    def pump(self):
+        """Handles whatever arrived; returns False once the server has closed the connection."""
+        try:
+            data = self.sock.recv(65536)
+        except (ssl.SSLWantReadError, BlockingIOError):
+            return True
+        except OSError:
+            data = b''
+        self.ws.receive_data(data or None)
+        for event in self.ws.events():
+            if isinstance(event, CloseConnection) or (isinstance(event, TextMessage) and event.data == '1'):
+                self.closed = True
+            elif isinstance(event, TextMessage) and event.data == '2' and not self.silent:
+                self.sock.sendall(self.ws.send(TextMessage('3')))
+        if not data: self.closed = True
+        return not self.closed
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'): return int(line.split()[1])
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=5000, help='Idle connections to hold open.')
+    parser.add_argument('--silent', type=int, default=20, help='Extra connections that stop answering pings.')
+    parser.add_argument('--budget-kb', type=float, default=128, help='Allowed server memory per idle connection.')
+    parser.add_argument('--concurrency', type=int, default=32, help='Connections opened in parallel.')
+    parser.add_argument('--port', type=int, default=9462)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+    say = (lambda *a: None) if args.json else (lambda *a: print(*a, flush=True))
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 2 * (args.connections + args.silent) + 256
+    if soft < wanted: resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+    home = tempfile.mkdtemp(prefix='snailsynk-idle-')
+    env = dict(os.environ, HOME=home, SNAILSYNK_INSTANCE_DIR=os.path.join(home, 'instance'),
+               SNAILSYNK_PORT=str(args.port), SNAILSYNK_ADMIN_USER='bench', SNAILSYNK_ADMIN_PASS='bench-password',
+               SNAILSYNK_MAX_CONNECTIONS_PER_IP=str(args.connections + args.silent),
+               SNAILSYNK_PING_INTERVAL=str(PING_INTERVAL), SNAILSYNK_PING_TIMEOUT=str(PING_TIMEOUT))
+    proc = subprocess.Popen([sys.executable, str(ROOT / 'SnailSynk.py')], cwd=home, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sel = selectors.DefaultSelector()
+    opened, clients, failures = queue.Queue(), [], []
+
+    def pump(seconds):
+        end = time.monotonic() + seconds
+        while True:
+            while not opened.empty():
+                client = opened.get()
+                clients.append(client)
+                sel.register(client.sock, selectors.EVENT_READ, client)
+            remaining = end - time.monotonic()
+            if remaining <= 0: return
+            for key, _ in sel.select(min(remaining, 0.2)):
+                if not key.data.pump(): sel.unregister(key.fileobj)
+
+    def open_clients(count, silent=False):
+        errors = []
+        def _open(_):
+            try:
+                client = Client(args.port, silent)
+            except (OSError, ConnectionError) as e:
+                errors.append(str(e))
+                return
+            if client.refusal: errors.append(f"refused: {client.refusal}")
+            else: opened.put(client)
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            done = threading.Event()
+            threading.Thread(target=lambda: (list(pool.map(_open, range(count))), done.set()), daemon=True).start()
+            while not done.is_set(): pump(0.2)
+        pump(0.5)
+        if errors: failures.append(f"{len(errors)} connections failed, e.g. {errors[0]}")
+
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', args.port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or proc.poll() is not None: raise RuntimeError("Server did not come up.")
+                time.sleep(0.3)
+        time.sleep(2)
+
+        open_clients(BASELINE_CONNECTIONS)
+        pump(PING_INTERVAL + 2)
+        base_rss = rss_kb(proc.pid)
+        say(f"{BASELINE_CONNECTIONS} connections, server RSS {base_rss / 1024:.1f} MB")
+
+        start = time.monotonic()
+        open_clients(args.connections - BASELINE_CONNECTIONS)
+        open_seconds = time.monotonic() - start
+        say(f"opened {args.connections} connections in {open_seconds:.0f}s")
+        open_clients(args.silent, silent=True)
+
+        # Two ping cycles: every connection has been pinged, silent ones have timed out.
+        pump(2 * (PING_INTERVAL + PING_TIMEOUT) + 5)
+        idle_rss = rss_kb(proc.pid)
+        alive = sum(1 for c in clients if not c.silent and not c.closed)
+        silent_left = sum(1 for c in clients if c.silent and not c.closed)
+        deflate = sum(1 for c in clients if c.deflate)
+
+        # Reaping freed the silent connections' share of the cap: refill it, then go one over.
+        open_clients(args.silent)
+        extra = Client(args.port)
+        refusal = extra.refusal
+        if not refusal: extra.sock.close()
+
+        per_connection = (idle_rss - base_rss) / max(1, args.connections - BASELINE_CONNECTIONS)
+        if alive != args.connections:
+            failures.append(f"{args.connections - alive} idle connections were dropped")
+        if silent_left:
+            failures.append(f"{silent_left} silent connections were not reaped")
+        if not refusal:
+            failures.append("a connection over the per-IP cap was accepted")
+        if per_connection > args.budget_kb:
+            failures.append(f"{per_connection:.1f} KB per connection is over the {args.budget_kb:g} KB budget")
+    finally:
+        for client in clients:
+            try: client.sock.close()
+            except OSError: pass
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(home, ignore_errors=True)
+
+    result = {
+        'connections': args.connections, 'alive': alive, 'deflate_negotiated': deflate,
+        'open_seconds': round(open_seconds, 1),
+        'baseline_rss_kb': base_rss, 'idle_rss_kb': idle_rss,
+        'per_connection_kb': round(per_connection, 1), 'budget_kb': args.budget_kb,
+        'silent': args.silent, 'silent_reaped': args.silent - silent_left,
+        'cap_refusal': refusal, 'failures': failures,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"  {alive}/{args.connections} idle connections alive ({deflate} with permessage-deflate)")
+        print(f"  server RSS {idle_rss / 1024:.1f} MB: {result['per_connection_kb']} KB per connection "
+              f"(budget {args.budget_kb:g} KB)")
+        print(f"  silent connections reaped: {result['silent_reaped']}/{args.silent}")
+        print(f"  connection over the per-IP cap: {'refused (' + refusal + ')' if refusal else 'accepted'}")
+        for failure in failures:
+            print(f"  FAIL {failure}")
+        print("OK" if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+"""
+bench_load.py — Mixed-workload load test with comparable JSON results
+
+Starts SnailSynk in a throwaway HOME on a synthetic share tree (--files spread
+over a folder tree --depth levels deep with --fanout subfolders per folder;
+every tenth file is an image), then runs concurrent HTTPS clients for a fixed
+time. Each request is drawn from a weighted mix:
+
+  list      GET  /api/files/list for a random folder
+  download  GET  /files/<path> for a random file
+  upload    POST /upload of --upload-kb random bytes into a random folder
+  zip       POST /api/folder/download of a leaf folder
+  preview   GET  /api/preview/<path> for a random image
+  text      POST /api/shared-text with a one-character edit
+
+Meanwhile --listeners Socket.IO clients stay connected and time how long each
+shared-text edit takes to reach them (fan-out latency).
+
+Reports, per operation and in total, request count, errors, throughput and
+p50/p95/p99 latency, plus the Socket.IO delivery latency and the server's peak
+resident memory (all worker processes summed). --output saves the JSON;
+--compare prints the change against a saved run. Run both on the same
+machine with the same arguments for the numbers to be comparable.
+
+Linux only (reads RSS from /proc). Exits non-zero if the server dies, more
+than --max-error-rate of requests fail, or, with --compare and
+--max-regression, an operation's p95 got slower by more than that many
+percent.
+
+Usage:
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --files 5000 --depth 4 --clients 16 --duration 30 --output before.json
+    python benchmarks/bench_load.py --mix list=60,download=30,text=10 --compare before.json --max-regression 15
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from pathlib import Path
+from urllib.parse import quote
+from datetime import datetime, timezone
+
+import requests
+import socketio
+import urllib3
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MIX = 'list=35,download=25,upload=10,zip=5,preview=10,text=15'
+OPERATIONS = ('list', 'download', 'upload', 'zip', 'preview', 'text')
+IMAGE_EVERY = 10
+SAMPLE_INTERVAL = 0.25
+
+
+# --- Share tree ---
+def build_tree(files_dir, files, depth, fanout, file_kb):
+    """Creates the folder tree and files. Returns {'folders', 'leaves', 'files', 'images'} as paths relative to files_dir."""
+    rng = random.Random(50)
+    folders, level = [''], ['']
+    for d in range(depth):
+        level = [f"{parent}/dir_{d}_{i}".lstrip('/') for parent in level for i in range(fanout)]
+        folders.extend(level)
+    for folder in folders[1:]:
+        os.makedirs(os.path.join(files_dir, folder), exist_ok=True)
+    paths, images = [], []
+    for i in range(files):
+        folder = folders[i % len(folders)]
+        image = i % IMAGE_EVERY == 0
+        name = f"file_{i:06d}.{'png' if image else 'bin'}"
+        rel = f"{folder}/{name}" if folder else name
+        with open(os.path.join(files_dir, rel), 'wb') as f:
+            f.write(rng.randbytes(rng.randint(1, max(1, file_kb)) * 1024))
+        (images if image else paths).append(rel)
+    return {'folders': folders, 'leaves': level if depth else [], 'files': paths, 'images': images}
+
+
+# --- Server ---
+def start_server(home, port, workers):
+    env = dict(os.environ, HOME=home, SNAILSYNK_INSTANCE_DIR=os.path.join(home, 'instance'),
+               SNAILSYNK_PORT=str(port), SNAILSYNK_WORKERS=str(workers),
+               SNAILSYNK_ADMIN_USER='bench', SNAILSYNK_ADMIN_PASS='bench-password',
+               SNAILSYNK_FS_WATCH='off', SNAILSYNK_MAX_CONNECTIONS_PER_IP='0')
+    proc = subprocess.Popen([sys.executable, str(ROOT / 'SnailSynk.py')], cwd=home, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 90
+    while time.monotonic() < deadline:
+        if proc.poll() is not None: break
+        try:
+            _session().get(f"https://127.0.0.1:{port}/api/shared-text", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.3)
+    proc.kill()
+    raise RuntimeError("Server did not come up.")
+
+
+def tree_rss_kb(pid):
+    """Resident memory of pid and its descendants (the supervisor and its workers)."""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next((int(line.split()[1]) for line in f if line.startswith('VmRSS:')), 0)
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid, self.peak, self.stopped = pid, 0, threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, tree_rss_kb(self.pid))
+
+
+# --- Clients ---
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS: raise ValueError(f"Unknown operation '{name}' (expected one of {', '.join(OPERATIONS)}).")
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def _session():
+    # The server's certificate is self-signed. trust_env is off because a REQUESTS_CA_BUNDLE in the
+    # environment would otherwise turn verification back on.
+    session = requests.Session()
+    session.verify, session.trust_env = False, False
+    return session
+
+
+def _request(session, base, op, tree, rng, upload_kb, state):
+    """Runs one operation. Returns (ok, bytes transferred)."""
+    if op == 'list':
+        r = session.get(f"{base}/api/files/list", params={'path': rng.choice(tree['folders'])})
+    elif op == 'download':
+        r = session.get(f"{base}/files/{quote(rng.choice(tree['files']))}")
+    elif op == 'preview':
+        r = session.get(f"{base}/api/preview/{quote(rng.choice(tree['images']))}")
+    elif op == 'upload':
+        payload = rng.randbytes(upload_kb * 1024)
+        r = session.post(f"{base}/upload", data={'subpath': rng.choice(tree['folders'])},
+                         files={'file': (f"upload_{rng.getrandbits(48):012x}.bin", payload)})
+        return r.status_code == 200 and r.json().get('success', False), len(payload)
+    elif op == 'zip':
+        parent, _, name = rng.choice(tree['leaves']).rpartition('/')
+        r = session.post(f"{base}/api/folder/download", json={'path': parent, 'folder_name': name})
+    elif op == 'text':
+        # A stale version is transformed server-side; only a very stale one (409) needs a resync.
+        r = session.post(f"{base}/api/shared-text",
+                         json={'op': ['x'], 'version': state['version'], 'client_id': f"bench:{time.time()!r}"})
+        if r.status_code == 409:
+            state['version'] = session.get(f"{base}/api/shared-text").json()['version']
+        elif r.status_code == 200:
+            state['version'] = r.json()['version']
+    return r.status_code == 200, len(r.content)
+
+
+def client_loop(args):
+    base, duration, mix, tree, upload_kb, seed = args
+    urllib3.disable_warnings()
+    rng = random.Random(seed)
+    session = _session()
+    names, weights = list(mix), list(mix.values())
+    state = {'version': 0}
+    samples = {op: [] for op in names}
+    errors = {op: 0 for op in names}
+    transferred = {op: 0 for op in names}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        op = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            ok, size = _request(session, base, op, tree, rng, upload_kb, state)
+        except (requests.RequestException, ValueError):
+            ok, size = False, 0
+            session = _session()
+        samples[op].append(time.perf_counter() - start)
+        transferred[op] += size
+        if not ok: errors[op] += 1
+    return samples, errors, transferred
+
+
+def run_load(base, clients, duration, mix, tree, upload_kb):
+    jobs = [(base, duration, mix, tree, upload_kb, seed) for seed in range(clients)]
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client_loop, jobs)
+    merged = {op: {'samples': [], 'errors': 0, 'bytes': 0} for op in mix}
+    for samples, errors, transferred in results:
+        for op in mix:
+            merged[op]['samples'].extend(samples[op])
+            merged[op]['errors'] += errors[op]
+            merged[op]['bytes'] += transferred[op]
+    return merged
+
+
+def percentiles(values, scale=1000):
+    values = sorted(values)
+    pct = lambda p: round(values[min(len(values) - 1, int(len(values) * p))] * scale, 2) if values else 0
+    return {'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99), 'max': round(values[-1] * scale, 2) if values else 0}
+
+
+class Listener:
+    """A Socket.IO client that timestamps every shared-text edit it receives."""
+    def __init__(self, base, transports):
+        self.delays, self.received = [], 0
+        self.recording = False
+        self.client = socketio.Client(ssl_verify=False, reconnection=False, http_session=_session())
+        self.client.on('text_delta', self._on_delta)
+        self.client.connect(base, transports=transports, wait_timeout=10)
+
+    def _on_delta(self, delta):
+        if not self.recording: return
+        self.received += 1
+        client_id = str(delta.get('client_id') or '')
+        if client_id.startswith('bench:'):
+            self.delays.append(time.time() - float(client_id[6:]))
+
+
+def compare(result, baseline):
+    """Per-operation change against a saved run: {op: {'p95_pct', 'rps_pct'}}."""
+    change = {}
+    pct = lambda new, old: round((new - old) / old * 100, 1) if old else None
+    for op, now in result['operations'].items():
+        before = baseline.get('operations', {}).get(op)
+        if not before: continue
+        change[op] = {'p95_pct': pct(now['latency_ms']['p95'], before['latency_ms']['p95']),
+                      'rps_pct': pct(now['rps'], before['rps'])}
+    change['peak_rss_pct'] = pct(result['peak_rss_kb'], baseline.get('peak_rss_kb', 0))
+    return change
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=2000, help='Files in the synthetic share tree.')
+    parser.add_argument('--depth', type=int, default=3, help='Folder levels below the share root.')
+    parser.add_argument('--fanout', type=int, default=3, help='Subfolders per folder.')
+    parser.add_argument('--file-kb', type=int, default=64, help='Largest seeded file; sizes are uniform from 1 KB.')
+    parser.add_argument('--upload-kb', type=int, default=256, help='Size of each uploaded file.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default {DEFAULT_MIX}).')
+    parser.add_argument('--clients', type=int, default=max(4, (os.cpu_count() or 1) * 2), help='Concurrent HTTP clients.')
+    parser.add_argument('--listeners', type=int, default=20, help='Socket.IO clients receiving shared-text edits.')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of measured load.')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of unmeasured load first.')
+    parser.add_argument('--workers', type=int, default=1, help='SNAILSYNK_WORKERS for the server.')
+    parser.add_argument('--port', type=int, default=9480)
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Allowed share of failed requests.')
+    parser.add_argument('--output', help='Also write the JSON result to this file.')
+    parser.add_argument('--compare', help='A saved result to compare against.')
+    parser.add_argument('--max-regression', type=float, help='With --compare: fail if any p95 is this many percent slower.')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+    say = (lambda *a: None) if args.json else (lambda *a: print(*a, flush=True))
+    urllib3.disable_warnings()
+    mix = parse_mix(args.mix)
+    if 'zip' in mix and args.depth < 1: parser.error("the zip operation needs --depth 1 or more")
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+
+    home = tempfile.mkdtemp(prefix='snailsynk-load-')
+    base = f"https://127.0.0.1:{args.port}"
+    listeners, failures = [], []
+    try:
+        files_dir = Path(home) / "Downloads" / "SnailSynk" / "files"
+        files_dir.mkdir(parents=True)
+        started = time.monotonic()
+        tree = build_tree(files_dir, args.files, args.depth, args.fanout, args.file_kb)
+        if not tree['images'] and 'preview' in mix: parser.error("the preview operation needs --files 1 or more")
+        say(f"share tree: {args.files} files in {len(tree['folders'])} folders ({time.monotonic() - started:.1f}s)")
+
+        proc = start_server(home, args.port, args.workers)
+        sampler = RSSSampler(proc.pid)
+        sampler.start()
+        try:
+            idle_rss = tree_rss_kb(proc.pid)
+            # Multi-worker servers only offer WebSocket transport (no sticky sessions for polling).
+            transports = ['websocket'] if args.workers > 1 else ['polling', 'websocket']
+            listeners = [Listener(base, transports) for _ in range(args.listeners)]
+            if args.warmup > 0:
+                run_load(base, args.clients, args.warmup, mix, tree, args.upload_kb)
+            time.sleep(0.5)
+            for listener in listeners: listener.recording = True
+            merged = run_load(base, args.clients, args.duration, mix, tree, args.upload_kb)
+            time.sleep(1)  # let the last edits arrive
+            for listener in listeners: listener.recording = False
+            if proc.poll() is not None: failures.append(f"server exited with code {proc.returncode}")
+        finally:
+            sampler.stopped.set()
+            for listener in listeners:
+                try: listener.client.disconnect()
+                except Exception: pass
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    operations, total, total_errors = {}, 0, 0
+    for op, data in merged.items():
+        count = len(data['samples'])
+        total, total_errors = total + count, total_errors + data['errors']
+        operations[op] = {'requests': count, 'errors': data['errors'], 'rps': round(count / args.duration, 1),
+                          'mb_per_s': round(data['bytes'] / args.duration / 1e6, 2),
+                          'latency_ms': percentiles(data['samples'])}
+    commits = operations.get('text', {}).get('requests', 0) - operations.get('text', {}).get('errors', 0)
+    delays = [d for listener in listeners for d in listener.delays]
+    result = {
+        'meta': {'timestamp': datetime.now(timezone.utc).isoformat(), 'revision': git_revision(),
+                 'python': platform.python_version(), 'cpu_count': os.cpu_count(),
+                 'args': {k: v for k, v in vars(args).items() if k not in ('json', 'output', 'compare')}},
+        'operations': operations,
+        'total': {'requests': total, 'errors': total_errors, 'rps': round(total / args.duration, 1)},
+        'socketio': {'listeners': len(listeners), 'commits': commits,
+                     'deliveries_expected': commits * len(listeners),
+                     'deliveries_received': sum(listener.received for listener in listeners),
+                     'delivery_ms': percentiles(delays)},
+        'idle_rss_kb': idle_rss,
+        'peak_rss_kb': max(sampler.peak, idle_rss),
+    }
+    if total and total_errors / total > args.max_error_rate:
+        failures.append(f"{total_errors} of {total} requests failed")
+    if baseline:
+        result['compare'] = {'baseline': baseline.get('meta', {}).get('revision'), 'change': compare(result, baseline)}
+        if args.max_regression is not None:
+            for op, change in result['compare']['change'].items():
+                if isinstance(change, dict) and (change['p95_pct'] or 0) > args.max_regression:
+                    failures.append(f"{op} p95 is {change['p95_pct']}% slower than the baseline")
+    result['failures'] = failures
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{'operation':<10} {'requests':>9} {'errors':>7} {'req/s':>8} {'MB/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for op, row in operations.items():
+            lat = row['latency_ms']
+            print(f"{op:<10} {row['requests']:>9} {row['errors']:>7} {row['rps']:>8} {row['mb_per_s']:>7} "
+                  f"{lat['p50']:>8} {lat['p95']:>8} {lat['p99']:>8}")
+        print(f"{'total':<10} {total:>9} {total_errors:>7} {result['total']['rps']:>8}")
+        sio = result['socketio']
+        print(f"Socket.IO fan-out: {sio['deliveries_received']}/{sio['deliveries_expected']} edits delivered to "
+              f"{sio['listeners']} listeners, p50 {sio['delivery_ms']['p50']} ms, p95 {sio['delivery_ms']['p95']} ms, "
+              f"p99 {sio['delivery_ms']['p99']} ms")
+        print(f"server RSS: {idle_rss / 1024:.1f} MB idle, {result['peak_rss_kb'] / 1024:.1f} MB peak")
+        if baseline:
+            print(f"vs {args.compare}:")
+            for op, change in result['compare']['change'].items():
+                if isinstance(change, dict):
+                    print(f"  {op:<10} p95 {change['p95_pct']:+}%  req/s {change['rps_pct']:+}%"
+                          if change['p95_pct'] is not None and change['rps_pct'] is not None else f"  {op:<10} n/a")
+            if result['compare']['change']['peak_rss_pct'] is not None:
+                print(f"  peak RSS {result['compare']['change']['peak_rss_pct']:+}%")
+        for failure in failures:
+            print(f"  FAIL {failure}")
+        print("OK" if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+bench_metadata_prefix.py — Metadata subtree lookup benchmark and deep-tree check
+
+Fills file_metadata.json with N keys (locks and favorites) spread over a
+deep folder tree, then:
+
+  - times FileManager._keys_under, the sorted-index range scan behind folder
+    rename, move and delete, against the original pass over every key;
+  - times whole-subtree operations (rename_folder, move_path, delete to the
+    trash and restore) on that tree;
+  - checks after each one that every metadata key followed its file: locks
+    and favorites are found at the new paths, none are left at the old ones,
+    and the index agrees with a full scan.
+
+Exits non-zero if any check fails.
+
+Usage:
+    python benchmarks/bench_metadata_prefix.py
+    python benchmarks/bench_metadata_prefix.py --keys 50000 --depth 12 --json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from backbone.file_manager import FileManager
+from backbone.trash import Trash
+
+
+def key_under(key, prefix):
+    """The original per-key test, used for the baseline scan and as the oracle."""
+    if key.startswith('folder:'): key = key[len('folder:'):]
+    return key == prefix or key.startswith(prefix + '/')
+
+
+def build(files_dir, fm, keys, depth, fanout):
+    """A chain of `depth` nested folders per branch, with files whose metadata keys fill up to `keys`."""
+    branches, leaves = max(1, keys // (depth * 4)), []
+    for b in range(branches):
+        path = f"b{b % fanout}/t{b}"
+        for level in range(depth):
+            path = f"{path}/l{level}"
+            leaves.append(path)
+    for rel in leaves:
+        os.makedirs(os.path.join(files_dir, rel), exist_ok=True)
+    metadata = {}
+    per_folder = max(1, keys // len(leaves))
+    for rel in leaves:
+        for i in range(per_folder):
+            name = f"{rel}/f{i}.txt"
+            Path(files_dir, name).write_text(name)
+            metadata[name] = {'password_hash': 'x'} if i % 2 else {'favorite': True}
+        metadata[f"folder:{rel}"] = {'locked': True, 'password_hash': 'x'}
+    with fm._metadata_transaction() as md:
+        md.update(metadata)
+    return leaves
+
+
+def check_subtree(fm, files_dir, old_prefix, new_prefix, expected):
+    """expected: {key relative to the subtree: entry} taken before the operation."""
+    failures = []
+    metadata = fm.metadata
+    leftover = [k for k in metadata if key_under(k, old_prefix)] if old_prefix != new_prefix else []
+    if leftover:
+        failures.append(f"{len(leftover)} keys left under {old_prefix}")
+    for suffix, entry in expected.items():
+        tag, rest = suffix
+        key = f"{tag}{new_prefix}{rest}"
+        if metadata.get(key) != entry:
+            failures.append(f"metadata lost for {key}")
+            break
+    indexed = sorted(fm._keys_under(new_prefix)) if new_prefix else []
+    scanned = sorted(k for k in metadata if key_under(k, new_prefix)) if new_prefix else []
+    if indexed != scanned:
+        failures.append(f"index disagrees with a full scan under {new_prefix}")
+    return failures
+
+
+def snapshot_subtree(fm, prefix):
+    out = {}
+    for key, entry in fm.metadata.items():
+        if key_under(key, prefix):
+            tag = 'folder:' if key.startswith('folder:') else ''
+            out[(tag, key[len(tag) + len(prefix):])] = entry
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=20000, help='Metadata entries to create.')
+    parser.add_argument('--depth', type=int, default=10, help='Nesting depth of each branch.')
+    parser.add_argument('--fanout', type=int, default=8, help='Top-level folders.')
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='snailsynk-metaprefix-')
+    failures, timings = [], {}
+    try:
+        files_dir, instance_dir = os.path.join(root, 'files'), os.path.join(root, 'instance')
+        os.makedirs(files_dir)
+        os.makedirs(instance_dir)
+        fm = FileManager(files_dir, instance_dir, trash=Trash(os.path.join(root, 'trash'), os.path.join(instance_dir, 'trash.json')))
+        leaves = build(files_dir, fm, args.keys, args.depth, args.fanout)
+        total_keys = len(fm.metadata)
+        probes = [leaves[(i * 7919) % len(leaves)].rsplit('/', 1 + (i % 3))[0] for i in range(args.lookups)]
+
+        start = time.perf_counter()
+        for prefix in probes:
+            [k for k in fm.metadata if key_under(k, prefix)]
+        timings['scan_lookup_us'] = round((time.perf_counter() - start) / len(probes) * 1e6, 1)
+        fm._keys_under(probes[0])  # build the index once
+        start = time.perf_counter()
+        for prefix in probes:
+            fm._keys_under(prefix)
+        timings['index_lookup_us'] = round((time.perf_counter() - start) / len(probes) * 1e6, 1)
+        for prefix in probes[:50]:
+            if sorted(fm._keys_under(prefix)) != sorted(k for k in fm.metadata if key_under(k, prefix)):
+                failures.append(f"index lookup wrong for {prefix}")
+
+        # Rename a whole branch.
+        old = leaves[0].split('/l0')[0]
+        new_name = 'renamed'
+        expected = snapshot_subtree(fm, old)
+        start = time.perf_counter()
+        ok, message = fm.rename_folder(old.rsplit('/', 1)[0], old.rsplit('/', 1)[1], new_name, '127.0.0.1')
+        timings['rename_folder_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        new = f"{old.rsplit('/', 1)[0]}/{new_name}"
+        failures += [] if ok else [f"rename_folder failed: {message}"]
+        failures += check_subtree(fm, files_dir, old, new, expected)
+
+        # Move a deep subtree into another top-level folder.
+        old, dest = f"{new}/l0/l1", 'b1'
+        expected = snapshot_subtree(fm, old)
+        start = time.perf_counter()
+        fm.move_path(old, f"{dest}/l1", '127.0.0.1')
+        timings['move_path_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        failures += check_subtree(fm, files_dir, old, f"{dest}/l1", expected)
+
+        # Delete to the trash and restore.
+        old = f"{dest}/l1"
+        expected = snapshot_subtree(fm, old)
+        start = time.perf_counter()
+        ok, message = fm.delete_folder(dest, 'l1', '127.0.0.1')
+        timings['delete_folder_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        failures += [] if ok else [f"delete_folder failed: {message}"]
+        if [k for k in fm.metadata if key_under(k, old)] or fm._keys_under(old):
+            failures.append("metadata left behind after delete")
+        entry_id = fm.trash.list_entries()[0]['id']
+        start = time.perf_counter()
+        ok, message, restored = fm.restore_from_trash(entry_id, '127.0.0.1')
+        timings['restore_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        failures += [] if ok else [f"restore failed: {message}"]
+        failures += check_subtree(fm, files_dir, old, restored or old, expected)
+
+        if len(fm.metadata) != total_keys:
+            failures.append(f"key count changed: {total_keys} -> {len(fm.metadata)}")
+        with open(fm.metadata_path) as f:
+            if json.load(f) != fm.metadata:
+                failures.append("file_metadata.json differs from the in-memory snapshot")
+        for key in fm.metadata:
+            path = key[len('folder:'):] if key.startswith('folder:') else key
+            if not os.path.exists(os.path.join(files_dir, path)):
+                failures.append(f"metadata key for missing path: {key}")
+                break
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    result = {'keys': total_keys, 'depth': args.depth, 'lookups': len(probes), **timings, 'failures': failures}
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{total_keys} metadata keys, depth {args.depth}")
+        print(f"  subtree lookup: scan {timings['scan_lookup_us']} us, sorted index {timings['index_lookup_us']} us")
+        print(f"  rename_folder {timings['rename_folder_ms']} ms, move_path {timings['move_path_ms']} ms, "
+              f"delete {timings['delete_folder_ms']} ms, restore {timings['restore_ms']} ms")
+        for failure in failures[:20]:
+            print(f"  FAIL {failure}")
+        print("OK: metadata followed every subtree operation" if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+bench_search.py — SearchIndex query latency benchmark
+
+Fills a SearchIndex with N synthetic entries (camera dumps, documents,
+nested project folders) without touching the disk, then times prefix,
+substring, fuzzy and filtered queries the way /api/files/search issues them.
+Also times a reconcile of a small real tree to show incremental cost.
+
+Usage:
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --entries 500000 --queries 200 --json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from backbone.search_index import SearchIndex, FTS5_AVAILABLE
+
+WORDS = ['holiday', 'paris', 'report', 'invoice', 'budget', 'meeting', 'notes', 'draft', 'final', 'scan',
+         'receipt', 'family', 'birthday', 'project', 'design', 'backup', 'export', 'summary', 'lecture',
+         'slides', 'contract', 'photo', 'video', 'music', 'podcast', 'thesis', 'chapter', 'resume', 'garden']
+EXTS = ['.jpg', '.png', '.pdf', '.docx', '.txt', '.mp4', '.mp3', '.zip', '.csv', '.md']
+
+
+def synthetic_rows(count, rng):
+    rows, folders = [], ['']
+    now = time.time()
+    while len(rows) < count:
+        parent = rng.choice(folders)
+        if rng.random() < 0.02:
+            name = f"{rng.choice(WORDS)}_{rng.randrange(1000)}"
+            path = f"{parent}/{name}" if parent else name
+            folders.append(path)
+            rows.append((path, name, name.lower(), parent, 'folder', '', 0, now - rng.randrange(10 ** 8)))
+            continue
+        roll = rng.random()
+        if roll < 0.4:
+            name = f"IMG_{rng.randrange(2015, 2026)}{rng.randrange(1, 13):02d}{rng.randrange(1, 29):02d}_{rng.randrange(10 ** 6):06d}.jpg"
+        else:
+            name = '_'.join(rng.choice(WORDS) for _ in range(rng.randrange(1, 4))) + f"-{rng.randrange(100)}" + rng.choice(EXTS)
+        path = f"{parent}/{name}" if parent else name
+        rows.append((path, name, name.lower(), parent, 'file', os.path.splitext(name)[1],
+                     rng.randrange(10 ** 8), now - rng.randrange(10 ** 8)))
+    return rows
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {'p50_ms': round(samples[len(samples) // 2], 2), 'p95_ms': round(samples[int(len(samples) * 0.95)], 2),
+            'max_ms': round(samples[-1], 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=500000)
+    parser.add_argument('--queries', type=int, default=100, help='Repetitions per query type.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix='snailsynk-search-')
+    try:
+        files_dir = os.path.join(workdir, 'files')
+        os.makedirs(files_dir)
+        index = SearchIndex(files_dir, os.path.join(workdir, 'search.db'))
+        conn = index._conn()
+        start = time.perf_counter()
+        rows = synthetic_rows(args.entries, rng)
+        for i in range(0, len(rows), 5000):
+            with conn:
+                index._upsert(conn, rows[i:i + 5000])
+        build_s = time.perf_counter() - start
+
+        queries = {
+            'prefix': lambda: index.search(rng.choice(WORDS)[:4], match='prefix'),
+            'substring': lambda: index.search(rng.choice(WORDS)[1:6], match='substring'),
+            'fuzzy': lambda: index.search(rng.choice(['holliday', 'reciept', 'buget', 'invioce', 'birthdya']), match='fuzzy'),
+            'auto': lambda: index.search(rng.choice(WORDS)[:5]),
+            'filtered': lambda: index.search('img_2021', kind='file', extensions=['jpg'],
+                                             min_size=10 ** 6, modified_after=time.time() - 10 ** 7),
+            'recent_no_query': lambda: index.search('', extensions=['pdf']),
+        }
+        results = {name: timed(fn, args.queries) for name, fn in queries.items()}
+
+        # Incremental cost on a real tree: 2000 files, then one changed file.
+        for d in range(20):
+            os.makedirs(os.path.join(files_dir, f"dir{d}"))
+            for f in range(100):
+                Path(files_dir, f"dir{d}", f"file{f}.txt").write_text('x')
+        small = SearchIndex(files_dir, os.path.join(workdir, 'small.db'))
+        start = time.perf_counter(); small.reconcile(); full_ms = (time.perf_counter() - start) * 1000
+        Path(files_dir, 'dir3', 'file7.txt').write_text('changed')
+        start = time.perf_counter(); small.sync_paths('dir3/file7.txt'); sync_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter(); small.reconcile(); noop_ms = (time.perf_counter() - start) * 1000
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = {'entries': args.entries, 'fts5': FTS5_AVAILABLE, 'build_s': round(build_s, 1), 'queries': results,
+               'real_tree': {'files': 2000, 'initial_reconcile_ms': round(full_ms, 1),
+                             'sync_one_path_ms': round(sync_ms, 2), 'noop_reconcile_ms': round(noop_ms, 1)}}
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{args.entries} entries indexed in {summary['build_s']}s (fts5={FTS5_AVAILABLE})")
+    for name, r in results.items():
+        print(f"  {name:<16} p50 {r['p50_ms']:>7} ms  p95 {r['p95_ms']:>7} ms  max {r['max_ms']:>7} ms")
+    rt = summary['real_tree']
+    print(f"2000-file tree: initial reconcile {rt['initial_reconcile_ms']} ms, one-path sync "
+          f"{rt['sync_one_path_ms']} ms, no-op reconcile {rt['noop_reconcile_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+bench_socketio_payloads.py — Bytes on the wire for Socket.IO folder listings
+
+Builds a throwaway folder with N entries (5000 by default; a mix of files and
+folders, some locked or favorited), lists it with FileManager and encodes the
+'file_list_updated' event twice:
+
+  - legacy: one JSON object per entry, as sent before the columnar format;
+  - columnar: backbone.listing_codec.pack_listing.
+
+For each it reports the Socket.IO text frame size, and the size after
+permessage-deflate (raw DEFLATE per message with no context takeover, the
+worst case a browser negotiates). It also checks that unpack_listing gives
+back the original listing.
+
+With --probe it starts SnailSynk in a throwaway HOME, opens a WebSocket to
+/socket.io/ offering permessage-deflate and reports whether the server
+accepted it.
+
+Exits non-zero if the round trip fails or the probe finds no deflate.
+
+Usage:
+    python benchmarks/bench_socketio_payloads.py
+    python benchmarks/bench_socketio_payloads.py --entries 20000 --probe --json
+"""
+
+import os
+import sys
+import ssl
+import json
+import time
+import zlib
+import base64
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from socketio import packet
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from backbone.file_manager import FileManager
+from backbone.listing_codec import pack_listing, unpack_listing
+
+
+def build(files_dir, fm, entries):
+    rng = random.Random(46)
+    words = ['report', 'IMG', 'backup', 'notes', 'scan', 'invoice', 'draft', 'final', 'video', 'log']
+    for i in range(entries):
+        name = f"{rng.choice(words)}_{i:05d} {rng.choice(words)}"
+        if i % 10 == 0:
+            os.mkdir(os.path.join(files_dir, name))
+        else:
+            name += rng.choice(['.jpg', '.pdf', '.txt', '.mp4', '.tar.gz'])
+            with open(os.path.join(files_dir, name), 'wb') as f:
+                f.write(b'x' * rng.randint(0, 4096))
+        if i % 7 == 0: fm.toggle_favorite(name)
+    with fm._metadata_transaction() as md:  # locks without paying for password hashing
+        for name in sorted(os.listdir(files_dir))[::13]:
+            key = f"folder:{name}" if os.path.isdir(os.path.join(files_dir, name)) else name
+            md[key] = {**md.get(key, {}), 'locked': True, 'password_hash': 'x'}
+
+
+def frame(event, payload):
+    """The Socket.IO packet as it travels in a WebSocket text frame."""
+    return ('4' + packet.Packet(packet.EVENT, data=[event, payload]).encode()).encode('utf-8')
+
+
+def deflated(data):
+    """permessage-deflate payload size (RFC 7692: raw DEFLATE, sync flush, trailing 00 00 ff ff dropped)."""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+def probe_deflate(port):
+    """Starts the server and returns the Sec-WebSocket-Extensions header of a /socket.io/ upgrade."""
+    home = tempfile.mkdtemp(prefix='snailsynk-wsprobe-')
+    env = dict(os.environ, HOME=home, SNAILSYNK_INSTANCE_DIR=os.path.join(home, 'instance'),
+               SNAILSYNK_PORT=str(port), SNAILSYNK_ADMIN_USER='bench', SNAILSYNK_ADMIN_PASS='bench-password')
+    proc = subprocess.Popen([sys.executable, str(ROOT / 'SnailSynk.py')], cwd=home, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    context = ssl.create_default_context()
+    context.check_hostname, context.verify_mode = False, ssl.CERT_NONE
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                sock = context.wrap_socket(socket.create_connection(('127.0.0.1', port), timeout=5))
+                break
+            except OSError:
+                if time.monotonic() > deadline: raise RuntimeError("Server did not come up.")
+                time.sleep(0.3)
+        key = base64.b64encode(os.urandom(16)).decode()
+        sock.sendall((f"GET /socket.io/?EIO=4&transport=websocket HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+                      f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                      "Sec-WebSocket-Version: 13\r\n"
+                      "Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits\r\n\r\n").encode())
+        response = b''
+        while b'\r\n\r\n' not in response:
+            chunk = sock.recv(4096)
+            if not chunk: break
+            response += chunk
+        sock.close()
+        headers = response.split(b'\r\n\r\n')[0].decode('latin-1').split('\r\n')
+        status = headers[0]
+        extensions = next((h.split(':', 1)[1].strip() for h in headers[1:]
+                           if h.lower().startswith('sec-websocket-extensions:')), '')
+        return status, extensions
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        shutil.rmtree(home, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=5000, help='Entries in the folder.')
+    parser.add_argument('--probe', action='store_true', help='Also check permessage-deflate on a live server.')
+    parser.add_argument('--port', type=int, default=9461)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='snailsynk-payloads-')
+    failures = []
+    try:
+        files_dir, instance_dir = os.path.join(root, 'files'), os.path.join(root, 'instance')
+        os.makedirs(files_dir)
+        os.makedirs(instance_dir)
+        fm = FileManager(files_dir, instance_dir)
+        build(files_dir, fm, args.entries)
+        files = fm.list_files('')
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    legacy = frame('file_list_updated', {'files': files, 'path': ''})
+    packed = pack_listing(files, '')
+    columnar = frame('file_list_updated', packed)
+    start = time.perf_counter()
+    for _ in range(20): pack_listing(files, '')
+    pack_ms = (time.perf_counter() - start) / 20 * 1000
+
+    expected = [{**f, 'mtime': int(f['mtime'])} for f in files]
+    if unpack_listing(json.loads(json.dumps(packed))) != expected:
+        failures.append("unpack_listing does not reproduce the listing")
+
+    result = {
+        'entries': len(files),
+        'legacy_bytes': len(legacy), 'legacy_deflate_bytes': deflated(legacy),
+        'columnar_bytes': len(columnar), 'columnar_deflate_bytes': deflated(columnar),
+        'pack_ms': round(pack_ms, 2),
+    }
+    result['saving_uncompressed'] = round(1 - result['columnar_bytes'] / result['legacy_bytes'], 3)
+    result['saving_on_wire'] = round(1 - result['columnar_deflate_bytes'] / result['legacy_bytes'], 3)
+    if args.probe:
+        status, extensions = probe_deflate(args.port)
+        result['probe_status'], result['probe_extensions'] = status, extensions
+        if 'permessage-deflate' not in extensions:
+            failures.append(f"server did not negotiate permessage-deflate ({status})")
+    result['failures'] = failures
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        kb = lambda n: f"{n / 1024:,.1f} KB"
+        print(f"file_list_updated for {result['entries']} entries")
+        print(f"  legacy JSON objects : {kb(result['legacy_bytes']):>10}   deflated {kb(result['legacy_deflate_bytes']):>10}")
+        print(f"  columnar            : {kb(result['columnar_bytes']):>10}   deflated {kb(result['columnar_deflate_bytes']):>10}")
+        print(f"  {result['saving_uncompressed']:.0%} smaller before compression, "
+              f"{result['saving_on_wire']:.0%} smaller on the wire with permessage-deflate; packing takes {result['pack_ms']} ms")
+        if args.probe:
+            print(f"  live server: {result['probe_status']} / Sec-WebSocket-Extensions: {result['probe_extensions'] or '(none)'}")
+        for failure in failures:
+            print(f"  FAIL {failure}")
+        print("OK" if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
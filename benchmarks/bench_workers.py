@@ -0,0 +1,136 @@
+"""
+bench_workers.py — Multi-worker throughput load test
+
+Starts SnailSynk once per worker count (SNAILSYNK_WORKERS) in a throwaway HOME
+with a few hundred files, then drives it with keep-alive HTTPS clients running
+in separate processes for a fixed time. Reports requests/second, latency
+percentiles and the speedup over a single worker.
+
+Client processes need CPU too, so meaningful scaling numbers need more cores
+than the largest worker count being tested.
+
+Usage:
+    python benchmarks/bench_workers.py
+    python benchmarks/bench_workers.py --workers 1,2,4 --clients 16 --duration 15 --json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+import requests
+import urllib3
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def seed_files(home, count):
+    files_dir = Path(home) / "Downloads" / "SnailSynk" / "files"
+    files_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        (files_dir / f"file_{i:04d}.txt").write_text("x" * (i % 512))
+
+
+def start_server(home, port, workers):
+    env = dict(os.environ, HOME=home, SNAILSYNK_INSTANCE_DIR=os.path.join(home, 'instance'),
+               SNAILSYNK_PORT=str(port), SNAILSYNK_WORKERS=str(workers),
+               SNAILSYNK_ADMIN_USER='bench', SNAILSYNK_ADMIN_PASS='bench-password')
+    proc = subprocess.Popen([sys.executable, str(ROOT / 'SnailSynk.py')], cwd=home, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"https://127.0.0.1:{port}/api/shared-text", verify=False, timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.3)
+    proc.kill()
+    raise RuntimeError(f"Server with {workers} workers did not come up.")
+
+
+def client_loop(args):
+    url, duration = args
+    urllib3.disable_warnings()
+    session = requests.Session()
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            if session.get(url, verify=False, timeout=10).status_code != 200:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+            session = requests.Session()
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def run_load(url, clients, duration):
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client_loop, [(url, duration)] * clients)
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    pct = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2) if latencies else 0
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1),
+        'latency_ms': {'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts to test.')
+    parser.add_argument('--clients', type=int, default=max(4, (os.cpu_count() or 1) * 2))
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per worker count.')
+    parser.add_argument('--path', default='/api/files/list', help='Endpoint to request.')
+    parser.add_argument('--files', type=int, default=300, help='Files seeded into the share folder.')
+    parser.add_argument('--port', type=int, default=9350)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+    urllib3.disable_warnings()
+
+    runs = []
+    for index, workers in enumerate(int(w) for w in args.workers.split(',')):
+        home = tempfile.mkdtemp(prefix='snailsynk-bench-')
+        port = args.port + index
+        try:
+            seed_files(home, args.files)
+            proc = start_server(home, port, workers)
+            try:
+                run_load(f"https://127.0.0.1:{port}{args.path}", args.clients, 1.0)  # warm-up
+                result = run_load(f"https://127.0.0.1:{port}{args.path}", args.clients, args.duration)
+            finally:
+                proc.terminate()
+                proc.wait(15)
+        finally:
+            shutil.rmtree(home, ignore_errors=True)
+        result['workers'] = workers
+        runs.append(result)
+        if not args.json:
+            print(f"{workers:>2} workers: {result['rps']:>8} req/s  p50 {result['latency_ms']['p50']} ms  "
+                  f"p95 {result['latency_ms']['p95']} ms  errors {result['errors']}")
+
+    baseline = runs[0]['rps'] or 1
+    for run in runs:
+        run['speedup'] = round(run['rps'] / baseline, 2)
+    summary = {'cpu_count': os.cpu_count(), 'clients': args.clients, 'duration_s': args.duration,
+               'path': args.path, 'runs': runs}
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print("Speedup vs first run: " + ", ".join(f"{r['workers']}w x{r['speedup']}" for r in runs)
+              + f"  (cpu_count={summary['cpu_count']})")
+
+
+if __name__ == '__main__':
+    main()
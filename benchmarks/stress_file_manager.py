@@ -0,0 +1,220 @@
+"""
+stress_file_manager.py — FileManager concurrency stress test
+
+Builds a throwaway share folder and runs thousands of concurrent mutations
+against one FileManager from many threads: file renames, moves between
+folders, folder renames, favorite toggles and lock/unlock cycles. Afterwards
+it checks that the metadata is still consistent with the files on disk:
+
+  - no file was lost or duplicated;
+  - files locked before the run are still locked wherever they ended up, and
+    no other file is locked (metadata followed every rename/move);
+  - every metadata key points at an existing file or folder;
+  - each favorite's state matches the parity of the toggles applied to it,
+    even with lock/unlock running on the same files (no lost updates);
+  - file_metadata.json on disk equals the in-memory snapshot.
+
+Exits non-zero if any check fails. --no-path-locks disables FileManager's
+path locks to show what the checks catch without them.
+
+Usage:
+    python benchmarks/stress_file_manager.py
+    python benchmarks/stress_file_manager.py --threads 64 --ops 8000 --json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import nullcontext
+
+from argon2 import PasswordHasher
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from backbone.file_manager import FileManager
+
+PASSWORD = 'stress-password'
+STATIC_DIR = 'static'
+
+
+class _NoPathLocks:
+    def hold(self, *paths):
+        return nullcontext()
+
+
+def build_tree(files_dir, folders, files_per_folder, static_files):
+    for f in range(folders):
+        folder = Path(files_dir) / f"d{f}"
+        folder.mkdir()
+        for i in range(files_per_folder):
+            (folder / f"f{f}_{i}.txt").write_text(f"id-{f}-{i}")
+    static = Path(files_dir) / STATIC_DIR
+    static.mkdir()
+    for i in range(static_files):
+        (static / f"s{i}.txt").write_text(f"static-{i}")
+
+
+def scan(files_dir):
+    """Maps file content (a stable id) -> relative path for every file on disk."""
+    found = {}
+    for dirpath, _, filenames in os.walk(files_dir):
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            found.setdefault(Path(full).read_text(), []).append(os.path.relpath(full, files_dir).replace(os.sep, '/'))
+    return found
+
+
+def movable_folders(files_dir):
+    return [e for e in os.listdir(files_dir) if e != STATIC_DIR and os.path.isdir(os.path.join(files_dir, e))]
+
+
+def worker(fm, files_dir, ops, seed, static_files, counters, errors, lock):
+    rng = random.Random(seed)
+    toggles = {}
+    for n in range(ops):
+        try:
+            roll = rng.random()
+            folders = movable_folders(files_dir)
+            if not folders:
+                continue
+            folder = rng.choice(folders)
+            try:
+                names = os.listdir(os.path.join(files_dir, folder))
+            except FileNotFoundError:
+                names = []
+            if roll < 0.30 and names:
+                name = rng.choice(names)
+                fm.rename_file(folder, name, f"r{seed}_{n}", '127.0.0.1')
+            elif roll < 0.50 and names:
+                fm.move_file(rng.choice(names), folder, rng.choice(folders), '127.0.0.1')
+            elif roll < 0.55:
+                fm.rename_folder('', folder, f"d{seed}_{n}", '127.0.0.1')
+            elif roll < 0.85:
+                index = rng.randrange(static_files)
+                path = f"{STATIC_DIR}/s{index}.txt"
+                fm.toggle_favorite(path)
+                toggles[path] = toggles.get(path, 0) + 1
+            else:
+                path = f"{STATIC_DIR}/s{rng.randrange(static_files)}.txt"
+                fm.lock_file(path, PASSWORD)
+                fm.unlock_file(path)
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+    with lock:
+        for path, count in toggles.items():
+            counters[path] = counters.get(path, 0) + count
+
+
+def check(fm, files_dir, expected_ids, locked_ids, favorites_before, toggle_counts):
+    failures = []
+    found = scan(files_dir)
+    if set(found) != expected_ids:
+        failures.append(f"file set changed: {len(expected_ids - set(found))} missing, {len(set(found) - expected_ids)} unexpected")
+    duplicated = [i for i, paths in found.items() if len(paths) > 1]
+    if duplicated:
+        failures.append(f"{len(duplicated)} ids found at more than one path")
+
+    metadata = fm.metadata
+    for file_id, paths in found.items():
+        is_locked = fm.is_locked(paths[0])
+        if file_id in locked_ids and not is_locked:
+            failures.append(f"lock lost for {file_id} (now at {paths[0]})")
+        elif file_id not in locked_ids and is_locked:
+            failures.append(f"unexpected lock on {paths[0]}")
+
+    for key in metadata:
+        path = key[len('folder:'):] if key.startswith('folder:') else key
+        if not os.path.exists(os.path.join(files_dir, path)):
+            failures.append(f"metadata key for missing path: {key}")
+
+    for path in set(favorites_before) | set(toggle_counts):
+        expected = favorites_before.get(path, False) ^ (toggle_counts.get(path, 0) % 2 == 1)
+        if fm.is_favorite(path) != expected:
+            failures.append(f"favorite parity wrong for {path}")
+
+    with open(fm.metadata_path) as f:
+        if json.load(f) != metadata:
+            failures.append("file_metadata.json differs from the in-memory snapshot")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--ops', type=int, default=4000, help='Total mutations across all threads.')
+    parser.add_argument('--folders', type=int, default=6)
+    parser.add_argument('--files', type=int, default=20, help='Files per folder.')
+    parser.add_argument('--static-files', type=int, default=8, help='Files that only get favorite/lock churn.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-path-locks', action='store_true', help='Disable path locks to demonstrate the races.')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON only.')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='snailsynk-stress-')
+    try:
+        files_dir, instance_dir = os.path.join(root, 'files'), os.path.join(root, 'instance')
+        os.makedirs(files_dir)
+        os.makedirs(instance_dir)
+        build_tree(files_dir, args.folders, args.files, args.static_files)
+        fm = FileManager(files_dir, instance_dir, PasswordHasher(time_cost=1, memory_cost=8, parallelism=1))
+        if args.no_path_locks:
+            fm._path_locks = _NoPathLocks()
+
+        rng = random.Random(args.seed)
+        expected_ids = set(scan(files_dir))
+        locked_ids = set()
+        for file_id, paths in scan(files_dir).items():
+            if not file_id.startswith('static-') and rng.random() < 0.25:
+                fm.lock_file(paths[0], PASSWORD)
+                locked_ids.add(file_id)
+        favorites_before = {}
+        for i in range(0, args.static_files, 2):
+            path = f"{STATIC_DIR}/s{i}.txt"
+            favorites_before[path] = fm.toggle_favorite(path)
+
+        counters, errors, lock = {}, [], threading.Lock()
+        per_thread = max(1, args.ops // args.threads)
+        threads = [threading.Thread(target=worker, args=(fm, files_dir, per_thread, args.seed * 1000 + t,
+                                                         args.static_files, counters, errors, lock))
+                   for t in range(args.threads)]
+        start = time.perf_counter()
+        for t in threads: t.start()
+        for t in threads: t.join()
+        elapsed = time.perf_counter() - start
+
+        failures = errors + check(fm, files_dir, expected_ids, locked_ids, favorites_before, counters)
+        result = {
+            'threads': args.threads,
+            'ops': per_thread * args.threads,
+            'path_locks': not args.no_path_locks,
+            'elapsed_s': round(elapsed, 3),
+            'ops_per_s': round(per_thread * args.threads / elapsed, 1),
+            'files': len(expected_ids),
+            'locked_files': len(locked_ids),
+            'failures': failures,
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['ops']} mutations on {args.threads} threads in {result['elapsed_s']}s "
+              f"({result['ops_per_s']} ops/s), path locks {'on' if result['path_locks'] else 'off'}")
+        for failure in failures[:20]:
+            print(f"  FAIL {failure}")
+        if len(failures) > 20:
+            print(f"  ... and {len(failures) - 20} more")
+        print("OK: metadata consistent" if not failures else f"{len(failures)} consistency failures")
+    sys.exit(1 if result['failures'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+cluster.py — Multi-Worker Server Mode
+
+Runs SnailSynk as N forked worker processes accepting on one shared listening
+socket, so request handling can use more than one core.
+
+  - Each worker is a gevent pywsgi server, the same server socketio.run uses.
+  - Socket.IO events are fanned out between workers through a small local
+    broker process (a stand-in for Redis) over a Unix socket, using
+    python-socketio's PubSubManager protocol.
+  - Shared state lives in the run directory (see backbone/shared_state.py);
+    it is wiped on startup, like in-memory state would be.
+
+Long-polling needs sticky sessions, which a shared listener can't provide, so
+clients should use the WebSocket transport in this mode.
+
+Usage:
+    cluster = WorkerCluster(run_dir, workers=4)
+    socketio = SocketIO(app, client_manager=cluster.client_manager())
+    ...
+    cluster.serve(app, '0.0.0.0', 9000, certfile=..., keyfile=...)
+
+Requires os.fork (Linux/macOS) and the gevent async mode.
+"""
+
+import os
+import sys
+import time
+import errno
+import pickle
+import shutil
+import signal
+import socket
+import uuid
+import struct
+import logging
+import selectors
+import threading
+
+import socketio
+
+FORK_AVAILABLE = hasattr(os, 'fork') and hasattr(socket, 'AF_UNIX')
+
+_HEADER = struct.Struct('!I')
+# First byte a client sends to the broker: it either publishes frames or receives them.
+_ROLE_PUBLISHER = b'P'
+_ROLE_SUBSCRIBER = b'S'
+_RESPAWN_DELAY = 1.0
+
+
+def _recv_exact(sock, size):
+    """Reads exactly size bytes, or returns None if the peer closed the socket."""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+# ======================================================================
+# Broker process
+# ======================================================================
+
+class LocalBroker:
+    """
+    Relays length-prefixed frames from publisher connections to every subscriber
+    connection. Each worker holds one of each; publishers never read, so frames
+    are only ever written to subscribers.
+    """
+
+    def __init__(self, address):
+        self.address = address
+
+    def serve_forever(self):
+        try:
+            os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.address)
+        os.chmod(self.address, 0o600)
+        listener.listen(64)
+
+        selector = selectors.DefaultSelector()
+        selector.register(listener, selectors.EVENT_READ)
+        buffers = {}        # publisher socket -> bytes received but not yet relayed
+        subscribers = set()
+        pending = set()     # accepted, role byte not read yet
+
+        def drop(sock):
+            selector.unregister(sock)
+            buffers.pop(sock, None)
+            subscribers.discard(sock)
+            pending.discard(sock)
+            sock.close()
+
+        while True:
+            for key, _ in selector.select():
+                sock = key.fileobj
+                if sock is listener:
+                    client, _ = listener.accept()
+                    selector.register(client, selectors.EVENT_READ)
+                    pending.add(client)
+                    continue
+                try:
+                    chunk = sock.recv(65536)
+                except OSError:
+                    chunk = b''
+                if not chunk:
+                    drop(sock)
+                    continue
+                if sock in pending:
+                    pending.discard(sock)
+                    role, chunk = chunk[:1], chunk[1:]
+                    if role == _ROLE_SUBSCRIBER:
+                        # Subscribers only read; readability now just signals a close.
+                        subscribers.add(sock)
+                        continue
+                    buffers[sock] = bytearray()
+                if sock in subscribers:
+                    continue
+                buffer = buffers[sock]
+                buffer.extend(chunk)
+                while len(buffer) >= _HEADER.size:
+                    frame_len = _HEADER.size + _HEADER.unpack_from(buffer)[0]
+                    if len(buffer) < frame_len:
+                        break
+                    frame = bytes(buffer[:frame_len])
+                    del buffer[:frame_len]
+                    for peer in list(subscribers):
+                        try:
+                            peer.sendall(frame)
+                        except OSError:
+                            drop(peer)
+
+
+# ======================================================================
+# Socket.IO client manager
+# ======================================================================
+
+class LocalBrokerManager(socketio.PubSubManager):
+    """Socket.IO client manager that shares emits between workers via LocalBroker."""
+    name = 'localbroker'
+
+    def __init__(self, address, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = address
+        self._pub_sock = None
+        self._pub_pid = None
+        self._pub_lock = None
+
+    def _async_primitives(self):
+        # Under gevent without monkey patching, blocking stdlib sockets would
+        # stall the whole worker, so use gevent's cooperative versions.
+        if self.server is not None and self.server.async_mode == 'gevent':
+            from gevent import socket as gsocket
+            from gevent.lock import Semaphore
+            return gsocket, Semaphore
+        return socket, threading.Lock
+
+    def _ensure_process_state(self):
+        """
+        The manager is built before the workers fork, so host_id, the publish
+        socket and its lock would otherwise be shared by every worker. Each
+        process gets its own the first time it uses them.
+        """
+        if self._pub_pid != os.getpid():
+            self.host_id = uuid.uuid4().hex
+            self._pub_lock = self._async_primitives()[1]()
+            self._pub_sock, self._pub_pid = None, os.getpid()
+
+    def initialize(self):
+        self._ensure_process_state()
+        super().initialize()
+
+    def _connect(self, role):
+        socket_module, _ = self._async_primitives()
+        sock = socket_module.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.address)
+        sock.sendall(role)
+        return sock
+
+    def _publish(self, data):
+        payload = pickle.dumps(data)
+        frame = _HEADER.pack(len(payload)) + payload
+        self._ensure_process_state()
+        with self._pub_lock:
+            for attempt in range(2):
+                try:
+                    if self._pub_sock is None:
+                        self._pub_sock = self._connect(_ROLE_PUBLISHER)
+                    self._pub_sock.sendall(frame)
+                    return
+                except OSError as e:
+                    if self._pub_sock is not None:
+                        self._pub_sock.close()
+                    self._pub_sock = None
+                    if attempt:
+                        self._get_logger().error(f"Could not publish to local broker: {e}")
+
+    def _listen(self):
+        while True:
+            try:
+                sock = self._connect(_ROLE_SUBSCRIBER)
+            except OSError:
+                self.server.sleep(_RESPAWN_DELAY)
+                continue
+            try:
+                while True:
+                    header = _recv_exact(sock, _HEADER.size)
+                    if header is None:
+                        break
+                    payload = _recv_exact(sock, _HEADER.unpack(header)[0])
+                    if payload is None:
+                        break
+                    yield pickle.loads(payload)
+            except OSError:
+                pass
+            finally:
+                sock.close()
+            self._get_logger().warning('Lost connection to local broker, reconnecting.')
+            self.server.sleep(_RESPAWN_DELAY)
+
+
+# ======================================================================
+# Supervisor
+# ======================================================================
+
+class WorkerCluster:
+    """Forks and supervises the broker and worker processes."""
+
+    def __init__(self, run_dir, workers):
+        self.run_dir = run_dir
+        self.workers = workers
+        shutil.rmtree(run_dir, ignore_errors=True)
+        os.makedirs(run_dir, exist_ok=True)
+        self.broker_address = os.path.join(run_dir, 'broker.sock')
+        self._stopping = False
+        self._children = {}  # pid -> ('broker', None) or ('worker', index)
+
+    def state_path(self, name):
+        """Path for a shared-state file that lives only as long as this cluster run."""
+        return os.path.join(self.run_dir, name)
+
+    def client_manager(self):
+        return LocalBrokerManager(self.broker_address)
+
+    # ------------------------------------------------------------------
+    def serve(self, app, host, port, on_worker_start=None, on_worker_exit=None, **server_kwargs):
+        """
+        Binds the listening socket, then forks the broker and the workers and
+        restarts any that die. Blocks until SIGINT/SIGTERM.
+
+        on_worker_start() runs inside each new worker; on_worker_exit(pid) runs
+        in the supervisor after a worker exits, to clean up its shared state.
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((host, port))
+        listener.listen(1024)
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self._spawn('broker', None, lambda: LocalBroker(self.broker_address).serve_forever())
+        self._wait_for_broker()
+        for index in range(self.workers):
+            self._spawn('worker', index, lambda: self._worker_main(listener, app, server_kwargs, on_worker_start))
+        logging.info(f"Started {self.workers} workers on {host}:{port}")
+
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            role, index = self._children.pop(pid, (None, None))
+            if role == 'worker' and on_worker_exit:
+                try:
+                    on_worker_exit(pid)
+                except Exception as e:
+                    logging.error(f"Cleanup after worker {pid} failed: {e}")
+            if self._stopping or role is None:
+                continue
+            logging.warning(f"{role.capitalize()} process {pid} exited (status {status}), restarting.")
+            time.sleep(_RESPAWN_DELAY)
+            if self._stopping:
+                continue
+            if role == 'broker':
+                self._spawn('broker', None, lambda: LocalBroker(self.broker_address).serve_forever())
+            else:
+                self._spawn('worker', index, lambda: self._worker_main(listener, app, server_kwargs, on_worker_start))
+        listener.close()
+
+    def _request_stop(self, signum, frame):
+        if self._stopping:
+            return
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _spawn(self, role, index, target):
+        pid = os.fork()
+        if pid:
+            self._children[pid] = (role, index)
+            return pid
+        # --- child ---
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            target()
+        except Exception:
+            logging.exception(f"{role.capitalize()} process crashed")
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _wait_for_broker(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.broker_address)
+                return
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.ECONNREFUSED):
+                    raise
+            finally:
+                probe.close()
+            time.sleep(0.05)
+        raise RuntimeError("Local broker did not start in time.")
+
+    @staticmethod
+    def _worker_main(listener, app, server_kwargs, on_worker_start):
+        import gevent
+        from gevent import pywsgi
+        from gevent import socket as gsocket
+        gevent.reinit()
+        # Re-wrap the inherited listener as a cooperative gevent socket.
+        worker_listener = gsocket.fromfd(listener.fileno(), socket.AF_INET, socket.SOCK_STREAM)
+        listener.close()
+        if on_worker_start:
+            on_worker_start()
+        server = pywsgi.WSGIServer(worker_listener, app, log=None, **server_kwargs)
+        gevent.signal_handler(signal.SIGTERM, server.stop)
+        server.serve_forever()
@@ -0,0 +1,239 @@
+"""
+mirror.py — SnailSynk Folder Mirror
+
+Keeps a local folder in sync with a folder on a SnailSynk server. Only files
+that changed are downloaded; a large file that changed in places is patched
+from the blocks the local copy already has, fetching just the missing byte
+ranges (zsync-style delta transfer via /api/sync/signature).
+
+Can be run standalone — no dependencies beyond the Python standard library.
+
+Usage:
+    python mirror.py https://192.168.1.10:9000 ./Photos --path Photos --insecure
+    python mirror.py https://host:9000 ./backup --delete
+"""
+
+import os
+import sys
+import ssl
+import json
+import zlib
+import shutil
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path
+from urllib.parse import quote, urlencode
+from urllib.request import urlopen, Request
+from urllib.error import URLError, HTTPError
+
+ADLER_MOD = 65521
+CHUNK_SIZE = 1024 * 1024
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Helpers
+# ──────────────────────────────────────────────────────────────────────
+
+def print_step(msg):
+    print(f"  [+] {msg}")
+
+
+def print_warn(msg):
+    print(f"  [!] {msg}")
+
+
+def print_error(msg):
+    print(f"  [✘] {msg}")
+
+
+def sha256_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def strong_hash(block):
+    return hashlib.blake2b(block, digest_size=16).hexdigest()
+
+
+class Server:
+    def __init__(self, base_url, insecure=False):
+        self.base_url = base_url.rstrip('/')
+        self.context = ssl._create_unverified_context() if insecure else None
+        self.bytes_received = 0
+
+    def open(self, path, params=None, headers=None):
+        url = f"{self.base_url}{path}" + (f"?{urlencode(params)}" if params else '')
+        return urlopen(Request(url, headers=headers or {}), context=self.context, timeout=60)
+
+    def manifest(self, subpath):
+        """Yields manifest entries; raises if the stream ends without its summary line."""
+        with self.open('/api/sync/manifest', {'path': subpath, 'hashes': '1'}) as response:
+            for line in response:
+                self.bytes_received += len(line)
+                item = json.loads(line)
+                yield item
+                if item['type'] == 'end': return
+        raise IOError("Manifest was cut off before the end; not trusting it.")
+
+    def signature(self, rel_path):
+        with self.open('/api/sync/signature', {'path': rel_path}) as response:
+            body = response.read()
+        self.bytes_received += len(body)
+        return json.loads(body)
+
+    def download(self, rel_path, out, byte_range=None):
+        headers = {'Range': f"bytes={byte_range[0]}-{byte_range[1] - 1}"} if byte_range else {}
+        with self.open(f"/files/{quote(rel_path)}", headers=headers) as response:
+            if byte_range and response.status != 206:
+                raise IOError(f"Server ignored the Range request for {rel_path}")
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                self.bytes_received += len(chunk)
+                out.write(chunk)
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Delta transfer
+# ──────────────────────────────────────────────────────────────────────
+
+def match_blocks(data, blocks, block_size):
+    """
+    Rolls Adler-32 over the local bytes and returns {block index: local offset}
+    for every full-size remote block whose weak and strong hashes both match.
+    The roll is zlib's Adler-32: a = 1 + sum(x), b = sum of the running a's.
+    """
+    full_blocks = len(blocks) - 1 if len(blocks) and blocks[-1][2] < block_size else len(blocks)
+    table = {}
+    for index in range(full_blocks):
+        table.setdefault(blocks[index][0], []).append(index)
+    found, size, pos = {}, len(data), 0
+    if size < block_size: return found
+    checksum = zlib.adler32(data[0:block_size])
+    a, b = checksum & 0xffff, checksum >> 16
+    while True:
+        candidates = table.get((b << 16) | a)
+        if candidates:
+            window = data[pos:pos + block_size]
+            strong = strong_hash(window)
+            hits = [i for i in candidates if i not in found and blocks[i][1] == strong]
+            if hits:
+                for index in hits: found[index] = pos
+                pos += block_size
+                if pos + block_size > size: break
+                checksum = zlib.adler32(data[pos:pos + block_size])
+                a, b = checksum & 0xffff, checksum >> 16
+                continue
+        if pos + block_size >= size: break
+        out_byte, in_byte = data[pos], data[pos + block_size]
+        a = (a - out_byte + in_byte) % ADLER_MOD
+        b = (b - block_size * out_byte + a - 1) % ADLER_MOD
+        pos += 1
+    return found
+
+
+def delta_update(server, rel_path, local_path, tmp_path):
+    """Rebuilds local_path into tmp_path from matching local blocks plus fetched ranges. Returns bytes reused."""
+    signature = server.signature(rel_path)
+    block_size, size = signature['block_size'], signature['size']
+    blocks = [(weak, strong, min(block_size, size - i * block_size))
+              for i, (weak, strong) in enumerate(signature['blocks'])]
+    with open(local_path, 'rb') as f:
+        data = f.read()
+    found = match_blocks(data, blocks, block_size)
+    reused = 0
+    with open(tmp_path, 'wb') as out:
+        index = 0
+        while index < len(blocks):
+            if index in found:
+                out.write(data[found[index]:found[index] + block_size])
+                reused += block_size
+                index += 1
+                continue
+            start = index  # one Range request per run of missing blocks
+            while index < len(blocks) and index not in found: index += 1
+            server.download(rel_path, out, (start * block_size, min(size, index * block_size)))
+    if sha256_file(tmp_path) != signature['sha256']:
+        raise IOError(f"Checksum mismatch after patching {rel_path}")
+    return reused
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Main
+# ──────────────────────────────────────────────────────────────────────
+
+def mirror(server, subpath, target, delete=False, min_delta_size=1024 * 1024):
+    stats = {'unchanged': 0, 'downloaded': 0, 'patched': 0, 'deleted': 0, 'bytes_reused': 0}
+    prefix = f"{subpath}/" if subpath else ''
+    seen = set()
+    for item in server.manifest(subpath):
+        if item['type'] == 'end': continue
+        rel = item['path'][len(prefix):]
+        local = target / rel
+        seen.add(local)
+        if item['type'] == 'folder':
+            local.mkdir(parents=True, exist_ok=True)
+            continue
+        local.parent.mkdir(parents=True, exist_ok=True)
+        if local.is_file():
+            st = local.stat()
+            same_stamp = st.st_size == item['size'] and int(st.st_mtime) == int(item['mtime'])
+            if same_stamp and ('sha256' not in item or sha256_file(local) == item['sha256']):
+                stats['unchanged'] += 1
+                continue
+        fd, tmp = tempfile.mkstemp(prefix='.mirror-', dir=local.parent)
+        os.close(fd)
+        try:
+            if local.is_file() and local.stat().st_size >= min_delta_size and item['size'] >= min_delta_size:
+                stats['bytes_reused'] += delta_update(server, item['path'], local, tmp)
+                stats['patched'] += 1
+                print_step(f"Patched {item['path']}")
+            else:
+                with open(tmp, 'wb') as out:
+                    server.download(item['path'], out)
+                if 'sha256' in item and sha256_file(tmp) != item['sha256']:
+                    raise IOError(f"Checksum mismatch for {item['path']}")
+                stats['downloaded'] += 1
+                print_step(f"Downloaded {item['path']}")
+            os.replace(tmp, local)
+            os.utime(local, (item['mtime'], item['mtime']))
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+    if delete:
+        for path in sorted(target.rglob('*'), reverse=True):
+            if path in seen or path.name.startswith('.'): continue
+            if path.is_dir(): shutil.rmtree(path)
+            else: path.unlink()
+            stats['deleted'] += 1
+            print_step(f"Deleted {path.relative_to(target)}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('server', help='Server URL, e.g. https://192.168.1.10:9000')
+    parser.add_argument('target', help='Local folder to keep in sync.')
+    parser.add_argument('--path', default='', help='Folder on the server to mirror (default: everything).')
+    parser.add_argument('--delete', action='store_true', help='Remove local files that no longer exist on the server.')
+    parser.add_argument('--insecure', action='store_true', help="Accept the server's self-signed certificate.")
+    parser.add_argument('--min-delta-size', type=int, default=1024 * 1024,
+                        help='Files at least this large are patched block by block instead of re-downloaded.')
+    args = parser.parse_args()
+
+    target = Path(args.target)
+    target.mkdir(parents=True, exist_ok=True)
+    server = Server(args.server, insecure=args.insecure)
+    try:
+        stats = mirror(server, args.path.strip('/'), target, delete=args.delete, min_delta_size=args.min_delta_size)
+    except (URLError, HTTPError, IOError) as e:
+        print_error(f"Mirror failed: {e}")
+        sys.exit(1)
+    print_step(f"{stats['downloaded']} downloaded, {stats['patched']} patched, {stats['unchanged']} unchanged, "
+               f"{stats['deleted']} deleted; {server.bytes_received} bytes received, "
+               f"{stats['bytes_reused']} bytes reused from local copies")
+
+
+if __name__ == '__main__':
+    main()
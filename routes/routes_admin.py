@@ -2,7 +2,10 @@ from flask import (Blueprint, Response, render_template, request, flash, redirec
                    url_for, session, jsonify)
 from urllib.parse import urlparse, urljoin
 from functools import wraps
-from .utils import get_local_ip, get_current_ssid
+import hmac
+import logging
+from backbone.listing_codec import pack_listing
+from .utils import network_info
 
 admin_bp = Blueprint('admin', __name__,
                      template_folder='../templates/admin',
@@ -10,11 +13,20 @@ admin_bp = Blueprint('admin', __name__,
 
 # Managers will be initialized by the main app
 user_manager, socketio, blocklist_manager, action_logger, notes_manager = None, None, None, None, None
+rate_limiter, hashing_pool, dedup_store, integrity_verifier, file_manager = None, None, None, None, None
+client_registry, connection_supervisor = None, None
+metrics_registry, metrics_token = None, None
 
-def init_admin_routes(um, sio, blm, al, nm):
+def init_admin_routes(um, sio, blm, al, nm, rl=None, hp=None, ds=None, iv=None, fm=None, cr=None, cs=None,
+                      mr=None, mt=None):
     """Initialize the blueprint with managers from the main app."""
     global user_manager, socketio, blocklist_manager, action_logger, notes_manager
+    global rate_limiter, hashing_pool, dedup_store, integrity_verifier, file_manager, client_registry, connection_supervisor
+    global metrics_registry, metrics_token
     user_manager, socketio, blocklist_manager, action_logger, notes_manager = um, sio, blm, al, nm
+    rate_limiter, hashing_pool, dedup_store, integrity_verifier, file_manager = rl, hp, ds, iv, fm
+    client_registry, connection_supervisor = cr, cs
+    metrics_registry, metrics_token = mr, mt
 
 def is_safe_url(target):
     ref_url = urlparse(request.host_url)
@@ -41,12 +53,12 @@ def add_no_cache_headers(response):
 @admin_bp.route('/monitoring')
 @login_required
 def monitoring():
-    return render_template('dashboard.html', server_ip=get_local_ip(), current_ssid=get_current_ssid())
+    return render_template('dashboard.html', server_ip=network_info.local_ip, current_ssid=network_info.ssid)
 
 @admin_bp.route('/notes')
 @login_required
 def notes():
-    return render_template('admin/notes.html', server_ip=get_local_ip(), current_ssid=get_current_ssid())
+    return render_template('admin/notes.html', server_ip=network_info.local_ip, current_ssid=network_info.ssid)
 
 @admin_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -74,11 +86,15 @@ def logout():
 @login_required
 def block_ip():
     ip_to_block = request.json.get('ip')
+    ttl_seconds = request.json.get('ttl_seconds')
     if not ip_to_block: return jsonify(success=False, error="IP address is required."), 400
-    if ip_to_block == request.remote_addr: return jsonify(success=False, error="You cannot block your own IP address."), 400
-    success, message = blocklist_manager.block_ip(ip_to_block)
+    if blocklist_manager.covers(ip_to_block, request.remote_addr): return jsonify(success=False, error="You cannot block your own IP address."), 400
+    if ttl_seconds is not None:
+        try: ttl_seconds = float(ttl_seconds)
+        except (TypeError, ValueError): return jsonify(success=False, error="Invalid ban duration."), 400
+    success, message = blocklist_manager.block_ip(ip_to_block, ttl_seconds=ttl_seconds)
     if success:
-        action_logger.log(request.remote_addr, 'IP_BLOCK', {'target_ip': ip_to_block})
+        action_logger.log(request.remote_addr, 'IP_BLOCK', {'target_ip': ip_to_block, 'ttl_seconds': ttl_seconds})
         socketio.emit('update_blocklist', {'blocklist': blocklist_manager.get_blocklist()}, room='admin_room')
         return jsonify(success=True, message=message)
     return jsonify(success=False, error=message), 400
@@ -114,22 +130,29 @@ def get_logs():
 @admin_bp.route('/api/clients')
 @login_required
 def get_clients():
-    """Get list of currently connected clients."""
-    clients = []
-    if socketio and hasattr(socketio, 'active_clients'):
-        for sid, client_data in socketio.active_clients.items():
-            clients.append({
-                'ip': client_data.get('ip', 'Unknown'),
-                'connected_since': client_data.get('connected_since', '')
-            })
-    return jsonify(success=True, clients=clients)
+    """Connected clients, newest first: ?offset=&limit= (max 500), optionally ?ip= for one address."""
+    if not client_registry:
+        return jsonify(success=True, clients=[], total=0, has_more=False, by_ip=[])
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    clients, total = client_registry.page(offset, limit, ip=request.args.get('ip') or None)
+    return jsonify(success=True, clients=clients, total=total, has_more=offset + len(clients) < total,
+                   by_ip=client_registry.summary())
 
 @admin_bp.route('/api/blocklist')
 @login_required
 def get_blocklist():
-    """Get list of blocked IP addresses."""
-    blocked_ips = blocklist_manager.get_blocklist() if blocklist_manager else []
-    return jsonify(success=True, blocked_ips=blocked_ips)
+    """Get list of blocked IP addresses and CIDR ranges, with their expiry."""
+    rules = blocklist_manager.get_rules() if blocklist_manager else []
+    return jsonify(success=True, blocked_ips=[r['rule'] for r in rules], rules=rules)
+
+@admin_bp.route('/api/rate_limits')
+@login_required
+def get_rate_limits():
+    """Get rate limiter counters, top offenders and recent automatic bans."""
+    if not rate_limiter:
+        return jsonify(success=False, error='Rate limiting is not enabled'), 404
+    return jsonify(success=True, rate_limits=rate_limiter.get_stats())
 
 @admin_bp.route('/api/stats')
 @login_required
@@ -163,9 +186,98 @@ def get_stats():
                 except:
                     pass
         stats['recent_activity'] = recent_count
+
+    if hashing_pool:
+        stats['hashing'] = hashing_pool.get_stats()
+    if dedup_store:
+        stats['dedup'] = dedup_store.get_stats()
+    if integrity_verifier:
+        stats['integrity'] = integrity_verifier.summary()
+    if file_manager and file_manager.trash:
+        stats['trash'] = file_manager.trash.stats()
+    if connection_supervisor:
+        stats['connections'] = connection_supervisor.stats()
     
     return jsonify(success=True, stats=stats)
 
+@admin_bp.route('/metrics')
+def metrics():
+    """Prometheus text format. Scrapers without an admin session send 'Authorization: Bearer <SNAILSYNK_METRICS_TOKEN>'."""
+    if 'admin_logged_in' not in session:
+        supplied = request.headers.get('Authorization', '')
+        if not (metrics_token and hmac.compare_digest(supplied.encode(), f"Bearer {metrics_token}".encode())):
+            return Response("Unauthorized\n", status=401, mimetype='text/plain',
+                            headers={'WWW-Authenticate': 'Bearer realm="metrics"'})
+    if not metrics_registry:
+        return Response("Metrics are not enabled.\n", status=503, mimetype='text/plain')
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@admin_bp.route('/api/dedup/scrub', methods=['POST'])
+@login_required
+def scrub_dedup_store():
+    """Remove deduplicated blobs that no file refers to any more."""
+    if not dedup_store:
+        return jsonify(success=False, error='Deduplication is disabled'), 404
+    removed, freed = dedup_store.scrub()
+    action_logger.log(request.remote_addr, 'DEDUP_SCRUB', {'removed': removed, 'bytes_freed': freed})
+    return jsonify(success=True, removed=removed, bytes_freed=freed)
+
+@admin_bp.route('/api/integrity', methods=['GET', 'POST'])
+@login_required
+def integrity_report():
+    """GET: last verification report. POST: start a verification pass now."""
+    if not integrity_verifier:
+        return jsonify(success=False, error='Integrity verification is disabled'), 404
+    if request.method == 'POST':
+        if not integrity_verifier.request_run():
+            return jsonify(success=False, error='A verification pass is already running'), 409
+        action_logger.log(request.remote_addr, 'INTEGRITY_VERIFY', {})
+        return jsonify(success=True, message='Verification started'), 202
+    return jsonify(success=True, report=integrity_verifier.report)
+
+@admin_bp.route('/api/trash', methods=['GET'])
+@login_required
+def get_trash():
+    if not file_manager or not file_manager.trash:
+        return jsonify(success=False, error='Trash is disabled'), 404
+    return jsonify(success=True, items=file_manager.trash.list_entries(), stats=file_manager.trash.stats())
+
+@admin_bp.route('/api/trash/<entry_id>/restore', methods=['POST'])
+@login_required
+def restore_trash_item(entry_id):
+    if not file_manager or not file_manager.trash:
+        return jsonify(success=False, error='Trash is disabled'), 404
+    success, message, rel_path = file_manager.restore_from_trash(entry_id, request.remote_addr)
+    if not success:
+        return jsonify(success=False, error=message), 404 if message == "Item not found in trash." else 500
+    action_logger.log(request.remote_addr, 'TRASH_RESTORE', {'path': rel_path})
+    parent = rel_path.rpartition('/')[0]
+    try:
+        socketio.emit('file_list_updated', pack_listing(file_manager.list_files(parent), parent))
+    except Exception as e:
+        logging.error(f"Failed to broadcast after restore: {e}")
+    return jsonify(success=True, message=message, path=rel_path)
+
+@admin_bp.route('/api/trash/<entry_id>', methods=['DELETE'])
+@login_required
+def purge_trash_item(entry_id):
+    """Deletes one item for good; the reaper reclaims the space within a few seconds."""
+    if not file_manager or not file_manager.trash:
+        return jsonify(success=False, error='Trash is disabled'), 404
+    if not file_manager.trash.purge(entry_id):
+        return jsonify(success=False, error='Item not found in trash.'), 404
+    action_logger.log(request.remote_addr, 'TRASH_PURGE', {'id': entry_id})
+    return jsonify(success=True)
+
+@admin_bp.route('/api/trash/empty', methods=['POST'])
+@login_required
+def empty_trash():
+    if not file_manager or not file_manager.trash:
+        return jsonify(success=False, error='Trash is disabled'), 404
+    count = file_manager.trash.purge()
+    action_logger.log(request.remote_addr, 'TRASH_EMPTY', {'items': count})
+    return jsonify(success=True, purged=count)
+
 @admin_bp.route('/api/clear_logs', methods=['POST'])
 @login_required
 def clear_logs():
@@ -1,24 +1,56 @@
 # routes/routes-index.py
 import os
+import json
+import time
+import errno
+import base64
 import logging
 from flask import (Blueprint, request, redirect, url_for, render_template,
-                   send_from_directory, send_file, flash, jsonify, Response, session)
-from flask_socketio import emit, join_room
-from urllib.parse import unquote
-from datetime import datetime, timezone
+                   send_from_directory, send_file, flash, jsonify, Response, session, stream_with_context, abort)
+from flask_socketio import emit, join_room, ConnectionRefusedError
+from urllib.parse import quote, unquote
+from werkzeug.utils import secure_filename
 
 from qr_gen import generate_custom_qr_svg
-from .utils import get_local_ip, get_current_ssid
+from backbone.hash_pool import HashingBusyError
+from backbone.content_manager import STALE_VERSION, PIN_PAGE_SIZE
+from backbone.blob_cache import BLOB_TOO_LARGE, INLINE_MIME_TYPES
+from backbone.listing_codec import pack_listing
+from .utils import network_info
 
 main_bp = Blueprint('main', __name__, template_folder='../templates')
 
 # Managers will be initialized by the main app
 file_manager, content_manager, action_logger, socketio = None, None, None, None
+broadcast_leader, search_index, delta_sync, job_manager, blob_cache = None, None, None, None, None
+client_registry, connection_supervisor = None, None
 
-def init_index_routes(fm, cm, al, sio):
+# Upper bound for /api/files/search page size.
+SEARCH_MAX_LIMIT = 200
+
+def init_index_routes(fm, cm, al, sio, leader=None, si=None, ds=None, jm=None, bc=None, cr=None, cs=None):
     """Initialize the blueprint with managers from the main app."""
-    global file_manager, content_manager, action_logger, socketio
+    global file_manager, content_manager, action_logger, socketio, broadcast_leader, search_index, delta_sync, job_manager, blob_cache
+    global client_registry, connection_supervisor
     file_manager, content_manager, action_logger, socketio = fm, cm, al, sio
+    broadcast_leader, search_index, delta_sync, job_manager, blob_cache = leader, si, ds, jm, bc
+    client_registry, connection_supervisor = cr, cs
+
+def broadcast_file_changes(batch):
+    """
+    FileSystemWatcher subscriber: refreshes the FileManager caches and pushes
+    listings that changed outside the app (rsync, camera import...) to clients.
+    With several workers only the leader broadcasts; every worker still
+    refreshes its own caches.
+    """
+    changed = file_manager.apply_fs_changes(batch)
+    if broadcast_leader is not None and not broadcast_leader.is_leader():
+        return
+    for subpath in changed:
+        try:
+            socketio.emit('file_list_updated', pack_listing(file_manager.list_files(subpath), subpath))
+        except Exception as e:
+            logging.error(f"Failed to broadcast external changes in '{subpath}': {e}")
 
 @main_bp.route('/')
 def index():
@@ -27,7 +59,7 @@ def index():
         files = []
         flash("Error listing files. Check server logs for details.", "error")
     is_admin = session.get('admin_logged_in', False)
-    return render_template('index.html', files=files, server_ip=get_local_ip(), current_ssid=get_current_ssid(), is_admin=is_admin)
+    return render_template('index.html', files=files, server_ip=network_info.local_ip, current_ssid=network_info.ssid, is_admin=is_admin)
 
 @main_bp.route('/upload', methods=['POST'])
 def upload_file():
@@ -37,24 +69,52 @@ def upload_file():
     uploaded_files = request.files.getlist('file')
     subpath = request.form.get('subpath', '')
     is_admin = session.get('admin_logged_in', False)
-    success_msgs, error_msgs = file_manager.save_uploaded_files(uploaded_files, request.remote_addr, subpath=subpath, is_admin=is_admin)
+    # Optional client-side SHA-256 per file, in the same order as the files (hex or 'sha-256=:<base64>:').
+    expected_hashes = request.form.getlist('sha256')
+    success_msgs, error_msgs = file_manager.save_uploaded_files(uploaded_files, request.remote_addr, subpath=subpath,
+                                                                is_admin=is_admin, expected_hashes=expected_hashes)
 
     if success_msgs:
         action_logger.log(request.remote_addr, 'FILE_UPLOAD', {'files': [f.filename for f in uploaded_files if f.filename], 'path': subpath})
         # After a successful upload, broadcast for the uploaded path
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to get updated file list after upload: {e}")
 
     return jsonify(success=True, messages={'success': success_msgs, 'error': error_msgs})
 
+def send_with_digest(rel_path):
+    """send_from_directory plus Repr-Digest (RFC 9530) and legacy Digest headers when an upload checksum is on record."""
+    # Dotfiles are server-private and never listed; send_from_directory alone would serve them.
+    if any(part.startswith('.') for part in rel_path.replace('\\', '/').split('/')):
+        abort(404)
+    response = send_from_directory(file_manager.files_folder, rel_path, as_attachment=True)
+    sha256 = file_manager.get_checksum(os.path.normpath(rel_path))
+    if sha256:
+        b64 = base64.b64encode(bytes.fromhex(sha256)).decode('ascii')
+        response.headers['Repr-Digest'] = f"sha-256=:{b64}:"
+        response.headers['Digest'] = f"sha-256={b64}"
+    return response
+
+def broadcast_job_update(job):
+    """JobManager subscriber: pushes progress to admins, and fresh listings once a job finishes."""
+    socketio.emit('job_progress', job, room='admin_room')
+    if job['status'] not in ('completed', 'failed', 'cancelled') or job['type'] == 'zip':
+        return
+    for subpath in {job['params']['source_path'], job['params']['dest_path']} if job['type'] in ('move', 'copy') \
+            else {job['params']['source_path']}:
+        try:
+            socketio.emit('file_list_updated', pack_listing(file_manager.list_files(subpath), subpath))
+        except Exception as e:
+            logging.error(f"Failed to broadcast after {job['type']} job {job['id']}: {e}")
+
 @main_bp.route('/files/<path:filename>', methods=['GET'])
 def download_file(filename):
     decoded_filename = unquote(filename)
     action_logger.log(request.remote_addr, 'FILE_DOWNLOAD', {'file': decoded_filename})
-    return send_from_directory(file_manager.files_folder, decoded_filename, as_attachment=True)
+    return send_with_digest(decoded_filename)
 
 @main_bp.route('/delete/<path:filename>', methods=['DELETE'])
 def delete_file(filename):
@@ -69,7 +129,7 @@ def delete_file(filename):
         action_logger.log(request.remote_addr, 'FILE_DELETE', {'file': decoded_filename})
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to get updated file list after delete: {e}")
         return jsonify(success=True, message=message)
@@ -107,31 +167,13 @@ def lock_batch_files():
     if not isinstance(filenames, list) or not password:
         return jsonify(success=False, error="Invalid request data."), 400
 
-    locked_files, failed_files = [], []
-    for filename in filenames:
-        # Determine if file or folder
-        try:
-            target_dir = file_manager._validate_subpath(subpath)
-        except ValueError:
-            failed_files.append(filename)
-            continue
-        full_path = os.path.join(target_dir, filename)
-        if os.path.isdir(full_path):
-            folder_subpath = f"{subpath}/{filename}" if subpath else filename
-            success, _ = file_manager.lock_folder(folder_subpath, password)
-        else:
-            rel_path = f"{subpath}/{filename}" if subpath else filename
-            success, _ = file_manager.lock_file(rel_path, password)
-        if success:
-            locked_files.append(filename)
-        else:
-            failed_files.append(filename)
-    
+    locked_files, failed_files = file_manager.lock_batch(subpath, filenames, password)
+
     if locked_files:
         action_logger.log(request.remote_addr, 'FILES_LOCK_BATCH', {'files': locked_files})
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to get updated file list after batch lock: {e}")
 
@@ -175,7 +217,7 @@ def delete_batch_files():
         action_logger.log(request.remote_addr, 'FILES_DELETE_BATCH', {'files': deleted_files})
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to get updated file list after batch delete: {e}")
 
@@ -198,33 +240,13 @@ def unlock_batch_files():
     if not isinstance(filenames, list) or password is None:
         return jsonify(success=False, error="Invalid request data."), 400
 
-    unlocked_files, failed_files = [], []
-    for filename in filenames:
-        try:
-            target_dir = file_manager._validate_subpath(subpath)
-        except ValueError:
-            failed_files.append(filename)
-            continue
-        full_path = os.path.join(target_dir, filename)
-        if os.path.isdir(full_path):
-            folder_subpath = f"{subpath}/{filename}" if subpath else filename
-            success, _ = file_manager.unlock_folder(folder_subpath, password)
-        else:
-            rel_path = f"{subpath}/{filename}" if subpath else filename
-            if file_manager.verify_file_password(rel_path, password):
-                success, _ = file_manager.unlock_file(rel_path)
-            else:
-                success = False
-        if success:
-            unlocked_files.append(filename)
-        else:
-            failed_files.append(filename)
-    
+    unlocked_files, failed_files = file_manager.unlock_batch(subpath, filenames, password)
+
     if unlocked_files:
         action_logger.log(request.remote_addr, 'FILES_UNLOCK_BATCH', {'files': unlocked_files})
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to get updated file list after batch unlock: {e}")
 
@@ -247,6 +269,15 @@ def move_batch_files():
     if not isinstance(filenames, list) or dest_path is None:
         return jsonify(success=False, error="Invalid request data."), 400
 
+    # "background": true queues a move job instead (progress via /api/jobs and 'job_progress').
+    if data.get('background'):
+        success, result = job_manager.submit('move', {'items': filenames, 'source_path': source_path,
+                                                      'dest_path': dest_path}, request.remote_addr)
+        if not success:
+            return jsonify(success=False, error=result), 400
+        action_logger.log(request.remote_addr, 'JOB_SUBMIT', {'type': 'move', 'job': result['id'], 'files': filenames})
+        return jsonify(success=True, job=result), 202
+
     moved_files, failed_files = [], []
     for filename in filenames:
         try:
@@ -257,18 +288,21 @@ def move_batch_files():
             continue
         source_item = os.path.join(source_dir, filename)
         if os.path.isdir(source_item):
-            # Move folder
-            dest_item = os.path.join(dest_dir, filename)
-            if os.path.exists(dest_item):
-                failed_files.append({'file': filename, 'reason': 'Folder already exists at destination.'})
-                continue
+            # Move folder (a rename, so locks and favorites inside it follow)
+            old_rel = f"{source_path}/{filename}" if source_path else filename
+            new_rel = f"{dest_path}/{filename}" if dest_path else filename
             try:
-                import shutil
-                shutil.move(source_item, dest_item)
+                file_manager.move_path(old_rel, new_rel, request.remote_addr)
                 moved_files.append(filename)
-            except Exception as e:
-                logging.error(f"Error moving folder {source_item}: {e}")
-                failed_files.append({'file': filename, 'reason': str(e)})
+            except FileExistsError:
+                failed_files.append({'file': filename, 'reason': 'Folder already exists at destination.'})
+            except OSError as e:
+                if e.errno == errno.EXDEV:
+                    reason = 'Destination is on another drive; move it with "background": true.'
+                else:
+                    logging.error(f"Error moving folder {source_item}: {e}")
+                    reason = str(e)
+                failed_files.append({'file': filename, 'reason': reason})
         else:
             success, msg = file_manager.move_file(filename, source_path, dest_path, request.remote_addr)
             if success:
@@ -280,9 +314,9 @@ def move_batch_files():
         action_logger.log(request.remote_addr, 'FILES_MOVE_BATCH', {'files': moved_files, 'from': source_path, 'to': dest_path})
         try:
             src_files = file_manager.list_files(source_path)
-            socketio.emit('file_list_updated', {'files': src_files, 'path': source_path})
+            socketio.emit('file_list_updated', pack_listing(src_files, source_path))
             dest_files = file_manager.list_files(dest_path)
-            socketio.emit('file_list_updated', {'files': dest_files, 'path': dest_path})
+            socketio.emit('file_list_updated', pack_listing(dest_files, dest_path))
         except Exception as e:
             logging.error(f"Failed to broadcast after batch move: {e}")
 
@@ -305,6 +339,52 @@ def list_files_api():
         logging.error(f"Error listing files for path '{subpath}': {e}")
         return jsonify(success=False, error="Failed to list files."), 500
 
+@main_bp.route('/api/files/search', methods=['GET'])
+def search_files_api():
+    """
+    Searches the whole share folder. Query args: q, match (auto|prefix|substring|fuzzy),
+    type (file|folder), ext (comma-separated), min_size/max_size (bytes),
+    after/before (unix mtime), path (limit to a folder), content=1, limit.
+    """
+    if search_index is None:
+        return jsonify(success=False, error="Search is disabled on this server."), 404
+    args = request.args
+    match = args.get('match', 'auto')
+    if match not in ('auto', 'prefix', 'substring', 'fuzzy'):
+        return jsonify(success=False, error="Invalid match mode."), 400
+    try:
+        number = lambda key, cast=float: cast(args[key]) if args.get(key) else None
+        limit = max(1, min(number('limit', int) or 50, SEARCH_MAX_LIMIT))
+        filters = {
+            'kind': args.get('type') or None,
+            'extensions': [e for e in args.get('ext', '').split(',') if e] or None,
+            'min_size': number('min_size', int), 'max_size': number('max_size', int),
+            'modified_after': number('after'), 'modified_before': number('before'),
+        }
+    except ValueError:
+        return jsonify(success=False, error="Invalid filter value."), 400
+    content = args.get('content') == '1'
+    is_admin = session.get('admin_logged_in', False)
+    start = time.perf_counter()
+    try:
+        results = search_index.search(args.get('q', ''), match=match, scope=args.get('path', ''),
+                                      content=content, limit=limit, **filters)
+    except Exception as e:
+        logging.error(f"Search failed for {dict(args)}: {e}")
+        return jsonify(success=False, error="Search failed."), 500
+    items = []
+    for result in results:
+        is_folder = result['type'] == 'folder'
+        is_locked = file_manager.is_folder_locked(result['path']) if is_folder else file_manager.is_locked(result['path'])
+        # A content hit would reveal text from a password-protected file.
+        if content and is_locked and not is_admin:
+            continue
+        result.update(encoded_name=quote(result['path'], safe='/'), is_locked=is_locked,
+                      is_favorite=file_manager.is_favorite(result['path']))
+        items.append(result)
+    return jsonify(success=True, results=items, count=len(items),
+                   took_ms=round((time.perf_counter() - start) * 1000, 2))
+
 @main_bp.route('/api/file/move', methods=['POST'])
 def move_file():
     if not session.get('admin_logged_in'):
@@ -321,9 +401,9 @@ def move_file():
         # Broadcast updated file lists for both source and destination
         try:
             src_files = file_manager.list_files(source_path)
-            socketio.emit('file_list_updated', {'files': src_files, 'path': source_path})
+            socketio.emit('file_list_updated', pack_listing(src_files, source_path))
             dest_files = file_manager.list_files(dest_path)
-            socketio.emit('file_list_updated', {'files': dest_files, 'path': dest_path})
+            socketio.emit('file_list_updated', pack_listing(dest_files, dest_path))
         except Exception as e:
             logging.error(f"Failed to broadcast after file move: {e}")
         return jsonify(success=True, message=message)
@@ -331,14 +411,147 @@ def move_file():
 
 @main_bp.route('/api/folders/list', methods=['GET'])
 def list_all_folders():
-    """Return all folder paths for the folder picker."""
+    """
+    Return folder paths for the folder picker. Without arguments, the whole tree.
+    ?parent=<path> returns only the folders below it (one level unless ?depth= is
+    given), for loading children on demand. Responses carry an ETag.
+    """
+    parent = request.args.get('parent')
+    depth = request.args.get('depth', type=int)
     try:
-        folders = file_manager.list_all_folders()
-        return jsonify(success=True, folders=folders)
+        if parent is None:
+            folders = file_manager.list_all_folders(max_depth=depth)
+        else:
+            if not os.path.isdir(file_manager._validate_subpath(parent)):
+                return jsonify(success=False, error="Folder not found."), 404
+            folders = file_manager.list_all_folders(parent, max_depth=depth or 1, include_root=False)
+        response = jsonify(success=True, folders=folders, parent=(parent or '').strip('/'))
+        # Always revalidate, but let an unchanged tree come back as a bodiless 304.
+        response.headers['Cache-Control'] = 'no-cache'
+        response.add_etag()
+        return response.make_conditional(request)
+    except ValueError:
+        return jsonify(success=False, error="Invalid path."), 400
     except Exception as e:
         logging.error(f"Error listing all folders: {e}")
         return jsonify(success=False, error="Failed to list folders."), 500
 
+@main_bp.route('/api/sync/manifest', methods=['GET'])
+def sync_manifest():
+    """
+    Streams every folder and file under ?path= as NDJSON (one JSON object per
+    line, ending with a {"type": "end"} summary) for mirroring clients.
+    ?hashes=1 adds each file's SHA-256; locked files only get one for admins.
+    """
+    subpath = request.args.get('path', '').strip('/')
+    try:
+        if not os.path.isdir(file_manager._validate_subpath(subpath)):
+            return jsonify(success=False, error="Folder not found."), 404
+    except ValueError:
+        return jsonify(success=False, error="Invalid path."), 400
+    hashes = request.args.get('hashes') == '1'
+    is_admin = session.get('admin_logged_in', False)
+    hash_filter = None if is_admin else (lambda rel_path: not file_manager.is_locked(rel_path))
+    action_logger.log(request.remote_addr, 'SYNC_MANIFEST', {'path': subpath, 'hashes': hashes})
+
+    def generate():
+        try:
+            for item in delta_sync.iter_manifest(subpath, hashes=hashes, hash_filter=hash_filter):
+                yield json.dumps(item) + '\n'
+        except Exception as e:
+            # Headers are already sent; the missing 'end' line tells the client the manifest is incomplete.
+            logging.error(f"Sync manifest for '{subpath}' failed: {e}")
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@main_bp.route('/api/sync/signature', methods=['GET'])
+def sync_signature():
+    """
+    Block signature of one file (?path=, optional ?block_size=) for delta
+    transfers: per-block Adler-32 and BLAKE2b-128 plus the file's SHA-256.
+    Clients keep the blocks they already have and fetch the rest with Range
+    requests on /files/<path>.
+    """
+    rel_path = request.args.get('path', '').strip('/')
+    try:
+        file_manager._validate_subpath(rel_path)
+        block_size = request.args.get('block_size', type=int)
+    except ValueError:
+        return jsonify(success=False, error="Invalid path."), 400
+    if not rel_path:
+        return jsonify(success=False, error="File not found."), 404
+    if file_manager.is_locked(rel_path) and not session.get('admin_logged_in'):
+        return jsonify(success=False, error="This file is locked."), 403
+    try:
+        signature = delta_sync.signature(rel_path, block_size)
+    except FileNotFoundError:
+        return jsonify(success=False, error="File not found."), 404
+    except HashingBusyError:
+        return jsonify(success=False, error="Server is busy, please try again shortly."), 503
+    except Exception as e:
+        logging.error(f"Error computing signature for '{rel_path}': {e}")
+        return jsonify(success=False, error="Failed to compute signature."), 500
+    return jsonify(success=True, **signature)
+
+# --- Background Jobs API ---
+@main_bp.route('/api/jobs', methods=['GET', 'POST'])
+def jobs_api():
+    """
+    GET lists recent jobs (?status= to filter). POST queues one:
+    {"type": "move"|"copy"|"delete"|"zip", "items": [...], "source_path": "", "dest_path": ""}.
+    """
+    if not session.get('admin_logged_in'):
+        return jsonify(success=False, error="Authentication required."), 403
+    if request.method == 'GET':
+        limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+        return jsonify(success=True, jobs=job_manager.list_jobs(request.args.get('status'), limit))
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(success=False, error="Request body must be a JSON object."), 400
+    success, result = job_manager.submit(data.get('type'), data, request.remote_addr)
+    if not success:
+        return jsonify(success=False, error=result), 400
+    action_logger.log(request.remote_addr, 'JOB_SUBMIT', {'type': result['type'], 'job': result['id'],
+                                                          'files': result['params']['items']})
+    return jsonify(success=True, job=result), 202
+
+@main_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    if not session.get('admin_logged_in'):
+        return jsonify(success=False, error="Authentication required."), 403
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify(success=False, error="Job not found."), 404
+    return jsonify(success=True, job=job)
+
+@main_bp.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not session.get('admin_logged_in'):
+        return jsonify(success=False, error="Authentication required."), 403
+    success, message = job_manager.cancel(job_id)
+    if not success:
+        return jsonify(success=False, error=message), 404 if message == "Job not found." else 409
+    action_logger.log(request.remote_addr, 'JOB_CANCEL', {'job': job_id})
+    return jsonify(success=True, message=message)
+
+@main_bp.route('/api/jobs/<job_id>/download', methods=['GET'])
+def download_job_output(job_id):
+    """The archive built by a completed zip job."""
+    if not session.get('admin_logged_in'):
+        return jsonify(success=False, error="Authentication required."), 403
+    # Finished jobs are pruned in the background, so the job and its archive can vanish at any point here.
+    job, path = job_manager.get(job_id), job_manager.output_path(job_id)
+    try:
+        archive = open(path, 'rb') if job and path else None
+    except FileNotFoundError:
+        archive = None
+    if archive is None:
+        return jsonify(success=False, error="No archive for this job."), 404
+    action_logger.log(request.remote_addr, 'FILES_DOWNLOAD_ZIP', {'job': job_id})
+    return send_file(archive, mimetype='application/zip', as_attachment=True,
+                     download_name=job.get('download_name', f'{job_id}.zip'))
+
 @main_bp.route('/api/folder/lock', methods=['POST'])
 def lock_folder():
     if not session.get('admin_logged_in'):
@@ -355,7 +568,7 @@ def lock_folder():
             # Broadcast updated list for the parent folder
             parent = '/'.join(subpath.replace('\\', '/').split('/')[:-1])
             updated_files = file_manager.list_files(parent)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': parent})
+            socketio.emit('file_list_updated', pack_listing(updated_files, parent))
         except Exception as e:
             logging.error(f"Failed to broadcast after folder lock: {e}")
         return jsonify(success=True, message=message)
@@ -376,7 +589,7 @@ def unlock_folder():
         try:
             parent = '/'.join(subpath.replace('\\', '/').split('/')[:-1])
             updated_files = file_manager.list_files(parent)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': parent})
+            socketio.emit('file_list_updated', pack_listing(updated_files, parent))
         except Exception as e:
             logging.error(f"Failed to broadcast after folder unlock: {e}")
         return jsonify(success=True, message=message)
@@ -396,7 +609,7 @@ def create_folder():
         action_logger.log(request.remote_addr, 'FOLDER_CREATE', {'name': folder_name, 'path': subpath})
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to broadcast after folder creation: {e}")
         return jsonify(success=True, message=message)
@@ -416,7 +629,7 @@ def delete_folder():
         action_logger.log(request.remote_addr, 'FOLDER_DELETE', {'name': folder_name, 'path': subpath})
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to broadcast after folder deletion: {e}")
         return jsonify(success=True, message=message)
@@ -439,7 +652,7 @@ def rename_file():
         action_logger.log(request.remote_addr, 'FILE_RENAME', {'old': old_name, 'new': new_name, 'path': subpath})
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to broadcast after file rename: {e}")
         return jsonify(success=True, message=message)
@@ -462,7 +675,7 @@ def rename_folder():
         action_logger.log(request.remote_addr, 'FOLDER_RENAME', {'old': old_name, 'new': new_name, 'path': subpath})
         try:
             updated_files = file_manager.list_files(subpath)
-            socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+            socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
         except Exception as e:
             logging.error(f"Failed to broadcast after folder rename: {e}")
         return jsonify(success=True, message=message)
@@ -502,8 +715,7 @@ def create_share_link():
     action_logger.log(request.remote_addr, 'FILE_SHARE_LINK', {'file': filepath, 'expiry_hours': expiry_hours})
     
     # Construct full URL with IP address
-    from .utils import get_local_ip
-    local_ip = get_local_ip()
+    local_ip = network_info.local_ip
     port = os.environ.get('SNAILSYNK_PORT', 9000)
     share_url = f"https://{local_ip}:{port}/share/{token}"
     
@@ -536,7 +748,7 @@ def resolve_share_link(token):
             logging.error(f"Error serving shared folder: {e}")
             flash("An error occurred while preparing the shared folder.", "error")
             return redirect(url_for('.index'))
-    return send_from_directory(file_manager.files_folder, filepath, as_attachment=True)
+    return send_with_digest(filepath)
 
 @main_bp.route('/api/file/favorite', methods=['POST'])
 def toggle_favorite():
@@ -551,7 +763,7 @@ def toggle_favorite():
     action_logger.log(request.remote_addr, 'FILE_FAVORITE', {'file': filepath, 'favorited': new_state})
     try:
         updated_files = file_manager.list_files(subpath)
-        socketio.emit('file_list_updated', {'files': updated_files, 'path': subpath})
+        socketio.emit('file_list_updated', pack_listing(updated_files, subpath))
     except Exception as e:
         logging.error(f"Failed to broadcast after favorite toggle: {e}")
     return jsonify(success=True, favorited=new_state)
@@ -571,7 +783,7 @@ def generate_qr_code():
         # Get dynamic port from the request
         host_port = request.host.split(':')
         port = host_port[1] if len(host_port) > 1 else '9000'
-        qr_data_string = f"https://{get_local_ip()}:{port}"
+        qr_data_string = f"https://{network_info.local_ip}:{port}"
     elif qr_type == 'wifi':
         if not data.get('ssid'): return jsonify(success=False, error="SSID is required."), 400
         qr_data_string = f"WIFI:T:WPA;S:{data.get('ssid')};P:{data.get('password')};;"
@@ -598,43 +810,110 @@ def get_image_preview(filename):
     
     return jsonify(success=False, error="File is not a supported image or could not be found."), 404
 
+def commit_text_delta(data, remote_addr):
+    """Applies {"op", "version"} or a whole {"text"} to the shared buffer and broadcasts the delta. Returns (delta, error)."""
+    if 'op' in data:
+        delta, error = content_manager.apply_text_delta(data['op'], data.get('version'), remote_addr, data.get('client_id'))
+    else:
+        delta, error = content_manager.update_shared_text(data['text'], remote_addr)
+    if delta and delta['op']:
+        # Only the change travels; clients apply it to the version they hold.
+        socketio.emit('text_delta', delta)
+        action_logger.log(remote_addr, 'BUFFER_UPDATE', {'length': delta['length'], 'version': delta['version']})
+    return delta, error
+
 @main_bp.route('/api/shared-text', methods=['GET', 'POST'])
 def shared_text_api():
+    """GET: the full text and its version. POST: {"text": ...} replaces it, {"op": [...], "version": n} edits it."""
     if request.method == 'GET':
-        return jsonify(success=True, text=content_manager.get_shared_text())
-    # POST
-    data = request.get_json()
-    if not data or 'text' not in data: return jsonify(success=False, error="Invalid request."), 400
-    updated_text = content_manager.update_shared_text(data['text'], request.remote_addr)
-    socketio.emit('text_updated', {'text': updated_text})
-    action_logger.log(request.remote_addr, 'BUFFER_UPDATE', {'length': len(updated_text)})
-    return jsonify(success=True, message="Shared text updated.")
+        return jsonify(success=True, **content_manager.get_snapshot())
+    data = request.get_json(silent=True)
+    if not data or ('text' not in data and 'op' not in data): return jsonify(success=False, error="Invalid request."), 400
+    delta, error = commit_text_delta(data, request.remote_addr)
+    if error:
+        return jsonify(success=False, error=error, resync=error == STALE_VERSION), 409 if error == STALE_VERSION else 400
+    return jsonify(success=True, message="Shared text updated.", version=delta['version'], op=delta['op'])
 
 @main_bp.route('/api/copy-text', methods=['POST'])
 def copy_text_to_clipboard():
     success, message = content_manager.copy_buffer_to_clipboard()
     return jsonify(success=success, error=None if success else message), 200 if success else 500
 
-@main_bp.route('/api/pins', methods=['POST'])
-def add_pin():
+def page_args():
+    """?before=<cursor>&limit=<n> for the history endpoints; limit is clamped to 1-100."""
+    return request.args.get('before', type=int), max(1, min(request.args.get('limit', PIN_PAGE_SIZE, type=int), 100))
+
+@main_bp.route('/api/shared-text/history')
+def shared_text_history():
+    """Earlier buffer texts, newest first. Pass the returned cursor as ?before= for the next page."""
+    before, limit = page_args()
+    return jsonify(success=True, **content_manager.get_revisions(before, limit))
+
+@main_bp.route('/api/pins', methods=['GET', 'POST'])
+def pins_api():
+    """GET: a page of pins, newest first (?before=<cursor>&limit=<n>). POST: pins {"text"}."""
+    if request.method == 'GET':
+        before, limit = page_args()
+        return jsonify(success=True, **content_manager.get_pins(before, limit))
     text_to_pin = request.json.get('text', '')
-    updated_pins, error = content_manager.add_pin(text_to_pin, request.remote_addr)
+    page, error = content_manager.add_pin(text_to_pin, request.remote_addr)
     if error: return jsonify(success=False, error=error), 400
-    socketio.emit('pins_updated', {'pins': updated_pins})
-    return jsonify(success=True, pins=updated_pins)
+    # Clients get the newest page and a cursor, never the whole history.
+    socketio.emit('pins_updated', page)
+    return jsonify(success=True, **page)
 
 @main_bp.route('/api/pins/<pin_id>', methods=['DELETE'])
 def delete_pin(pin_id):
-    updated_pins, error = content_manager.delete_pin(pin_id, request.remote_addr)
+    page, error = content_manager.delete_pin(pin_id, request.remote_addr)
     if error: return jsonify(success=False, error=error), 404
-    socketio.emit('pins_updated', {'pins': updated_pins})
-    return jsonify(success=True, pins=updated_pins)
+    socketio.emit('pins_updated', page)
+    return jsonify(success=True, **page)
 
 @main_bp.route('/api/pins/clear', methods=['DELETE'])
 def clear_all_pins():
-    updated_pins, error = content_manager.clear_all_pins(request.remote_addr)
-    socketio.emit('pins_updated', {'pins': updated_pins})
-    return jsonify(success=True, pins=updated_pins)
+    page, error = content_manager.clear_all_pins(request.remote_addr)
+    socketio.emit('pins_updated', page)
+    return jsonify(success=True, **page)
+
+@main_bp.route('/api/clipboard/blobs', methods=['POST'])
+def clipboard_blob_upload():
+    """
+    Adds a binary clipboard item. The request body is the raw payload (streamed,
+    not base64), Content-Type its MIME type, and X-Filename an optional name.
+    """
+    if request.content_length and request.content_length > blob_cache.max_blob_bytes:
+        return jsonify(success=False, error=BLOB_TOO_LARGE), 413
+    name = secure_filename(unquote(request.headers.get('X-Filename', '')))
+    entry, error = blob_cache.put(request.stream, request.mimetype, name, request.remote_addr)
+    if error: return jsonify(success=False, error=error), 413 if error == BLOB_TOO_LARGE else 400
+    blob = {k: v for k, v in entry.items() if k != 'by'}
+    action_logger.log(request.remote_addr, 'CLIPBOARD_BLOB', {'id': blob['id'], 'mime': blob['mime'], 'size': blob['size']})
+    # Announce by reference only; clients fetch the payload when they want it.
+    socketio.emit('clipboard_blob', blob)
+    return jsonify(success=True, blob=blob)
+
+@main_bp.route('/api/clipboard/blobs', methods=['GET'])
+def clipboard_blob_list():
+    return jsonify(success=True, blobs=blob_cache.list_entries(limit=request.args.get('limit', 50, type=int)))
+
+@main_bp.route('/api/clipboard/blobs/<blob_id>', methods=['GET', 'DELETE'])
+def clipboard_blob(blob_id):
+    if request.method == 'DELETE':
+        if not blob_cache.delete(blob_id): return jsonify(success=False, error="Clipboard item not found."), 404
+        socketio.emit('clipboard_blob_removed', {'id': blob_id})
+        return jsonify(success=True)
+    path, entry = blob_cache.open(blob_id)
+    if not path: return jsonify(success=False, error="Clipboard item not found or evicted."), 404
+    # The type comes from the uploader, so only a few harmless ones may render on this origin.
+    inline = entry['mime'] in INLINE_MIME_TYPES and request.args.get('download') != '1'
+    response = send_file(path, mimetype=entry['mime'], download_name=entry['name'] or f"clipboard-{blob_id[:12]}",
+                         as_attachment=not inline, conditional=True, max_age=86400)
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = 'sandbox'
+    # The id is the content hash, so the payload behind a URL never changes.
+    response.headers['Repr-Digest'] = f"sha-256=:{base64.b64encode(bytes.fromhex(blob_id)).decode('ascii')}:"
+    response.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+    return response
 
 @main_bp.route('/api/file/status/<path:filename>')
 def get_file_status(filename):
@@ -651,7 +930,7 @@ def lock_file(filename):
         # After lock, broadcast the updated file list
         try:
             updated_files = file_manager.list_files()
-            socketio.emit('file_list_updated', {'files': updated_files})
+            socketio.emit('file_list_updated', pack_listing(updated_files))
         except Exception as e:
             logging.error(f"Failed to get updated file list after lock: {e}")
         return jsonify(success=True, message=message)
@@ -666,7 +945,7 @@ def unlock_file(filename):
         # After unlock, broadcast the updated file list
         try:
             updated_files = file_manager.list_files()
-            socketio.emit('file_list_updated', {'files': updated_files})
+            socketio.emit('file_list_updated', pack_listing(updated_files))
         except Exception as e:
             logging.error(f"Failed to get updated file list after unlock: {e}")
         return jsonify(success=True, message=message)
@@ -674,13 +953,20 @@ def unlock_file(filename):
 
 @main_bp.route('/api/file/download_locked/<path:filename>', methods=['POST'])
 def download_locked_file(filename):
-    password = request.json.get('password')
-    if not password: return jsonify(error="Password is required."), 400
+    data = request.get_json(silent=True) or {}
+    password, token = data.get('password'), data.get('token')
+    if not password and not token: return jsonify(error="Password is required."), 400
     decoded_filename = unquote(filename)
     if not file_manager.is_locked(decoded_filename): return jsonify(error="File is no longer locked."), 409
-    if file_manager.verify_file_password(decoded_filename, password):
+    # A valid unlock token from an earlier download skips the Argon2 verify.
+    if token and file_manager.verify_unlock_token(token, decoded_filename):
         action_logger.log(request.remote_addr, 'FILE_DOWNLOAD_UNLOCKED', {'file': decoded_filename})
-        return send_from_directory(file_manager.files_folder, decoded_filename, as_attachment=True)
+        return send_with_digest(decoded_filename)
+    if password and file_manager.verify_file_password(decoded_filename, password):
+        action_logger.log(request.remote_addr, 'FILE_DOWNLOAD_UNLOCKED', {'file': decoded_filename})
+        response = send_with_digest(decoded_filename)
+        response.headers['X-Unlock-Token'] = file_manager.issue_unlock_token(decoded_filename)
+        return response
     else:
         action_logger.log(request.remote_addr, 'FILE_DOWNLOAD_FAIL', {'file': decoded_filename})
         return jsonify(error="Incorrect password."), 403
@@ -688,21 +974,35 @@ def download_locked_file(filename):
 def register_socketio_events(sio):
     @sio.on('connect')
     def handle_connect():
-        remote_ip = request.remote_addr
-        sio.active_clients[request.sid] = {
-            'ip': remote_ip, 'connected_since': datetime.now(timezone.utc).isoformat()
-        }
-        emit('pins_updated', {'pins': content_manager.get_pins()})
-        sio.emit('update_client_list', list(sio.active_clients.values()), room='admin_room')
+        refusal = connection_supervisor.admit(request.remote_addr) if connection_supervisor else None
+        if refusal:
+            raise ConnectionRefusedError(refusal)
+        client = client_registry.connect(request.sid, request.remote_addr, request.headers.get('User-Agent', ''),
+                                         request.headers.get('Accept-Language', ''))
+        if connection_supervisor: connection_supervisor.connected()
+        emit('pins_updated', content_manager.get_pins())
+        # Admins get just the change; the full list is paged from /admin/api/clients.
+        sio.emit('client_joined', client, room='admin_room')
 
     @sio.on('disconnect')
     def handle_disconnect():
-        if request.sid in sio.active_clients:
-            del sio.active_clients[request.sid]
-            sio.emit('update_client_list', list(sio.active_clients.values()), room='admin_room')
+        client = client_registry.disconnect(request.sid)
+        if client:
+            if connection_supervisor: connection_supervisor.disconnected()
+            sio.emit('client_left', {'sid': client['sid'], 'ip': client['ip']}, room='admin_room')
+
+    @sio.on('text_delta')
+    def handle_text_delta(data):
+        """An edit to the shared buffer: {"op", "version", "client_id"}. The ack carries the committed version."""
+        client_registry.touch(request.sid)
+        if not isinstance(data, dict) or 'op' not in data:
+            return {'success': False, 'error': "Invalid request."}
+        delta, error = commit_text_delta(data, request.remote_addr)
+        if error:
+            return {'success': False, 'error': error, 'resync': error == STALE_VERSION}
+        return {'success': True, 'version': delta['version'], 'op': delta['op']}
 
     @sio.on('join_admin')
     def handle_join_admin_room():
         if session.get('admin_logged_in'):
-            join_room('admin_room')
-            emit('update_client_list', list(sio.active_clients.values()))
\ No newline at end of file
+            join_room('admin_room')
\ No newline at end of file
@@ -1,6 +1,8 @@
 # routes/utils.py
 import socket
+import select
 import platform
+import threading
 import subprocess
 import logging
 
@@ -34,4 +36,94 @@ def get_current_ssid():
     except (subprocess.CalledProcessError, FileNotFoundError):
         logging.warning("Could not determine Wi-Fi SSID.")
         return None
-    return None
\ No newline at end of file
+    return None
+
+class NetworkInfo:
+    """
+    Caches the server's LAN IP and Wi-Fi SSID so page renders never open a socket
+    or spawn a subprocess. A background thread refreshes both on an interval and,
+    on Linux, immediately after a netlink link/address change.
+    """
+    # rtnetlink multicast groups: link state, IPv4 and IPv6 address changes
+    _NETLINK_GROUPS = 0x1 | 0x10 | 0x100
+    _CHANGE_SETTLE_SECONDS = 2
+
+    def __init__(self, refresh_interval=60):
+        self.refresh_interval = refresh_interval
+        self._local_ip = None
+        self._ssid = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def local_ip(self):
+        if not self._loaded: self.refresh()
+        return self._local_ip
+
+    @property
+    def ssid(self):
+        if not self._loaded: self.refresh()
+        return self._ssid
+
+    def refresh(self):
+        local_ip, ssid = get_local_ip(), get_current_ssid()
+        with self._lock:
+            changed = self._loaded and (local_ip, ssid) != (self._local_ip, self._ssid)
+            self._local_ip, self._ssid, self._loaded = local_ip, ssid, True
+        if changed:
+            logging.info(f"Network changed: IP {local_ip}, SSID {ssid or 'unknown'}")
+
+    def start(self):
+        """Starts the background refresher. Safe to call more than once."""
+        if self._thread and self._thread.is_alive(): return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='network-info', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _open_netlink(self):
+        if not hasattr(socket, 'AF_NETLINK'): return None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, self._NETLINK_GROUPS))
+            return sock
+        except OSError as e:
+            logging.debug(f"Netlink unavailable, using interval refresh only: {e}")
+            return None
+
+    def _run(self):
+        netlink = self._open_netlink()
+        try:
+            self.refresh()
+            while not self._stop_event.is_set():
+                if netlink is None:
+                    self._stop_event.wait(self.refresh_interval)
+                else:
+                    ready, _, _ = select.select([netlink], [], [], self.refresh_interval)
+                    if ready:
+                        # Interface changes arrive in bursts; let DHCP settle, then drain.
+                        self._stop_event.wait(self._CHANGE_SETTLE_SECONDS)
+                        self._drain(netlink)
+                if not self._stop_event.is_set():
+                    self.refresh()
+        except Exception as e:
+            logging.error(f"Network info refresher stopped: {e}")
+        finally:
+            if netlink is not None: netlink.close()
+
+    @staticmethod
+    def _drain(sock):
+        sock.setblocking(False)
+        try:
+            while sock.recv(65536): pass
+        except (BlockingIOError, OSError):
+            pass
+        finally:
+            sock.setblocking(True)
+
+
+network_info = NetworkInfo()
@@ -30,9 +30,16 @@ document.addEventListener('DOMContentLoaded', () => {
     const ipInput = document.getElementById('ip-to-block-input');
     const toggleFormBtn = document.querySelector('.toggle-form-btn');
     const clientCountEl = document.getElementById('client-count');
+    const clientTrendEl = document.getElementById('client-trend');
     const blockedCountEl = document.getElementById('blocked-count');
     const totalLogsEl = document.getElementById('total-logs');
     const recentActivityEl = document.getElementById('recent-activity');
+    const dedupCardEl = document.getElementById('dedup-card');
+    const dedupSavedEl = document.getElementById('dedup-saved');
+    const dedupTrendEl = document.getElementById('dedup-trend');
+    const integrityCardEl = document.getElementById('integrity-card');
+    const integrityCorruptedEl = document.getElementById('integrity-corrupted');
+    const integrityTrendEl = document.getElementById('integrity-trend');
     const loadMoreBtn = document.getElementById('load-more-logs-btn');
     const logFooter = document.getElementById('log-footer');
     const clearLogsBtn = document.querySelector('.clear-logs-btn');
@@ -41,6 +48,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const activityTimeline = document.getElementById('activity-timeline');
 
     // --- State ---
+    const clientPageSize = 50;
+    let clientTotal = 0;
     let logOffset = 0;
     const logLimit = 20;
     let allLogs = [];
@@ -49,16 +58,18 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Socket.IO Connection (if available) ---
     const initializeSocket = () => {
         if (typeof io !== 'undefined') {
-            const socket = io();
+            const socket = io({ transports: window.SOCKETIO_TRANSPORTS || ['polling', 'websocket'] });
 
             socket.on('connect', () => {
                 console.log('Connected to server');
-            });
-
-            socket.on('client_update', (data) => {
+                // Presence events go to the admin room; reload the page of clients after a reconnect.
+                socket.emit('join_admin');
                 loadClients();
             });
 
+            socket.on('client_joined', (client) => addClientRow(client));
+            socket.on('client_left', ({ sid }) => removeClientRow(sid));
+
             socket.on('blocklist_update', (data) => {
                 loadBlocklist();
             });
@@ -99,22 +110,10 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     // --- Load Functions ---
-    const loadClients = async () => {
-        const data = await apiCall('clients');
-        if (!data || !data.clients) return;
-
-        clientCountEl.textContent = data.clients.length;
-
-        if (data.clients.length === 0) {
-            clientListBody.innerHTML = '<tr class="empty-row"><td colspan="3">No connected clients</td></tr>';
-            return;
-        }
-
-        clientListBody.innerHTML = data.clients
-            .map(
-                (client) => `
-            <tr style="animation: fadeIn 0.3s ease-out;">
+    const clientRowHtml = (client) => `
+            <tr data-sid="${escapeHtml(client.sid)}" style="animation: fadeIn 0.3s ease-out;">
                 <td><code>${escapeHtml(client.ip)}</code></td>
+                <td title="${escapeHtml(client.user_agent || '')}">${escapeHtml(client.device || '')}</td>
                 <td>${formatDate(client.connected_since)}</td>
                 <td style="text-align: right;">
                     <button class="btn-sm btn-danger" onclick="blockClient('${escapeHtml(client.ip)}')" title="Block this IP">
@@ -122,27 +121,55 @@ document.addEventListener('DOMContentLoaded', () => {
                     </button>
                 </td>
             </tr>
-        `
-            )
-            .join('');
+        `;
+    const renderClientCount = () => {
+        clientCountEl.textContent = clientTotal;
+        if (clientTotal === 0) clientListBody.innerHTML = '<tr class="empty-row"><td colspan="4">No connected clients</td></tr>';
+    };
+
+    // The table shows the newest page; join/leave events patch it instead of reloading the list.
+    const addClientRow = (client) => {
+        if (clientListBody.querySelector(`tr[data-sid="${CSS.escape(client.sid)}"]`)) return;
+        clientTotal++;
+        clientListBody.querySelector('.empty-row')?.remove();
+        clientListBody.insertAdjacentHTML('afterbegin', clientRowHtml(client));
+        const rows = clientListBody.querySelectorAll('tr[data-sid]');
+        if (rows.length > clientPageSize) rows[rows.length - 1].remove();
+        renderClientCount();
+    };
+
+    const removeClientRow = (sid) => {
+        clientTotal = Math.max(0, clientTotal - 1);
+        clientListBody.querySelector(`tr[data-sid="${CSS.escape(sid)}"]`)?.remove();
+        renderClientCount();
+    };
+
+    const loadClients = async () => {
+        const data = await apiCall(`clients?limit=${clientPageSize}`);
+        if (!data || !data.clients) return;
+
+        clientTotal = data.total;
+        clientListBody.innerHTML = data.clients.map(clientRowHtml).join('');
+        renderClientCount();
     };
 
     const loadBlocklist = async () => {
         const data = await apiCall('blocklist');
         if (!data || !data.blocked_ips) return;
 
-        blockedCountEl.textContent = data.blocked_ips.length;
+        const rules = data.rules || data.blocked_ips.map((ip) => ({ rule: ip, expires: null }));
+        blockedCountEl.textContent = rules.length;
 
-        if (data.blocked_ips.length === 0) {
+        if (rules.length === 0) {
             blocklistBody.innerHTML = '<tr class="empty-row"><td colspan="2">No blocked IPs</td></tr>';
             return;
         }
 
-        blocklistBody.innerHTML = data.blocked_ips
+        blocklistBody.innerHTML = rules
             .map(
-                (ip) => `
+                ({ rule: ip, expires }) => `
             <tr style="animation: fadeIn 0.3s ease-out;">
-                <td><code>${escapeHtml(ip)}</code></td>
+                <td><code>${escapeHtml(ip)}</code>${expires ? ` <small style="color: var(--c-text-muted);">until ${formatDate(new Date(expires * 1000).toISOString())}</small>` : ''}</td>
                 <td style="text-align: right;">
                     <button class="btn-sm btn-danger" onclick="unblockIp('${escapeHtml(ip)}')" title="Unblock this IP">
                         Unblock
@@ -154,12 +181,99 @@ document.addEventListener('DOMContentLoaded', () => {
             .join('');
     };
 
+    const loadRateLimits = async () => {
+        const body = document.getElementById('rate-limit-body');
+        if (!body) return;
+        const data = await apiCall('rate_limits');
+        if (!data || !data.rate_limits) return;
+
+        const { classes, top_offenders: offenders, recent_bans: bans } = data.rate_limits;
+        body.innerHTML = Object.entries(classes)
+            .map(
+                ([name, c]) => `
+            <tr>
+                <td><code>${escapeHtml(name)}</code></td>
+                <td>${c.capacity} burst, ${Number(c.refill_per_sec * 60).toFixed(0)}/min</td>
+                <td>${c.allowed}</td>
+                <td>${c.throttled}</td>
+                <td style="text-align: right;">${c.recent_requests} req / ${c.recent_throttled} throttled</td>
+            </tr>
+        `
+            )
+            .join('');
+
+        const summary = document.getElementById('rate-limit-summary');
+        if (summary) {
+            const worst = offenders.length ? `, top offender ${escapeHtml(offenders[0].ip)} (${offenders[0].violations})` : '';
+            summary.innerHTML = `${bans.length} auto-ban${bans.length === 1 ? '' : 's'}${worst}`;
+        }
+    };
+
     const loadStats = async () => {
         const data = await apiCall('stats');
         if (!data || !data.stats) return;
 
         totalLogsEl.textContent = data.stats.total_logs || 0;
         recentActivityEl.textContent = data.stats.recent_activity || 0;
+
+        const connections = data.stats.connections;
+        if (connections && clientTrendEl) {
+            const refused = connections.totals.refused_per_ip + connections.totals.refused_total;
+            clientTrendEl.textContent = `${connections.connects_per_minute}/min in, ${connections.disconnects_per_minute}/min out` +
+                (refused ? `, ${refused} refused` : '');
+        }
+
+        const dedup = data.stats.dedup;
+        if (dedup) {
+            dedupCardEl.style.display = '';
+            dedupSavedEl.textContent = formatBytes(dedup.saved_bytes);
+            dedupTrendEl.textContent = `${dedup.blobs} blobs, ${formatBytes(dedup.stored_bytes)} stored`;
+        }
+
+        const integrity = data.stats.integrity;
+        if (integrity) {
+            integrityCardEl.style.display = '';
+            integrityCorruptedEl.textContent = integrity.corrupted;
+            if (integrity.running) integrityTrendEl.textContent = 'Verifying now...';
+            else if (integrity.last_finished) integrityTrendEl.textContent =
+                `${integrity.files_checked} checked ${new Date(integrity.last_finished * 1000).toLocaleString()}`;
+        }
+    };
+
+    const loadTrash = async () => {
+        const body = document.getElementById('trash-body');
+        if (!body) return;
+        const data = await apiCall('trash');
+        if (!data || !data.items) return;
+
+        const summary = document.getElementById('trash-summary');
+        if (summary) summary.textContent = `${data.items.length} item${data.items.length === 1 ? '' : 's'}, kept ${data.stats.retention_days} days`;
+        if (data.items.length === 0) {
+            body.innerHTML = '<tr class="empty-row"><td colspan="4">Trash is empty</td></tr>';
+            return;
+        }
+        body.innerHTML = data.items
+            .map(
+                (item) => `
+            <tr>
+                <td><code>${escapeHtml(item.path)}</code>${item.is_dir ? ' (folder)' : ''}</td>
+                <td>${new Date(item.deleted_at * 1000).toLocaleString()}</td>
+                <td>${item.size === null ? '...' : formatBytes(item.size)}</td>
+                <td style="text-align: right;">
+                    <button class="btn-sm" onclick="restoreTrashItem('${escapeHtml(item.id)}')" title="Put it back">Restore</button>
+                    <button class="btn-sm btn-danger" onclick="purgeTrashItem('${escapeHtml(item.id)}')" title="Delete for good">Delete</button>
+                </td>
+            </tr>
+        `
+            )
+            .join('');
+    };
+
+    const formatBytes = (bytes) => {
+        const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+        let i = 0;
+        while (bytes >= 1024 && i < units.length - 1) { bytes /= 1024; i++; }
+        return `${i ? bytes.toFixed(1) : bytes} ${units[i]}`;
     };
 
     const loadLogs = async (reset = false) => {
@@ -215,6 +329,7 @@ document.addEventListener('DOMContentLoaded', () => {
             // IP actions
             'IP_BLOCK': '<span class="badge badge-danger">IP Block</span>',
             'IP_UNBLOCK': '<span class="badge badge-success">IP Unblock</span>',
+            'IP_AUTO_BAN': '<span class="badge badge-danger">Auto Ban</span>',
             // AI Chat
             'AI_CHAT': '<span class="badge badge-primary">AI Chat</span>',
             // File operations
@@ -314,7 +429,11 @@ document.addEventListener('DOMContentLoaded', () => {
         const ip = ipInput.value.trim();
         if (!ip) return;
 
-        const success = await apiCall('block_ip', 'POST', { ip });
+        const durationSelect = document.getElementById('block-duration-select');
+        const payload = { ip };
+        if (durationSelect && durationSelect.value) payload.ttl_seconds = Number(durationSelect.value);
+
+        const success = await apiCall('block_ip', 'POST', payload);
         if (success) {
             ipInput.value = '';
             await loadBlocklist();
@@ -405,6 +524,34 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    window.restoreTrashItem = async (id) => {
+        const data = await apiCall(`trash/${id}/restore`, 'POST');
+        if (data && data.success) {
+            await loadTrash();
+            showNotification(`Restored to ${data.path}`, 'success');
+        }
+    };
+
+    window.purgeTrashItem = async (id) => {
+        if (confirm('Delete this item permanently? It cannot be restored.')) {
+            const data = await apiCall(`trash/${id}`, 'DELETE');
+            if (data && data.success) await loadTrash();
+        }
+    };
+
+    const emptyTrashBtn = document.getElementById('empty-trash-btn');
+    if (emptyTrashBtn) {
+        emptyTrashBtn.addEventListener('click', async () => {
+            if (confirm('Permanently delete everything in the trash?')) {
+                const data = await apiCall('trash/empty', 'POST');
+                if (data && data.success) {
+                    await loadTrash();
+                    showNotification(`${data.purged} item(s) deleted`, 'success');
+                }
+            }
+        });
+    }
+
     // --- Utility Functions ---
     const formatDate = (dateString) => {
         try {
@@ -694,15 +841,19 @@ document.addEventListener('DOMContentLoaded', () => {
     loadClients();
     loadBlocklist();
     loadStats();
+    loadRateLimits();
+    loadTrash();
     loadLogs();
     loadActivityTimeline();
     initCharts();
 
     // Refresh data every 10 seconds
     setInterval(() => {
-        loadClients();
+        if (!socket || !socket.connected) loadClients(); // otherwise join/leave events keep it current
         loadBlocklist();
         loadStats();
+        loadRateLimits();
+        loadTrash();
         loadActivityTimeline();
     }, 10000);
 });
@@ -56,8 +56,7 @@ document.addEventListener('DOMContentLoaded', () => {
         return;
     }
 
-    const PIN_LIMIT = 10;
-    const socket = io();
+    const socket = io({ transports: window.SOCKETIO_TRANSPORTS || ['polling', 'websocket'] });
 
     // --- DOM ELEMENT SELECTION ---
     const sharedTextArea = document.getElementById('sharedTextArea');
@@ -68,6 +67,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const pinBtn = document.getElementById('pinBtn');
     const clipboardStatus = document.getElementById('clipboardStatus');
     const textMeta = document.getElementById('textMeta');
+    const clipboardBlobsContainer = document.getElementById('clipboardBlobs');
     const selectTextAction = document.getElementById('selectTextAction');
     const viewBtnShared = document.getElementById('viewBtnShared');
     const viewBtnPinned = document.getElementById('viewBtnPinned');
@@ -117,32 +117,83 @@ document.addEventListener('DOMContentLoaded', () => {
     let isPreviewMode = false;
 
     // --- WEBSOCKET EVENT LISTENERS ---
-    socket.on('text_updated', (data) => {
-        if (sharedTextArea) {
-            if (isEditorMode && easyMDEInstance) {
-                // Update editor content if in editor mode
-                easyMDEInstance.value(data.text);
-            } else {
-                // Update textarea if in plain text mode
-                sharedTextArea.value = data.text;
-            }
-            updateTextMeta();
-            setStatus('[OK] Buffer synced from another client.', 'info');
-        }
-    });
+    // The shared buffer arrives as versioned deltas (see text-ot.js), not the full text.
+    socket.on('text_delta', (delta) => receiveTextDelta(delta));
     socket.on('pins_updated', (data) => {
+        // Only the newest page arrives; older pins are fetched with the cursor on demand.
+        pinsCursor = data.cursor;
         renderPinnedMessages(data.pins);
-        updatePinButtonState(data.pins.length);
+        updatePinButtonState();
+    });
+    // Admins join the admin room for background job progress.
+    let socketConnectedBefore = false;
+    socket.on('connect', () => {
+        if (document.getElementById('lockSelectedBtn')) socket.emit('join_admin');
+        // Deltas sent while we were disconnected are gone; catch up from a snapshot.
+        if (socketConnectedBefore) resyncSharedText();
+        socketConnectedBefore = true;
+    });
+    const watchedJobs = new Set();
+    const formatBytes = (bytes) => {
+        const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+        let i = 0;
+        while (bytes >= 1024 && i < units.length - 1) { bytes /= 1024; i++; }
+        return `${i ? bytes.toFixed(1) : bytes} ${units[i]}`;
+    };
+    // Binary clipboard items are announced by reference; the payload is fetched only when opened.
+    socket.on('clipboard_blob', (blob) => renderClipboardBlobs([blob], true));
+    socket.on('clipboard_blob_removed', ({ id }) => clipboardBlobsContainer?.querySelector(`[data-id="${id}"]`)?.remove());
+    socket.on('job_progress', (job) => {
+        if (!watchedJobs.has(job.id)) return;
+        const p = job.progress || {};
+        const verb = { move: 'Moving', copy: 'Copying', delete: 'Deleting', zip: 'Zipping' }[job.type] || 'Working';
+        if (job.status === 'running' || job.status === 'queued') {
+            const pct = p.bytes_total ? Math.floor(100 * p.bytes_done / p.bytes_total)
+                : (p.items_total ? Math.floor(100 * p.items_done / p.items_total) : 0);
+            const detail = p.bytes_total ? ` (${formatBytes(p.bytes_done)} of ${formatBytes(p.bytes_total)})` : '';
+            setStatus(`${verb}... ${pct}%${detail}`, 'info', 60000);
+            return;
+        }
+        watchedJobs.delete(job.id);
+        const done = job.result?.done?.length || 0;
+        const failed = job.result?.failed?.length || 0;
+        if (job.status === 'completed') {
+            let msg = `[OK] ${verb} finished: ${done} item(s).`;
+            if (failed > 0) msg += ` ${failed} failed.`;
+            setStatus(msg, failed > 0 ? 'warning' : 'success');
+        } else if (job.status === 'cancelled') {
+            setStatus(`[WARN] ${verb} cancelled after ${done} item(s).`, 'warning');
+        } else {
+            setStatus(`[ERR] ${verb} failed: ${job.error || 'unknown error'}`, 'error');
+        }
     });
+
+    // Listings arrive columnar (backbone/listing_codec.py): column names once, then one array per entry.
+    const encodePathPart = (part) => encodeURIComponent(part).replace(/[!'()*]/g, c => '%' + c.charCodeAt(0).toString(16).toUpperCase());
+    function unpackListing(data) {
+        if (!data.rows) return data.files;
+        const col = Object.fromEntries(data.columns.map((name, i) => [name, i]));
+        const prefix = data.path ? data.path.split('/').map(encodePathPart).join('/') + '/' : '';
+        return data.rows.map(row => ({
+            name: row[col.name],
+            encoded_name: prefix + encodePathPart(row[col.name]),
+            type: row[col.is_folder] ? 'folder' : 'file',
+            is_locked: !!row[col.is_locked],
+            is_favorite: !!row[col.is_favorite],
+            mtime: row[col.mtime],
+            size: row[col.size],
+        }));
+    }
     socket.on('file_list_updated', (data) => {
         // Only re-render if the broadcast is for the path we're currently viewing
         const broadcastPath = data.path || '';
         if (broadcastPath !== currentPath) return;
-        if (data.files && fileListBody) {
+        const files = unpackListing(data);
+        if (files && fileListBody) {
             flash('File list has been updated in real-time.', 'info');
-            renderFileList(data.files);
+            renderFileList(files);
             reinitializeFileActions();
-        } else if (data.files && !fileListBody) {
+        } else if (files && !fileListBody) {
             window.location.reload();
         }
     });
@@ -364,7 +415,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 e.preventDefault();
                 e.stopPropagation();
                 const folderName = btn.dataset.folderName;
-                const confirmed = await snailConfirm('Delete Folder', `Are you sure you want to permanently delete the folder "${folderName}" and ALL its contents?`, { danger: true, confirmText: 'Delete' });
+                const confirmed = await snailConfirm('Delete Folder', `Move the folder "${folderName}" and ALL its contents to the trash?`, { danger: true, confirmText: 'Delete' });
                 if (!confirmed) return;
                 setStatus(`[INFO] Deleting folder '${folderName}'...`, 'info', 60000);
                 try {
@@ -834,8 +885,138 @@ document.addEventListener('DOMContentLoaded', () => {
     const isLocal = ['localhost', '127.0.0.1', ''].includes(window.location.hostname.toLowerCase());
     if (selectTextAction) { selectTextAction.textContent = isLocal ? 'copies to clipboard' : 'copies to clipboard'; }
     function updateTextMeta() { if (sharedTextArea && textMeta) { const charCount = sharedTextArea.value.length; textMeta.textContent = `${charCount} chars`; updatePinButtonState(); } }
-    async function loadSharedText() { if (!sharedTextArea) return; try { const response = await fetch('/api/shared-text'); if (!response.ok) throw new Error(`Server error: ${response.status}`); const result = await response.json(); if (result.success) { sharedTextArea.value = result.text; updateTextMeta(); } else { throw new Error(result.error || 'Unknown server error'); } } catch (error) { console.error('Error loading shared text:', error); setStatus(`[ERR] Load failed: ${error.message}`, 'error'); sharedTextArea.value = 'Error loading content.'; sharedTextArea.disabled = true; if (commitBtn) commitBtn.disabled = true; } }
-    async function commitSharedText() { if (!sharedTextArea || !commitBtn) return; const textToSend = isEditorMode && easyMDEInstance ? easyMDEInstance.value() : sharedTextArea.value; commitBtn.disabled = true; commitBtn.textContent = 'Committing...'; setStatus('', 'info'); try { const response = await fetch('/api/shared-text', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ text: textToSend }), }); if (!response.ok) throw new Error(`Server error: ${response.status}`); const result = await response.json(); if (result.success) { setStatus('[OK] Buffer updated.', 'success'); } else { throw new Error(result.error || 'Unknown server error'); } } catch (error) { console.error('Error committing shared text:', error); setStatus(`[ERR] Commit failed: ${error.message}`, 'error'); } finally { commitBtn.disabled = false; commitBtn.textContent = 'Commit'; } }
+    // --- Shared buffer sync: bufferText/bufferVersion mirror the server; the editor may hold uncommitted edits on top ---
+    const bufferClientId = Math.random().toString(36).slice(2);
+    let bufferText = '';
+    let bufferVersion = 0;
+    const pendingDeltas = new Map(); // version -> delta that arrived ahead of its predecessor
+    let deltaGapTimer = null;
+    function getBufferValue() { return isEditorMode && easyMDEInstance ? easyMDEInstance.value() : sharedTextArea.value; }
+    function setBufferValue(text, op) {
+        // op maps old caret positions to new ones, so a remote edit doesn't move the local cursor.
+        if (isEditorMode && easyMDEInstance) {
+            const cm = easyMDEInstance.codemirror;
+            const caret = cm.indexFromPos(cm.getCursor());
+            cm.setValue(text);
+            if (op) cm.setCursor(cm.posFromIndex(TextOT.transformIndex(caret, op)));
+        } else {
+            const { selectionStart, selectionEnd } = sharedTextArea;
+            const focused = document.activeElement === sharedTextArea;
+            sharedTextArea.value = text;
+            if (op && focused) sharedTextArea.setSelectionRange(TextOT.transformIndex(selectionStart, op), TextOT.transformIndex(selectionEnd, op));
+        }
+        updateTextMeta();
+    }
+    function receiveTextDelta(delta) {
+        if (!sharedTextArea || delta.version <= bufferVersion) return;
+        pendingDeltas.set(delta.version, delta);
+        let synced = false;
+        while (pendingDeltas.has(bufferVersion + 1)) {
+            const next = pendingDeltas.get(bufferVersion + 1);
+            pendingDeltas.delete(next.version);
+            const before = bufferText;
+            bufferText = TextOT.apply(bufferText, next.op);
+            bufferVersion = next.version;
+            if (next.client_id === bufferClientId) continue; // our own commit; the editor already shows it
+            // Rebase local, uncommitted edits onto the new server text.
+            const [localOp, remoteOp] = TextOT.transform(TextOT.diff(before, getBufferValue()), next.op);
+            setBufferValue(TextOT.apply(bufferText, localOp), remoteOp);
+            synced = true;
+        }
+        if (synced) setStatus('[OK] Buffer synced from another client.', 'info');
+        clearTimeout(deltaGapTimer);
+        if (pendingDeltas.size) deltaGapTimer = setTimeout(() => { if (pendingDeltas.size) resyncSharedText(); }, 3000);
+    }
+    async function fetchSharedSnapshot() {
+        const response = await fetch('/api/shared-text');
+        if (!response.ok) throw new Error(`Server error: ${response.status}`);
+        const result = await response.json();
+        if (!result.success) throw new Error(result.error || 'Unknown server error');
+        return result;
+    }
+    // --- Clipboard items: images, files and very large text go over the blob channel, not the buffer ---
+    const BLOB_TEXT_THRESHOLD = 1024 * 1024; // pasted text longer than this becomes a clipboard item
+    function renderClipboardBlobs(blobs, prepend = false) {
+        if (!clipboardBlobsContainer) return;
+        if (!prepend) clipboardBlobsContainer.innerHTML = '';
+        blobs.forEach(blob => {
+            clipboardBlobsContainer.querySelector(`[data-id="${blob.id}"]`)?.remove();
+            const url = `/api/clipboard/blobs/${blob.id}`;
+            const chip = document.createElement('div');
+            chip.className = 'clipboard-blob';
+            chip.dataset.id = blob.id;
+            const link = document.createElement('a');
+            link.href = url; link.target = '_blank'; link.rel = 'noopener';
+            link.textContent = `${blob.name || blob.mime} (${formatBytes(blob.size)})`;
+            link.title = 'Open';
+            const download = document.createElement('a');
+            download.href = `${url}?download=1`; download.className = 'btn btn-secondary btn-sm'; download.textContent = 'Save';
+            const remove = document.createElement('button');
+            remove.className = 'btn btn-secondary btn-sm remove-blob-btn'; remove.textContent = 'Remove';
+            chip.append(link, download, remove);
+            clipboardBlobsContainer.prepend(chip);
+        });
+    }
+    async function loadClipboardBlobs() { if (!clipboardBlobsContainer) return; try { const response = await fetch('/api/clipboard/blobs?limit=10'); const result = await response.json(); if (result.success) renderClipboardBlobs(result.blobs.reverse()); } catch (error) { console.error('Error loading clipboard items:', error); } }
+    async function uploadClipboardBlob(blob, name) {
+        setStatus(`Sending ${formatBytes(blob.size)} to the clipboard...`, 'info', 60000);
+        try {
+            // The raw bytes are the request body, so nothing is base64-encoded and the browser streams it.
+            const response = await fetch('/api/clipboard/blobs', { method: 'POST', headers: { 'Content-Type': blob.type || 'application/octet-stream', 'X-Filename': encodeURIComponent(name || '') }, body: blob });
+            const result = await response.json();
+            if (!result.success) throw new Error(result.error || 'Upload failed.');
+            setStatus('[OK] Added to the shared clipboard.', 'success');
+        } catch (error) { console.error('Error sending clipboard item:', error); setStatus(`[ERR] ${error.message}`, 'error'); }
+    }
+    if (clipboardBlobsContainer) {
+        clipboardBlobsContainer.addEventListener('click', async (e) => {
+            const removeBtn = e.target.closest('.remove-blob-btn');
+            if (!removeBtn) return;
+            const id = removeBtn.closest('.clipboard-blob').dataset.id;
+            try { const response = await fetch(`/api/clipboard/blobs/${id}`, { method: 'DELETE' }); const result = await response.json(); if (!result.success) throw new Error(result.error || 'Failed to remove.'); } catch (error) { setStatus(`[ERR] ${error.message}`, 'error'); }
+        });
+    }
+    async function loadSharedText() { if (!sharedTextArea) return; try { const result = await fetchSharedSnapshot(); bufferText = result.text; bufferVersion = result.version; sharedTextArea.value = result.text; updateTextMeta(); } catch (error) { console.error('Error loading shared text:', error); setStatus(`[ERR] Load failed: ${error.message}`, 'error'); sharedTextArea.value = 'Error loading content.'; sharedTextArea.disabled = true; if (commitBtn) commitBtn.disabled = true; } }
+    async function resyncSharedText() {
+        if (!sharedTextArea || sharedTextArea.disabled) return;
+        try {
+            const result = await fetchSharedSnapshot();
+            if (result.version <= bufferVersion && !pendingDeltas.size) return;
+            const hadLocalEdits = getBufferValue() !== bufferText;
+            bufferText = result.text;
+            bufferVersion = result.version;
+            for (const version of [...pendingDeltas.keys()]) if (version <= bufferVersion) pendingDeltas.delete(version);
+            // Uncommitted local edits are kept; the next commit applies them on top of the new text.
+            if (!hadLocalEdits) setBufferValue(result.text, null);
+        } catch (error) {
+            console.error('Error resyncing shared text:', error);
+        }
+    }
+    function sendTextDelta(payload) {
+        if (socket.connected) {
+            return new Promise((resolve) => socket.timeout(10000).emit('text_delta', payload, (err, ack) => resolve(err ? { success: false, error: 'Server did not answer.' } : ack)));
+        }
+        return fetch('/api/shared-text', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) }).then((r) => r.json());
+    }
+    async function commitSharedText() {
+        if (!sharedTextArea || !commitBtn) return;
+        commitBtn.disabled = true; commitBtn.textContent = 'Committing...'; setStatus('', 'info');
+        try {
+            for (let attempt = 0; attempt < 2; attempt++) {
+                const op = TextOT.diff(bufferText, getBufferValue());
+                if (!op.length) { setStatus('[OK] Buffer updated.', 'success'); return; }
+                const result = await sendTextDelta({ op, version: bufferVersion, client_id: bufferClientId });
+                if (result.success) {
+                    receiveTextDelta({ version: result.version, op: result.op, client_id: bufferClientId });
+                    setStatus('[OK] Buffer updated.', 'success');
+                    return;
+                }
+                if (!result.resync) throw new Error(result.error || 'Unknown server error');
+                await resyncSharedText(); // too far behind: catch up, then diff again
+            }
+            throw new Error('Buffer is changing too fast; try again.');
+        } catch (error) { console.error('Error committing shared text:', error); setStatus(`[ERR] Commit failed: ${error.message}`, 'error'); } finally { commitBtn.disabled = false; commitBtn.textContent = 'Commit'; }
+    }
     function clearSharedText() {
         if (sharedTextArea) {
             if (isEditorMode && easyMDEInstance) { easyMDEInstance.value(''); } else { sharedTextArea.value = ''; }
@@ -910,13 +1091,16 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // --- PINNED MESSAGES LOGIC ---
-    function updatePinButtonState(pinCount) { if (!pinBtn) return; const currentPinCount = pinCount ?? (pinnedMessagesContainer.children.length - (pinnedMessagesContainer.querySelector('.no-pins-message') ? 1 : 0)); const isTextAreaEmpty = sharedTextArea.value.trim() === ''; if (currentPinCount >= PIN_LIMIT) { pinBtn.disabled = true; pinBtn.title = `Pin limit of ${PIN_LIMIT} reached.`; } else if (isTextAreaEmpty) { pinBtn.disabled = true; pinBtn.title = 'Cannot pin empty text.'; } else { pinBtn.disabled = false; pinBtn.title = 'Pin the current text'; } }
+    let pinsCursor = null;
+    function updatePinButtonState() { if (!pinBtn) return; const isTextAreaEmpty = sharedTextArea.value.trim() === ''; if (isTextAreaEmpty) { pinBtn.disabled = true; pinBtn.title = 'Cannot pin empty text.'; } else { pinBtn.disabled = false; pinBtn.title = 'Pin the current text'; } }
     async function handlePinClick() { const textToPin = sharedTextArea.value; if (textToPin.trim() === '' || pinBtn.disabled) return; pinBtn.disabled = true; try { const response = await fetch('/api/pins', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ text: textToPin }), }); const result = await response.json(); if (!result.success) { throw new Error(result.error || 'Failed to pin message.'); } flash('[OK] Message pinned successfully.', 'success'); setStatus('[OK] Message pinned.', 'success'); } catch (error) { console.error('Error pinning message:', error); setStatus(`[ERR] ${error.message}`, 'error'); } }
     async function handleUnpinClick(pinId) { try { const response = await fetch(`/api/pins/${pinId}`, { method: 'DELETE' }); const result = await response.json(); if (!result.success) { throw new Error(result.error || 'Failed to unpin message.'); } setStatus('[OK] Message unpinned.', 'success'); } catch (error) { console.error('Error unpinning message:', error); setStatus(`[ERR] ${error.message}`, 'error'); } }
-    function renderPinnedMessages(pins = []) {
+    async function loadMorePins() { if (!pinsCursor) return; try { const response = await fetch(`/api/pins?before=${pinsCursor}`); const result = await response.json(); if (!result.success) { throw new Error(result.error || 'Failed to load pins.'); } pinsCursor = result.cursor; renderPinnedMessages(result.pins, true); } catch (error) { console.error('Error loading pins:', error); setStatus(`[ERR] ${error.message}`, 'error'); } }
+    function renderPinnedMessages(pins = [], append = false) {
         if (!pinnedMessagesContainer) return;
-        pinnedMessagesContainer.innerHTML = '';
-        if (pins.length === 0) {
+        if (append) pinnedMessagesContainer.querySelector('.load-more-pins')?.remove();
+        else pinnedMessagesContainer.innerHTML = '';
+        if (pins.length === 0 && !append) {
             pinnedMessagesContainer.innerHTML = '<p class="no-pins-message">No pinned messages. Type something in the shared buffer and click "Pin" to save it here.</p>';
             return;
         }
@@ -937,6 +1121,12 @@ document.addEventListener('DOMContentLoaded', () => {
 
             pinnedMessagesContainer.appendChild(card);
         });
+        if (pinsCursor) {
+            const more = document.createElement('button');
+            more.className = 'btn btn-secondary load-more-pins';
+            more.textContent = 'Load older pins';
+            pinnedMessagesContainer.appendChild(more);
+        }
     }
     function switchView(view) {
         currentView = view;
@@ -971,6 +1161,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const copyBtn = e.target.closest('.copy-pin-btn');
             const enlargeBtn = e.target.closest('.enlarge-pin-btn');
             const unpinBtn = e.target.closest('.unpin-btn');
+            if (e.target.closest('.load-more-pins')) { loadMorePins(); return; }
             if (copyBtn) { const card = copyBtn.closest('.pin-card'); const content = card.querySelector('.pin-card-content').textContent; const copied = await copyToClipboard(content); if (copied) { flash('[OK] Pinned text copied.', 'success'); } else { flash('[ERR] Failed to copy.', 'error'); } }
             if (enlargeBtn) {
                 const card = enlargeBtn.closest('.pin-card');
@@ -1006,7 +1197,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (!deleteButton) return;
             const encodedFilename = deleteButton.dataset.filename;
             const decodedFilename = decodeURIComponent(encodedFilename);
-            if (!confirm(`Are you sure you want to permanently delete the file:\n\n${decodedFilename}`)) { return; }
+            if (!confirm(`Move this file to the trash?\n\n${decodedFilename}`)) { return; }
             setStatus(`[INFO] Deleting '${decodedFilename}'...`, 'info', 60000);
             try {
                 const response = await fetch(`/delete/${encodedFilename}`, { method: 'DELETE' });
@@ -1217,8 +1408,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 try {
                     const response = await fetch(`/api/file/status/${filename}`);
                     const data = await response.json();
-                    if (data.locked) { openPasswordModal(filename); }
-                    else { window.location.href = downloadLink.href; }
+                    if (!data.locked) { window.location.href = downloadLink.href; }
+                    else if (!(await downloadWithUnlockToken(filename))) { openPasswordModal(filename); }
                 } catch (error) { console.error("Failed to check file status:", error); setStatus('[ERR] Could not verify file status.', 'error'); }
             }
             if (lockButton) {
@@ -1239,6 +1430,35 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // Unlock tokens are short-lived and scoped to one file; the server rejects them once expired or re-locked.
+    const unlockTokenKey = (filename) => `snailsynk-unlock:${filename}`;
+
+    function saveDownloadBlob(blob, filename) {
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.style.display = 'none';
+        a.href = url;
+        a.download = decodeURIComponent(filename);
+        document.body.appendChild(a);
+        a.click();
+        window.URL.revokeObjectURL(url);
+        a.remove();
+    }
+
+    async function downloadWithUnlockToken(filename) {
+        const token = sessionStorage.getItem(unlockTokenKey(filename));
+        if (!token) return false;
+        try {
+            const response = await fetch(`/api/file/download_locked/${filename}`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ token }) });
+            if (response.ok) {
+                saveDownloadBlob(await response.blob(), filename);
+                return true;
+            }
+        } catch (error) { console.error("Token download failed:", error); }
+        sessionStorage.removeItem(unlockTokenKey(filename));
+        return false;
+    }
+
     if (passwordModalForm) {
         passwordModalForm.addEventListener('submit', async (e) => {
             e.preventDefault();
@@ -1251,16 +1471,9 @@ document.addEventListener('DOMContentLoaded', () => {
             try {
                 const response = await fetch(`/api/file/download_locked/${filename}`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ password }) });
                 if (response.ok) {
-                    const blob = await response.blob();
-                    const url = window.URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.style.display = 'none';
-                    a.href = url;
-                    a.download = decodeURIComponent(filename);
-                    document.body.appendChild(a);
-                    a.click();
-                    window.URL.revokeObjectURL(url);
-                    a.remove();
+                    const token = response.headers.get('X-Unlock-Token');
+                    if (token) sessionStorage.setItem(unlockTokenKey(filename), token);
+                    saveDownloadBlob(await response.blob(), filename);
                     closePasswordModal();
                 } else if (response.status === 403) {
                     passwordModalError.textContent = 'Incorrect password. Please try again.';
@@ -1347,20 +1560,17 @@ document.addEventListener('DOMContentLoaded', () => {
             moveModalError.textContent = '';
             try {
                 if (batchMoveFilenames && batchMoveFilenames.length > 0) {
-                    // Batch move
+                    // Batch move runs as a background job; progress arrives via 'job_progress'
                     const response = await fetch('/api/files/move_batch', {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ filenames: batchMoveFilenames, source_path: sourcePath, dest_path: selectedDestPath })
+                        body: JSON.stringify({ filenames: batchMoveFilenames, source_path: sourcePath, dest_path: selectedDestPath, background: true })
                     });
                     const result = await response.json();
                     if (!response.ok) throw new Error(result.error || 'Failed to move files.');
                     closeMoveModal();
-                    const movedCount = result.details?.moved?.length || 0;
-                    const failedCount = result.details?.failed?.length || 0;
-                    let msg = `[OK] Moved ${movedCount} file(s).`;
-                    if (failedCount > 0) msg += ` ${failedCount} file(s) failed.`;
-                    setStatus(msg, failedCount > 0 ? 'warning' : 'success');
+                    watchedJobs.add(result.job.id);
+                    setStatus(`Moving ${batchMoveFilenames.length} item(s)...`, 'info', 60000);
                 } else {
                     // Single file move
                     const filename = moveFileName.value;
@@ -1386,6 +1596,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- INITIAL PAGE LOAD SETUP ---
     function initializePage() {
+        loadClipboardBlobs();
         loadSharedText().then(() => { if (scrollBufferBtn && scrollBufferBtn.handler) setTimeout(() => scrollBufferBtn.handler(), 100); });
         updateTextMeta();
         fileUploaded();
@@ -1441,6 +1652,22 @@ document.addEventListener('DOMContentLoaded', () => {
             });
         }
 
+        // --- Pasting files, images or huge text into the buffer sends them to the shared clipboard ---
+        const sharedTextSection = document.querySelector('.shared-text-section');
+        if (sharedTextSection && clipboardBlobsContainer) {
+            sharedTextSection.addEventListener('paste', (e) => {
+                const data = e.clipboardData || window.clipboardData;
+                if (!data || !e.target.closest('#sharedTextArea, .EasyMDEContainer')) return;
+                const file = Array.from(data.items || []).find(item => item.kind === 'file')?.getAsFile();
+                const text = file ? null : data.getData('text/plain');
+                if (!file && !(text && text.length > BLOB_TEXT_THRESHOLD)) return;
+                e.preventDefault();
+                e.stopPropagation(); // keep the page-wide paste-to-upload handler out of it
+                if (file) uploadClipboardBlob(file, file.name);
+                else uploadClipboardBlob(new Blob([text], { type: 'text/plain' }), 'pasted.txt');
+            });
+        }
+
         // --- QOL: Paste Image from Clipboard to Upload ---
         if (sharedTextArea && fileInput) {
             document.addEventListener('paste', (e) => {
@@ -1538,7 +1765,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const selectedFiles = Array.from(selectedCheckboxes).map(cb => cb.value);
                 if (selectedFiles.length === 0) return;
                 const fileListString = selectedFiles.map(name => `- ${decodeURIComponent(name)}`).join('\n');
-                if (confirm(`Are you sure you want to permanently delete these ${selectedFiles.length} files?\n\n${fileListString}`)) {
+                if (confirm(`Move these ${selectedFiles.length} items to the trash?\n\n${fileListString}`)) {
                     try {
                         const response = await fetch('/api/files/delete_batch', {
                             method: 'DELETE',
@@ -0,0 +1,118 @@
+// static/js/text-ot.js
+//
+// Operational transformation for the shared text buffer; the client half of
+// backbone/text_ot.py, which it must stay in step with. An operation is a list
+// walked over the document: a positive number retains that many characters, a
+// negative number deletes that many, a string is inserted. JavaScript string
+// lengths are UTF-16 code units, which is what the server counts too.
+(function () {
+    'use strict';
+
+    function builder() {
+        const ops = [];
+        return {
+            retain(n) {
+                if (n <= 0) return;
+                const last = ops[ops.length - 1];
+                if (typeof last === 'number' && last > 0) ops[ops.length - 1] += n; else ops.push(n);
+            },
+            delete(n) {
+                if (n <= 0) return;
+                const last = ops[ops.length - 1];
+                if (typeof last === 'number' && last < 0) ops[ops.length - 1] -= n; else ops.push(-n);
+            },
+            insert(text) {
+                if (!text) return;
+                const last = ops[ops.length - 1];
+                if (typeof last === 'string') ops[ops.length - 1] += text;
+                // Inserts go before a delete at the same position, as on the server.
+                else if (typeof last === 'number' && last < 0) {
+                    if (typeof ops[ops.length - 2] === 'string') ops[ops.length - 2] += text;
+                    else ops.splice(ops.length - 1, 0, text);
+                } else ops.push(text);
+            },
+            result() {
+                const last = ops[ops.length - 1];
+                if (typeof last === 'number' && last > 0) ops.pop();
+                return ops;
+            },
+        };
+    }
+
+    function apply(text, op) {
+        const out = [];
+        let pos = 0;
+        for (const c of op) {
+            if (typeof c === 'string') { out.push(c); continue; }
+            const n = Math.abs(c);
+            if (pos + n > text.length) throw new Error('Operation is longer than the document.');
+            if (c > 0) out.push(text.slice(pos, pos + n));
+            pos += n;
+        }
+        out.push(text.slice(pos));
+        return out.join('');
+    }
+
+    // For a and b made against the same document, returns [a', b'] with
+    // apply(apply(doc, a), b') === apply(apply(doc, b), a'). a's inserts win ties.
+    function transform(a, b) {
+        const aOut = builder(), bOut = builder();
+        let ia = 0, ib = 0;
+        let ca = a.length ? a[0] : null, cb = b.length ? b[0] : null;
+        while (ca !== null || cb !== null) {
+            if (typeof ca === 'string') {
+                aOut.insert(ca); bOut.retain(ca.length);
+                ca = ++ia < a.length ? a[ia] : null;
+                continue;
+            }
+            if (typeof cb === 'string') {
+                aOut.retain(cb.length); bOut.insert(cb);
+                cb = ++ib < b.length ? b[ib] : null;
+                continue;
+            }
+            // Past the end of either op the rest of the document is an implied retain.
+            if (ca === null) ca = Math.abs(cb);
+            if (cb === null) cb = Math.abs(ca);
+            const n = Math.min(Math.abs(ca), Math.abs(cb));
+            if (ca > 0 && cb > 0) { aOut.retain(n); bOut.retain(n); }
+            else if (ca < 0 && cb > 0) aOut.delete(n);
+            else if (ca > 0 && cb < 0) bOut.delete(n);
+            ca = ca > 0 ? ca - n : ca + n;
+            cb = cb > 0 ? cb - n : cb + n;
+            if (ca === 0) ca = ++ia < a.length ? a[ia] : null;
+            if (cb === 0) cb = ++ib < b.length ? b[ib] : null;
+        }
+        return [aOut.result(), bOut.result()];
+    }
+
+    // Single-region operation turning oldText into newText.
+    function diff(oldText, newText) {
+        let prefix = 0;
+        const max = Math.min(oldText.length, newText.length);
+        while (prefix < max && oldText.charCodeAt(prefix) === newText.charCodeAt(prefix)) prefix++;
+        let suffix = 0;
+        while (suffix < max - prefix &&
+               oldText.charCodeAt(oldText.length - 1 - suffix) === newText.charCodeAt(newText.length - 1 - suffix)) suffix++;
+        const b = builder();
+        b.retain(prefix);
+        b.insert(newText.slice(prefix, newText.length - suffix));
+        b.delete(oldText.length - prefix - suffix);
+        b.retain(suffix);
+        return b.result();
+    }
+
+    // Where a caret at `index` ends up once op is applied.
+    function transformIndex(index, op) {
+        let pos = 0, shifted = index;
+        for (const c of op) {
+            if (pos > index) break;
+            if (typeof c === 'string') { shifted += c.length; continue; }
+            const n = Math.abs(c);
+            if (c < 0) shifted -= Math.min(n, index - pos);
+            pos += n;
+        }
+        return Math.max(0, shifted);
+    }
+
+    window.TextOT = { apply, transform, diff, transformIndex };
+})();